@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Chart payload benchmark: JSON copies vs deduplicated compressed blobs
+
+Compares how complete profiles used to be stored (json.dumps into
+users.birth_chart_data and birth_chart_store.profile_data) with the
+chart_payload_codec blobs, on size and on encode/decode latency. json+zlib is
+shown as a stand-in for PostgreSQL's own TOAST compression (pglz compresses
+less than zlib, so the comparison favours the old format).
+
+Profiles are generated offline with the sidereal ephemeris for a few birth
+details, or sampled from birth_chart_store when DATABASE_URL and --from-db are
+given.
+
+Usage:
+    python benchmark_chart_payloads.py [--iterations 200]
+    DATABASE_URL=postgresql://... python benchmark_chart_payloads.py --from-db 50
+"""
+
+import os
+import json
+import time
+import zlib
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from services.chart_payload_codec import MSGPACK_AVAILABLE, ZSTD_AVAILABLE, decode_payload, encode_payload
+from services.birth_chart_store import generate_birth_details_hash, stored_reference
+
+SAMPLE_BIRTH_DETAILS = [
+    {"date": "1990-04-12", "time": "06:30", "location": "Jaffna, Sri Lanka", "timezone": "Asia/Colombo"},
+    {"date": "1985-11-02", "time": "21:15", "location": "Chennai, India", "timezone": "Asia/Kolkata"},
+    {"date": "2001-07-23", "time": "12:05", "location": "Toronto, Canada", "timezone": "America/Toronto"},
+]
+
+
+def offline_profiles() -> List[Dict[str, Any]]:
+    """Complete profiles shaped like EnhancedBirthChartCacheService builds them"""
+    from services.enhanced_birth_chart_cache_service import EnhancedBirthChartCacheService
+
+    service = EnhancedBirthChartCacheService("postgresql://unused")
+    profiles = []
+    for birth_details in SAMPLE_BIRTH_DETAILS:
+        reports = service.pdf_processor.offline_reports(birth_details)
+        reading = " ".join(["Vanakkam. Your Moon nakshatra shapes a reflective, devoted nature."] * 40)
+        profiles.append({
+            'birth_chart': service._offline_birth_chart_data(birth_details),
+            'pdf_reports': reports,
+            'swamiji_reading': {'reading': reading, 'generated_at': datetime.now().isoformat()},
+            'generated_at': datetime.now().isoformat(),
+        })
+    return profiles
+
+
+async def stored_profiles(limit: int) -> List[Dict[str, Any]]:
+    from knowledge_seeding_system import AsyncPGCompatPool
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise SystemExit("DATABASE_URL is required for --from-db")
+    pool = AsyncPGCompatPool(database_url, max_size=2)
+    try:
+        async with pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT profile_blob, profile_data FROM birth_chart_store
+                WHERE profile_blob IS NOT NULL OR profile_data IS NOT NULL
+                ORDER BY random() LIMIT $1
+            """, limit)
+    finally:
+        await pool.close()
+    profiles = []
+    for row in rows:
+        if row['profile_blob'] is not None:
+            profiles.append(decode_payload(row['profile_blob']))
+        else:
+            data = row['profile_data']
+            profiles.append(json.loads(data) if isinstance(data, str) else data)
+    return profiles
+
+
+def timed(run: Callable[[], Any], iterations: int) -> float:
+    """Median milliseconds per call"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def report(profiles: List[Dict[str, Any]], iterations: int):
+    codec = f"{'msgpack' if MSGPACK_AVAILABLE else 'json'}+{'zstd' if ZSTD_AVAILABLE else 'zlib'}"
+    print(f"{len(profiles)} profiles, codec {codec}, median of {iterations} runs\n")
+    print(f"{'':<10}{'json':>10}{'json+zlib':>12}{'blob':>10}{'ratio':>8}"
+          f"{'dumps ms':>11}{'loads ms':>11}{'encode ms':>11}{'decode ms':>11}")
+    totals = {"json": 0, "zlib": 0, "blob": 0}
+    for n, profile in enumerate(profiles):
+        text = json.dumps(profile)
+        blob = encode_payload(profile)
+        assert decode_payload(blob) == json.loads(text)
+        sizes = {"json": len(text.encode()), "zlib": len(zlib.compress(text.encode(), 6)), "blob": len(blob)}
+        for key in totals:
+            totals[key] += sizes[key]
+        print(f"{'#' + str(n + 1):<10}{sizes['json']:>10,}{sizes['zlib']:>12,}{sizes['blob']:>10,}"
+              f"{sizes['json'] / sizes['blob']:>7.1f}x"
+              f"{timed(lambda: json.dumps(profile), iterations):>11.3f}"
+              f"{timed(lambda: json.loads(text), iterations):>11.3f}"
+              f"{timed(lambda: encode_payload(profile), iterations):>11.3f}"
+              f"{timed(lambda: decode_payload(blob), iterations):>11.3f}")
+    print(f"{'total':<10}{totals['json']:>10,}{totals['zlib']:>12,}{totals['blob']:>10,}"
+          f"{totals['json'] / max(totals['blob'], 1):>7.1f}x")
+
+    reference = json.dumps(stored_reference(generate_birth_details_hash(SAMPLE_BIRTH_DETAILS[0]), 'profile'))
+    average_json = totals['json'] // max(len(profiles), 1)
+    print(f"\nusers.birth_chart_data: {average_json:,} bytes per copy before, {len(reference)} byte reference now")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--from-db", type=int, default=0, metavar="N",
+                        help="sample N stored profiles instead of generating offline ones")
+    args = parser.parse_args()
+
+    profiles = await stored_profiles(args.from_db) if args.from_db else offline_profiles()
+    if not profiles:
+        raise SystemExit("No profiles to benchmark")
+    report(profiles, args.iterations)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
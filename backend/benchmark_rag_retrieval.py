@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+RAG retrieval benchmark: per-domain loop vs single multi-domain query
+
+Compares the previous retrieval shape (one pgvector query per domain, run
+sequentially, each on a freshly acquired connection, distance computed in the
+WHERE clause) with RAGKnowledgeEngine._retrieve_domain_knowledge, which
+fetches the top-k of every domain in one index-friendly query.
+
+Usage:
+    DATABASE_URL=postgresql://... python benchmark_rag_retrieval.py [--iterations 50] [--concurrency 8]
+"""
+
+import os
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from typing import List
+
+from knowledge_seeding_system import AsyncPGCompatPool
+from enhanced_rag_knowledge_engine import RAGKnowledgeEngine, DEPTH_SIMILARITY_THRESHOLDS
+
+LEGACY_DOMAIN_SQL = """
+    SELECT id, knowledge_domain, content_type, title, content, metadata,
+           source_reference, authority_level, cultural_context,
+           1 - (embedding_vector <=> $1::vector) as similarity
+    FROM rag_knowledge_base
+    WHERE knowledge_domain = $2
+    AND 1 - (embedding_vector <=> $1::vector) > $3
+    ORDER BY similarity DESC
+    LIMIT 10
+"""
+
+DEFAULT_DOMAINS = [
+    "classical_astrology", "tamil_spiritual_literature", "relationship_astrology",
+    "career_astrology", "health_astrology", "remedial_measures",
+]
+
+
+async def legacy_retrieval(pool, embedding: List[float], domains: List[str], depth_level: str) -> int:
+    threshold = DEPTH_SIMILARITY_THRESHOLDS.get(depth_level, 0.75)
+    found = 0
+    for domain in domains:
+        async with pool.acquire() as conn:
+            found += len(await conn.fetch(LEGACY_DOMAIN_SQL, embedding, domain, threshold))
+    return found
+
+
+async def sample_embeddings(pool, count: int) -> List[List[float]]:
+    """Use stored knowledge vectors (slightly perturbed) as realistic query embeddings"""
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            "SELECT embedding_vector::text AS v FROM rag_knowledge_base "
+            "WHERE embedding_vector IS NOT NULL ORDER BY random() LIMIT $1", count
+        )
+    vectors = [[float(x) for x in row["v"].strip("[]").split(",")] for row in rows]
+    if not vectors:
+        vectors = [[random.uniform(-1, 1) for _ in range(1536)]]
+    return [[x + random.gauss(0, 0.01) for x in vectors[i % len(vectors)]] for i in range(count)]
+
+
+async def measure(label: str, run, embeddings: List[List[float]], concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    results: List[int] = []
+
+    async def one(embedding):
+        async with semaphore:
+            start = time.perf_counter()
+            results.append(await run(embedding))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one(e) for e in embeddings))
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label:<28} mean {statistics.mean(latencies):8.2f} ms   p50 {statistics.median(latencies):8.2f} ms   "
+          f"p95 {p95:8.2f} ms   {len(embeddings) / wall:7.1f} req/s   rows/req {statistics.mean(results):.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--depth-level", default="standard", choices=sorted(DEPTH_SIMILARITY_THRESHOLDS))
+    parser.add_argument("--domains", default=",".join(DEFAULT_DOMAINS))
+    args = parser.parse_args()
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise SystemExit("DATABASE_URL is required")
+
+    domains = [d.strip() for d in args.domains.split(",") if d.strip()]
+    pool = AsyncPGCompatPool(database_url, max_size=max(2, args.concurrency))
+    engine = RAGKnowledgeEngine(pool, os.getenv("OPENAI_API_KEY", "benchmark"))
+    try:
+        embeddings = await sample_embeddings(pool, args.iterations)
+
+        # Warm connections and caches before timing
+        await legacy_retrieval(pool, embeddings[0], domains, args.depth_level)
+        await engine._retrieve_domain_knowledge(domains, embeddings[0], "", args.depth_level)
+
+        print(f"{len(domains)} domains, {args.iterations} queries, concurrency {args.concurrency}")
+        await measure("per-domain loop (legacy)",
+                      lambda e: legacy_retrieval(pool, e, domains, args.depth_level),
+                      embeddings, args.concurrency)
+
+        async def single_query(embedding):
+            return len(await engine._retrieve_domain_knowledge(domains, embedding, "", args.depth_level))
+
+        await measure("single multi-domain query", single_query, embeddings, args.concurrency)
+        print(f"pool: {pool.get_stats()}")
+    finally:
+        await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
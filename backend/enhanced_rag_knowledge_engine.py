@@ -5,10 +5,9 @@ Provides infinite knowledge capability for Swami Jyotirananthan with authentic s
 
 import os
 import json
-import hashlib
 import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Tuple
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict, field
 import logging
 
@@ -39,10 +38,22 @@ try:
 except ImportError:
     ASYNCPG_AVAILABLE = False
 
+from services.embedding_service import get_embedding_service
+from services.vector_index import get_vector_index, RAG_VECTOR_INDEX_ENABLED
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Per-domain top-k for vector retrieval and the minimum similarity kept per depth level
+RAG_DOMAIN_TOP_K = int(os.getenv("RAG_DOMAIN_TOP_K", "10"))
+DEPTH_SIMILARITY_THRESHOLDS = {
+    "basic": 0.7,
+    "standard": 0.75,
+    "comprehensive": 0.8,
+    "comprehensive_30_minute": 0.85
+}
+
 @dataclass
 class KnowledgeQuery:
     """Structured query for knowledge retrieval"""
@@ -96,7 +107,7 @@ class RAGKnowledgeEngine:
     def __init__(self, database_pool, openai_api_key: str):
         self.db_pool = database_pool
         self.openai_client = AsyncOpenAI(api_key=openai_api_key)
-        self.embedding_cache = {}
+        self.embedding_service = get_embedding_service(self.openai_client, database_pool)
         self.persona_cache = {}
         self.knowledge_domains = self._initialize_knowledge_domains()
         
@@ -158,8 +169,12 @@ class RAGKnowledgeEngine:
         Main knowledge retrieval method - gets relevant knowledge for any query
         """
         try:
-            # Generate embedding for the query
-            query_embedding = await self._generate_embedding(query.primary_question)
+            # Embed the question and every chart element in one batched request
+            chart_elements = self._extract_chart_elements(query.birth_details) if query.birth_details else {}
+            element_queries = [f"{element} {value}" for element, value in chart_elements.items()]
+            query_embedding, *element_embeddings = await self._generate_embeddings(
+                [query.primary_question] + element_queries
+            )
             
             # Get service configuration if available
             service_config = await self._get_service_configuration(query.service_type)
@@ -169,19 +184,16 @@ class RAGKnowledgeEngine:
             if service_config and service_config.get("knowledge_domains"):
                 target_domains = service_config["knowledge_domains"]
             
-            # Perform multi-domain knowledge retrieval
-            retrieved_knowledge = []
-            
-            for domain in target_domains:
-                domain_knowledge = await self._retrieve_domain_knowledge(
-                    domain, query_embedding, query.primary_question, query.depth_level
-                )
-                retrieved_knowledge.extend(domain_knowledge)
+            # Perform multi-domain knowledge retrieval (one query for all domains)
+            retrieved_knowledge = await self._retrieve_domain_knowledge(
+                target_domains, query_embedding, query.primary_question, query.depth_level
+            )
             
             # Add birth chart specific knowledge if birth details provided
             if query.birth_details:
                 chart_specific_knowledge = await self._retrieve_chart_specific_knowledge(
-                    query.birth_details, query_embedding
+                    query.birth_details, query_embedding,
+                    element_embeddings=dict(zip(element_queries, element_embeddings))
                 )
                 retrieved_knowledge.extend(chart_specific_knowledge)
             
@@ -195,59 +207,87 @@ class RAGKnowledgeEngine:
             logger.error(f"Knowledge retrieval error: {e}")
             return await self._get_fallback_knowledge(query)
     
-    async def _retrieve_domain_knowledge(self, domain: str, query_embedding: List[float], 
+    async def _retrieve_domain_knowledge(self, domains: List[str], query_embedding: List[float], 
                                        query_text: str, depth_level: str) -> List[KnowledgeRetrieval]:
-        """Retrieve knowledge from a specific domain"""
+        """Retrieve the top-k knowledge pieces for every requested domain in a single query"""
+        domains = list(dict.fromkeys(domains))
+        if not domains:
+            return []
+        # Calculate similarity threshold based on depth level
+        similarity_threshold = DEPTH_SIMILARITY_THRESHOLDS.get(depth_level, 0.75)
+        
+        # In-process index fast path; any problem falls through to pgvector
+        if RAG_VECTOR_INDEX_ENABLED:
+            try:
+                vector_index = get_vector_index()
+                if await vector_index.ensure_loaded(self.db_pool):
+                    return [
+                        self._knowledge_from_row(row, similarity)
+                        for row, similarity in vector_index.search(query_embedding, domains, RAG_DOMAIN_TOP_K)
+                        if similarity > similarity_threshold
+                    ]
+            except Exception as e:
+                logger.warning(f"Vector index search failed, falling back to pgvector: {e}")
+        
         try:
-            async with self.db_pool.acquire() as conn:
-                # Calculate similarity threshold based on depth level
-                similarity_threshold = {
-                    "basic": 0.7,
-                    "standard": 0.75,
-                    "comprehensive": 0.8,
-                    "comprehensive_30_minute": 0.85
-                }.get(depth_level, 0.75)
-                
-                # Query for similar knowledge in the domain
-                query_sql = """
+            # Each lateral subquery is a plain ORDER BY distance LIMIT k, which the
+            # HNSW index on embedding_vector can serve; the threshold is applied below
+            query_sql = """
+                SELECT k.id, k.knowledge_domain, k.content_type, k.title, k.content, k.metadata,
+                       k.source_reference, k.authority_level, k.cultural_context,
+                       1 - k.distance AS similarity
+                FROM unnest($2::text[]) AS d(domain)
+                CROSS JOIN LATERAL (
                     SELECT id, knowledge_domain, content_type, title, content, metadata,
                            source_reference, authority_level, cultural_context,
-                           1 - (embedding_vector <=> $1::vector) as similarity
-                    FROM rag_knowledge_base 
-                    WHERE knowledge_domain = $2 
-                    AND 1 - (embedding_vector <=> $1::vector) > $3
-                    ORDER BY similarity DESC
-                    LIMIT 10
-                """
-                
-                rows = await conn.fetch(query_sql, query_embedding, domain, similarity_threshold)
-                
-                knowledge_pieces = []
-                for row in rows:
-                    knowledge_pieces.append(KnowledgeRetrieval(
-                        content=row["content"],
-                        source_reference=row["source_reference"],
-                        authority_level=row["authority_level"],
-                        relevance_score=float(row["similarity"]),
-                        knowledge_domain=row["knowledge_domain"],
-                        content_type=row["content_type"],
-                        cultural_context=row["cultural_context"],
-                        metadata=row["metadata"]
-                    ))
-                
-                return knowledge_pieces
-                
+                           embedding_vector <=> $1::vector AS distance
+                    FROM rag_knowledge_base
+                    WHERE knowledge_domain = d.domain
+                    AND embedding_vector IS NOT NULL
+                    ORDER BY embedding_vector <=> $1::vector
+                    LIMIT $3
+                ) k
+            """
+            
+            async with self.db_pool.acquire() as conn:
+                rows = await conn.fetch(query_sql, query_embedding, domains, RAG_DOMAIN_TOP_K)
+            
+            return [
+                self._knowledge_from_row(row, float(row["similarity"]))
+                for row in rows
+                if float(row["similarity"]) > similarity_threshold
+            ]
+            
         except Exception as e:
-            logger.error(f"Domain knowledge retrieval error for {domain}: {e}")
+            logger.error(f"Domain knowledge retrieval error for {', '.join(domains)}: {e}")
             return []
     
+    @staticmethod
+    def _knowledge_from_row(row, similarity: float) -> KnowledgeRetrieval:
+        return KnowledgeRetrieval(
+            content=row["content"],
+            source_reference=row["source_reference"],
+            authority_level=row["authority_level"],
+            relevance_score=similarity,
+            knowledge_domain=row["knowledge_domain"],
+            content_type=row["content_type"],
+            cultural_context=row["cultural_context"],
+            metadata=row["metadata"]
+        )
+    
     async def _retrieve_chart_specific_knowledge(self, birth_details: Dict[str, Any], 
-                                               query_embedding: List[float]) -> List[KnowledgeRetrieval]:
+                                               query_embedding: List[float],
+                                               element_embeddings: Optional[Dict[str, List[float]]] = None) -> List[KnowledgeRetrieval]:
         """Retrieve knowledge specific to birth chart elements"""
         try:
             # Extract astrological elements from birth details
             chart_elements = self._extract_chart_elements(birth_details)
             
+            # Embed all chart elements in one batch unless the caller already did
+            element_queries = [f"{element} {value}" for element, value in chart_elements.items()]
+            if element_embeddings is None or any(q not in element_embeddings for q in element_queries):
+                element_embeddings = dict(zip(element_queries, await self._generate_embeddings(element_queries)))
+            
             # Search for knowledge related to specific chart elements
             chart_specific_knowledge = []
             
@@ -255,7 +295,7 @@ class RAGKnowledgeEngine:
                 for element, value in chart_elements.items():
                     # Search for knowledge tagged with this chart element
                     element_query = f"{element} {value}"
-                    element_embedding = await self._generate_embedding(element_query)
+                    element_embedding = element_embeddings[element_query]
                     
                     query_sql = """
                         SELECT id, knowledge_domain, content_type, title, content, metadata,
@@ -318,29 +358,20 @@ class RAGKnowledgeEngine:
     
     async def _generate_embedding(self, text: str) -> List[float]:
         """Generate OpenAI embedding for text"""
+        return (await self._generate_embeddings([text]))[0]
+    
+    async def _generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for several texts in one cache lookup and one API batch"""
+        if not texts:
+            return []
         try:
-            # Check cache first
-            text_hash = hashlib.md5(text.encode()).hexdigest()
-            if text_hash in self.embedding_cache:
-                return self.embedding_cache[text_hash]
-            
-            # Generate new embedding
-            response = await self.openai_client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=text
-            )
-            
-            embedding = response.data[0].embedding
-            
-            # Cache the embedding
-            self.embedding_cache[text_hash] = embedding
-            
-            return embedding
+            # Two-tier cache (memory LRU + Postgres) first, misses coalesced into one request
+            return await self.embedding_service.embed_many(texts)
             
         except Exception as e:
             logger.error(f"Embedding generation error: {e}")
-            # Return zero vector as fallback
-            return [0.0] * 1536
+            # Return zero vectors as fallback
+            return [[0.0] * 1536 for _ in texts]
     
     async def _get_service_configuration(self, service_type: str) -> Optional[Dict[str, Any]]:
         """Get service configuration from cache or database"""
@@ -772,6 +803,7 @@ class AutomatedKnowledgeExpansion:
                     knowledge_data.get("cultural_context", "universal")
                 )
             
+            get_vector_index().upsert(knowledge_data, embedding)
             return True
             
         except Exception as e:
@@ -813,67 +845,100 @@ async def initialize_rag_system(database_pool, openai_api_key: str):
     
     return rag_engine, persona_engine, knowledge_expansion
 
+async def _prepare_rag_guidance(user_query: str, birth_details: Optional[Dict[str, Any]],
+                                service_type: str) -> Dict[str, Any]:
+    """
+    Everything that happens before the completion call: Prokerala enrichment,
+    knowledge retrieval, service configuration and persona prompt
+    """
+    if not rag_engine or not persona_engine:
+        raise Exception("RAG system not initialized")
+    
+    # ENHANCED: Get real birth chart data from Prokerala if birth details provided
+    enhanced_birth_details = birth_details
+    if birth_details and all(birth_details.get(key) for key in ["date", "time", "location"]):
+        try:
+            from routers.sessions import get_prokerala_chart_data
+            prokerala_data = await get_prokerala_chart_data(birth_details)
+            
+            # Enhance birth_details with real Prokerala calculations
+            enhanced_birth_details = {
+                **birth_details,
+                "prokerala_response": prokerala_data,
+                "real_astrology": True
+            }
+            
+            logger.info(f"Enhanced RAG with Prokerala data: {len(str(prokerala_data))} chars")
+            
+        except Exception as e:
+            logger.warning(f"Prokerala integration failed in RAG: {e}")
+            enhanced_birth_details = {
+                **birth_details,
+                "prokerala_error": str(e),
+                "real_astrology": False
+            }
+    
+    # Create knowledge query with enhanced birth details
+    query = KnowledgeQuery(
+        primary_question=user_query,
+        birth_details=enhanced_birth_details,
+        service_type=service_type
+    )
+    
+    # Retrieve relevant knowledge
+    knowledge_retrieval = await rag_engine.retrieve_knowledge_for_query(query)
+    
+    # Get service configuration
+    service_config = await rag_engine._get_service_configuration(service_type) or {}
+    
+    # Get appropriate persona
+    persona_config = await persona_engine.get_persona_for_service(service_type, service_config)
+    
+    # Generate enhanced prompt
+    enhanced_prompt = await persona_engine.generate_persona_enhanced_prompt(
+        persona_config, knowledge_retrieval, user_query, service_config
+    )
+    
+    return {
+        "enhanced_prompt": enhanced_prompt,
+        "enhanced_birth_details": enhanced_birth_details,
+        # Transparency metadata returned alongside the guidance
+        "metadata": {
+            "knowledge_sources": [
+                {
+                    "domain": k.knowledge_domain,
+                    "source": k.source_reference,
+                    "authority_level": k.authority_level,
+                    "relevance": round(k.relevance_score, 3)
+                }
+                for k in knowledge_retrieval[:5]  # Top 5 sources
+            ],
+            "persona_mode": persona_config.persona_mode,
+            "service_configuration": service_config.get("knowledge_configuration", {}),
+            "analysis_sections": service_config.get("specialized_prompts", {}).get("analysis_sections", [])
+        }
+    }
+
+def _guidance_messages(enhanced_prompt: str, user_query: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": enhanced_prompt},
+        {"role": "user", "content": user_query}
+    ]
+
+RAG_GUIDANCE_FALLBACK = "I apologize, but I'm experiencing some difficulty accessing my knowledge base right now. Please try again in a moment."
+
 async def get_rag_enhanced_guidance(user_query: str, birth_details: Optional[Dict[str, Any]], 
                                   service_type: str = "general") -> Dict[str, Any]:
     """
     Main interface for getting RAG-enhanced spiritual guidance with REAL PROKERALA INTEGRATION
     """
     try:
-        if not rag_engine or not persona_engine:
-            raise Exception("RAG system not initialized")
-        
-        # ENHANCED: Get real birth chart data from Prokerala if birth details provided
-        enhanced_birth_details = birth_details
-        if birth_details and all(birth_details.get(key) for key in ["date", "time", "location"]):
-            try:
-                from routers.sessions import get_prokerala_chart_data
-                prokerala_data = await get_prokerala_chart_data(birth_details)
-                
-                # Enhance birth_details with real Prokerala calculations
-                enhanced_birth_details = {
-                    **birth_details,
-                    "prokerala_response": prokerala_data,
-                    "real_astrology": True
-                }
-                
-                logger.info(f"Enhanced RAG with Prokerala data: {len(str(prokerala_data))} chars")
-                
-            except Exception as e:
-                logger.warning(f"Prokerala integration failed in RAG: {e}")
-                enhanced_birth_details = {
-                    **birth_details,
-                    "prokerala_error": str(e),
-                    "real_astrology": False
-                }
-        
-        # Create knowledge query with enhanced birth details
-        query = KnowledgeQuery(
-            primary_question=user_query,
-            birth_details=enhanced_birth_details,
-            service_type=service_type
-        )
-        
-        # Retrieve relevant knowledge
-        knowledge_retrieval = await rag_engine.retrieve_knowledge_for_query(query)
-        
-        # Get service configuration
-        service_config = await rag_engine._get_service_configuration(service_type) or {}
-        
-        # Get appropriate persona
-        persona_config = await persona_engine.get_persona_for_service(service_type, service_config)
-        
-        # Generate enhanced prompt
-        enhanced_prompt = await persona_engine.generate_persona_enhanced_prompt(
-            persona_config, knowledge_retrieval, user_query, service_config
-        )
+        prepared = await _prepare_rag_guidance(user_query, birth_details, service_type)
         
         # Generate response with OpenAI
         response = await rag_engine.openai_client.chat.completions.create(
             model="gpt-4",
-            messages=[
-                {"role": "system", "content": enhanced_prompt},
-                {"role": "user", "content": user_query}
-            ],
+            messages=_guidance_messages(prepared["enhanced_prompt"], user_query),
             max_tokens=3000,
             temperature=0.7
         )
@@ -883,28 +948,52 @@ async def get_rag_enhanced_guidance(user_query: str, birth_details: Optional[Dic
         # Prepare response with transparency
         return {
             "enhanced_guidance": enhanced_guidance,
-            "enhanced_birth_details": enhanced_birth_details,  # Include enhanced birth details
-            "knowledge_sources": [
-                {
-                    "domain": k.knowledge_domain,
-                    "source": k.source_reference,
-                    "authority_level": k.authority_level,
-                    "relevance": round(k.relevance_score, 3)
-                }
-                for k in knowledge_retrieval[:5]  # Top 5 sources
-            ],
-            "persona_mode": persona_config.persona_mode,
-            "service_configuration": service_config.get("knowledge_configuration", {}),
-            "analysis_sections": service_config.get("specialized_prompts", {}).get("analysis_sections", [])
+            "enhanced_birth_details": prepared["enhanced_birth_details"],  # Include enhanced birth details
+            **prepared["metadata"]
         }
         
     except Exception as e:
         logger.error(f"RAG enhanced guidance error: {e}")
         return {
-            "enhanced_guidance": "I apologize, but I'm experiencing some difficulty accessing my knowledge base right now. Please try again in a moment.",
+            "enhanced_guidance": RAG_GUIDANCE_FALLBACK,
             "knowledge_sources": [],
             "persona_mode": "general",
             "service_configuration": {},
             "analysis_sections": [],
             "error": str(e)
-        }
\ No newline at end of file
+        }
+
+async def stream_rag_enhanced_guidance(user_query: str, birth_details: Optional[Dict[str, Any]],
+                                       service_type: str = "general") -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming variant of get_rag_enhanced_guidance, yielding (event, data) pairs:
+    "metadata" once knowledge and persona are ready, "token" for every completion
+    delta, optionally "error", and always a final "done" carrying the full text
+    """
+    guidance_parts: List[str] = []
+    try:
+        prepared = await _prepare_rag_guidance(user_query, birth_details, service_type)
+        yield "metadata", prepared["metadata"]
+        
+        stream = await rag_engine.openai_client.chat.completions.create(
+            model="gpt-4",
+            messages=_guidance_messages(prepared["enhanced_prompt"], user_query),
+            max_tokens=3000,
+            temperature=0.7,
+            stream=True
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                guidance_parts.append(text)
+                yield "token", {"text": text}
+        
+    except Exception as e:
+        logger.error(f"RAG enhanced guidance stream error: {e}")
+        if not guidance_parts:
+            guidance_parts.append(RAG_GUIDANCE_FALLBACK)
+        yield "error", {"message": RAG_GUIDANCE_FALLBACK, "error": str(e)}
+    
+    yield "done", {"enhanced_guidance": "".join(guidance_parts)}
@@ -654,8 +654,17 @@ async def generate_reading_preview(birth_date: str, birth_time: str, birth_locat
     """Generate a preview of the comprehensive reading"""
     try:
         # Simple preview generation - in a real implementation this would use actual astrology calculations
+        from services.gazetteer import resolve_birth_place
+        place = resolve_birth_place({"date": birth_date, "time": birth_time, "location": birth_location})
         return {
             "chart_summary": f"Birth chart for {birth_date} at {birth_time} in {birth_location}",
+            "birth_place": {
+                "latitude": place["latitude"],
+                "longitude": place["longitude"],
+                "timezone": place["timezone"],
+                "utc_offset": place["utc_offset"],
+                "resolved": place["source"] == "gazetteer"
+            },
             "key_highlights": [
                 "Planetary positions indicate strong spiritual inclination",
                 "Favorable period for major life decisions approaching",
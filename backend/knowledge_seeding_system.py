@@ -8,6 +8,10 @@ import json
 import asyncio
 import logging
 import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from functools import lru_cache
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 
@@ -17,6 +21,11 @@ try:
 except ImportError:
     from global_knowledge_collector import GlobalKnowledgeCollector, collect_global_knowledge
 
+# Shared, batching embeddings client and vector index. Imported the same way as
+# enhanced_rag_knowledge_engine so both resolve to the same module singletons
+from services.embedding_service import get_embedding_service
+from services.vector_index import get_vector_index
+
 # Try to import OpenAI, fallback gracefully
 try:
     from openai import AsyncOpenAI
@@ -38,47 +47,452 @@ except ImportError:
 # Parameter translation helper for asyncpg-style $n to psycopg %s
 _DOLLAR_PARAM_RE = re.compile(r'\$(\d+)')
 
+# Statement caching knobs. Translated SQL is memoised per process; psycopg then
+# prepares hot statements server-side on each physical (pooled) connection.
+# Set DB_PREPARE_THRESHOLD=off when running behind a transaction-mode PgBouncer.
+DB_SQL_CACHE_SIZE = int(os.getenv("DB_SQL_CACHE_SIZE", "1024"))
+_prepare_threshold_env = os.getenv("DB_PREPARE_THRESHOLD", "2").strip().lower()
+DB_PREPARE_THRESHOLD = None if _prepare_threshold_env in ("", "off", "none", "false") else int(_prepare_threshold_env)
+DB_PREPARED_MAX = int(os.getenv("DB_PREPARED_MAX", "256"))
+
+@lru_cache(maxsize=DB_SQL_CACHE_SIZE)
+def _translate_query(query: str):
+    """Translate a $n query once; returns (psycopg_query, argument order or None if already in order)"""
+    order = tuple(int(n) - 1 for n in _DOLLAR_PARAM_RE.findall(query))
+    translated_query = _DOLLAR_PARAM_RE.sub('%s', query)
+    if order == tuple(range(len(order))):
+        order = None
+    return translated_query, order
+
 def _translate_params(query: str, args: tuple):
     """Convert asyncpg-style $n placeholders to psycopg %s format"""
     if not args:
         return query, args
     
-    # Replace $1, $2, etc. with %s
-    translated_query = _DOLLAR_PARAM_RE.sub('%s', query)
+    # Replace $1, $2, etc. with %s (memoised), reordering/repeating args when
+    # placeholders are reused or appear out of order
+    translated_query, order = _translate_query(query)
+    if order is not None and max(order) < len(args):
+        args = tuple(args[i] for i in order)
     return translated_query, args
 
+def get_sql_cache_stats() -> Dict[str, int]:
+    """Hit/miss counters for the translated-SQL LRU"""
+    info = _translate_query.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Pool tuning knobs (environment overridable, mirrors asyncpg.create_pool defaults)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))  # seconds before an idle extra connection is reaped
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))  # seconds before a connection is recycled
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "30"))
+DB_POOL_CHECK_AFTER_IDLE = float(os.getenv("DB_POOL_CHECK_AFTER_IDLE", "5"))  # ping on checkout if idle longer than this
+DB_POOL_REAP_INTERVAL = float(os.getenv("DB_POOL_REAP_INTERVAL", "30"))
+
+
+class PoolTimeoutError(asyncio.TimeoutError):
+    """Raised when no connection could be checked out within the acquire timeout"""
+
+
+class PoolClosedError(RuntimeError):
+    """Raised when acquiring from a pool that has been closed"""
+
+
+# Route attribution for pool telemetry: holds either an ASGI scope (resolved to the
+# matched route template lazily, after routing) or a plain string label.
+_db_route_context: ContextVar[Any] = ContextVar("db_route_context", default=None)
+_TELEMETRY_SAMPLE_SIZE = 1024
+_TELEMETRY_MAX_ROUTES = 200
+
+
+def set_db_route_context(scope_or_label: Any):
+    """Attribute pool checkouts in the current context to a route; returns a reset token"""
+    return _db_route_context.set(scope_or_label)
+
+
+def reset_db_route_context(token):
+    _db_route_context.reset(token)
+
+
+def _resolve_route_label(route_ctx: Any) -> str:
+    if route_ctx is None:
+        return "background"
+    if isinstance(route_ctx, str):
+        return route_ctx
+    route = route_ctx.get("route")
+    path = getattr(route, "path", None) or route_ctx.get("path", "unknown")
+    method = route_ctx.get("method")
+    return f"{method} {path}" if method else path
+
+
+def _percentiles(samples) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0, "avg": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {
+        "count": len(ordered),
+        "avg": round(sum(ordered) / len(ordered), 3),
+        "p50": round(ordered[int(last * 0.50)], 3),
+        "p95": round(ordered[int(last * 0.95)], 3),
+        "p99": round(ordered[int(last * 0.99)], 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+class _PoolTelemetry:
+    """Checkout wait / hold time accounting, overall and per route (milliseconds)"""
+
+    def __init__(self):
+        self.wait_samples: deque = deque(maxlen=_TELEMETRY_SAMPLE_SIZE)
+        self.hold_samples: deque = deque(maxlen=_TELEMETRY_SAMPLE_SIZE)
+        self.routes: Dict[str, Dict[str, float]] = {}
+        self.started_at = time.time()
+
+    def _route(self, label: str) -> Dict[str, float]:
+        entry = self.routes.get(label)
+        if entry is None:
+            if len(self.routes) >= _TELEMETRY_MAX_ROUTES:
+                label = "other"
+                entry = self.routes.get(label)
+            if entry is None:
+                entry = {"checkouts": 0, "timeouts": 0, "wait_total_ms": 0.0, "wait_max_ms": 0.0,
+                         "hold_total_ms": 0.0, "hold_max_ms": 0.0}
+                self.routes[label] = entry
+        return entry
+
+    def record_checkout(self, wait_ms: float):
+        self.wait_samples.append(wait_ms)
+
+    def record_release(self, label: str, wait_ms: float, hold_ms: float):
+        self.hold_samples.append(hold_ms)
+        entry = self._route(label)
+        entry["checkouts"] += 1
+        entry["wait_total_ms"] += wait_ms
+        entry["wait_max_ms"] = max(entry["wait_max_ms"], wait_ms)
+        entry["hold_total_ms"] += hold_ms
+        entry["hold_max_ms"] = max(entry["hold_max_ms"], hold_ms)
+
+    def record_timeout(self, label: str):
+        self._route(label)["timeouts"] += 1
+
+    def snapshot(self, top_routes: int = 25) -> Dict[str, Any]:
+        routes = []
+        for label, entry in self.routes.items():
+            count = entry["checkouts"] or 1
+            routes.append({
+                "route": label,
+                "checkouts": entry["checkouts"],
+                "timeouts": entry["timeouts"],
+                "avg_wait_ms": round(entry["wait_total_ms"] / count, 3),
+                "max_wait_ms": round(entry["wait_max_ms"], 3),
+                "avg_hold_ms": round(entry["hold_total_ms"] / count, 3),
+                "max_hold_ms": round(entry["hold_max_ms"], 3),
+                "total_hold_ms": round(entry["hold_total_ms"], 3),
+            })
+        routes.sort(key=lambda r: r["total_hold_ms"], reverse=True)
+        return {
+            "since": datetime.fromtimestamp(self.started_at).isoformat(),
+            "checkout_wait_ms": _percentiles(self.wait_samples),
+            "hold_ms": _percentiles(self.hold_samples),
+            "routes": routes[:top_routes],
+        }
+
+    def reset(self):
+        self.__init__()
+
+
+class _PooledConnection:
+    """Book-keeping record for one physical psycopg connection owned by the pool"""
+
+    __slots__ = ("raw", "created_at", "last_used_at", "compat", "checked_out_at", "wait_ms", "route_ctx")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+        self.compat = None
+        self.checked_out_at = 0.0
+        self.wait_ms = 0.0
+        self.route_ctx = None
+
+
 class _AcquireContext:
-    """Async context manager for acquiring database connections"""
+    """Async context manager (and awaitable) for acquiring pooled database connections"""
     
-    def __init__(self, connection_string: str):
-        self.connection_string = connection_string
-        self._raw_conn = None
+    def __init__(self, pool: "AsyncPGCompatPool", timeout: Optional[float] = None):
+        self._pool = pool
+        self._timeout = timeout
         self._compat_conn = None
     
     async def __aenter__(self):
-        """Open connection and return AsyncPGCompatConnection"""
-        if PSYCOPG_AVAILABLE:
+        """Check a connection out of the pool and return AsyncPGCompatConnection"""
+        self._compat_conn = await self._pool._acquire_connection(self._timeout)
+        return self._compat_conn
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Return the connection to the pool"""
+        if self._compat_conn is not None:
+            conn, self._compat_conn = self._compat_conn, None
+            await self._pool.release(conn)
+    
+    def __await__(self):
+        # asyncpg-style ``conn = await pool.acquire()``; caller must ``await pool.release(conn)``
+        return self._pool._acquire_connection(self._timeout).__await__()
+
+
+class AsyncPGCompatPool:
+    """
+    Bounded psycopg v3 connection pool exposing an asyncpg-like API.
+    
+    Physical connections are opened lazily up to ``max_size``, kept warm down to
+    ``min_size``, health-checked on checkout, recycled after ``max_lifetime`` and
+    reaped after ``max_idle``. pgvector adapters are registered once per physical
+    connection. Waiters queue FIFO and time out after ``acquire_timeout``.
+    """
+    
+    def __init__(self, connection_string: str, min_size: Optional[int] = None,
+                 max_size: Optional[int] = None, max_idle: Optional[float] = None,
+                 max_lifetime: Optional[float] = None, acquire_timeout: Optional[float] = None):
+        self.connection_string = connection_string
+        self.min_size = DB_POOL_MIN_SIZE if min_size is None else min_size
+        self.max_size = DB_POOL_MAX_SIZE if max_size is None else max_size
+        self.max_idle = DB_POOL_MAX_IDLE if max_idle is None else max_idle
+        self.max_lifetime = DB_POOL_MAX_LIFETIME if max_lifetime is None else max_lifetime
+        self.acquire_timeout = DB_POOL_ACQUIRE_TIMEOUT if acquire_timeout is None else acquire_timeout
+        if self.max_size < 1 or self.min_size < 0 or self.min_size > self.max_size:
+            raise ValueError(f"Invalid pool bounds: min_size={self.min_size}, max_size={self.max_size}")
+        
+        self._idle: deque = deque()  # LIFO stack of idle _PooledConnection
+        self._in_use: Dict[int, _PooledConnection] = {}  # id(compat_conn) -> record
+        self._waiters: deque = deque()  # FIFO of futures waiting for a connection
+        self._size = 0  # physical connections open or being opened
+        self._closed = False
+        self._reaper_task: Optional[asyncio.Task] = None
+        self._stats = {
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "connection_errors": 0,
+            "checkouts": 0,
+            "checkout_waits": 0,
+            "checkout_timeouts": 0,
+            "health_check_failures": 0,
+            "max_waiters": 0,
+        }
+        self.telemetry = _PoolTelemetry()
+    
+    # ------------------------------------------------------------------
+    # Public asyncpg-compatible API
+    # ------------------------------------------------------------------
+    def acquire(self, timeout: Optional[float] = None):
+        """Return an async context manager for database connections"""
+        return _AcquireContext(self, timeout)
+    
+    async def release(self, conn: "AsyncPGCompatConnection"):
+        """Return a connection obtained via ``await pool.acquire()`` to the pool"""
+        pooled = self._in_use.pop(id(conn), None)
+        if pooled is None:
+            if not self._closed:
+                logger.warning("Attempted to release a connection that does not belong to this pool")
+            return
+        conn._pool = None
+        hold_ms = (time.monotonic() - pooled.checked_out_at) * 1000
+        self.telemetry.record_release(_resolve_route_label(pooled.route_ctx), pooled.wait_ms, hold_ms)
+        pooled.route_ctx = None
+        await self._checkin(pooled)
+    
+    async def close(self):
+        """Close the pool: fail pending waiters and close every physical connection"""
+        self._closed = True
+        if self._reaper_task:
+            self._reaper_task.cancel()
+            self._reaper_task = None
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(PoolClosedError("Database pool closed"))
+        idle, self._idle = list(self._idle), deque()
+        in_use, self._in_use = list(self._in_use.values()), {}
+        for pooled in idle + in_use:
+            await self._close_physical(pooled)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Snapshot of pool sizing and checkout counters"""
+        return {
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "size": self._size,
+            "idle": len(self._idle),
+            "in_use": len(self._in_use),
+            "waiting": sum(1 for w in self._waiters if not w.done()),
+            "closed": self._closed,
+            "prepare_threshold": DB_PREPARE_THRESHOLD,
+            "sql_translation_cache": get_sql_cache_stats(),
+            **self._stats,
+        }
+    
+    def get_telemetry(self, top_routes: int = 25) -> Dict[str, Any]:
+        """Pool sizing plus checkout wait / hold time percentiles and per-route breakdown"""
+        return {"pool": self.get_stats(), **self.telemetry.snapshot(top_routes)}
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+    
+    # ------------------------------------------------------------------
+    # Checkout / checkin
+    # ------------------------------------------------------------------
+    async def _acquire_connection(self, timeout: Optional[float] = None) -> "AsyncPGCompatConnection":
+        route_ctx = _db_route_context.get()
+        started = time.monotonic()
+        try:
+            pooled = await self._checkout(self.acquire_timeout if timeout is None else timeout)
+        except PoolTimeoutError:
+            self.telemetry.record_timeout(_resolve_route_label(route_ctx))
+            raise
+        pooled.checked_out_at = time.monotonic()
+        pooled.wait_ms = (pooled.checked_out_at - started) * 1000
+        pooled.route_ctx = route_ctx
+        self.telemetry.record_checkout(pooled.wait_ms)
+        compat = pooled.compat
+        compat._pool = self
+        self._in_use[id(compat)] = pooled
+        self._stats["checkouts"] += 1
+        return compat
+    
+    async def _checkout(self, timeout: float) -> _PooledConnection:
+        if not PSYCOPG_AVAILABLE:
+            raise ImportError("psycopg not available")
+        self._ensure_reaper()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        
+        while True:
+            if self._closed:
+                raise PoolClosedError("Database pool closed")
+            
+            while self._idle:
+                pooled = self._idle.pop()
+                if await self._is_healthy(pooled):
+                    return pooled
+                await self._discard(pooled)
+            
+            if self._size < self.max_size:
+                self._size += 1
+                try:
+                    return await self._open_physical()
+                except BaseException:
+                    self._size -= 1
+                    self._wake_waiter(None)
+                    raise
+            
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self._stats["checkout_timeouts"] += 1
+                raise PoolTimeoutError(f"Timed out after {timeout:.1f}s waiting for a database connection")
+            
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            self._stats["checkout_waits"] += 1
+            self._stats["max_waiters"] = max(self._stats["max_waiters"], len(self._waiters))
+            try:
+                done, _ = await asyncio.wait({waiter}, timeout=remaining)
+            except asyncio.CancelledError:
+                self._abandon_waiter(waiter)
+                raise
+            if not done:
+                self._abandon_waiter(waiter)
+                continue  # loop re-checks idle connections before raising the timeout
+            pooled = waiter.result()  # re-raises PoolClosedError
+            if pooled is not None:
+                return pooled
+            # A slot was freed (connection discarded) - retry opening one
+    
+    def _abandon_waiter(self, waiter: asyncio.Future):
+        """Drop a waiter that gave up; hand any connection it was given to the next one"""
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+            pooled = waiter.result()
+            if pooled is not None:
+                self._return_idle(pooled)
+            else:
+                self._wake_waiter(None)
+        else:
+            waiter.cancel()
+    
+    def _wake_waiter(self, pooled: Optional[_PooledConnection]) -> bool:
+        """Hand a connection (or a freed slot when None) to the oldest live waiter"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(pooled)
+                return True
+        return False
+    
+    def _return_idle(self, pooled: _PooledConnection):
+        pooled.last_used_at = time.monotonic()
+        if not self._wake_waiter(pooled):
+            self._idle.append(pooled)
+    
+    async def _checkin(self, pooled: _PooledConnection):
+        if self._closed or self._expired(pooled) or not await self._reset(pooled):
+            await self._discard(pooled)
+            return
+        self._return_idle(pooled)
+    
+    async def _reset(self, pooled: _PooledConnection) -> bool:
+        """Make sure a returned connection is idle outside of any transaction"""
+        raw = pooled.raw
+        if raw.closed or raw.broken:
+            return False
+        if raw.info.transaction_status == psycopg.pq.TransactionStatus.IDLE:
+            return True
+        try:
+            await raw.rollback()
+            return raw.info.transaction_status == psycopg.pq.TransactionStatus.IDLE
+        except Exception as e:
+            logger.warning(f"Could not reset pooled connection, discarding it: {e}")
+            return False
+    
+    # ------------------------------------------------------------------
+    # Physical connection lifecycle
+    # ------------------------------------------------------------------
+    async def _open_physical(self) -> _PooledConnection:
+        try:
             # Open raw connection with dict row factory
-            self._raw_conn = await AsyncConnection.connect(
-                self.connection_string, 
+            raw = await AsyncConnection.connect(
+                self.connection_string,
                 row_factory=dict_row,
                 autocommit=True
             )
-            
-            # Register pgvector type adapters for Python list <-> vector mapping
-            try:
-                await self._register_pgvector_adapters(self._raw_conn)
-            except Exception as e:
-                logger.warning(f"Could not register pgvector type adapters (extension may not be installed): {e}")
-            
-            # Wrap in compatibility adapter
-            self._compat_conn = AsyncPGCompatConnection(self._raw_conn)
-            return self._compat_conn
-        else:
-            raise ImportError("psycopg not available")
+        except Exception:
+            self._stats["connection_errors"] += 1
+            raise
+        
+        # Register pgvector type adapters once per physical connection
+        try:
+            await self._register_pgvector_adapters(raw)
+        except Exception as e:
+            logger.warning(f"Could not register pgvector type adapters (extension may not be installed): {e}")
+        
+        # Server-side prepared statements live per physical connection; psycopg
+        # prepares a query once it has been executed prepare_threshold times
+        raw.prepare_threshold = DB_PREPARE_THRESHOLD
+        raw.prepared_max = DB_PREPARED_MAX
+        
+        pooled = _PooledConnection(raw)
+        pooled.compat = AsyncPGCompatConnection(raw)
+        self._stats["connections_opened"] += 1
+        return pooled
     
     async def _register_pgvector_adapters(self, conn):
         """Register pgvector type adapters for Python list <-> vector conversion"""
@@ -93,41 +507,88 @@ class _AcquireContext:
         except Exception as e:
             logger.warning(f"Failed to register pgvector adapters: {e}")
     
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """Close the raw connection"""
-        if self._raw_conn:
-            await self._raw_conn.close()
-            self._raw_conn = None
-            self._compat_conn = None
-
-class AsyncPGCompatPool:
-    """Adapter to provide asyncpg-like API using psycopg v3"""
+    def _expired(self, pooled: _PooledConnection) -> bool:
+        return self.max_lifetime > 0 and time.monotonic() - pooled.created_at > self.max_lifetime
     
-    def __init__(self, connection_string: str):
-        self.connection_string = connection_string
-        self._connection = None
+    async def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        """Cheap liveness check on checkout; pings only connections idle for a while"""
+        raw = pooled.raw
+        if raw.closed or raw.broken or self._expired(pooled):
+            return False
+        if time.monotonic() - pooled.last_used_at < DB_POOL_CHECK_AFTER_IDLE:
+            return True
+        try:
+            await raw.execute("SELECT 1")
+            return True
+        except Exception as e:
+            self._stats["health_check_failures"] += 1
+            logger.warning(f"Pooled connection failed health check, replacing it: {e}")
+            return False
     
-    def acquire(self):
-        """Return an async context manager for database connections"""
-        return _AcquireContext(self.connection_string)
+    async def _discard(self, pooled: _PooledConnection):
+        await self._close_physical(pooled)
+        self._wake_waiter(None)
     
-    async def close(self):
-        """Close the pool (no-op for compatibility)"""
-        if self._connection:
-            await self._connection.close()
-            self._connection = None
+    async def _close_physical(self, pooled: _PooledConnection):
+        self._size = max(0, self._size - 1)
+        self._stats["connections_closed"] += 1
+        try:
+            await pooled.raw.close()
+        except Exception as e:
+            logger.debug(f"Error closing pooled connection: {e}")
     
-    def __aenter__(self):
-        return self
+    # ------------------------------------------------------------------
+    # Background maintenance
+    # ------------------------------------------------------------------
+    def _ensure_reaper(self):
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.get_running_loop().create_task(self._reap_forever())
     
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.close()
+    async def _reap_forever(self):
+        while not self._closed:
+            await asyncio.sleep(DB_POOL_REAP_INTERVAL)
+            try:
+                await self._reap_once()
+            except Exception as e:
+                logger.warning(f"Database pool reaper error: {e}")
+    
+    async def _reap_once(self):
+        """Close expired connections and idle ones beyond ``min_size``, then refill to ``min_size``"""
+        now = time.monotonic()
+        keep = deque()
+        # Oldest idle connections sit at the left of the LIFO stack
+        while self._idle:
+            pooled = self._idle.popleft()
+            idle_for = now - pooled.last_used_at
+            surplus = self._size > self.min_size
+            if self._expired(pooled) or (surplus and self.max_idle > 0 and idle_for > self.max_idle):
+                await self._discard(pooled)
+            else:
+                keep.append(pooled)
+        # Checkouts may have queued while we were closing (the idle stack looked empty);
+        # hand kept connections to them first. last_used_at is left alone so idle age still counts
+        checked_in, self._idle = self._idle, deque()
+        for pooled in keep:
+            if not self._wake_waiter(pooled):
+                self._idle.append(pooled)
+        self._idle.extend(checked_in)  # anything checked in while we were closing
+        
+        while not self._closed and self._size < self.min_size:
+            self._size += 1
+            try:
+                pooled = await self._open_physical()
+            except Exception as e:
+                self._size -= 1
+                logger.warning(f"Could not pre-open pooled connection: {e}")
+                break
+            self._return_idle(pooled)
 
 class AsyncPGCompatConnection:
     """Adapter to provide asyncpg-like connection API using psycopg v3"""
     
     def __init__(self, psycopg_conn):
         self._conn = psycopg_conn
+        self._pool: Optional[AsyncPGCompatPool] = None  # set while checked out of a pool
     
     async def fetchval(self, query: str, *args):
         """Execute query and return single value (asyncpg-compatible)"""
@@ -138,6 +599,13 @@ class AsyncPGCompatConnection:
             result = await cur.fetchone()
             return result[0] if result else None
     
+    async def fetch(self, query: str, *args):
+        """Execute query and return all rows (asyncpg-compatible)"""
+        translated_query, translated_args = _translate_params(query, args)
+        async with self._conn.cursor() as cur:
+            await cur.execute(translated_query, translated_args)
+            return await cur.fetchall()
+    
     async def fetchrow(self, query: str, *args):
         """Execute query and return single row (asyncpg-compatible)"""
         translated_query, translated_args = _translate_params(query, args)
@@ -156,7 +624,11 @@ class AsyncPGCompatConnection:
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self._conn.close()
+        # Pooled connections go back to their pool; direct connections are closed
+        if self._pool is not None:
+            await self._pool.release(self)
+        else:
+            await self._conn.close()
 
 def format_embedding_for_storage(embedding: Any, use_pgvector: bool) -> Any:
     """
@@ -233,6 +705,7 @@ class KnowledgeSeeder:
     def __init__(self, database_pool, openai_api_key: str):
         self.db_pool = database_pool
         self.openai_client = AsyncOpenAI(api_key=openai_api_key) if OPENAI_AVAILABLE else None
+        self.embedding_service = get_embedding_service(self.openai_client, database_pool) if self.openai_client else None
         
         # Log initialization status
         logger.info(f"KnowledgeSeeder initialized with:")
@@ -449,8 +922,7 @@ class KnowledgeSeeder:
             }
         ]
         
-        for knowledge in classical_knowledge:
-            await self._add_knowledge_with_embedding(knowledge)
+        await self._add_knowledge_batch(classical_knowledge)
     
     async def _seed_tamil_spiritual_knowledge(self):
         """Seed Tamil spiritual literature and wisdom"""
@@ -487,8 +959,7 @@ class KnowledgeSeeder:
             }
         ]
         
-        for knowledge in tamil_knowledge:
-            await self._add_knowledge_with_embedding(knowledge)
+        await self._add_knowledge_batch(tamil_knowledge)
     
     async def _seed_relationship_astrology(self):
         """Seed relationship and marriage astrology knowledge"""
@@ -535,8 +1006,7 @@ class KnowledgeSeeder:
             }
         ]
         
-        for knowledge in relationship_knowledge:
-            await self._add_knowledge_with_embedding(knowledge)
+        await self._add_knowledge_batch(relationship_knowledge)
     
     async def _seed_career_astrology(self):
         """Seed career and professional success knowledge"""
@@ -583,8 +1053,7 @@ class KnowledgeSeeder:
             }
         ]
         
-        for knowledge in career_knowledge:
-            await self._add_knowledge_with_embedding(knowledge)
+        await self._add_knowledge_batch(career_knowledge)
     
     async def _seed_health_astrology(self):
         """Seed health and wellness astrology knowledge"""
@@ -621,8 +1090,7 @@ class KnowledgeSeeder:
             }
         ]
         
-        for knowledge in health_knowledge:
-            await self._add_knowledge_with_embedding(knowledge)
+        await self._add_knowledge_batch(health_knowledge)
     
     async def _seed_remedial_measures(self):
         """Seed comprehensive remedial measures knowledge"""
@@ -669,8 +1137,7 @@ class KnowledgeSeeder:
             }
         ]
         
-        for knowledge in remedial_knowledge:
-            await self._add_knowledge_with_embedding(knowledge)
+        await self._add_knowledge_batch(remedial_knowledge)
     
     async def _seed_world_knowledge(self):
         """Seed current world knowledge with spiritual perspectives"""
@@ -707,8 +1174,7 @@ class KnowledgeSeeder:
             }
         ]
         
-        for knowledge in world_knowledge:
-            await self._add_knowledge_with_embedding(knowledge)
+        await self._add_knowledge_batch(world_knowledge)
     
     async def _seed_psychological_integration(self):
         """Seed psychological integration with ancient wisdom"""
@@ -745,8 +1211,11 @@ class KnowledgeSeeder:
             }
         ]
         
-        for knowledge in psychological_knowledge:
-            await self._add_knowledge_with_embedding(knowledge)
+        await self._add_knowledge_batch(psychological_knowledge)
+    
+    async def _add_knowledge_batch(self, knowledge_list: List[Dict[str, Any]]):
+        """Add a category of knowledge concurrently so its embeddings go out as one batched request"""
+        await asyncio.gather(*(self._add_knowledge_with_embedding(knowledge) for knowledge in knowledge_list))
     
     async def _add_knowledge_with_embedding(self, knowledge_data: Dict[str, Any]):
         """Add knowledge piece to database with OpenAI embedding"""
@@ -756,11 +1225,7 @@ class KnowledgeSeeder:
             if self.openai_client and OPENAI_AVAILABLE:
                 try:
                     logger.info(f"Generating embedding for: {knowledge_data['title'][:50]}...")
-                    response = await self.openai_client.embeddings.create(
-                        model="text-embedding-ada-002",
-                        input=knowledge_data["content"]
-                    )
-                    embedding = response.data[0].embedding
+                    embedding = await self.embedding_service.embed(knowledge_data["content"])
                     logger.info("✅ OpenAI embedding generated successfully")
                 except Exception as embed_error:
                     import traceback
@@ -888,6 +1353,7 @@ class KnowledgeSeeder:
                     "This should be provided during initialization."
                 )
             
+            get_vector_index().upsert(knowledge_data, embedding)
             logger.info(f"Added knowledge: {knowledge_data['title'][:50]}...")
             
         except Exception as e:
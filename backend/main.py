@@ -341,6 +341,38 @@ async def lifespan(app: FastAPI):
             print("⚠️ Monitoring system initialization skipped - not available")
             print("   → Will auto-initialize once monitoring dependencies are resolved")
         
+        # Start birth chart prefetch workers (also resumes jobs left pending by the last run)
+        try:
+            from services.chart_prefetch import get_chart_prefetch_queue
+            get_chart_prefetch_queue().start()
+            print("✅ Birth chart prefetch workers started")
+        except Exception as prefetch_error:
+            print(f"⚠️ Birth chart prefetch workers not started: {prefetch_error}")
+        
+        # Start the incremental birth chart cache cleaner (bounded batches, no full-table UPDATE)
+        try:
+            from services.birth_chart_cache_maintenance import get_birth_chart_cache_maintenance
+            get_birth_chart_cache_maintenance().start()
+            print("✅ Birth chart cache cleaner started")
+        except Exception as cleaner_error:
+            print(f"⚠️ Birth chart cache cleaner not started: {cleaner_error}")
+        
+        # Start the batched monitoring_api_calls writer (the monitoring middleware only queues rows)
+        try:
+            from monitoring.api_call_writer import get_api_call_writer
+            get_api_call_writer().start()
+            print("✅ API call log writer started")
+        except Exception as writer_error:
+            print(f"⚠️ API call log writer not started: {writer_error}")
+        
+        # Start the monitoring rollups refresh (the dashboard reads these instead of scanning sessions)
+        try:
+            from monitoring.metrics_rollups import get_metrics_rollups
+            get_metrics_rollups().start()
+            print("✅ Monitoring rollups refresh started")
+        except Exception as rollups_error:
+            print(f"⚠️ Monitoring rollups refresh not started: {rollups_error}")
+        
         print("✅ Unified JyotiFlow.ai system ready!")
         print("🎯 Ready to serve API requests with all features enabled")
         # Force deployment refresh - indentation fix applied
@@ -354,12 +386,60 @@ async def lifespan(app: FastAPI):
     yield
     
     # Shutdown operations (cleanup)
+    # Flush buffered API call rows while the database pool is still open
+    try:
+        from monitoring.api_call_writer import get_api_call_writer
+        await get_api_call_writer().stop()
+    except Exception as e:
+        print(f"⚠️ Error flushing API call log: {str(e)}")
+    
+    # Stop birth chart prefetch workers while the pool is still open, so a job in progress can
+    # record its outcome; unfinished jobs stay pending for the next start
+    try:
+        from services.chart_prefetch import get_chart_prefetch_queue
+        await get_chart_prefetch_queue().stop()
+    except Exception as e:
+        print(f"⚠️ Error stopping chart prefetch workers: {str(e)}")
+    
+    try:
+        from services.birth_chart_cache_maintenance import get_birth_chart_cache_maintenance
+        await get_birth_chart_cache_maintenance().stop()
+    except Exception as e:
+        print(f"⚠️ Error stopping birth chart cache cleaner: {str(e)}")
+    
+    try:
+        from monitoring.metrics_rollups import get_metrics_rollups
+        await get_metrics_rollups().stop()
+    except Exception as e:
+        print(f"⚠️ Error stopping monitoring rollups refresh: {str(e)}")
+    
+    # Close the chart generation lock session (it lives outside the pool)
+    try:
+        from services.chart_generation_flights import get_chart_generation_flights
+        await get_chart_generation_flights().close()
+    except Exception as e:
+        print(f"⚠️ Error closing chart generation lock session: {str(e)}")
+    
+    # Stop the monitoring websocket publisher (started by the first client); its tick reads the pool
+    try:
+        from monitoring.dashboard import health_publisher
+        await health_publisher.stop()
+    except Exception as e:
+        print(f"⚠️ Error stopping monitoring websocket publisher: {str(e)}")
+    
     try:
         print("🔄 Shutting down unified system...")
         await cleanup_unified_system(db_pool)
         print("✅ Unified system shutdown completed")
     except Exception as e:
         print(f"⚠️ Error during unified system cleanup: {str(e)}")
+    
+    # Close pooled Prokerala connections (same module path the routers import)
+    try:
+        from services.prokerala_client import close_prokerala_client
+        await close_prokerala_client()
+    except Exception as e:
+        print(f"⚠️ Error closing Prokerala client: {str(e)}")
 
 # Create FastAPI app with lifespan manager
 app = FastAPI(
@@ -0,0 +1,20 @@
+-- Migration: Persistent embedding cache
+-- Purpose: Second tier of the embedding cache (services/embedding_cache.py) so
+--          repeated questions and chart elements are never re-embedded across
+--          restarts or between workers
+-- Author: JyotiFlow Team
+-- Date: 2026-10-16
+
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    model VARCHAR(100) NOT NULL,
+    content_hash VARCHAR(64) NOT NULL,       -- SHA-256 hex of the embedded text
+    dimensions INTEGER NOT NULL,
+    embedding BYTEA NOT NULL,                -- little-endian float32 array
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (model, content_hash)
+);
+
+COMMENT ON TABLE embedding_cache IS 'OpenAI embeddings keyed by model and content hash; float32 vectors stored as bytea';
+
+-- Rollback:
+-- DROP TABLE IF EXISTS embedding_cache;
@@ -0,0 +1,38 @@
+-- Migration: ANN index for multi-domain RAG retrieval
+-- Purpose: Serve the per-domain "ORDER BY embedding_vector <=> $1 LIMIT k" lookups in
+--          enhanced_rag_knowledge_engine._retrieve_domain_knowledge from an index
+--          instead of a sequential scan over rag_knowledge_base
+-- Author: JyotiFlow Team
+-- Date: 2026-10-16
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Prefer HNSW (pgvector >= 0.5.0); fall back to IVFFlat on older pgvector builds.
+-- Migration 026 may already have created the HNSW index, in which case this is a no-op.
+DO $$
+BEGIN
+    IF to_regclass('public.rag_knowledge_base') IS NULL THEN
+        RETURN;
+    END IF;
+
+    IF to_regclass('public.rag_knowledge_base_embedding_vector_cosine_idx') IS NULL THEN
+        BEGIN
+            CREATE INDEX rag_knowledge_base_embedding_vector_cosine_idx
+                ON public.rag_knowledge_base
+                USING hnsw (embedding_vector vector_cosine_ops)
+                WITH (m = 16, ef_construction = 64);
+        EXCEPTION WHEN undefined_object OR feature_not_supported THEN
+            RAISE NOTICE 'HNSW not available, creating IVFFlat index instead';
+            CREATE INDEX rag_knowledge_base_embedding_vector_cosine_idx
+                ON public.rag_knowledge_base
+                USING ivfflat (embedding_vector vector_cosine_ops)
+                WITH (lists = 100);
+        END;
+    END IF;
+
+    -- Fresh statistics so the planner weighs the ANN index against idx_rag_knowledge_domain
+    ANALYZE public.rag_knowledge_base;
+END $$;
+
+-- Rollback:
+-- DROP INDEX IF EXISTS rag_knowledge_base_embedding_vector_cosine_idx;
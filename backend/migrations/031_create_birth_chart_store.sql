@@ -0,0 +1,30 @@
+-- Migration: Content-addressed birth chart store
+-- Purpose: Share generated birth charts between everyone with the same birth
+--          details (services/birth_chart_store.py). Charts are keyed only by the
+--          normalized birth-details hash; users reference them through
+--          users.birth_chart_hash, so a second person with the same date, time
+--          and place, or a guest who later signs up, never triggers another
+--          Prokerala fan-out
+-- Author: JyotiFlow Team
+-- Date: 2026-10-16
+
+CREATE TABLE IF NOT EXISTS birth_chart_store (
+    birth_hash VARCHAR(64) PRIMARY KEY,      -- SHA-256 hex of the normalized birth details
+    birth_details JSONB NOT NULL,            -- normalized date/time/location/timezone
+    chart_data JSONB,                        -- birth chart payload (spiritual birth-chart endpoint)
+    profile_data JSONB,                      -- complete profile (chart + reports + Swamiji reading)
+    hit_count BIGINT NOT NULL DEFAULT 0,     -- lookups served without calling Prokerala
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_hit_at TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_birth_chart_store_expires_at ON birth_chart_store(expires_at);
+CREATE INDEX IF NOT EXISTS idx_users_birth_chart_hash ON users(birth_chart_hash) WHERE birth_chart_hash IS NOT NULL;
+
+COMMENT ON TABLE birth_chart_store IS 'Birth charts keyed by normalized birth-details hash and shared by every user with the same details';
+
+-- Rollback:
+-- DROP INDEX IF EXISTS idx_users_birth_chart_hash;
+-- DROP TABLE IF EXISTS birth_chart_store;
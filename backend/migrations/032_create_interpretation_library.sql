@@ -0,0 +1,33 @@
+-- Migration: Precomputed birth chart interpretation library
+-- Purpose: Planet-in-sign and planet-in-house readings are the same for every
+--          chart, so they are generated once per language and persona by
+--          warm_interpretation_library.py and read by
+--          BirthChartInterpretationService (services/interpretation_library.py)
+--          instead of a RAG + GPT-4 call per planet per chart
+-- Author: JyotiFlow Team
+-- Date: 2026-10-16
+
+CREATE TABLE IF NOT EXISTS interpretation_library (
+    id SERIAL PRIMARY KEY,
+    entry_key VARCHAR(64) NOT NULL,          -- e.g. Saturn_in_Capricorn, Mars_in_house_5
+    kind VARCHAR(8) NOT NULL CHECK (kind IN ('sign', 'house')),
+    planet VARCHAR(16) NOT NULL,
+    placement VARCHAR(16) NOT NULL,          -- sign name or house number
+    language VARCHAR(16) NOT NULL DEFAULT 'en',
+    persona VARCHAR(64) NOT NULL DEFAULT 'astrological_interpretation',
+    version INTEGER NOT NULL DEFAULT 1,      -- INTERPRETATION_LIBRARY_VERSION the entry was generated for
+    interpretation TEXT NOT NULL,
+    source VARCHAR(32) DEFAULT 'rag',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (entry_key, language, persona, version)
+);
+
+CREATE INDEX IF NOT EXISTS idx_interpretation_library_scope
+    ON interpretation_library(language, persona, version);
+
+COMMENT ON TABLE interpretation_library IS 'Chart-independent planet-in-sign / planet-in-house interpretations, versioned per language and persona';
+
+-- Rollback:
+-- DROP INDEX IF EXISTS idx_interpretation_library_scope;
+-- DROP TABLE IF EXISTS interpretation_library;
@@ -0,0 +1,38 @@
+-- Migration: Background birth chart prefetch jobs
+-- Purpose: Registration and login queue the complete profile (chart + reports +
+--          Swamiji reading) for generation in the background
+--          (services/chart_prefetch.py), so the first dashboard load is a cache
+--          hit. The table makes jobs survive overflow of the in-process queue,
+--          retries and restarts
+-- Author: JyotiFlow Team
+-- Date: 2026-10-16
+
+CREATE TABLE IF NOT EXISTS chart_prefetch_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    user_email VARCHAR(255) NOT NULL,
+    birth_hash VARCHAR(64) NOT NULL,         -- birth_chart_store hash of the birth details
+    birth_details JSONB NOT NULL,
+    reason VARCHAR(32) NOT NULL DEFAULT 'registration',  -- registration | login
+    status VARCHAR(16) NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'running', 'done', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,  -- retry backoff
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- One open job per user and birth details: repeated logins do not pile up work
+CREATE UNIQUE INDEX IF NOT EXISTS idx_chart_prefetch_jobs_open
+    ON chart_prefetch_jobs(user_email, birth_hash) WHERE status IN ('pending', 'running');
+CREATE INDEX IF NOT EXISTS idx_chart_prefetch_jobs_due
+    ON chart_prefetch_jobs(run_after) WHERE status = 'pending';
+
+COMMENT ON TABLE chart_prefetch_jobs IS 'Background complete-profile generation queued on registration and login';
+
+-- Rollback:
+-- DROP INDEX IF EXISTS idx_chart_prefetch_jobs_due;
+-- DROP INDEX IF EXISTS idx_chart_prefetch_jobs_open;
+-- DROP TABLE IF EXISTS chart_prefetch_jobs;
@@ -0,0 +1,154 @@
+-- Migration: Incremental birth chart cache maintenance
+-- Purpose: The admin cache statistics and cleanup endpoints used to scan the
+--          whole users table. Expired entries are now found through partial
+--          indexes and cleared in bounded batches by the scheduled cleaner
+--          (services/birth_chart_cache_maintenance.py), and the statistics are
+--          kept in a small rollup table maintained by triggers on every write,
+--          so reading them does not depend on the number of users.
+--          The rollup is split over 8 slots picked by backend pid: concurrent
+--          writers on different connections never wait on the same row.
+--          Store reuse (hit_count) is not tracked by trigger: BirthChartStore
+--          flushes hit counts in batches and adds each batch to store_hits in
+--          the same statement, so cache reads never touch the rollup
+-- Author: JyotiFlow Team
+-- Date: 2026-10-16
+
+-- Only cached rows are indexed; the cleaner walks the expired prefix in order
+CREATE INDEX IF NOT EXISTS idx_users_birth_chart_expires_at
+    ON users(birth_chart_expires_at, id) WHERE birth_chart_data IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_birth_chart_store_expires_hash
+    ON birth_chart_store(expires_at, birth_hash);
+
+CREATE TABLE IF NOT EXISTS birth_chart_cache_stats (
+    slot SMALLINT PRIMARY KEY CHECK (slot BETWEEN 0 AND 7),
+    total_users BIGINT NOT NULL DEFAULT 0,
+    cached_users BIGINT NOT NULL DEFAULT 0,         -- birth_chart_data IS NOT NULL
+    free_chart_users BIGINT NOT NULL DEFAULT 0,     -- has_free_birth_chart = true
+    linked_users BIGINT NOT NULL DEFAULT 0,         -- birth_chart_hash IS NOT NULL
+    cached_at_count BIGINT NOT NULL DEFAULT 0,      -- birth_chart_cached_at IS NOT NULL
+    cached_at_epoch_sum BIGINT NOT NULL DEFAULT 0,  -- SUM(epoch of birth_chart_cached_at), for the average age
+    stored_charts BIGINT NOT NULL DEFAULT 0,        -- birth_chart_store rows
+    store_hits BIGINT NOT NULL DEFAULT 0,           -- SUM(birth_chart_store.hit_count), added by the hit flush
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION birth_chart_cache_stats_users() RETURNS TRIGGER AS $$
+DECLARE
+    d_users BIGINT := 0;
+    d_cached BIGINT := 0;
+    d_free BIGINT := 0;
+    d_linked BIGINT := 0;
+    d_age_count BIGINT := 0;
+    d_age_sum BIGINT := 0;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        d_users := d_users + 1;
+        d_cached := d_cached + (NEW.birth_chart_data IS NOT NULL)::int;
+        d_free := d_free + COALESCE(NEW.has_free_birth_chart, false)::int;
+        d_linked := d_linked + (NEW.birth_chart_hash IS NOT NULL)::int;
+        IF NEW.birth_chart_cached_at IS NOT NULL THEN
+            d_age_count := d_age_count + 1;
+            d_age_sum := d_age_sum + EXTRACT(EPOCH FROM NEW.birth_chart_cached_at)::bigint;
+        END IF;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        d_users := d_users - 1;
+        d_cached := d_cached - (OLD.birth_chart_data IS NOT NULL)::int;
+        d_free := d_free - COALESCE(OLD.has_free_birth_chart, false)::int;
+        d_linked := d_linked - (OLD.birth_chart_hash IS NOT NULL)::int;
+        IF OLD.birth_chart_cached_at IS NOT NULL THEN
+            d_age_count := d_age_count - 1;
+            d_age_sum := d_age_sum - EXTRACT(EPOCH FROM OLD.birth_chart_cached_at)::bigint;
+        END IF;
+    END IF;
+    -- Most updates (re-linking the same chart, touching other columns) change nothing
+    IF d_users = 0 AND d_cached = 0 AND d_free = 0 AND d_linked = 0 AND d_age_count = 0 AND d_age_sum = 0 THEN
+        RETURN NULL;
+    END IF;
+    UPDATE birth_chart_cache_stats SET
+        total_users = total_users + d_users,
+        cached_users = cached_users + d_cached,
+        free_chart_users = free_chart_users + d_free,
+        linked_users = linked_users + d_linked,
+        cached_at_count = cached_at_count + d_age_count,
+        cached_at_epoch_sum = cached_at_epoch_sum + d_age_sum,
+        updated_at = NOW()
+    WHERE slot = pg_backend_pid() % 8;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION birth_chart_cache_stats_store() RETURNS TRIGGER AS $$
+DECLARE
+    d_charts BIGINT := 0;
+    d_hits BIGINT := 0;
+BEGIN
+    -- Inserts and deletes only; hit_count updates are counted by the hit flush itself
+    IF TG_OP = 'INSERT' THEN
+        d_charts := 1;
+        d_hits := NEW.hit_count;
+    ELSE
+        d_charts := -1;
+        d_hits := -OLD.hit_count;
+    END IF;
+    UPDATE birth_chart_cache_stats SET
+        stored_charts = stored_charts + d_charts,
+        store_hits = store_hits + d_hits,
+        updated_at = NOW()
+    WHERE slot = pg_backend_pid() % 8;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Seed the rollup from the current tables (slot 0 holds the totals) and attach
+-- the triggers under one lock (the migration runner wraps the file in a
+-- transaction) so no write is counted twice or missed
+LOCK TABLE users, birth_chart_store IN SHARE ROW EXCLUSIVE MODE;
+
+DELETE FROM birth_chart_cache_stats;
+INSERT INTO birth_chart_cache_stats (slot) SELECT generate_series(0, 7);
+UPDATE birth_chart_cache_stats SET
+    total_users = u.total_users,
+    cached_users = u.cached_users,
+    free_chart_users = u.free_chart_users,
+    linked_users = u.linked_users,
+    cached_at_count = u.cached_at_count,
+    cached_at_epoch_sum = u.cached_at_epoch_sum,
+    stored_charts = s.stored_charts,
+    store_hits = s.store_hits
+FROM (
+    SELECT
+        COUNT(*) AS total_users,
+        COUNT(birth_chart_data) AS cached_users,
+        COUNT(*) FILTER (WHERE has_free_birth_chart = true) AS free_chart_users,
+        COUNT(birth_chart_hash) AS linked_users,
+        COUNT(birth_chart_cached_at) AS cached_at_count,
+        COALESCE(SUM(EXTRACT(EPOCH FROM birth_chart_cached_at)::bigint), 0) AS cached_at_epoch_sum
+    FROM users
+) u, (
+    SELECT COUNT(*) AS stored_charts, COALESCE(SUM(hit_count), 0) AS store_hits FROM birth_chart_store
+) s
+WHERE slot = 0;
+
+DROP TRIGGER IF EXISTS birth_chart_cache_stats_users_trigger ON users;
+CREATE TRIGGER birth_chart_cache_stats_users_trigger
+    AFTER INSERT OR DELETE OR UPDATE OF birth_chart_data, birth_chart_hash, birth_chart_cached_at, has_free_birth_chart
+    ON users
+    FOR EACH ROW EXECUTE FUNCTION birth_chart_cache_stats_users();
+
+DROP TRIGGER IF EXISTS birth_chart_cache_stats_store_trigger ON birth_chart_store;
+CREATE TRIGGER birth_chart_cache_stats_store_trigger
+    AFTER INSERT OR DELETE
+    ON birth_chart_store
+    FOR EACH ROW EXECUTE FUNCTION birth_chart_cache_stats_store();
+
+COMMENT ON TABLE birth_chart_cache_stats IS 'Trigger-maintained birth chart cache counters; sum the slots for the totals';
+
+-- Rollback:
+-- DROP TRIGGER IF EXISTS birth_chart_cache_stats_store_trigger ON birth_chart_store;
+-- DROP TRIGGER IF EXISTS birth_chart_cache_stats_users_trigger ON users;
+-- DROP FUNCTION IF EXISTS birth_chart_cache_stats_store();
+-- DROP FUNCTION IF EXISTS birth_chart_cache_stats_users();
+-- DROP TABLE IF EXISTS birth_chart_cache_stats;
+-- DROP INDEX IF EXISTS idx_birth_chart_store_expires_hash;
+-- DROP INDEX IF EXISTS idx_users_birth_chart_expires_at;
@@ -0,0 +1,39 @@
+-- Migration: Compressed birth chart payloads
+-- Purpose: Stored charts and complete profiles become deduplicated, compressed
+--          blobs (services/chart_payload_codec.py) instead of JSONB, and
+--          users.birth_chart_data becomes a small reference to the stored entry
+--          instead of a copy of it, so queries on users no longer read the
+--          payload out of TOAST. Existing JSONB payloads stay readable and are
+--          re-encoded gradually by the birth chart cache cleaner
+-- Author: JyotiFlow Team
+-- Date: 2026-10-16
+
+ALTER TABLE birth_chart_store ADD COLUMN IF NOT EXISTS chart_blob BYTEA;
+ALTER TABLE birth_chart_store ADD COLUMN IF NOT EXISTS profile_blob BYTEA;
+
+-- Blobs are already compressed: store them out of line without another pglz pass
+ALTER TABLE birth_chart_store ALTER COLUMN chart_blob SET STORAGE EXTERNAL;
+ALTER TABLE birth_chart_store ALTER COLUMN profile_blob SET STORAGE EXTERNAL;
+
+-- Entries still waiting to be re-encoded (empty once the cleaner has caught up)
+CREATE INDEX IF NOT EXISTS idx_birth_chart_store_legacy_payload
+    ON birth_chart_store(birth_hash) WHERE chart_data IS NOT NULL OR profile_data IS NOT NULL;
+
+-- User rows holding an exact copy of a stored payload become references to it
+UPDATE users u SET birth_chart_data = jsonb_build_object(
+    'stored_chart', jsonb_build_object(
+        'birth_hash', u.birth_chart_hash,
+        'kind', CASE WHEN u.birth_chart_data::jsonb = s.profile_data THEN 'profile' ELSE 'chart' END
+    )
+)
+FROM birth_chart_store s
+WHERE s.birth_hash = u.birth_chart_hash
+AND (u.birth_chart_data::jsonb = s.profile_data OR u.birth_chart_data::jsonb = s.chart_data);
+
+COMMENT ON COLUMN birth_chart_store.chart_blob IS 'Birth chart payload encoded by chart_payload_codec (replaces chart_data)';
+COMMENT ON COLUMN birth_chart_store.profile_blob IS 'Complete profile payload encoded by chart_payload_codec (replaces profile_data)';
+
+-- Rollback (payloads cached since then are dropped and regenerated on demand):
+-- DROP INDEX IF EXISTS idx_birth_chart_store_legacy_payload;
+-- ALTER TABLE birth_chart_store DROP COLUMN IF EXISTS profile_blob;
+-- ALTER TABLE birth_chart_store DROP COLUMN IF EXISTS chart_blob;
@@ -0,0 +1,53 @@
+-- Migration: Pre-aggregated monitoring dashboard rollups
+-- Purpose: The admin monitoring dashboard re-aggregated the last 1 / 24 hours of
+--          sessions and integration_validations on every poll. Per-minute and
+--          per-hour counts are now kept in two small rollup tables, refreshed by
+--          a background job (monitoring/metrics_rollups.py) that only
+--          re-aggregates the trailing minutes whose source rows can still
+--          change. Dashboard windows read at most ~60 minute rows plus ~24 hour
+--          rows per key.
+-- Author: JyotiFlow Team
+-- Date: 2026-10-16
+
+CREATE TABLE IF NOT EXISTS monitoring_session_rollups (
+    resolution VARCHAR(10) NOT NULL CHECK (resolution IN ('minute', 'hour')),
+    bucket TIMESTAMP NOT NULL,                      -- date_trunc(resolution, sessions.created_at)
+    service_type VARCHAR(100) NOT NULL,             -- '' for sessions without a service type
+    total INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    active INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    duration_count INTEGER NOT NULL DEFAULT 0,      -- sessions with duration_minutes set
+    duration_minutes_sum NUMERIC NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (resolution, bucket, service_type)
+);
+
+CREATE TABLE IF NOT EXISTS monitoring_integration_rollups (
+    resolution VARCHAR(10) NOT NULL CHECK (resolution IN ('minute', 'hour')),
+    bucket TIMESTAMP NOT NULL,                      -- date_trunc(resolution, integration_validations.validation_time)
+    integration_name VARCHAR(100) NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    successful INTEGER NOT NULL DEFAULT 0,
+    response_time_count INTEGER NOT NULL DEFAULT 0,
+    response_time_ms_sum BIGINT NOT NULL DEFAULT 0,
+    last_validation TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (resolution, bucket, integration_name)
+);
+
+-- The refresh job reads the trailing window of each source by time
+CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions(created_at);
+
+DO $$
+BEGIN
+    IF to_regclass('public.integration_validations') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS idx_integration_validations_validation_time
+            ON integration_validations(validation_time);
+    END IF;
+END $$;
+
+-- Rollback:
+-- DROP TABLE IF EXISTS monitoring_integration_rollups;
+-- DROP TABLE IF EXISTS monitoring_session_rollups;
+-- DROP INDEX IF EXISTS idx_integration_validations_validation_time;
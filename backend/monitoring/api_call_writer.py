@@ -0,0 +1,146 @@
+"""
+API Call Writer - buffered, batched inserts into monitoring_api_calls
+
+The monitoring middleware used to spawn one task per HTTP request, each taking
+a pool connection for a single-row INSERT. Requests now only append a tuple to
+a bounded in-memory buffer; one background flusher writes it out with a
+multi-row ``INSERT ... SELECT FROM unnest(...)`` whenever ``batch_size`` rows
+are waiting or ``flush_interval`` seconds have passed. When the buffer is full
+(database down or too slow) new rows are dropped and counted rather than
+queued without limit. ``stop`` drains what is left, so the lifespan shutdown
+hook loses nothing that was accepted.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MONITORING_API_CALL_BUFFER_SIZE = int(os.getenv("MONITORING_API_CALL_BUFFER_SIZE", "10000"))
+MONITORING_API_CALL_BATCH_SIZE = int(os.getenv("MONITORING_API_CALL_BATCH_SIZE", "500"))
+MONITORING_API_CALL_FLUSH_INTERVAL_SECONDS = float(os.getenv("MONITORING_API_CALL_FLUSH_INTERVAL_SECONDS", "2"))
+
+# (endpoint, method, status_code, response_time, user_id, request_body, error, unix time)
+ApiCallRow = Tuple[str, str, int, int, Optional[int], Optional[str], Optional[str], float]
+
+
+class ApiCallWriter:
+    """Bounded buffer of API call rows drained by a single batching flusher"""
+
+    def __init__(self, capacity: int = MONITORING_API_CALL_BUFFER_SIZE,
+                 batch_size: int = MONITORING_API_CALL_BATCH_SIZE,
+                 flush_interval: float = MONITORING_API_CALL_FLUSH_INTERVAL_SECONDS):
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: Deque[ApiCallRow] = deque()
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self.stats = {"recorded": 0, "written": 0, "dropped": 0, "batches": 0,
+                      "errors": 0, "last_flush_at": None}
+
+    def record(self, endpoint: str, method: str, status_code: int, response_time: int,
+               user_id: Optional[int] = None, request_body: Optional[str] = None,
+               error: Optional[str] = None) -> bool:
+        """Queue one row without waiting; False when the buffer is full and the row was dropped"""
+        if len(self._buffer) >= self.capacity:
+            self.stats["dropped"] += 1
+            return False
+        self._buffer.append((endpoint, method, status_code, response_time, user_id, request_body, error, time.time()))
+        self.stats["recorded"] += 1
+        if not self._closed and (self._task is None or self._task.done()):
+            self.start()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def start(self):
+        """Start the flusher on the running loop (idempotent)"""
+        if self._task and not self._task.done():
+            return
+        self._closed = False
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        """Stop the flusher and write out everything still buffered"""
+        self._closed = True
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _loop(self):
+        # Started from inside a request: keep the flusher's DB time out of that route's numbers
+        try:
+            from db import set_db_route_context
+            set_db_route_context("monitoring.api_call_writer")
+        except ImportError:
+            pass
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write buffered rows in batches; a failed batch is dropped (and counted) instead of retried"""
+        written = 0
+        async with self._lock:
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                try:
+                    await self._write(batch)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    self.stats["dropped"] += len(batch)
+                    logger.error(f"Failed to log {len(batch)} API calls: {e}")
+                    break
+                written += len(batch)
+                self.stats["batches"] += 1
+        self.stats["written"] += written
+        self.stats["last_flush_at"] = datetime.now().isoformat()
+        return written
+
+    async def _write(self, rows: List[ApiCallRow]):
+        columns = list(zip(*rows))
+        async with self._pool().acquire() as conn:
+            await conn.execute("""
+                INSERT INTO monitoring_api_calls
+                (endpoint, method, status_code, response_time, user_id, request_body, error, timestamp)
+                SELECT endpoint, method, status_code, response_time, user_id, request_body, error,
+                       to_timestamp(called_at)::timestamp
+                FROM unnest($1::text[], $2::text[], $3::int[], $4::int[], $5::int[], $6::text[], $7::text[],
+                            $8::float8[])
+                    AS t(endpoint, method, status_code, response_time, user_id, request_body, error, called_at)
+            """, *[list(column) for column in columns])
+
+    def _pool(self):
+        import db
+        return db.require_db_pool()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "buffered": len(self._buffer), "capacity": self.capacity,
+                "batch_size": self.batch_size, "flush_interval_seconds": self.flush_interval,
+                "running": bool(self._task) and not self._task.done()}
+
+
+# Shared instance
+_api_call_writer: Optional[ApiCallWriter] = None
+
+
+def get_api_call_writer() -> ApiCallWriter:
+    """Return the process-wide monitoring_api_calls writer"""
+    global _api_call_writer
+    if _api_call_writer is None:
+        _api_call_writer = ApiCallWriter()
+    return _api_call_writer
@@ -14,6 +14,8 @@ import re
 import os
 import openai
 
+from services.embedding_service import get_embedding_service
+
 # Try to import numpy, but handle gracefully if not installed
 try:
     import numpy as np
@@ -47,6 +49,7 @@ class BusinessLogicValidator:
             self.openai_client = openai.AsyncClient(api_key=openai_key)
         except Exception as e:
             raise ValueError(f"Failed to initialize OpenAI client: {e}")
+        self.embedding_service = get_embedding_service(self.openai_client)
             
         self.spiritual_keywords = self._load_spiritual_keywords()
         self.tamil_vedic_terms = self._load_tamil_vedic_terms()
@@ -825,28 +828,18 @@ class BusinessLogicValidator:
             cache_key1 = self._get_embedding_cache_key(text1)
             cache_key2 = self._get_embedding_cache_key(text2)
             
-            # Get embeddings (with caching)
-            if cache_key1 in self._embedding_cache:
-                embedding1 = self._embedding_cache[cache_key1]
-            else:
-                await self._rate_limited_api_call()
-                embedding1_response = await self.openai_client.embeddings.create(
-                    model="text-embedding-ada-002",
-                    input=text1[:8000]  # Limit input length
-                )
-                embedding1 = embedding1_response.data[0].embedding
-                self._embedding_cache[cache_key1] = embedding1
-            
-            if cache_key2 in self._embedding_cache:
-                embedding2 = self._embedding_cache[cache_key2]
-            else:
+            # Get embeddings (with caching); misses go out together in one batched request
+            missing = {
+                key: text[:8000]  # Limit input length
+                for key, text in ((cache_key1, text1), (cache_key2, text2))
+                if key not in self._embedding_cache
+            }
+            if missing:
                 await self._rate_limited_api_call()
-                embedding2_response = await self.openai_client.embeddings.create(
-                    model="text-embedding-ada-002",
-                    input=text2[:8000]  # Limit input length
-                )
-                embedding2 = embedding2_response.data[0].embedding
-                self._embedding_cache[cache_key2] = embedding2
+                vectors = await self.embedding_service.embed_many(list(missing.values()))
+                self._embedding_cache.update(zip(missing.keys(), vectors))
+            embedding1 = self._embedding_cache[cache_key1]
+            embedding2 = self._embedding_cache[cache_key2]
             
             # Calculate cosine similarity
             if NUMPY_AVAILABLE:
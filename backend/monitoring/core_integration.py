@@ -3,28 +3,35 @@
 Integrates the monitoring system with core_foundation_enhanced
 """
 
+import os
+import random
 import asyncio
 from typing import Optional
 from functools import wraps
 import time
-from fastapi import Request
 
 # Import monitoring components
 from .integration_monitor import IntegrationMonitor
 from .context_tracker import ContextTracker
 from .business_validator import BusinessLogicValidator
+from .api_call_writer import get_api_call_writer
+from .request_metrics import get_request_metrics, route_template
 
 # Database manager
 try:
-    from db import db_manager
+    from db import db_manager, set_db_route_context, reset_db_route_context
 except ImportError:
     print("⚠️ db_manager not available, monitoring will run in limited mode")
     db_manager = None
+    set_db_route_context = reset_db_route_context = None
 
 # Logger
 import logging
 logger = logging.getLogger(__name__)
 
+# Fraction of successful requests logged in full to monitoring_api_calls (5xx are always logged)
+MONITORING_TRACE_SAMPLE_RATE = float(os.getenv("MONITORING_TRACE_SAMPLE_RATE", "0.05"))
+
 class MonitoringCoreIntegration:
     """Core integration for monitoring system"""
     
@@ -50,105 +57,119 @@ class MonitoringCoreIntegration:
             raise
             
     def create_middleware(self):
-        """Create FastAPI middleware for monitoring"""
-        from starlette.middleware.base import BaseHTTPMiddleware
-        import time
-        
+        """Create the ASGI monitoring middleware class (``app.add_middleware(...)``)"""
         # Store reference to self for the middleware class
         monitoring_integration = self
         
-        class MonitoringMiddleware(BaseHTTPMiddleware):
+        class MonitoringMiddleware:
+            """
+            Raw ASGI middleware: responses (including streaming ones) pass straight
+            through, latency goes into the per-route histograms and a sampled
+            fraction of requests is queued for detailed logging
+            """
+            
             def __init__(self, app):
-                super().__init__(app)
+                self.app = app
                 self.monitoring_integration = monitoring_integration
+            
+            async def __call__(self, scope, receive, send):
+                if scope["type"] != "http":
+                    await self.app(scope, receive, send)
+                    return
                 
-            async def dispatch(self, request: Request, call_next):
-                """Middleware to monitor all API calls"""
-                start_time = time.time()
-                
-                # Extract request info
-                endpoint = str(request.url.path)
-                method = request.method
-                
-                # Skip monitoring endpoints to avoid recursion
-                # All monitoring endpoints are under /api/monitoring prefix
-                if endpoint.startswith("/api/monitoring") or endpoint.startswith("/monitoring/ws"):
-                    return await call_next(request)
+                # Attribute DB pool checkouts made while handling this request to its route.
+                # The scope is shared with the router, so the matched route template is
+                # resolved lazily once routing has happened.
+                route_token = set_db_route_context(scope) if set_db_route_context else None
+                try:
+                    # Skip monitoring endpoints to avoid recursion
+                    # All monitoring endpoints are under /api/monitoring prefix
+                    endpoint = scope.get("path", "")
+                    if endpoint.startswith("/api/monitoring") or endpoint.startswith("/monitoring/ws"):
+                        await self.app(scope, receive, send)
+                        return
+                    await self._monitor(scope, receive, send)
+                finally:
+                    if route_token is not None:
+                        reset_db_route_context(route_token)
+            
+            async def _monitor(self, scope, receive, send):
+                started = time.perf_counter()
+                # Store request info for later use (request.state.monitoring_start_time)
+                scope.setdefault("state", {})["monitoring_start_time"] = time.time()
+                response = {"status": 500, "first_byte": None}
                 
-                # Store request info for later use
-                request.state.monitoring_start_time = start_time
+                async def send_wrapper(message):
+                    if message["type"] == "http.response.start":
+                        response["status"] = message["status"]
+                        response["first_byte"] = time.perf_counter()
+                    await send(message)
                 
                 try:
-                    # Process request
-                    response = await call_next(request)
-                    
-                    # Calculate response time
-                    response_time = int((time.time() - start_time) * 1000)  # ms
-                    
-                    # Log API call asynchronously
-                    asyncio.create_task(self.monitoring_integration._log_api_call(
-                        endpoint=endpoint,
-                        method=method,
-                        status_code=response.status_code,
-                        response_time=response_time,
-                        request=request
-                    ))
-                    
-                    return response
-                    
+                    await self.app(scope, receive, send_wrapper)
                 except Exception as e:
-                    # Log error
-                    response_time = int((time.time() - start_time) * 1000)
-                    
-                    asyncio.create_task(self.monitoring_integration._log_api_call(
-                        endpoint=endpoint,
-                        method=method,
-                        status_code=500,
-                        response_time=response_time,
-                        request=request,
-                        error=str(e)
-                    ))
-                    
+                    self.monitoring_integration._record_request(scope, response["status"], started,
+                                                                response["first_byte"], error=str(e))
                     # Re-raise the exception
                     raise
+                self.monitoring_integration._record_request(scope, response["status"], started,
+                                                            response["first_byte"])
         
         return MonitoringMiddleware
-        
-    async def _log_api_call(self, endpoint: str, method: str, status_code: int, 
-                           response_time: int, request: Request, error: Optional[str] = None):
-        """Log API call to database"""
+    
+    def _record_request(self, scope, status_code: int, started: float,
+                        first_byte: Optional[float] = None, error: Optional[str] = None):
+        """Histogram every request; queue failures plus a sample of the rest for monitoring_api_calls"""
+        try:
+            finished = time.perf_counter()
+            response_time = (finished - started) * 1000  # ms, including a streamed body
+            route = route_template(scope)
+            get_request_metrics().record(route, response_time, status_code, error is not None)
+            
+            if error is None and status_code < 500 and random.random() >= MONITORING_TRACE_SAMPLE_RATE:
+                return
+            ttfb = f"{(first_byte - started) * 1000:.1f}" if first_byte is not None else "-"
+            logger.info(f"trace {route} path={scope.get('path')} status={status_code} "
+                        f"ttfb_ms={ttfb} total_ms={response_time:.1f}" + (f" error={error}" if error else ""))
+            self._log_api_call(
+                endpoint=scope.get("path", ""),
+                method=scope.get("method", ""),
+                status_code=status_code,
+                response_time=int(response_time),
+                state=scope.get("state") or {},
+                error=error
+            )
+        except Exception as e:
+            logger.error(f"Failed to record request metrics: {e}")
+    
+    def _log_api_call(self, endpoint: str, method: str, status_code: int, 
+                      response_time: int, state: dict, error: Optional[str] = None):
+        """Queue an API call row for monitoring_api_calls (written in batches by the API call writer)"""
         if not db_manager:
             return
             
         try:
-            # Extract user info if available
+            # Extract user info if available (request.state lives in the ASGI scope)
             user_id = None
-            if hasattr(request.state, "user"):
-                user_id = getattr(request.state.user, "id", None)
+            if "user" in state:
+                user_id = getattr(state["user"], "id", None)
             
             # Get request body safely without consuming it
             request_body = None
             if method in ["POST", "PUT", "PATCH"]:
                 try:
                     # Try to get body from request state if already read
-                    if hasattr(request.state, "_json"):
-                        request_body = str(request.state._json)
-                    elif hasattr(request.state, "_body"):
-                        request_body = request.state._body.decode("utf-8") if request.state._body else None
+                    if "_json" in state:
+                        request_body = str(state["_json"])
+                    elif "_body" in state:
+                        request_body = state["_body"].decode("utf-8") if state["_body"] else None
                     # Note: We cannot read request.body() here as it would consume the stream
                     # The body should be captured by endpoint handlers and stored in request.state
                 except (AttributeError, UnicodeDecodeError):
                     pass
             
-            conn = await db_manager.get_connection()
-            try:
-                await conn.execute("""
-                    INSERT INTO monitoring_api_calls 
-                    (endpoint, method, status_code, response_time, user_id, request_body, error, timestamp)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7, NOW())
-                """, endpoint, method, status_code, response_time, user_id, request_body, error)
-            finally:
-                await db_manager.release_connection(conn)
+            get_api_call_writer().record(endpoint, method, status_code, response_time,
+                                         user_id, request_body, error)
                 
         except Exception as e:
             logger.error(f"Failed to log API call: {e}")
@@ -187,17 +208,19 @@ class MonitoringCoreIntegration:
                                       execution_time: float, error: Optional[str] = None):
         """Track endpoint execution metrics"""
         try:
-            # Update integration metrics
+            # Update integration metrics: latency percentiles / call rate, and success ratio (mean)
+            await self.integration_monitor.update_metrics(
+                integration_name=endpoint_name,
+                metric_type="execution_time_ms",
+                value=execution_time * 1000
+            )
             await self.integration_monitor.update_metrics(
                 integration_name=endpoint_name,
-                metric_type="endpoint_execution",
-                value=1,
-                metadata={
-                    "success": success,
-                    "execution_time": execution_time,
-                    "error": error
-                }
+                metric_type="success",
+                value=1.0 if success else 0.0
             )
+            if error:
+                logger.debug(f"Endpoint {endpoint_name} failed: {error}")
         except Exception as e:
             logger.error(f"Failed to track endpoint execution: {e}")
 
@@ -8,14 +8,26 @@ import asyncio
 import asyncpg
 import uuid
 import os
+import time
 from datetime import datetime, timezone
 from typing import Dict, List, Any
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, status
-from db import db_manager
+from db import db_manager, get_db_pool_telemetry
+from services.embedding_service import get_embedding_stats
+from services.profile_pipeline import get_profile_stage_metrics
+from services.prokerala_client import get_prokerala_client_stats
+from services.vector_index import get_vector_index
+from .api_call_writer import get_api_call_writer
+from .request_metrics import get_request_metrics
+from .metrics_rollups import get_metrics_rollups, session_totals
+from .ws_publisher import ConnectionManager, HealthPublisher
 import logging
 logger = logging.getLogger(__name__)
 
+# How long an assembled dashboard payload is served to subsequent polls
+MONITORING_DASHBOARD_CACHE_SECONDS = float(os.getenv("MONITORING_DASHBOARD_CACHE_SECONDS", "5"))
+
 # Database connection managed through db_manager
 from pydantic import BaseModel, Field, model_validator
 from typing import Optional, Dict, Any
@@ -70,43 +82,20 @@ from .business_validator import BusinessLogicValidator
 router = APIRouter(prefix="/api/monitoring", tags=["monitoring"])
 
 # WebSocket manager for real-time updates
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        
-    def disconnect(self, websocket: WebSocket):
-        try:
-            self.active_connections.remove(websocket)
-        except ValueError:
-            # WebSocket was not in the list, ignore
-            pass
-        
-    async def broadcast(self, message: dict):
-        """Broadcast message to all connected admin clients"""
-        dead_connections = []
-        for connection in self.active_connections[:]:  # Create a copy to iterate safely
-            try:
-                await connection.send_json(message)
-            except WebSocketDisconnect:
-                logger.info("WebSocket client disconnected during broadcast")
-                dead_connections.append(connection)
-            except (ConnectionResetError, ConnectionAbortedError, OSError) as conn_error:
-                logger.warning(f"Connection closed during broadcast: {conn_error}")
-                dead_connections.append(connection)
-            except Exception as e:
-                logger.error(f"Unexpected error broadcasting to client: {e}")
-                dead_connections.append(connection)
-        
-        # Remove dead connections
-        for dead_conn in dead_connections:
-            self.disconnect(dead_conn)
-
 connection_manager = ConnectionManager()
 
+
+async def _collect_live_state() -> Dict[str, Any]:
+    """What the websocket clients see: system health plus database pool telemetry"""
+    state = {"system_health": await integration_monitor.get_system_health()}
+    pool_telemetry = get_db_pool_telemetry()
+    if pool_telemetry is not None:
+        state["db_pool"] = pool_telemetry
+    return state
+
+# Computes the live state once per tick for all connected clients
+health_publisher = HealthPublisher(connection_manager, _collect_live_state)
+
 class MonitoringDashboard:
     """
     Real-time monitoring dashboard that integrates with
@@ -115,33 +104,40 @@ class MonitoringDashboard:
     
     def __init__(self):
         self.business_validator = BusinessLogicValidator()
+        self._cached = None  # (monotonic time, payload)
+        self._building = None
         
     async def get_dashboard_data(self) -> Dict:
-        """Get comprehensive dashboard data for admin interface - database-driven"""
+        """
+        Get comprehensive dashboard data for admin interface - database-driven.
+        Aggregates come from the metrics rollups; the assembled payload is cached
+        for MONITORING_DASHBOARD_CACHE_SECONDS and concurrent polls share one build.
+        """
+        cached = self._cached
+        if cached and time.monotonic() - cached[0] < MONITORING_DASHBOARD_CACHE_SECONDS:
+            return cached[1]
+        if self._building is None or self._building.done():
+            self._building = asyncio.ensure_future(self._build_dashboard_data())
+        # Shielded: a poll that disconnects must not cancel the build other polls wait on
+        return await asyncio.shield(self._building)
+    
+    async def _build_dashboard_data(self) -> Dict:
         try:
-            # Get system health from database
-            system_health = await self._get_system_health_from_db()
-            
-            # Get recent sessions
-            recent_sessions = await self._get_recent_sessions()
-            
-            # Get integration statistics
-            integration_stats = await self._get_integration_statistics()
-            
-            # Get critical issues
-            critical_issues = await self._get_critical_issues()
-            
-            # Get social media health
-            social_media_health = await self._get_social_media_health()
-            
-            # Calculate overall metrics
-            overall_metrics = await self._calculate_overall_metrics()
-            
-            # Calculate per-integration metrics for frontend display
-            integration_metrics = await self._calculate_integration_metrics()
-            
-            # Get active sessions count from database
-            active_sessions_count = await self._get_active_sessions_count()
+            # The sections are independent; each reads a few rollup rows on its own connection
+            (system_health, recent_sessions, integration_stats, critical_issues, social_media_health,
+             overall_metrics, integration_metrics, active_sessions_count, alerts) = await asyncio.gather(
+                self._get_system_health_from_db(),
+                self._get_recent_sessions(),
+                self._get_integration_statistics(),
+                self._get_critical_issues(),
+                self._get_social_media_health(),
+                self._calculate_overall_metrics(),
+                # Calculate per-integration metrics for frontend display
+                self._calculate_integration_metrics(),
+                # Get active sessions count from database
+                self._get_active_sessions_count(),
+                self._get_active_alerts()
+            )
             
             dashboard_data = {
                 "timestamp": datetime.now(timezone.utc).isoformat(),
@@ -153,9 +149,20 @@ class MonitoringDashboard:
                 "social_media_health": social_media_health,
                 "overall_metrics": overall_metrics,
                 "metrics": integration_metrics,
-                "alerts": await self._get_active_alerts()
+                "alerts": alerts,
+                "db_pool": get_db_pool_telemetry(),
+                "profile_stages": get_profile_stage_metrics().snapshot(),
+                "embeddings": get_embedding_stats(),
+                "vector_index": get_vector_index().get_stats(),
+                "prokerala": get_prokerala_client_stats(),
+                "api_call_log": get_api_call_writer().get_stats(),
+                "request_latency": get_request_metrics().snapshot(top_routes=10),
+                "rollups": get_metrics_rollups().get_stats(),
+                "live_updates": health_publisher.get_stats(),
+                "endpoint_metrics": integration_monitor.get_metrics_summary()
             }
             
+            self._cached = (time.monotonic(), dashboard_data)
             return dashboard_data
             
         except Exception as e:
@@ -408,32 +415,28 @@ class MonitoringDashboard:
             from db import db_manager
             conn = await db_manager.get_connection()
             try:
-                # Get session statistics from actual sessions table
-                stats = await conn.fetchrow("""
-                        SELECT 
-                        COUNT(*) as total_sessions,
-                        AVG(duration_minutes * 60 * 1000) as avg_response_time_ms, -- Convert to milliseconds
-                        COUNT(CASE WHEN status = 'completed' THEN 1 END) as successful_sessions,
-                        COUNT(CASE WHEN status = 'active' THEN 1 END) as active_sessions
-                    FROM sessions
-                    WHERE created_at > NOW() - INTERVAL '24 hours'
-                """)
+                # Session statistics for the last 24 hours, per service type, from the rollups
+                by_service = await get_metrics_rollups().session_window(conn, 24 * 60)
+                totals = session_totals(by_service)
                 
-                # Get per-service type statistics
-                by_service = await conn.fetch("""
-                    SELECT 
-                        service_type as integration_name,
-                        COUNT(*) as total_calls,
-                        COUNT(CASE WHEN status = 'completed' THEN 1 END) as successful_calls,
-                        AVG(duration_minutes * 60 * 1000) as avg_duration_ms
-                    FROM sessions
-                    WHERE created_at > NOW() - INTERVAL '24 hours'
-                    GROUP BY service_type
-                """)
+                def avg_ms(row):
+                    # Sessions store duration in minutes; report milliseconds
+                    return float(row["duration_minutes_sum"]) / row["duration_count"] * 60 * 1000 \
+                        if row["duration_count"] else None
                 
                 return {
-                    "overall": dict(stats) if stats else {},
-                    "by_integration": [dict(i) for i in by_service]
+                    "overall": {
+                        "total_sessions": totals["total"],
+                        "avg_response_time_ms": avg_ms(totals),
+                        "successful_sessions": totals["completed"],
+                        "active_sessions": totals["active"]
+                    },
+                    "by_integration": [{
+                        "integration_name": row["service_type"],
+                        "total_calls": row["total"],
+                        "successful_calls": row["completed"],
+                        "avg_duration_ms": avg_ms(row)
+                    } for row in by_service]
                 }
             finally:
                 await db_manager.release_connection(conn)
@@ -562,36 +565,18 @@ class MonitoringDashboard:
             from db import db_manager
             conn = await db_manager.get_connection()
             try:
-                # Get success rate from sessions
-                success_rate = await conn.fetchrow("""
-                    SELECT 
-                        COUNT(CASE WHEN status = 'completed' THEN 1 END)::float / 
-                        NULLIF(COUNT(*), 0) * 100 as success_rate
-                    FROM sessions
-                    WHERE created_at > NOW() - INTERVAL '24 hours'
-                """)
-                
-                # Get average session duration
-                avg_duration = await conn.fetchrow("""
-                    SELECT 
-                        AVG(duration_minutes * 60) as avg_duration_seconds
-                    FROM sessions
-                    WHERE duration_minutes IS NOT NULL
-                    AND created_at > NOW() - INTERVAL '24 hours'
-                """)
-                
-                # Get system health score based on session completion rate
-                total_sessions = await conn.fetchval("""
-                    SELECT COUNT(*) FROM sessions 
-                    WHERE created_at > NOW() - INTERVAL '24 hours'
-                """)
+                # Success rate, average duration and volume for the last 24 hours from the rollups
+                totals = session_totals(await get_metrics_rollups().session_window(conn, 24 * 60))
+                success_rate = totals["completed"] / totals["total"] * 100 if totals["total"] else 0.0
+                avg_duration = (float(totals["duration_minutes_sum"]) / totals["duration_count"] * 60
+                                if totals["duration_count"] else 0.0)
                 
                 return {
-                    "success_rate": float(success_rate["success_rate"] or 0) if success_rate else 0,
-                    "avg_session_duration": float(avg_duration["avg_duration_seconds"] or 0) if avg_duration else 0,
-                    "total_sessions_24h": total_sessions or 0,
+                    "success_rate": success_rate,
+                    "avg_session_duration": avg_duration,
+                    "total_sessions_24h": totals["total"],
                     "quality_scores": {
-                        "system_health": min(float(success_rate["success_rate"] or 0), 100) if success_rate else 0,
+                        "system_health": min(success_rate, 100),
                         "uptime": 99.5  # Placeholder - could be calculated from monitoring data
                     }
                 }
@@ -612,31 +597,19 @@ class MonitoringDashboard:
             from db import db_manager
             conn = await db_manager.get_connection()
             try:
-                # Get per-service type metrics from sessions table
-                integration_stats = await conn.fetch("""
-                    SELECT 
-                        service_type as integration_name,
-                        COUNT(*) as total_validations,
-                        COUNT(CASE WHEN status = 'completed' THEN 1 END) as successful_validations,
-                        ROUND(
-                            (COUNT(CASE WHEN status = 'completed' THEN 1 END)::numeric / 
-                            NULLIF(COUNT(*), 0) * 100)::numeric, 1
-                        ) as success_rate,
-                        ROUND(AVG(duration_minutes * 60 * 1000)::numeric) as avg_response_time_ms
-                    FROM sessions
-                    WHERE created_at > NOW() - INTERVAL '24 hours'
-                    AND service_type IS NOT NULL
-                    GROUP BY service_type
-                    ORDER BY service_type
-                """)
+                # Per-service type metrics for the last 24 hours from the rollups
+                integration_stats = [row for row in await get_metrics_rollups().session_window(conn, 24 * 60)
+                                     if row["service_type"] is not None]
+                integration_stats.sort(key=lambda row: row["service_type"])
                 
                 success_rates = {}
                 avg_response_times = {}
                 
                 for row in integration_stats:
-                    integration_name = row['integration_name']
-                    success_rates[integration_name] = float(row['success_rate'] or 0)
-                    avg_response_times[integration_name] = int(row['avg_response_time_ms'] or 0)
+                    integration_name = row['service_type']
+                    success_rates[integration_name] = round(row['completed'] / row['total'] * 100, 1) if row['total'] else 0.0
+                    avg_response_times[integration_name] = round(
+                        float(row['duration_minutes_sum']) / row['duration_count'] * 60 * 1000) if row['duration_count'] else 0
                 
                 # Add common integration points that we expect to monitor
                 common_integrations = [
@@ -712,16 +685,12 @@ class MonitoringDashboard:
                     for alert in alert_data:
                         alerts.append(dict(alert))
                 else:
-                    # Generate basic alerts from session data
-                    error_rate = await conn.fetchrow("""
-                        SELECT 
-                            CASE 
-                                WHEN COUNT(*) = 0 THEN 0
-                                ELSE COUNT(CASE WHEN status != 'completed' THEN 1 END)::float / COUNT(*) * 100
-                            END as error_rate
-                        FROM sessions
-                        WHERE created_at > NOW() - INTERVAL '1 hour'
-                    """)
+                    # Generate basic alerts from the last hour of session rollups
+                    totals = session_totals(await get_metrics_rollups().session_window(conn, 60))
+                    error_rate = {
+                        "error_rate": (totals["total"] - totals["completed"]) / totals["total"] * 100
+                        if totals["total"] else 0
+                    }
                     
                     if error_rate and error_rate["error_rate"] > 20:
                         alerts.append({
@@ -748,16 +717,14 @@ class MonitoringDashboard:
             from db import db_manager
             conn = await db_manager.get_connection()
             try:
-                # Calculate system health based on session success rates
-                health_metrics = await conn.fetchrow("""
-                    SELECT 
-                        COUNT(*) as total_sessions,
-                        COUNT(CASE WHEN status = 'completed' THEN 1 END) as successful_sessions,
-                        COUNT(CASE WHEN status = 'active' THEN 1 END) as active_sessions,
-                        COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed_sessions
-                    FROM sessions
-                    WHERE created_at > NOW() - INTERVAL '1 hour'
-                """)
+                # Calculate system health based on the last hour of session success rates
+                totals = session_totals(await get_metrics_rollups().session_window(conn, 60))
+                health_metrics = {
+                    'total_sessions': totals['total'],
+                    'successful_sessions': totals['completed'],
+                    'active_sessions': totals['active'],
+                    'failed_sessions': totals['failed']
+                }
                 
                 if health_metrics and health_metrics['total_sessions'] > 0:
                     success_rate = (health_metrics['successful_sessions'] / health_metrics['total_sessions']) * 100
@@ -775,30 +742,22 @@ class MonitoringDashboard:
                 # Get integration points from database - try integration_validations table first
                 integration_points = {}
                 
-                # Check if integration_validations table exists and has data
+                # Check if integration_validations rollups are available and have data
                 try:
-                    integration_data = await conn.fetch("""
-                        SELECT 
-                            integration_name,
-                            COUNT(*) as total_validations,
-                            COUNT(CASE WHEN status = 'success' THEN 1 END) as successful_validations,
-                            AVG(response_time_ms) as avg_response_time,
-                            MAX(validation_time) as last_validation
-                        FROM integration_validations
-                        WHERE validation_time > NOW() - INTERVAL '24 hours'
-                        GROUP BY integration_name
-                    """)
+                    integration_data = await get_metrics_rollups().integration_window(conn, 24 * 60)
                     
                     # Process integration validations data
                     for integration in integration_data:
                         name = integration['integration_name']
-                        success_rate = (integration['successful_validations'] / integration['total_validations']) * 100 if integration['total_validations'] > 0 else 0
+                        success_rate = (integration['successful'] / integration['total']) * 100 if integration['total'] > 0 else 0
+                        avg_response_time = (integration['response_time_ms_sum'] / integration['response_time_count']
+                                             if integration['response_time_count'] else 0)
                         
                         integration_points[name] = {
                             "status": "healthy" if success_rate >= 95 else "warning" if success_rate >= 80 else "error",
                             "success_rate": round(success_rate, 1),
-                            "total_validations": integration['total_validations'], 
-                            "latency_ms": int(integration['avg_response_time'] or 0),
+                            "total_validations": integration['total'], 
+                            "latency_ms": int(avg_response_time),
                             "last_check": integration['last_validation'].isoformat() if integration['last_validation'] else datetime.now(timezone.utc).isoformat()
                         }
                         
@@ -1120,6 +1079,40 @@ async def get_dashboard():
             data=fallback_data
         )
 
+@router.get("/db-pool")
+async def get_db_pool_metrics(admin: dict = Depends(get_current_admin_dependency)):
+    """Connection pool saturation and checkout latency (wait/hold time per route, timeouts)"""
+    telemetry = get_db_pool_telemetry()
+    if telemetry is None:
+        return StandardResponse(
+            status="error",
+            message="Database pool not initialized",
+            data={}
+        )
+    return StandardResponse(
+        status="success",
+        message="Database pool telemetry retrieved",
+        data=telemetry
+    )
+
+@router.get("/profile-stages")
+async def get_profile_stage_latency(admin: dict = Depends(get_current_admin_dependency)):
+    """Birth chart profile assembly: latency and timeout/error counts per pipeline stage"""
+    return StandardResponse(
+        status="success",
+        message="Profile stage metrics retrieved",
+        data=get_profile_stage_metrics().snapshot()
+    )
+
+@router.get("/request-latency")
+async def get_request_latency(top_routes: int = 50, admin: dict = Depends(get_current_admin_dependency)):
+    """Per-route request latency histograms (route templates, slowest total time first)"""
+    return StandardResponse(
+        status="success",
+        message="Request latency histograms retrieved",
+        data=get_request_metrics().snapshot(top_routes=top_routes)
+    )
+
 @router.get("/session/{session_id}")
 async def get_session_validation(session_id: str, admin: dict = Depends(get_current_admin_dependency)):
     """Get detailed validation report for a specific session"""
@@ -2115,40 +2108,23 @@ async def get_spiritual_services_status():
 
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time monitoring updates"""
+    """
+    WebSocket endpoint for real-time monitoring updates. The shared publisher
+    sends a snapshot, then deltas; this handler only holds the connection open.
+    """
     await connection_manager.connect(websocket)
+    health_publisher.start()
+    health_publisher.wake()
     try:
         while True:
-            # Check if connection is still active
-            if websocket.client_state.name != "CONNECTED":
-                logger.info("WebSocket disconnected, ending monitoring")
-                break
-                
-            try:
-                # Send heartbeat and system status every 5 seconds
-                system_health = await integration_monitor.get_system_health()
-                await websocket.send_json({
-                    "type": "system_health",
-                    "data": system_health,
-                    "timestamp": datetime.now(timezone.utc).isoformat()
-                })
-            except Exception as send_error:
-                # Don't log error if it's just a disconnection
-                if "1005" not in str(send_error) and "no status received" not in str(send_error):
-                    logger.error(f"Error sending WebSocket message: {send_error}")
-                break
-            
-            # Wait for 5 seconds
-            try:
-                await asyncio.sleep(5)
-            except Exception as sleep_error:
-                logger.error(f"Error during WebSocket sleep: {sleep_error}")
-                break
-            
+            # Client messages are not used; receiving surfaces the disconnect
+            await websocket.receive_text()
     except WebSocketDisconnect:
         logger.info("WebSocket client disconnected")
     except Exception as e:
-        logger.error(f"Unexpected WebSocket error: {e}")
+        # Don't log error if it's just a disconnection
+        if "1005" not in str(e) and "no status received" not in str(e):
+            logger.error(f"Unexpected WebSocket error: {e}")
     finally:
         connection_manager.disconnect(websocket)
 
@@ -147,6 +147,11 @@ try:
 except ImportError:
     BusinessLogicValidator = None
 
+from .metric_series import MetricSeriesStore
+
+# Window the in-memory endpoint metrics are summarised over in system health
+INTEGRATION_METRICS_WINDOW_SECONDS = float(os.getenv("INTEGRATION_METRICS_WINDOW_SECONDS", "300"))
+
 class IntegrationStatus(Enum):
     SUCCESS = "success"
     PARTIAL = "partial"
@@ -250,7 +255,7 @@ class IntegrationMonitor:
             logger.warning(f"BusinessLogicValidator initialization failed: {e}")
             self.business_validator = None
         self.active_sessions = {}
-        self.metrics = {}  # Store metrics for each integration
+        self.metrics = MetricSeriesStore()  # Ring buffer of recent samples per (integration, metric)
         
     async def start_monitoring(self):
         """Start background monitoring tasks with cache management"""
@@ -262,23 +267,16 @@ class IntegrationMonitor:
         
     async def update_metrics(self, integration_name: str, metric_type: str, 
                            value: float, metadata: Optional[Dict] = None):
-        """Update metrics for an integration point"""
-        if integration_name not in self.metrics:
-            self.metrics[integration_name] = {}
-        
-        if metric_type not in self.metrics[integration_name]:
-            self.metrics[integration_name][metric_type] = []
-        
-        self.metrics[integration_name][metric_type].append({
-            "value": value,
-            "timestamp": datetime.now(timezone.utc),
-            "metadata": metadata or {}
-        })
-        
-        # Keep only last 1000 metrics per type
-        if len(self.metrics[integration_name][metric_type]) > 1000:
-            self.metrics[integration_name][metric_type] = \
-                self.metrics[integration_name][metric_type][-1000:]
+        """
+        Update metrics for an integration point. Only the numeric value is kept
+        (the buffers hold float64 samples); record anything else worth trending
+        as its own metric type.
+        """
+        self.metrics.record(integration_name, metric_type, float(value))
+    
+    def get_metrics_summary(self, window_seconds: Optional[float] = INTEGRATION_METRICS_WINDOW_SECONDS) -> Dict:
+        """Count, mean, p50/p95/p99 and rate per integration and metric over the recent window"""
+        return self.metrics.summary(window_seconds)
     
     async def _periodic_health_check(self):
         """Periodically check integration health"""
@@ -0,0 +1,121 @@
+"""
+Metric Series - fixed-capacity NumPy ring buffers behind IntegrationMonitor.metrics
+
+One series per (integration, metric): a float64 value array and an int64
+timestamp array (epoch nanoseconds) written at a rotating index, so recording a
+sample is two array stores with no allocation or copying once the buffer is
+full. Percentiles, means and rates are computed over the live slots with NumPy.
+Without NumPy nothing is recorded and summaries are empty.
+"""
+
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    np = None
+
+INTEGRATION_METRICS_CAPACITY = int(os.getenv("INTEGRATION_METRICS_CAPACITY", "1000"))
+INTEGRATION_METRICS_MAX_SERIES = int(os.getenv("INTEGRATION_METRICS_MAX_SERIES", "500"))
+
+PERCENTILES = (50, 95, 99)
+
+
+class MetricSeries:
+    """Ring buffer of the last ``capacity`` (timestamp, value) samples"""
+
+    __slots__ = ("capacity", "values", "timestamps", "_next", "_size")
+
+    def __init__(self, capacity: int = INTEGRATION_METRICS_CAPACITY):
+        self.capacity = capacity
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, value: float, timestamp_ns: Optional[int] = None):
+        self.values[self._next] = value
+        self.timestamps[self._next] = time.time_ns() if timestamp_ns is None else timestamp_ns
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def window(self, seconds: Optional[float] = None, now_ns: Optional[int] = None) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Live (values, timestamps) in slot order, optionally only the last ``seconds``"""
+        values, timestamps = self.values[:self._size], self.timestamps[:self._size]
+        if seconds is not None:
+            cutoff = (time.time_ns() if now_ns is None else now_ns) - int(seconds * 1e9)
+            recent = timestamps >= cutoff
+            values, timestamps = values[recent], timestamps[recent]
+        return values, timestamps
+
+    def rate(self, seconds: float, now_ns: Optional[int] = None) -> float:
+        """Samples per second over the last ``seconds``"""
+        now_ns = time.time_ns() if now_ns is None else now_ns
+        _, timestamps = self.window(seconds, now_ns)
+        if not timestamps.size:
+            return 0.0
+        span_ns = seconds * 1e9
+        if self._size == self.capacity:
+            # Samples older than the buffer were overwritten; only the span it still covers counts
+            span_ns = min(span_ns, now_ns - int(self.timestamps[:self._size].min()))
+        return float(timestamps.size / (span_ns / 1e9)) if span_ns > 0 else 0.0
+
+    def summary(self, seconds: Optional[float] = None, now_ns: Optional[int] = None) -> Dict[str, Any]:
+        """Count, mean, min/max, p50/p95/p99 and rate over the last ``seconds`` (or the whole buffer)"""
+        now_ns = time.time_ns() if now_ns is None else now_ns
+        values, _ = self.window(seconds, now_ns)
+        if not values.size:
+            return {"count": 0}
+        quantiles = np.percentile(values, PERCENTILES)
+        summary = {
+            "count": int(values.size),
+            "mean": round(float(values.mean()), 3),
+            "min": round(float(values.min()), 3),
+            "max": round(float(values.max()), 3),
+            **{f"p{q}": round(float(v), 3) for q, v in zip(PERCENTILES, quantiles)},
+        }
+        if seconds is not None:
+            summary["rate_per_s"] = round(self.rate(seconds, now_ns), 4)
+        return summary
+
+
+class MetricSeriesStore:
+    """Series keyed by (integration, metric), bounded to ``max_series``"""
+
+    def __init__(self, capacity: int = INTEGRATION_METRICS_CAPACITY,
+                 max_series: int = INTEGRATION_METRICS_MAX_SERIES):
+        self.capacity = capacity
+        self.max_series = max_series
+        self.series: Dict[Tuple[str, str], MetricSeries] = {}
+        self.dropped = 0
+
+    def record(self, integration: str, metric: str, value: float, timestamp_ns: Optional[int] = None):
+        if not NUMPY_AVAILABLE:
+            return
+        series = self.series.get((integration, metric))
+        if series is None:
+            if len(self.series) >= self.max_series:
+                self.dropped += 1
+                return
+            series = self.series[(integration, metric)] = MetricSeries(self.capacity)
+        series.append(value, timestamp_ns)
+
+    def get(self, integration: str, metric: str) -> Optional[MetricSeries]:
+        return self.series.get((integration, metric))
+
+    def summary(self, seconds: Optional[float] = None) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """{integration: {metric: summary}} for every series with samples in the window"""
+        now_ns = time.time_ns()
+        summaries: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (integration, metric), series in self.series.items():
+            summary = series.summary(seconds, now_ns)
+            if summary["count"]:
+                summaries.setdefault(integration, {})[metric] = summary
+        return summaries
@@ -0,0 +1,258 @@
+"""
+Metrics Rollups - per-minute / per-hour aggregates behind the monitoring dashboard
+
+A background job keeps ``monitoring_session_rollups`` and
+``monitoring_integration_rollups`` (migration 036) current. Each tick
+re-aggregates only the trailing minutes whose source rows can still change
+(sessions move from active to completed after they are created, validation rows
+may commit a little late), upserts those minute buckets, drops buckets that
+have become empty, and then re-derives the affected hour buckets from the
+minute rows. Re-aggregating whole buckets keeps every refresh idempotent, so a
+missed or repeated tick never double counts; a Postgres advisory lock keeps
+several workers from doing the same work at once.
+
+Dashboard windows are read back with ``session_window`` / ``integration_window``:
+hour rows for the complete hours inside the window, minute rows for the two
+partial hours at its edges.
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from services.chart_generation_flights import advisory_lock_key
+
+logger = logging.getLogger(__name__)
+
+MONITORING_ROLLUPS_ENABLED = os.getenv("MONITORING_ROLLUPS_ENABLED", "true").lower() == "true"
+MONITORING_ROLLUP_INTERVAL_SECONDS = float(os.getenv("MONITORING_ROLLUP_INTERVAL_SECONDS", "60"))
+# How far back source rows may still change, per source
+MONITORING_ROLLUP_SESSION_SETTLE_MINUTES = int(os.getenv("MONITORING_ROLLUP_SESSION_SETTLE_MINUTES", "120"))
+MONITORING_ROLLUP_VALIDATION_SETTLE_MINUTES = int(os.getenv("MONITORING_ROLLUP_VALIDATION_SETTLE_MINUTES", "10"))
+# The first refresh after start-up rebuilds enough history for the 24 hour windows
+MONITORING_ROLLUP_BACKFILL_MINUTES = int(os.getenv("MONITORING_ROLLUP_BACKFILL_MINUTES", str(25 * 60)))
+MONITORING_ROLLUP_MINUTE_RETENTION_HOURS = int(os.getenv("MONITORING_ROLLUP_MINUTE_RETENTION_HOURS", "48"))
+MONITORING_ROLLUP_HOUR_RETENTION_DAYS = int(os.getenv("MONITORING_ROLLUP_HOUR_RETENTION_DAYS", "90"))
+
+_LOCK_KEY = advisory_lock_key("monitoring_metrics_rollups")
+
+# Per source: rollup table, key column, summed columns, and the minute aggregation over the
+# source rows from $1 (a minute boundary) on
+_ROLLUPS = {
+    "sessions": {
+        "table": "monitoring_session_rollups",
+        "key": "service_type",
+        "sums": ["total", "completed", "active", "failed", "duration_count", "duration_minutes_sum"],
+        "maxes": [],
+        "settle_minutes": MONITORING_ROLLUP_SESSION_SETTLE_MINUTES,
+        "source": """
+            SELECT date_trunc('minute', created_at) AS bucket,
+                   COALESCE(service_type, '') AS service_type,
+                   COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+                   COUNT(*) FILTER (WHERE status = 'active') AS active,
+                   COUNT(*) FILTER (WHERE status = 'failed') AS failed,
+                   COUNT(duration_minutes) AS duration_count,
+                   COALESCE(SUM(duration_minutes), 0) AS duration_minutes_sum
+            FROM sessions
+            WHERE created_at >= $1
+            GROUP BY 1, 2
+        """,
+    },
+    "integrations": {
+        "table": "monitoring_integration_rollups",
+        "key": "integration_name",
+        "sums": ["total", "successful", "response_time_count", "response_time_ms_sum"],
+        "maxes": ["last_validation"],
+        "settle_minutes": MONITORING_ROLLUP_VALIDATION_SETTLE_MINUTES,
+        "source": """
+            SELECT date_trunc('minute', validation_time) AS bucket,
+                   integration_name,
+                   COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE status = 'success') AS successful,
+                   COUNT(response_time_ms) AS response_time_count,
+                   COALESCE(SUM(response_time_ms), 0) AS response_time_ms_sum,
+                   MAX(validation_time) AS last_validation
+            FROM integration_validations
+            WHERE validation_time >= $1 AND integration_name IS NOT NULL
+            GROUP BY 1, 2
+        """,
+    },
+}
+
+
+def _refresh_sql(spec: Dict[str, Any], resolution: str, fresh: str) -> str:
+    """Upsert the ``fresh`` aggregates and delete rows of the same range that no longer have any"""
+    table, key = spec["table"], spec["key"]
+    columns = spec["sums"] + spec["maxes"]
+    column_list = ", ".join(columns)
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns)
+    return f"""
+        WITH fresh AS ({fresh}),
+        emptied AS (
+            DELETE FROM {table} r
+            WHERE r.resolution = '{resolution}' AND r.bucket >= date_trunc('{resolution}', $1::timestamp)
+            AND NOT EXISTS (SELECT 1 FROM fresh f WHERE f.bucket = r.bucket AND f.{key} = r.{key})
+            RETURNING 1
+        )
+        INSERT INTO {table} (resolution, bucket, {key}, {column_list}, updated_at)
+        SELECT '{resolution}', bucket, {key}, {column_list}, NOW() FROM fresh
+        ON CONFLICT (resolution, bucket, {key}) DO UPDATE SET {updates}, updated_at = NOW()
+    """
+
+
+def _hours_from_minutes(spec: Dict[str, Any]) -> str:
+    key = spec["key"]
+    aggregates = [f"SUM({column}) AS {column}" for column in spec["sums"]]
+    aggregates += [f"MAX({column}) AS {column}" for column in spec["maxes"]]
+    return f"""
+        SELECT date_trunc('hour', bucket) AS bucket, {key}, {", ".join(aggregates)}
+        FROM {spec["table"]}
+        WHERE resolution = 'minute' AND bucket >= date_trunc('hour', $1::timestamp)
+        GROUP BY 1, 2
+    """
+
+
+def _window_sql(spec: Dict[str, Any]) -> str:
+    """Totals per key from $1 (a minute boundary) to now"""
+    key = spec["key"]
+    # SUM() yields numeric; hand the dashboard plain ints and floats
+    aggregates = [f"SUM({column})::{'float8' if column.endswith('_sum') else 'bigint'} AS {column}"
+                  for column in spec["sums"]]
+    aggregates += [f"MAX({column}) AS {column}" for column in spec["maxes"]]
+    return f"""
+        SELECT {key}, {", ".join(aggregates)}
+        FROM {spec["table"]}
+        WHERE (resolution = 'hour'
+               AND bucket >= date_trunc('hour', $1::timestamp) + INTERVAL '1 hour'
+               AND bucket < date_trunc('hour', LOCALTIMESTAMP))
+           OR (resolution = 'minute' AND bucket >= $1
+               AND (bucket < date_trunc('hour', $1::timestamp) + INTERVAL '1 hour'
+                    OR bucket >= date_trunc('hour', LOCALTIMESTAMP)))
+        GROUP BY {key}
+    """
+
+
+class MetricsRollups:
+    """Background refresh of the dashboard rollup tables plus the window readers"""
+
+    def __init__(self, interval: float = MONITORING_ROLLUP_INTERVAL_SECONDS,
+                 enabled: bool = MONITORING_ROLLUPS_ENABLED):
+        self.interval = interval
+        self.enabled = enabled
+        self._backfilled = set()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"refreshes": 0, "skipped": 0, "errors": 0, "last_refresh_at": None,
+                      "last_errors": {}}
+
+    def start(self):
+        """Start the periodic refresh on the running loop (idempotent)"""
+        if not self.enabled or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+        logger.info(f"Monitoring rollups refresh started (every {self.interval:.0f}s)")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Monitoring rollups refresh failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self) -> bool:
+        """One refresh of every source; False when another worker holds the refresh lock"""
+        async with self._pool().acquire() as conn:
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", _LOCK_KEY):
+                self.stats["skipped"] += 1
+                return False
+            try:
+                for source, spec in _ROLLUPS.items():
+                    # Sources fail independently (e.g. a deployment whose integration_validations predates
+                    # the integration_name column); the dashboard falls back for that section only
+                    try:
+                        await self._refresh_source(conn, source, spec)
+                        self.stats["last_errors"].pop(source, None)
+                    except Exception as e:
+                        self.stats["errors"] += 1
+                        self.stats["last_errors"][source] = str(e)
+                        logger.warning(f"Monitoring rollup for {source} failed: {e}")
+                await conn.execute(f"""
+                    DELETE FROM monitoring_session_rollups
+                    WHERE (resolution = 'minute' AND bucket < NOW() - INTERVAL '{MONITORING_ROLLUP_MINUTE_RETENTION_HOURS} hours')
+                       OR (resolution = 'hour' AND bucket < NOW() - INTERVAL '{MONITORING_ROLLUP_HOUR_RETENTION_DAYS} days')
+                """)
+                await conn.execute(f"""
+                    DELETE FROM monitoring_integration_rollups
+                    WHERE (resolution = 'minute' AND bucket < NOW() - INTERVAL '{MONITORING_ROLLUP_MINUTE_RETENTION_HOURS} hours')
+                       OR (resolution = 'hour' AND bucket < NOW() - INTERVAL '{MONITORING_ROLLUP_HOUR_RETENTION_DAYS} days')
+                """)
+            finally:
+                await conn.fetchval("SELECT pg_advisory_unlock($1)", _LOCK_KEY)
+        self.stats["refreshes"] += 1
+        self.stats["last_refresh_at"] = datetime.now().isoformat()
+        return True
+
+    async def _refresh_source(self, conn, source: str, spec: Dict[str, Any]):
+        minutes = spec["settle_minutes"] if source in self._backfilled else MONITORING_ROLLUP_BACKFILL_MINUTES
+        since = await conn.fetchval(
+            "SELECT date_trunc('minute', LOCALTIMESTAMP) - make_interval(mins => $1::int)", minutes)
+        await conn.execute(_refresh_sql(spec, "minute", spec["source"]), since)
+        await conn.execute(_refresh_sql(spec, "hour", _hours_from_minutes(spec)), since)
+        self._backfilled.add(source)
+
+    async def _window(self, conn, source: str, minutes: int) -> List[Dict[str, Any]]:
+        if source in self.stats["last_errors"] and source not in self._backfilled:
+            raise RuntimeError(f"{source} rollup unavailable: {self.stats['last_errors'][source]}")
+        since = await conn.fetchval(
+            "SELECT date_trunc('minute', LOCALTIMESTAMP) - make_interval(mins => $1::int)", minutes)
+        return [dict(row) for row in await conn.fetch(_window_sql(_ROLLUPS[source]), since)]
+
+    async def session_window(self, conn, minutes: int) -> List[Dict[str, Any]]:
+        """Session counts per service type (None for sessions without one) over the last ``minutes``"""
+        rows = await self._window(conn, "sessions", minutes)
+        for row in rows:
+            row["service_type"] = row["service_type"] or None
+        return rows
+
+    async def integration_window(self, conn, minutes: int) -> List[Dict[str, Any]]:
+        """Validation counts per integration over the last ``minutes``"""
+        return await self._window(conn, "integrations", minutes)
+
+    def _pool(self):
+        import db
+        return db.require_db_pool()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "enabled": self.enabled, "interval_seconds": self.interval,
+                "running": bool(self._task) and not self._task.done()}
+
+
+def session_totals(rows: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Sum session rollup rows over all service types"""
+    totals = {column: 0 for column in _ROLLUPS["sessions"]["sums"]}
+    for row in rows:
+        for column in totals:
+            totals[column] += row[column] or 0
+    return totals
+
+
+# Shared instance
+_metrics_rollups: Optional[MetricsRollups] = None
+
+
+def get_metrics_rollups() -> MetricsRollups:
+    """Return the process-wide monitoring rollups job"""
+    global _metrics_rollups
+    if _metrics_rollups is None:
+        _metrics_rollups = MetricsRollups()
+    return _metrics_rollups
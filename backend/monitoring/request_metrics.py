@@ -0,0 +1,119 @@
+"""
+Request Metrics - in-memory per-route latency histograms
+
+Filled by the monitoring middleware for every HTTP request. Requests are keyed
+by the matched route template (``GET /api/users/{user_id}``), not the raw path,
+so the number of series stays bounded; requests that match no route share one
+series per method. Each series is a fixed-bucket histogram plus status class
+counts, cheap enough to update on the request path with no I/O.
+"""
+
+import os
+import time
+import bisect
+from typing import Any, Dict, List, Optional
+
+REQUEST_METRICS_MAX_ROUTES = int(os.getenv("REQUEST_METRICS_MAX_ROUTES", "300"))
+
+# Upper bounds in milliseconds; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """``METHOD /template`` for the route the router matched into this ASGI scope"""
+    route = scope.get("route")
+    path = getattr(route, "path", None) or "<unmatched>"
+    method = scope.get("method")
+    return f"{method} {path}" if method else path
+
+
+class _RouteHistogram:
+    __slots__ = ("buckets", "count", "total_ms", "max_ms", "errors", "status")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+        self.status: Dict[str, int] = {}
+
+    def record(self, elapsed_ms: float, status_code: int, error: bool):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.errors += error
+        status_class = f"{status_code // 100}xx"
+        self.status[status_class] = self.status.get(status_class, 0) + 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (the observed max for the open bucket)"""
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if bucket_count and seen >= rank:
+                return float(LATENCY_BUCKETS_MS[index]) if index < len(LATENCY_BUCKETS_MS) else round(self.max_ms, 3)
+        return 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        bounds = [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["inf"]
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "status": dict(self.status),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.quantile(0.50),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "total_ms": round(self.total_ms, 3),
+            "buckets": {bound: count for bound, count in zip(bounds, self.buckets) if count},
+        }
+
+
+class RequestMetrics:
+    """Latency histogram per route template, bounded to ``max_routes`` series"""
+
+    def __init__(self, max_routes: int = REQUEST_METRICS_MAX_ROUTES):
+        self.max_routes = max_routes
+        self.routes: Dict[str, _RouteHistogram] = {}
+        self.started_at = time.time()
+
+    def record(self, route: str, elapsed_ms: float, status_code: int, error: bool = False):
+        histogram = self.routes.get(route)
+        if histogram is None:
+            if len(self.routes) >= self.max_routes:
+                route = "other"
+                histogram = self.routes.get(route)
+            if histogram is None:
+                histogram = self.routes[route] = _RouteHistogram()
+        histogram.record(elapsed_ms, status_code, error)
+
+    def snapshot(self, top_routes: Optional[int] = 50) -> Dict[str, Any]:
+        """Routes ordered by total time spent, so the most expensive come first"""
+        routes: List[Dict[str, Any]] = [{"route": route, **histogram.snapshot()}
+                                        for route, histogram in self.routes.items()]
+        routes.sort(key=lambda entry: entry["total_ms"], reverse=True)
+        return {
+            "since": self.started_at,
+            "requests": sum(entry["count"] for entry in routes),
+            "bucket_bounds_ms": list(LATENCY_BUCKETS_MS),
+            "routes": routes[:top_routes] if top_routes else routes,
+        }
+
+    def reset(self):
+        self.__init__(self.max_routes)
+
+
+# Shared instance
+_request_metrics: Optional[RequestMetrics] = None
+
+
+def get_request_metrics() -> RequestMetrics:
+    """Return the process-wide per-route request latency histograms"""
+    global _request_metrics
+    if _request_metrics is None:
+        _request_metrics = RequestMetrics()
+    return _request_metrics
@@ -0,0 +1,204 @@
+"""
+Live Health Publisher - one producer for every /api/monitoring/ws client
+
+A single background task collects the live monitoring state once per tick and
+hands it to ``ConnectionManager.broadcast``, however many admin tabs are open.
+Clients first receive a full ``monitoring_snapshot``; after that each tick
+sends a ``monitoring_delta`` holding an RFC 7386 JSON merge patch against the
+previous state (nothing at all when the state did not change). ``seq`` numbers
+the states so a client can spot a gap and reconnect. With no clients connected
+the task parks and no health is computed.
+"""
+
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+try:
+    from fastapi import WebSocket, WebSocketDisconnect
+    FASTAPI_AVAILABLE = True
+except ImportError:
+    FASTAPI_AVAILABLE = False
+    WebSocket = Any
+
+    class WebSocketDisconnect(Exception):
+        """Stand-in so the manager stays importable without FastAPI"""
+
+logger = logging.getLogger(__name__)
+
+MONITORING_WS_INTERVAL_SECONDS = float(os.getenv("MONITORING_WS_INTERVAL_SECONDS", "5"))
+# A websocket client that cannot take a message within this long is dropped instead of stalling the others
+MONITORING_WS_SEND_TIMEOUT_SECONDS = float(os.getenv("MONITORING_WS_SEND_TIMEOUT_SECONDS", "2"))
+
+
+def merge_patch(old: Dict[str, Any], new: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    JSON merge patch turning ``old`` into ``new`` ({} when equal). None when a
+    patch cannot express the change: merge patches read null as "remove key".
+    """
+    patch: Dict[str, Any] = {key: None for key in old.keys() - new.keys()}
+    for key, value in new.items():
+        if key in old and old[key] == value:
+            continue
+        if value is None:
+            return None
+        if isinstance(value, dict) and isinstance(old.get(key), dict):
+            nested = merge_patch(old[key], value)
+            if nested is None:
+                return None
+            patch[key] = nested
+        elif isinstance(value, dict) and _has_null_member(value):
+            return None  # Copied whole, its nulls would delete keys on the client
+        else:
+            patch[key] = value
+    return patch
+
+
+def _has_null_member(value: Dict[str, Any]) -> bool:
+    """Whether an object has a null member at any depth (arrays are replaced whole, so not searched)"""
+    return any(member is None or (isinstance(member, dict) and _has_null_member(member))
+               for member in value.values())
+
+
+class ConnectionManager:
+    def __init__(self, send_timeout: float = MONITORING_WS_SEND_TIMEOUT_SECONDS):
+        self.active_connections: List[WebSocket] = []
+        # Connected clients that have not received a full snapshot yet
+        self.pending_snapshot = set()
+        self.send_timeout = send_timeout
+        
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        self.active_connections.append(websocket)
+        self.pending_snapshot.add(websocket)
+        
+    def disconnect(self, websocket: WebSocket):
+        self.pending_snapshot.discard(websocket)
+        try:
+            self.active_connections.remove(websocket)
+        except ValueError:
+            # WebSocket was not in the list, ignore
+            pass
+        
+    async def broadcast(self, message: Optional[dict], snapshot: Optional[dict] = None):
+        """
+        Broadcast message to all connected admin clients, concurrently and with a
+        per-client send timeout. Clients still waiting for a full snapshot get
+        ``snapshot`` instead of ``message`` when one is given; a None message
+        reaches only those.
+        """
+        targets = []
+        for connection in self.active_connections[:]:  # Create a copy to iterate safely
+            payload = snapshot if snapshot is not None and connection in self.pending_snapshot else message
+            if payload is not None:
+                targets.append((connection, payload))
+        delivered = await asyncio.gather(*(self._send(connection, payload) for connection, payload in targets))
+        
+        for (connection, payload), ok in zip(targets, delivered):
+            if not ok:
+                # Remove dead connections
+                self.disconnect(connection)
+            elif payload is snapshot:
+                self.pending_snapshot.discard(connection)
+    
+    async def _send(self, connection: WebSocket, message: dict) -> bool:
+        try:
+            await asyncio.wait_for(connection.send_json(message), self.send_timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket client too slow, dropping it after {self.send_timeout}s")
+            try:
+                await asyncio.wait_for(connection.close(code=1013), self.send_timeout)
+            except Exception:
+                pass
+        except WebSocketDisconnect:
+            logger.info("WebSocket client disconnected during broadcast")
+        except (ConnectionResetError, ConnectionAbortedError, OSError) as conn_error:
+            logger.warning(f"Connection closed during broadcast: {conn_error}")
+        except Exception as e:
+            logger.error(f"Unexpected error broadcasting to client: {e}")
+        return False
+
+
+class HealthPublisher:
+    """Collects the live monitoring state once per tick and broadcasts snapshots / deltas"""
+
+    def __init__(self, manager, collect: Callable[[], Awaitable[Dict[str, Any]]],
+                 interval: float = MONITORING_WS_INTERVAL_SECONDS):
+        self.manager = manager
+        self.collect = collect
+        self.interval = interval
+        self._state: Optional[Dict[str, Any]] = None
+        self._seq = 0
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"ticks": 0, "snapshots": 0, "deltas": 0, "unchanged": 0, "errors": 0}
+
+    def start(self):
+        """Start the publisher on the running loop (idempotent)"""
+        if self._task and not self._task.done():
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    def wake(self):
+        """Publish now, e.g. so a client that just connected gets its snapshot without waiting a tick"""
+        if self._wake:
+            self._wake.set()
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            if not self.manager.active_connections:
+                # Nobody is watching: drop the state and compute nothing until a client connects
+                self._state = None
+                await self._wake.wait()
+            self._wake.clear()
+            try:
+                await self.publish()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Monitoring websocket publish failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def publish(self):
+        """Collect once and send every client either the snapshot it still needs or the delta"""
+        # Normalised through JSON so comparisons see exactly what the clients see
+        state = json.loads(json.dumps(await self.collect(), default=str))
+        self.stats["ticks"] += 1
+        patch = merge_patch(self._state, state) if self._state is not None else None
+        if patch == {} and not self.manager.pending_snapshot:
+            self.stats["unchanged"] += 1
+            return
+        if patch != {}:
+            self._seq += 1
+        self._state = state
+        timestamp = datetime.now(timezone.utc).isoformat()
+        snapshot = {"type": "monitoring_snapshot", "seq": self._seq, "data": state, "timestamp": timestamp}
+        if patch:
+            self.stats["deltas"] += 1
+            message = {"type": "monitoring_delta", "seq": self._seq, "patch": patch, "timestamp": timestamp}
+        elif patch is None:
+            # First state, or a change a patch cannot express
+            self.stats["snapshots"] += 1
+            message = snapshot
+        else:
+            # Unchanged: only clients that connected since the last tick need anything
+            self.stats["unchanged"] += 1
+            message = None
+        await self.manager.broadcast(message, snapshot=snapshot)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "seq": self._seq, "clients": len(self.manager.active_connections),
+                "running": bool(self._task) and not self._task.done()}
@@ -45,6 +45,12 @@ async def login(form: LoginForm, db=Depends(get_db)):
     if not bcrypt.checkpw(form.password.encode(), user["password_hash"].encode()):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     token = await create_jwt_token(user["id"], user["email"], user.get("role", "user"))
+    # Warm the birth chart profile in the background (missing, stale or birth details changed)
+    try:
+        from services.chart_prefetch import prefetch_for_user
+        await prefetch_for_user(user, reason="login")
+    except Exception as e:
+        print(f"Chart prefetch scheduling failed: {e}")
     return {
         "access_token": token, 
         "user": {
@@ -13,11 +13,12 @@ from fastapi import APIRouter, HTTPException, status, BackgroundTasks, Depends
 from pydantic import BaseModel, EmailStr, validator
 import bcrypt
 import asyncpg
-import json
 import logging
 import os
 
 from services.enhanced_birth_chart_cache_service import EnhancedBirthChartCacheService
+from services.birth_chart_store import get_birth_chart_store
+from services.chart_prefetch import get_chart_prefetch_queue
 from utils.welcome_credits_utils import get_dynamic_welcome_credits
 import db
 
@@ -93,8 +94,13 @@ class EnhancedRegistrationService:
             
             logger.info(f"✅ Enhanced registration completed for {user_data.email}")
             
+            if welcome_data.get('prefetch_status') == 'queued':
+                message = "வணக்கம்! Welcome to JyotiFlow! Your personalized birth chart and spiritual reading are being prepared."
+            else:
+                message = "வணக்கம்! Welcome to JyotiFlow! Your personalized birth chart and spiritual reading are ready."
+            
             return RegistrationResponse(
-                message="வணக்கம்! Welcome to JyotiFlow! Your personalized birth chart and spiritual reading are ready.",
+                message=message,
                 user_id=user_id,
                 email=user_data.email,
                 birth_chart_generated=welcome_data.get('birth_chart_generated', False),
@@ -183,7 +189,17 @@ class EnhancedRegistrationService:
                 logger.info(f"Using cached profile for {email}")
                 return self._format_welcome_data(cached_profile, from_cache=True)
             
-            # Generate new complete profile
+            # Generate in the background so registration returns immediately;
+            # the dashboard finds the profile cached (or joins the running generation)
+            if await get_chart_prefetch_queue().enqueue(email, birth_dict, reason="registration"):
+                return {
+                    'birth_chart_generated': False,
+                    'free_reading_available': False,
+                    'prefetch_status': 'queued',
+                    'fallback_message': 'Welcome to JyotiFlow! Your birth chart and Swamiji reading will be ready on your dashboard in a moment.'
+                }
+            
+            # Prefetch disabled or unavailable: generate new complete profile now
             complete_profile = await self.birth_chart_service.generate_and_cache_complete_profile(email, birth_dict)
             
             return self._format_welcome_data(complete_profile, from_cache=False)
@@ -302,9 +318,11 @@ async def get_user_birth_chart_profile(email: str, conn: asyncpg.Connection = De
                 detail="User birth details incomplete"
             )
         
-        # Check if cached data exists
+        # Check if cached data exists (the user row references the shared store)
+        profile_data = None
         if cached_data and has_free_chart:
-            profile_data = cached_data if isinstance(cached_data, dict) else json.loads(cached_data)
+            profile_data = await get_birth_chart_store().resolve_user_data(conn, cached_data)
+        if profile_data:
             return {
                 "status": "success",
                 "cached": True,
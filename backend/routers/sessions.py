@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from ..db import get_db
 import os
 import time
@@ -11,6 +12,7 @@ import logging
 # Import the enhanced birth chart logic from spiritual.py to avoid duplication
 from .spiritual import get_prokerala_birth_chart_data, create_south_indian_chart_structure
 from ..db import db_manager
+from ..utils.sse_utils import sse_stream, SSE_HEADERS
 try:
     from monitoring.integration_hooks import MonitoringHooks
 except ImportError:
@@ -165,23 +167,9 @@ async def schedule_session_followup(session_id: str, user_email: str, service_ty
         # Log error but don't fail the session
         logger.error(f"Failed to schedule follow-up for session {session_id}: {e}")
 
-@router.post("/start")
-@MonitoringHooks.monitor_session
-async def start_session(request: Request, session_data: Dict[str, Any], db=Depends(get_db)):
-    """Start a spiritual guidance session with enhanced birth chart integration"""
-    user_id = get_user_id_from_token(request)
-    user_email = await get_user_email_from_token(request)
-    
-    # Convert user_id to integer for database queries
-    user_id_int = convert_user_id_to_int(user_id)
-    if user_id_int is None:
-        raise HTTPException(status_code=400, detail="Invalid user ID")
-    
-    # Get service details first
-    service_type = session_data.get("service_type")
-    if not service_type:
-        raise HTTPException(status_code=400, detail="Service type is required")
-    
+async def _reserve_session(db, user_id_int: int, service_type: str, question: str,
+                           guidance: str, status: str = 'completed') -> Dict[str, Any]:
+    """Check and deduct credits, then create the session row, in one transaction"""
     # Use transaction to ensure atomicity - check credits and deduct in same transaction
     async with db.transaction():
         # Get user with FOR UPDATE to prevent race conditions
@@ -232,16 +220,17 @@ async def start_session(request: Request, session_data: Dict[str, Any], db=Depen
             INSERT INTO sessions (id, user_email, service_type, question, guidance, 
                                 avatar_video_url, credits_used, original_price, status, 
                                 prokerala_cache_used, prokerala_endpoints_used, created_at)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, 'completed', $9, $10, NOW())
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, NOW())
         """, 
             session_id, 
             user["email"], 
             service_type, 
-            session_data.get("question", ""),
-            f"Divine guidance for: {session_data.get('question', '')}",
+            question,
+            guidance,
             None,  # avatar_video_url
             service["credits_required"],
             service["price_usd"],
+            status,
             cache_used,
             endpoints_used
         )
@@ -249,6 +238,41 @@ async def start_session(request: Request, session_data: Dict[str, Any], db=Depen
         # Calculate remaining credits
         remaining_credits = user["credits"] - service["credits_required"]
     
+    return {
+        "user": user,
+        "service": service,
+        "session_id": session_id,
+        "remaining_credits": remaining_credits,
+    }
+
+@router.post("/start")
+@MonitoringHooks.monitor_session
+async def start_session(request: Request, session_data: Dict[str, Any], db=Depends(get_db)):
+    """Start a spiritual guidance session with enhanced birth chart integration"""
+    user_id = get_user_id_from_token(request)
+    user_email = await get_user_email_from_token(request)
+    
+    # Convert user_id to integer for database queries
+    user_id_int = convert_user_id_to_int(user_id)
+    if user_id_int is None:
+        raise HTTPException(status_code=400, detail="Invalid user ID")
+    
+    # Get service details first
+    service_type = session_data.get("service_type")
+    if not service_type:
+        raise HTTPException(status_code=400, detail="Service type is required")
+    
+    reservation = await _reserve_session(
+        db, user_id_int, service_type, session_data.get("question", ""),
+        f"Divine guidance for: {session_data.get('question', '')}"
+    )
+    user = reservation["user"]
+    service = reservation["service"]
+    session_id = reservation["session_id"]
+    remaining_credits = reservation["remaining_credits"]
+    cache_used = False
+    endpoints_used = []
+    
     # ENHANCED: Use unified birth chart logic from spiritual.py
     birth_details = session_data.get("birth_details")
     astrology_data = {}
@@ -401,4 +425,72 @@ async def start_session(request: Request, session_data: Dict[str, Any], db=Depen
         }
     } 
 
- 
\ No newline at end of file
+ 
+async def _persist_streamed_guidance(session_id: str, guidance_text: str, status: str):
+    """Store the final streamed text; uses its own connection because the request's is released before streaming"""
+    conn = await db_manager.get_connection()
+    try:
+        await conn.execute("""
+            UPDATE sessions SET guidance = $1, status = $2
+            WHERE id = $3
+        """, guidance_text, status, session_id)
+    finally:
+        await db_manager.release_connection(conn)
+
+@router.post("/start/stream")
+@MonitoringHooks.monitor_session
+async def start_session_stream(request: Request, session_data: Dict[str, Any], db=Depends(get_db)):
+    """
+    Streaming variant of /start: credits are deducted and the session created up front,
+    then knowledge sources, persona metadata and guidance tokens are sent as Server-Sent
+    Events. The session row is updated with the final guidance when the stream ends.
+    """
+    user_id = get_user_id_from_token(request)
+    user_id_int = convert_user_id_to_int(user_id)
+    if user_id_int is None:
+        raise HTTPException(status_code=400, detail="Invalid user ID")
+    
+    service_type = session_data.get("service_type")
+    if not service_type:
+        raise HTTPException(status_code=400, detail="Service type is required")
+    
+    question = session_data.get("question", "")
+    reservation = await _reserve_session(db, user_id_int, service_type, question, "", status="in_progress")
+    session_id = reservation["session_id"]
+    user_email = reservation["user"]["email"]
+    
+    from ..enhanced_rag_knowledge_engine import stream_rag_enhanced_guidance
+    
+    async def events():
+        yield "session", {
+            "session_id": session_id,
+            "service_type": service_type,
+            "credits_deducted": reservation["service"]["credits_required"],
+            "remaining_credits": reservation["remaining_credits"],
+        }
+        guidance_text, status = "", "interrupted"
+        try:
+            async for event, payload in stream_rag_enhanced_guidance(
+                question, session_data.get("birth_details"), service_type
+            ):
+                if event == "done":
+                    # "done" also follows an "error"; that guidance is partial text or the fallback apology
+                    guidance_text = payload["enhanced_guidance"]
+                    status = "failed" if status == "failed" else "completed"
+                    payload = {**payload, "session_id": session_id}
+                elif event == "error":
+                    status = "failed"
+                elif event == "token":
+                    guidance_text += payload["text"]
+                yield event, payload
+        finally:
+            # Shielded so a client disconnect does not abort the write
+            try:
+                await asyncio.shield(_persist_streamed_guidance(session_id, guidance_text, status))
+                logger.info(f"[Session] Stored streamed guidance for {session_id}: {len(guidance_text)} chars ({status})")
+            except Exception as e:
+                logger.error(f"[Session] Failed to store streamed guidance for {session_id}: {e}")
+            if status == "completed":
+                asyncio.create_task(schedule_session_followup(session_id, user_email, service_type, db_manager))
+    
+    return StreamingResponse(sse_stream(events()), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -1,10 +1,8 @@
 import os
 
-import time
-
 from fastapi import APIRouter, Request, HTTPException, Depends
 
-import httpx
+from fastapi.responses import StreamingResponse
 
 import openai
 
@@ -24,8 +22,26 @@ import asyncpg
 
 from db import db_manager
 
+from utils.sse_utils import sse_stream, SSE_HEADERS
+
 from services.enhanced_birth_chart_cache_service import EnhancedBirthChartCacheService
 
+from services.birth_chart_store import get_birth_chart_store
+
+from services.prokerala_client import get_prokerala_client
+
+from services.prokerala_token_manager import get_prokerala_token_manager
+
+from services.chart_generation_flights import get_chart_generation_flights
+
+from services.sidereal_ephemeris import (
+
+    get_sidereal_ephemeris, birth_moment, parse_prokerala_params, NUMPY_AVAILABLE as OFFLINE_EPHEMERIS_AVAILABLE
+
+)
+
+from services.gazetteer import prokerala_params
+
 from services.birth_chart_interpretation_service import BirthChartInterpretationService # IMPORT PUTHU SERVICE
 
 try:
@@ -106,14 +122,6 @@ PROKERALA_API_BASE = "https://api.prokerala.com/v2/astrology/birth-details"
 
 
 
-# Global token cache (for demo; use Redis or DB for production)
-
-prokerala_token = None
-
-prokerala_token_expiry = 0
-
-
-
 # Initialize birth chart cache service
 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -130,51 +138,77 @@ birth_chart_cache = BirthChartCacheService(DATABASE_URL)
 
 async def fetch_prokerala_token():
 
-    """Fetch a new access token from Prokerala API (English & Tamil comments)"""
+    """Force a new access token (shared, single-flight token manager)"""
 
-    global prokerala_token, prokerala_token_expiry
+    return await get_prokerala_token_manager(PROKERALA_CLIENT_ID, PROKERALA_CLIENT_SECRET).force_refresh()
 
-    async with httpx.AsyncClient() as client:
 
-        data = {
 
-            "grant_type": "client_credentials",
+async def get_prokerala_token():
 
-            "client_id": PROKERALA_CLIENT_ID,
+    """Get a valid token, refresh if expired (shared, single-flight token manager)"""
 
-            "client_secret": PROKERALA_CLIENT_SECRET
+    return await get_prokerala_token_manager(PROKERALA_CLIENT_ID, PROKERALA_CLIENT_SECRET).get_token()
 
-        }
 
-        resp = await client.post(PROKERALA_TOKEN_URL, data=data)
 
-        resp.raise_for_status()
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "your-openai-api-key")
 
-        token_data = resp.json()
 
-        prokerala_token = token_data["access_token"]
 
-        prokerala_token_expiry = int(time.time()) + int(token_data.get("expires_in", 3600)) - 60  # 1 min buffer
+async def _cached_birth_chart_response(user_email: str, birth_details: dict) -> dict | None:
 
-        return prokerala_token
+    """Birth chart response from the cache, or None on a miss"""
 
+    if not user_email:
 
+        return None
 
-async def get_prokerala_token():
+    try:
 
-    """Get a valid token, refresh if expired (English & Tamil)"""
+        cached_chart = await birth_chart_cache.get_cached_birth_chart(user_email, birth_details)
 
-    global prokerala_token, prokerala_token_expiry
+        if cached_chart:
 
-    if not prokerala_token or time.time() > prokerala_token_expiry:
+            print(f"[BirthChart] ✅ Using cached data for user {user_email}")
 
-        return await fetch_prokerala_token()
+            return {
+
+                "success": True,
+
+                "birth_chart": {
+
+                    **cached_chart['data'],
+
+                    "metadata": {
+
+                        **cached_chart['data'].get('metadata', {}),
+
+                        "cache_hit": True,
+
+                        "cached_at": cached_chart['cached_at'].isoformat(),
+
+                        "expires_at": cached_chart['expires_at'].isoformat(),
+
+                        "data_source": "Cached Prokerala API data"
+
+                    }
+
+                }
+
+            }
+
+    except Exception as e:
+
+        print(f"[BirthChart] Cache check failed: {e}")
+
+        # Continue without cache if cache fails
+
+    return None
 
-    return prokerala_token
 
 
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "your-openai-api-key")
 
 
 
@@ -192,12 +226,10 @@ async def get_prokerala_birth_chart_data(user_email: str, birth_details: dict) -
 
     time_ = birth_details.get("time")
 
-    location = birth_details.get("location", "Jaffna, Sri Lanka")
-
-    timezone = birth_details.get("timezone", "Asia/Colombo")
-
     
+
     
+
     # Validate required fields
 
     if not date or not time_:
@@ -208,63 +240,51 @@ async def get_prokerala_birth_chart_data(user_email: str, birth_details: dict) -
 
     # --- CHECK CACHE FIRST ---
 
-    if user_email:
+    cached_response = await _cached_birth_chart_response(user_email, birth_details)
 
-        try:
+    if cached_response:
 
-            cached_chart = await birth_chart_cache.get_cached_birth_chart(user_email, birth_details)
+        return cached_response
 
-            if cached_chart:
 
-                print(f"[BirthChart] ✅ Using cached data for user {user_email}")
 
-                return {
+    # --- ONE GENERATION PER BIRTH DETAILS (concurrent callers share the leader's result) ---
 
-                    "success": True,
+    birth_hash = birth_chart_cache.generate_birth_details_hash(birth_details)
 
-                    "birth_chart": {
+    return await get_chart_generation_flights().run(
 
-                        **cached_chart['data'],
+        f"birth_chart:{birth_hash}",
 
-                        "metadata": {
+        lambda: _generate_prokerala_birth_chart(user_email, birth_details),
 
-                            **cached_chart['data'].get('metadata', {}),
+        recheck=lambda: _cached_birth_chart_response(user_email, birth_details)
 
-                            "cache_hit": True,
+    )
 
-                            "cached_at": cached_chart['cached_at'].isoformat(),
 
-                            "expires_at": cached_chart['expires_at'].isoformat(),
 
-                            "data_source": "Cached Prokerala API data"
 
-                        }
 
-                    }
 
-                }
 
-        except Exception as e:
+async def _generate_prokerala_birth_chart(user_email: str, birth_details: dict) -> dict:
 
-            print(f"[BirthChart] Cache check failed: {e}")
+    """Call Prokerala, build the enhanced response and cache it"""
 
-            # Continue without cache if cache fails
-
-
-
-    # Default coordinates for Jaffna (can be enhanced with geocoding)
-
-    latitude = "9.66845"   # Jaffna latitude
+    date = birth_details.get("date")
 
-    longitude = "80.00742" # Jaffna longitude
+    time_ = birth_details.get("time")
 
+    location = birth_details.get("location", "Jaffna, Sri Lanka")
 
+    # Coordinates and the UTC offset in force at birth, from the offline gazetteer (Jaffna if unknown)
 
-    # Format datetime with timezone
+    datetime_str, coordinates, place = prokerala_params(birth_details)
 
-    datetime_str = f"{date}T{time_}:00+05:30"  # Default to IST
+    latitude, longitude, timezone = place["latitude"], place["longitude"], place["timezone"]
 
-    coordinates = f"{latitude},{longitude}"
+    place_details = {**birth_details, "latitude": latitude, "longitude": longitude, "timezone": timezone}
 
 
 
@@ -308,263 +328,135 @@ async def get_prokerala_birth_chart_data(user_email: str, birth_details: dict) -
     
     try:
 
-        # Get token and setup HTTP client
-
-        token = await get_prokerala_token()
-
+        # Fire the independent endpoint calls together on the shared client
+        await get_prokerala_token()  # Warm the shared token before the fan-out
         logger.info(f"[BirthChart] Making comprehensive API calls for {user_email}")
-
-        
-        
-        async with httpx.AsyncClient() as client:
-
-            headers = {"Authorization": f"Bearer {token}"}
-
-            
-            
-            # 1. Birth Details Endpoint
-
-            try:
-
-                birth_details_response = await client.get(
-
-                    "https://api.prokerala.com/v2/astrology/birth-details",
-
-                    params=base_params,
-
-                    headers=headers
+        client = get_prokerala_client()
+
+        async def fetch_endpoint(label: str, method: str, path: str, **kwargs):
+            response = await client.api_request(method, path, **kwargs)
+            logger.info(f"[BirthChart] {label} response: {response.status_code}")
+            if response.status_code != 200:
+                logger.warning(f"[BirthChart] {label} failed: {response.text}")
+                return None
+            return response.json()
+
+        # 1. Birth details, 2. South Indian chart, 3. Planetary positions, 4. Dasha periods
+        endpoint_calls = {
+            "birth_details": ("Birth details", "GET", "/v2/astrology/birth-details", {"params": base_params}),
+            "chart_visualization": ("Chart visualization", "GET", "/v2/astrology/chart", {"params": chart_params}),
+            "planetary_positions": ("Planetary positions", "GET", "/v2/astrology/planet-positions", {"params": base_params}),
+            "dasha_periods": ("Dasha periods", "POST", "/v2/astrology/dasha-periods", {"json": base_params}),
+        }
+        endpoint_results = await client.gather({
+            key: (lambda spec=spec: fetch_endpoint(spec[0], spec[1], spec[2], **spec[3]))
+            for key, spec in endpoint_calls.items()
+        })
+        for key, result in endpoint_results.items():
+            if isinstance(result, Exception):
+                logger.error(f"[BirthChart] {endpoint_calls[key][0]} API error: {str(result)}")
+            elif result is not None:
+                chart_data[key] = result
+                logger.info(f"[BirthChart] ✅ {endpoint_calls[key][0]} retrieved")
+
+        # 5. Alternative Chart Endpoints (fallback, tried in order)
+        if "chart_visualization" not in chart_data:
+            logger.info(f"[BirthChart] Trying alternative chart endpoints...")
+            alternative_endpoints = [
+                "/v2/astrology/birth-chart",
+                "/v2/astrology/kundli",
+                "/v2/astrology/horoscope-chart"
+            ]
+            for endpoint in alternative_endpoints:
+                try:
+                    alt_response = await client.api_post(endpoint, json=chart_params)
+                    if alt_response.status_code == 200:
+                        chart_data["chart_visualization"] = alt_response.json()
+                        logger.info(f"[BirthChart] ✅ Alternative chart endpoint worked: {endpoint}")
+                        break
+                except Exception as e:
+                    logger.warning(f"[BirthChart] Alternative endpoint {endpoint} failed: {str(e)}")
+
+
+        # Create comprehensive response with South Indian chart preference
+
+        if chart_data:
+
+            # Ensure we have the basic structure for South Indian chart
+
+            if "chart_visualization" not in chart_data and "birth_details" in chart_data:
+
+                chart_data["chart_visualization"] = create_south_indian_chart_structure(
+
+                    place_details
 
                 )
-
-                logger.info(f"[BirthChart] Birth details response: {birth_details_response.status_code}")
-
-                
-                
-                if birth_details_response.status_code == 200:
-
-                    birth_details_data = birth_details_response.json()
-
-                    chart_data["birth_details"] = birth_details_data
-
-                    logger.info(f"[BirthChart] ✅ Birth details retrieved successfully")
-
-                else:
-
-                    logger.warning(f"[BirthChart] Birth details failed: {birth_details_response.text}")
-                    
-                    
-                    
-            except Exception as e:
-
-                logger.error(f"[BirthChart] Birth details API error: {str(e)}")
             
             
             
-            # 2. Chart Visualization Endpoint (South Indian Style)
+            # Add metadata
 
-            try:
-
-                chart_response = await client.get(
-
-                    "https://api.prokerala.com/v2/astrology/chart",
+            chart_data["metadata"] = {
 
-                    params=chart_params,
-
-                    headers=headers
-
-                )
+                "chart_style": "south-indian",
 
-                logger.info(f"[BirthChart] Chart visualization response: {chart_response.status_code}")
+                "chart_type": "rasi",
 
-                
-                
-                if chart_response.status_code == 200:
+                "ayanamsa": "Lahiri",
 
-                    chart_viz = chart_response.json()
+                "coordinates": coordinates,
 
-                    chart_data["chart_visualization"] = chart_viz
+                "datetime": datetime_str,
 
-                    logger.info(f"[BirthChart] ✅ South Indian chart visualization retrieved")
+                "data_source": "Prokerala API v2",
 
-                else:
+                "api_calls_made": len([k for k in chart_data.keys() if k != "metadata"])
 
-                    logger.warning(f"[BirthChart] Chart visualization failed: {chart_response.text}")
-                    
-                    
-                    
-            except Exception as e:
+            }
 
-                logger.error(f"[BirthChart] Chart visualization API error: {str(e)}")
-            
-            
             
-            # 3. Planetary Positions Endpoint
 
-            try:
-
-                planets_response = await client.get(
+            # Cross-check Prokerala's answer with the offline ephemeris before it is cached
 
-                    "https://api.prokerala.com/v2/astrology/planet-positions",
+            if "birth_details" in chart_data and OFFLINE_EPHEMERIS_AVAILABLE:
 
-                    params=base_params,
+                try:
 
-                    headers=headers
+                    consistency = get_sidereal_ephemeris().check_consistency(
 
-                )
+                        chart_data["birth_details"], *birth_moment(place_details)
 
-                logger.info(f"[BirthChart] Planetary positions response: {planets_response.status_code}")
-
-                
-                
-                if planets_response.status_code == 200:
+                    )
 
-                    planetary_data = planets_response.json()
+                    chart_data["metadata"]["offline_consistency"] = {k: consistency[k] for k in ("consistent", "mismatches")}
 
-                    chart_data["planetary_positions"] = planetary_data
+                    if not consistency["consistent"]:
 
-                    logger.info(f"[BirthChart] ✅ Planetary positions retrieved")
+                        logger.warning(f"[BirthChart] Prokerala and offline ephemeris disagree: {consistency['mismatches']}")
 
-                else:
+                except Exception as e:
 
-                    logger.warning(f"[BirthChart] Planetary positions failed: {planets_response.text}")
-                    
-                    
-                    
-            except Exception as e:
+                    logger.warning(f"[BirthChart] Offline consistency check skipped: {e}")
 
-                logger.error(f"[BirthChart] Planetary positions API error: {str(e)}")
-            
             
             
-            # 4. Dasha Periods Endpoint
-
-            try:
-
-                dasha_response = await client.post(
-
-                    "https://api.prokerala.com/v2/astrology/dasha-periods",
-
-                    json=base_params,
-
-                    headers=headers
-
-                )
-
-                logger.info(f"[BirthChart] Dasha periods response: {dasha_response.status_code}")
-
-                
-                
-                if dasha_response.status_code == 200:
-
-                    dasha_data = dasha_response.json()
-
-                    chart_data["dasha_periods"] = dasha_data
-
-                    logger.info(f"[BirthChart] ✅ Dasha periods retrieved")
-
-                else:
-
-                    logger.warning(f"[BirthChart] Dasha periods failed: {dasha_response.text}")
-                    
-                    
-                    
-            except Exception as e:
-
-                logger.error(f"[BirthChart] Dasha periods API error: {str(e)}")
+            logger.info(f"[BirthChart] ✅ Comprehensive chart data compiled with keys: {list(chart_data.keys())}")
             
             
             
-            # 5. Alternative Chart Endpoints (fallback)
-
-            if "chart_visualization" not in chart_data:
-
-                logger.info(f"[BirthChart] Trying alternative chart endpoints...")
-
-                
-                
-                alternative_endpoints = [
-
-                    "https://api.prokerala.com/v2/astrology/birth-chart",
-
-                    "https://api.prokerala.com/v2/astrology/kundli",
-
-                    "https://api.prokerala.com/v2/astrology/horoscope-chart"
-
-                ]
-
-                
-                
-                for endpoint in alternative_endpoints:
-
-                    try:
-
-                        alt_response = await client.post(endpoint, json=chart_params, headers=headers)
-
-                        if alt_response.status_code == 200:
-
-                            chart_data["chart_visualization"] = alt_response.json()
-
-                            logger.info(f"[BirthChart] ✅ Alternative chart endpoint worked: {endpoint}")
-
-                            break
+        else:
 
-                    except Exception as e:
+            logger.warning(f"[BirthChart] No chart data retrieved, creating fallback")
 
-                        logger.warning(f"[BirthChart] Alternative endpoint {endpoint} failed: {str(e)}")
+            chart_data = create_offline_south_indian_chart(base_params)
             
             
             
-            # Create comprehensive response with South Indian chart preference
-
-            if chart_data:
-
-                # Ensure we have the basic structure for South Indian chart
-
-                if "chart_visualization" not in chart_data and "birth_details" in chart_data:
-
-                    chart_data["chart_visualization"] = create_south_indian_chart_structure(chart_data["birth_details"])
-                
-                
-                
-                # Add metadata
-
-                chart_data["metadata"] = {
-
-                    "chart_style": "south-indian",
-
-                    "chart_type": "rasi",
-
-                    "ayanamsa": "Lahiri",
-
-                    "coordinates": coordinates,
-
-                    "datetime": datetime_str,
-
-                    "data_source": "Prokerala API v2",
-
-                    "api_calls_made": len([k for k in chart_data.keys() if k != "metadata"])
-
-                }
-
-                
-                
-                logger.info(f"[BirthChart] ✅ Comprehensive chart data compiled with keys: {list(chart_data.keys())}")
-                
-                
-                
-            else:
-
-                logger.warning(f"[BirthChart] No chart data retrieved, creating fallback")
-
-                chart_data = create_fallback_south_indian_chart(base_params)
-                
-                
-                
     except Exception as e:
 
         logger.error(f"[BirthChart] Comprehensive API call failed: {str(e)}")
 
-        chart_data = create_fallback_south_indian_chart(base_params)
+        chart_data = create_offline_south_indian_chart(base_params)
 
 
 
@@ -630,11 +522,13 @@ async def get_prokerala_birth_chart_data(user_email: str, birth_details: dict) -
 
                 },
 
-                "calculation_method": "Vedic Astrology (Prokerala API)",
+                "calculation_method": chart_data.get("metadata", {}).get("calculation_method", "Vedic Astrology (Prokerala API)"),
 
                 "ayanamsa": "Lahiri",
 
-                "data_source": "Prokerala API v2/astrology/birth-details + chart endpoints",
+                "data_source": chart_data.get("metadata", {}).get("data_source", "Prokerala API v2/astrology/birth-details + chart endpoints"),
+
+                "offline_consistency": chart_data.get("metadata", {}).get("offline_consistency"),
 
                 "chart_visualization_available": bool(chart_data.get("chart_visualization")),
 
@@ -868,11 +762,9 @@ async def get_spiritual_guidance(request: Request):
 
         location = birth_details.get("location")
 
-        latitude = "9.66845"
+        # Birth place coordinates and historic UTC offset from the offline gazetteer
 
-        longitude = "80.00742"
-
-        timezone = "Asia/Colombo"
+        guidance_datetime, coordinates, _ = prokerala_params(birth_details)
 
 
 
@@ -886,11 +778,9 @@ async def get_spiritual_guidance(request: Request):
 
         # BUG FIX: Use consistent coordinate format (coordinates string like other functions)
 
-        coordinates = f"{latitude},{longitude}"
-
         params = {
 
-            "datetime": f"{date}T{time_}:00+05:30",
+            "datetime": guidance_datetime,
 
             "coordinates": coordinates,
 
@@ -910,41 +800,27 @@ async def get_spiritual_guidance(request: Request):
 
             logger.info(f"Prokerala API attempt {attempt + 1}")
 
-            token = await get_prokerala_token()
-
             try:
 
-                async with httpx.AsyncClient() as client:
-
-                    resp = await client.get(  # GET method instead of POST
-
-                        "https://api.prokerala.com/v2/astrology/birth-details",
-
-                        headers={"Authorization": f"Bearer {token}"},
+                # api_get refreshes the shared token and retries once on 401
 
-                        params=params  # Query parameters instead of JSON
+                resp = await get_prokerala_client().api_get(  # GET method instead of POST
 
-                    )
-
-                    logger.info(f"Prokerala response status: {resp.status_code}")
+                    "/v2/astrology/birth-details",
 
-                    
-                    
-                    if resp.status_code == 401 and attempt == 0:
+                    params=params  # Query parameters instead of JSON
 
-                        logger.info("Token expired, refreshing...")
-
-                        await fetch_prokerala_token()
+                )
 
-                        continue
+                logger.info(f"Prokerala response status: {resp.status_code}")
 
-                    resp.raise_for_status()
+                resp.raise_for_status()
 
-                    prokerala_data = resp.json()
+                prokerala_data = resp.json()
 
-                    logger.info("✅ Prokerala API call successful")
+                logger.info("✅ Prokerala API call successful")
 
-                    break
+                break
 
             except Exception as e:
 
@@ -1094,6 +970,34 @@ async def get_spiritual_guidance(request: Request):
 
 
 
+@router.post("/guidance/stream")
+@MonitoringHooks.monitor_session
+async def stream_spiritual_guidance(request: Request):
+    """
+    Streaming variant of /guidance: knowledge sources and persona metadata are sent
+    as soon as retrieval finishes, then the completion is streamed as Server-Sent Events
+    """
+    data = await request.json()
+    user_question = data.get("question")
+    birth_details = data.get("birth_details")
+    language = data.get("language", "ta")
+    service_type = data.get("service_type", "general")
+
+    if not user_question or not birth_details:
+        raise HTTPException(status_code=400, detail="Missing question or birth details")
+
+    from enhanced_rag_knowledge_engine import stream_rag_enhanced_guidance
+
+    async def events():
+        async for event, payload in stream_rag_enhanced_guidance(user_question, birth_details, service_type):
+            if event == "metadata":
+                payload = {**payload, "source": "rag_enhanced", "language": language, "service_type": service_type}
+            yield event, payload
+
+    return StreamingResponse(sse_stream(events()), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+
 @router.get("/birth-chart/cache-status")
 
 async def get_birth_chart_cache_status(request: Request):
@@ -1300,6 +1204,12 @@ async def cleanup_expired_birth_chart_cache(request: Request):
 
         raise HTTPException(status_code=500, detail="Failed to cleanup cache") from e
 
+    finally:
+
+        if conn:
+
+            await db_manager.release_connection(conn)
+
 
 
 @router.post("/birth-chart/link-to-user")
@@ -1344,29 +1254,39 @@ async def link_anonymous_chart_to_user(request: Request):
         
         cache_service = EnhancedBirthChartCacheService()
 
+        link_details = {
+
+            "session_id": session_id,
+
+            "linked_from_anonymous": True,
+
+            "linked_at": datetime.now().isoformat()
+
+        }
+
         
         
-        # Store the chart data with user association
-
-        success = await cache_service._cache_complete_profile(
+        # The guest's chart was generated server-side into the shared store - reference it
 
-            user_email, 
+        success = await cache_service.link_stored_chart(user_email, birth_details, extra=link_details) is not None
 
-            birth_details, 
+        
+        
+        if not success:
 
-            {
+            # Not in the store: keep the submitted chart on this user only (never shared)
 
-                "birth_chart": chart_data,
+            success = await cache_service._cache_complete_profile(
 
-                "session_id": session_id,
+                user_email, 
 
-                "linked_from_anonymous": True,
+                birth_details, 
 
-                "linked_at": datetime.now().isoformat()
+                {"birth_chart": chart_data, **link_details},
 
-            }
+                share=False
 
-        )
+            )
 
         
         
@@ -1636,10 +1556,38 @@ def generate_journey_insights(session_count, completion_rate, spiritual_level):
 
 def create_south_indian_chart_structure(birth_details: dict) -> dict:
 
-    """Create South Indian chart structure from birth details"""
+    """
+
+    Create South Indian chart structure from birth details. With a birth date and
+
+    time it is computed offline (sidereal ephemeris, whole-sign houses from the lagna).
+
+    """
 
     try:
 
+        if OFFLINE_EPHEMERIS_AVAILABLE and birth_details.get("date") and birth_details.get("time"):
+
+            engine = get_sidereal_ephemeris()
+
+            chart = engine.compute_chart(*birth_moment(birth_details))
+
+            return {
+
+                "houses": engine.south_indian_houses(chart),
+
+                "chart_style": "south-indian",
+
+                "chart_type": "rasi",
+
+                "lagna": chart["birth_details"]["lagna"],
+
+                "data_source": "Offline sidereal ephemeris"
+
+            }
+
+
+
         houses = []
 
         for i in range(12):
@@ -1678,6 +1626,68 @@ def create_south_indian_chart_structure(birth_details: dict) -> dict:
 
 
 
+def create_offline_south_indian_chart(params: dict) -> dict:
+
+    """Full chart from the offline ephemeris when the Prokerala API is unavailable"""
+
+    if not OFFLINE_EPHEMERIS_AVAILABLE:
+
+        return create_fallback_south_indian_chart(params)
+
+    try:
+
+        engine = get_sidereal_ephemeris()
+
+        moment, latitude, longitude = parse_prokerala_params(params)
+
+        chart = engine.compute_chart(moment, latitude, longitude)
+
+        return {
+
+            **engine.prokerala_payloads(chart),
+
+            "chart_visualization": {
+
+                "houses": engine.south_indian_houses(chart),
+
+                "chart_style": "south-indian",
+
+                "chart_type": "rasi"
+
+            },
+
+            "metadata": {
+
+                "chart_style": "south-indian",
+
+                "chart_type": "rasi",
+
+                "ayanamsa": "Lahiri",
+
+                "coordinates": params.get("coordinates"),
+
+                "datetime": params.get("datetime"),
+
+                "calculation_method": "Vedic Astrology (offline sidereal ephemeris)",
+
+                "data_source": "Offline sidereal ephemeris (Prokerala API unavailable)"
+
+            }
+
+        }
+
+    except Exception as e:
+
+        logger.error(f"Offline ephemeris failed: {e}")
+
+        return create_fallback_south_indian_chart(params)
+
+
+
+
+
+
+
 def create_fallback_south_indian_chart(params: dict) -> dict:
 
     """Create fallback South Indian chart when API fails"""
@@ -1928,6 +1938,20 @@ async def get_complete_birth_chart_profile(request: Request):
 
             """, user_email)
 
+            # The user row references the shared store; load the profile it points to
+
+            cached_profile = None
+
+            if user_data and user_data['birth_chart_data']:
+
+                try:
+
+                    cached_profile = await get_birth_chart_store().resolve_user_data(conn, user_data['birth_chart_data'])
+
+                except (json.JSONDecodeError, ValueError) as e:
+
+                    logger.warning(f"Corrupted birth chart data for user {user_email}: {e}")
+
         finally:
 
             if conn:
@@ -1952,19 +1976,21 @@ async def get_complete_birth_chart_profile(request: Request):
         
         # If birth chart data exists and is not expired, return it
 
-        if user_data['birth_chart_data']:
+        if cached_profile:
 
             try:
 
-                chart_data = json.loads(user_data['birth_chart_data']) if isinstance(user_data['birth_chart_data'], str) else user_data['birth_chart_data']
+                chart_data = cached_profile
 
                 # Check if data is recent (less than 30 days old)
 
-                if chart_data.get('cached_at'):
+                # Freshly generated (e.g. prefetched) profiles carry generated_at rather than cached_at
 
-                    # Handle cached_at field safely - it might be a string, datetime, or other type
+                cached_at = chart_data.get('cached_at') or chart_data.get('generated_at')
 
-                    cached_at = chart_data['cached_at']
+                if cached_at:
+
+                    # Handle cached_at field safely - it might be a string, datetime, or other type
 
                     if isinstance(cached_at, str):
 
@@ -2036,29 +2062,33 @@ async def get_complete_birth_chart_profile(request: Request):
 
         
         
-        # Update user's birth chart data in database
+        # The service already pointed the user row at the stored profile; keep an
 
-        conn = None
+        # inline copy only when it could not be cached
 
-        try:
+        if not complete_profile.get('cached'):
 
-            conn = await db_manager.get_connection()
+            conn = None
 
-            await conn.execute("""
+            try:
 
-                UPDATE users 
+                conn = await db_manager.get_connection()
 
-                SET birth_chart_data = $1, birth_chart_cached_at = NOW(), birth_chart_expires_at = NOW() + INTERVAL '365 days'
+                await conn.execute("""
 
-                WHERE email = $2
+                    UPDATE users 
 
-            """, json.dumps(complete_profile), user_email)
+                    SET birth_chart_data = $1, birth_chart_cached_at = NOW(), birth_chart_expires_at = NOW() + INTERVAL '365 days'
 
-        finally:
+                    WHERE email = $2
 
-            if conn:
+                """, json.dumps(complete_profile), user_email)
 
-                await db_manager.release_connection(conn)
+            finally:
+
+                if conn:
+
+                    await db_manager.release_connection(conn)
         
         
         
@@ -2092,6 +2122,117 @@ async def get_complete_birth_chart_profile(request: Request):
 
 
 
+@router.get("/birth-chart/complete-profile/stream")
+
+async def stream_complete_birth_chart_profile(request: Request):
+
+    """
+
+    Streaming variant of /birth-chart/complete-profile: each section is sent as a
+
+    Server-Sent Event as soon as it is ready (chart first, Swamiji's reading last),
+
+    followed by a 'profile' event with the complete, cached profile
+
+    """
+
+    user_email = extract_user_email_from_token(request)
+
+    if not user_email:
+
+        raise HTTPException(status_code=401, detail="Authentication required")
+
+    conn = None
+
+    try:
+
+        conn = await db_manager.get_connection()
+
+        user_data = await conn.fetchrow("""
+
+            SELECT birth_date, birth_time, birth_location
+
+            FROM users WHERE email = $1
+
+        """, user_email)
+
+    finally:
+
+        if conn:
+
+            await db_manager.release_connection(conn)
+
+    if not user_data or not user_data['birth_date']:
+
+        return {
+
+            "success": False,
+
+            "message": "Birth details not found. Please complete your profile.",
+
+            "needs_birth_details": True
+
+        }
+
+    birth_details = {
+
+        'date': user_data['birth_date'] if isinstance(user_data['birth_date'], str) else user_data['birth_date'].strftime('%Y-%m-%d'),
+
+        'time': user_data['birth_time'] if isinstance(user_data['birth_time'], str) else user_data['birth_time'].strftime('%H:%M'),
+
+        'location': user_data['birth_location'] or 'Jaffna, Sri Lanka',
+
+        'timezone': 'Asia/Colombo'
+
+    }
+
+    enhanced_service = EnhancedBirthChartCacheService()
+
+    async def events():
+
+        try:
+
+            async for event, payload in enhanced_service.stream_complete_profile(user_email, birth_details):
+
+                if event == "profile" and not payload.get('cached'):
+
+                    # Keep an inline copy only when the service could not cache the profile
+
+                    conn = None
+
+                    try:
+
+                        conn = await db_manager.get_connection()
+
+                        await conn.execute("""
+
+                            UPDATE users 
+
+                            SET birth_chart_data = $1, birth_chart_cached_at = NOW(), birth_chart_expires_at = NOW() + INTERVAL '365 days'
+
+                            WHERE email = $2
+
+                        """, json.dumps(payload), user_email)
+
+                    finally:
+
+                        if conn:
+
+                            await db_manager.release_connection(conn)
+
+                yield event, payload
+
+        except Exception as e:
+
+            logger.error(f"Streaming complete birth chart profile failed: {e}")
+
+            yield "error", {"message": "Failed to get birth chart profile"}
+
+    return StreamingResponse(sse_stream(events()), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+
+
 @router.post("/birth-chart/generate-for-user")
 
 async def generate_birth_chart_for_user(request: Request):
@@ -2168,29 +2309,33 @@ async def generate_birth_chart_for_user(request: Request):
 
         
         
-        # Update user's birth chart data in database
+        # The service already pointed the user row at the stored profile; keep an
 
-        conn = None
+        # inline copy only when it could not be cached
 
-        try:
+        if not complete_profile.get('cached'):
 
-            conn = await db_manager.get_connection()
+            conn = None
 
-            await conn.execute("""
+            try:
 
-                UPDATE users 
+                conn = await db_manager.get_connection()
 
-                SET birth_chart_data = $1, birth_chart_cached_at = NOW(), birth_chart_expires_at = NOW() + INTERVAL '365 days'
+                await conn.execute("""
 
-                WHERE email = $2
+                    UPDATE users 
 
-            """, json.dumps(complete_profile), user_email)
+                    SET birth_chart_data = $1, birth_chart_cached_at = NOW(), birth_chart_expires_at = NOW() + INTERVAL '365 days'
 
-        finally:
+                    WHERE email = $2
 
-            if conn:
+                """, json.dumps(complete_profile), user_email)
 
-                await db_manager.release_connection(conn)
+            finally:
+
+                if conn:
+
+                    await db_manager.release_connection(conn)
         
         
         
@@ -14,6 +14,7 @@ except ImportError:
 
 # Import centralized authentication helper
 from auth.auth_helpers import AuthenticationHelper
+from services.birth_chart_store import get_birth_chart_store
 
 router = APIRouter(prefix="/api/user", tags=["User"])
 logger = logging.getLogger(__name__)
@@ -349,7 +350,9 @@ async def get_cosmic_insights(request: Request, db=Depends(get_db)):
 async def _generate_cosmic_insights(user_id: str, user_data: dict, db) -> dict:
     """Generate teaser insights based on user's birth chart data"""
     try:
-        birth_data = user_data.get('birth_chart_data', {})
+        # users.birth_chart_data references the shared store; follow it to the chart or profile
+        birth_data = await get_birth_chart_store().resolve_user_data(db, user_data.get('birth_chart_data')) \
+            if user_data.get('birth_chart_data') else None
         
         # Extract some basic info if available
         insights = {
@@ -362,8 +365,10 @@ async def _generate_cosmic_insights(user_id: str, user_data: dict, db) -> dict:
         
         # Add personalized elements if birth data exists
         if birth_data and isinstance(birth_data, dict):
-            if 'birth_details' in birth_data:
-                details = birth_data['birth_details']
+            # A complete profile nests the chart under 'birth_chart'
+            chart = birth_data.get('birth_chart') if 'birth_details' not in birth_data else birth_data
+            if isinstance(chart, dict) and 'birth_details' in chart:
+                details = chart['birth_details']
                 if 'nakshatra' in details:
                     nakshatra = details['nakshatra'].get('name', 'Unknown')
                     insights['moon_sign'] = f"🌙 Your Nakshatra {nakshatra} brings special blessings..."
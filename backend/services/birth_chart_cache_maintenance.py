@@ -0,0 +1,225 @@
+"""
+Birth Chart Cache Maintenance - incremental cleanup and O(1) statistics
+
+Expired cached charts are cleared by a scheduled cleaner instead of one
+``UPDATE users ... WHERE birth_chart_expires_at < NOW()`` over the whole table.
+Each batch walks the partial expiry index (migration 034) from a cursor, takes
+at most ``batch_size`` rows with ``FOR UPDATE SKIP LOCKED`` (a user whose row is
+being written right now is left for the next pass) and runs on its own
+connection checkout, so no statement holds locks or a connection for long.
+Each tick also re-encodes one batch of store entries still holding JSONB
+payloads from before migration 035 and writes the store's batched hit counts.
+
+The cache statistics come from ``birth_chart_cache_stats``, a rollup kept
+current by triggers on ``users`` and ``birth_chart_store`` and by the store's
+batched hit flush. Reading it sums
+eight slot rows; only entries that expired since the last sweep are counted
+from the expiry index, and the cleaner keeps that tail short.
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from services.birth_chart_store import get_birth_chart_store
+
+logger = logging.getLogger(__name__)
+
+BIRTH_CHART_CLEANUP_ENABLED = os.getenv("BIRTH_CHART_CLEANUP_ENABLED", "true").lower() == "true"
+BIRTH_CHART_CLEANUP_BATCH_SIZE = int(os.getenv("BIRTH_CHART_CLEANUP_BATCH_SIZE", "500"))
+BIRTH_CHART_CLEANUP_MAX_BATCHES = int(os.getenv("BIRTH_CHART_CLEANUP_MAX_BATCHES", "20"))
+BIRTH_CHART_CLEANUP_INTERVAL_SECONDS = float(os.getenv("BIRTH_CHART_CLEANUP_INTERVAL_SECONDS", "900"))
+
+# Cursor-ordered batch statements; each returns the rows it cleared and the last key it visited
+_CLEANUP_BATCHES = {
+    "users": """
+        WITH batch AS (
+            SELECT id, birth_chart_expires_at AS expires_at FROM users
+            WHERE birth_chart_data IS NOT NULL
+            AND birth_chart_expires_at < NOW()
+            AND ($1::timestamp IS NULL OR (birth_chart_expires_at, id) > ($1::timestamp, $2::bigint))
+            ORDER BY birth_chart_expires_at, id
+            LIMIT $3
+            FOR UPDATE SKIP LOCKED
+        ), cleared AS (
+            UPDATE users u SET
+                birth_chart_data = NULL,
+                birth_chart_hash = NULL,
+                birth_chart_cached_at = NULL,
+                birth_chart_expires_at = NULL
+            FROM batch WHERE u.id = batch.id
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM cleared) AS cleared, expires_at AS cursor_expires_at, id::text AS cursor_key
+        FROM batch ORDER BY expires_at DESC, id DESC LIMIT 1
+    """,
+    "store": """
+        WITH batch AS (
+            SELECT birth_hash, expires_at FROM birth_chart_store
+            WHERE expires_at < NOW()
+            AND ($1::timestamp IS NULL OR (expires_at, birth_hash) > ($1::timestamp, $2::text))
+            ORDER BY expires_at, birth_hash
+            LIMIT $3
+            FOR UPDATE SKIP LOCKED
+        ), cleared AS (
+            DELETE FROM birth_chart_store s USING batch WHERE s.birth_hash = batch.birth_hash
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM cleared) AS cleared, expires_at AS cursor_expires_at, birth_hash AS cursor_key
+        FROM batch ORDER BY expires_at DESC, birth_hash DESC LIMIT 1
+    """,
+}
+
+
+class BirthChartCacheMaintenance:
+    """Scheduled bounded-batch cleaner plus the rollup-backed cache statistics"""
+
+    def __init__(self, batch_size: int = BIRTH_CHART_CLEANUP_BATCH_SIZE,
+                 max_batches: int = BIRTH_CHART_CLEANUP_MAX_BATCHES,
+                 interval: float = BIRTH_CHART_CLEANUP_INTERVAL_SECONDS,
+                 enabled: bool = BIRTH_CHART_CLEANUP_ENABLED):
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.interval = interval
+        self.enabled = enabled
+        # Target -> (expires_at, key) of the last row visited in the current pass
+        self._cursors: Dict[str, Optional[Tuple[datetime, str]]] = {target: None for target in _CLEANUP_BATCHES}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"sweeps": 0, "batches": 0, "passes": 0, "users_cleared": 0, "store_cleared": 0,
+                      "compacted": 0, "errors": 0, "last_sweep_at": None}
+
+    def start(self):
+        """Start the periodic sweep on the running loop (idempotent)"""
+        if not self.enabled or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+        logger.info(f"Birth chart cache cleaner started (every {self.interval:.0f}s, batches of {self.batch_size})")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush_hits()  # Reuse counted since the last tick
+        except Exception as e:
+            logger.warning(f"Could not write birth chart store hit counts: {e}")
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+                await self.compact()
+                await self.flush_hits()
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Birth chart cache sweep failed: {e}")
+
+    async def sweep(self, max_batches: Optional[int] = None) -> Dict[str, int]:
+        """
+        Clear up to ``max_batches`` batches per target, resuming each target's
+        cursor. Returns the number of user rows and store entries cleared.
+        """
+        max_batches = self.max_batches if max_batches is None else max_batches
+        cleared = {target: 0 for target in _CLEANUP_BATCHES}
+        async with self._lock:  # One sweep at a time shares the cursors
+            for target in _CLEANUP_BATCHES:
+                for _ in range(max_batches):
+                    count, done = await self._sweep_batch(target)
+                    cleared[target] += count
+                    if done:
+                        break
+                    await asyncio.sleep(0)
+        self.stats["sweeps"] += 1
+        self.stats["users_cleared"] += cleared["users"]
+        self.stats["store_cleared"] += cleared["store"]
+        self.stats["last_sweep_at"] = datetime.now().isoformat()
+        return cleared
+
+    async def compact(self) -> int:
+        """Move one batch of stored charts written before migration 035 to the compressed format"""
+        async with self._pool().acquire() as conn:
+            compacted = await get_birth_chart_store().compact_legacy(conn, self.batch_size)
+        self.stats["compacted"] += compacted
+        return compacted
+
+    async def flush_hits(self) -> int:
+        """Write the store's in-process hit counts"""
+        async with self._pool().acquire() as conn:
+            return await get_birth_chart_store().flush_hits(conn)
+
+    async def _sweep_batch(self, target: str) -> Tuple[int, bool]:
+        """One bounded batch; (rows cleared, whether the pass reached the end of the expired rows)"""
+        cursor = self._cursors[target]
+        async with self._pool().acquire() as conn:
+            row = await conn.fetchrow(_CLEANUP_BATCHES[target],
+                                      cursor[0] if cursor else None, cursor[1] if cursor else None,
+                                      self.batch_size)
+        self.stats["batches"] += 1
+        if row is None:
+            # Nothing expired past the cursor: the next pass starts over and picks up skipped rows
+            self._cursors[target] = None
+            self.stats["passes"] += 1
+            return 0, True
+        self._cursors[target] = (row['cursor_expires_at'], row['cursor_key'])
+        return int(row['cleared'] or 0), False
+
+    async def get_rollup(self, conn) -> Dict[str, Any]:
+        """Cache statistics from the trigger-maintained rollup (independent of the user count)"""
+        row = await conn.fetchrow("""
+            SELECT
+                SUM(total_users) AS total_users,
+                SUM(cached_users) AS cached_users,
+                SUM(free_chart_users) AS free_chart_users,
+                SUM(linked_users) AS linked_users,
+                SUM(cached_at_count) AS cached_at_count,
+                SUM(cached_at_epoch_sum) AS cached_at_epoch_sum,
+                SUM(stored_charts) AS stored_charts,
+                SUM(store_hits) AS store_hits,
+                EXTRACT(EPOCH FROM NOW()) AS now_epoch,
+                (SELECT COUNT(*) FROM users
+                 WHERE birth_chart_data IS NOT NULL AND birth_chart_expires_at < NOW()) AS expired_users,
+                (SELECT COUNT(*) FROM birth_chart_store WHERE expires_at < NOW()) AS expired_charts
+            FROM birth_chart_cache_stats
+        """)
+        now_epoch = float(row['now_epoch'])
+        totals = {key: int(row[key] or 0) for key in row.keys() if key != 'now_epoch'}
+        age_count = totals['cached_at_count']
+        return {
+            'total_users': totals['total_users'],
+            'users_with_cached_data': totals['cached_users'],
+            'users_with_valid_cache': max(totals['cached_users'] - totals['expired_users'], 0),
+            'users_with_free_chart': totals['free_chart_users'],
+            'user_references': totals['linked_users'],
+            'avg_cache_age_days': ((now_epoch - totals['cached_at_epoch_sum'] / age_count) / 86400
+                                   if age_count else 0.0),
+            'stored_charts': totals['stored_charts'],
+            'valid_charts': max(totals['stored_charts'] - totals['expired_charts'], 0),
+            'reuse_hits': totals['store_hits'],
+            'expired_pending_cleanup': totals['expired_users'] + totals['expired_charts'],
+        }
+
+    def _pool(self):
+        import db
+        return db.require_db_pool()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "enabled": self.enabled, "batch_size": self.batch_size,
+                "max_batches": self.max_batches, "interval_seconds": self.interval,
+                "running": bool(self._task) and not self._task.done()}
+
+
+# Shared instance
+_birth_chart_cache_maintenance: Optional[BirthChartCacheMaintenance] = None
+
+
+def get_birth_chart_cache_maintenance() -> BirthChartCacheMaintenance:
+    """Return the process-wide birth chart cache cleaner"""
+    global _birth_chart_cache_maintenance
+    if _birth_chart_cache_maintenance is None:
+        _birth_chart_cache_maintenance = BirthChartCacheMaintenance()
+    return _birth_chart_cache_maintenance
@@ -3,58 +3,67 @@ Birth Chart Caching Service
 Handles caching of birth chart data from Prokerala API to avoid repeated API calls
 """
 
-import hashlib
-import json
+import os
 import asyncpg
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 import logging
 
+from services.birth_chart_cache_maintenance import get_birth_chart_cache_maintenance
+from services.birth_chart_store import generate_birth_details_hash, get_birth_chart_store
+from services.chart_generation_flights import get_chart_generation_flights
+from services.chart_prefetch import get_chart_prefetch_queue
+from utils.ttl_cache import TTLLRUCache
+
 logger = logging.getLogger(__name__)
 
+# Guest charts are a hot copy of the shared store, so they only need to live for a visit
+GUEST_CHART_CACHE_MAX_ENTRIES = int(os.getenv("GUEST_CHART_CACHE_MAX_ENTRIES", "1000"))
+GUEST_CHART_CACHE_MAX_BYTES = int(os.getenv("GUEST_CHART_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+GUEST_CHART_CACHE_TTL_SECONDS = float(os.getenv("GUEST_CHART_CACHE_TTL_SECONDS", "86400"))
+GUEST_CHART_CACHE_SWEEP_SECONDS = float(os.getenv("GUEST_CHART_CACHE_SWEEP_SECONDS", "300"))
+
 class BirthChartCacheService:
     """Service for managing birth chart data caching"""
     
     def __init__(self, db_url: str):
         self.db_url = db_url
         self.cache_duration_days = 365  # Cache for 1 year
-        # In-memory cache for guest users
-        self.guest_cache = {}
+        # In-memory chart cache for guest users, keyed by birth hash (content-addressed)
+        self.guest_cache = TTLLRUCache(GUEST_CHART_CACHE_MAX_ENTRIES, GUEST_CHART_CACHE_MAX_BYTES,
+                                       GUEST_CHART_CACHE_TTL_SECONDS, sweep_interval=GUEST_CHART_CACHE_SWEEP_SECONDS)
+        # Guest id -> birth hashes that guest has looked up
+        self.guest_refs = TTLLRUCache(GUEST_CHART_CACHE_MAX_ENTRIES * 4, GUEST_CHART_CACHE_MAX_BYTES // 8,
+                                      GUEST_CHART_CACHE_TTL_SECONDS, sizeof=lambda hashes: 72 * len(hashes),
+                                      sweep_interval=GUEST_CHART_CACHE_SWEEP_SECONDS)
+        self.store = get_birth_chart_store()
     
     def generate_birth_details_hash(self, birth_details: Dict[str, Any]) -> str:
         """Generate a unique hash for birth details to use as cache key"""
-        # Create a normalized string from birth details
-        normalized_data = {
-            'date': birth_details.get('date', ''),
-            'time': birth_details.get('time', ''),
-            'location': birth_details.get('location', '').lower().strip(),
-            'timezone': birth_details.get('timezone', 'Asia/Colombo')
-        }
-        
-        # Sort keys for consistent hashing
-        normalized_string = json.dumps(normalized_data, sort_keys=True)
-        
-        # Generate SHA256 hash
-        return hashlib.sha256(normalized_string.encode()).hexdigest()
+        return generate_birth_details_hash(birth_details)
+    
+    def _add_guest_ref(self, user_email: str, birth_hash: str):
+        birth_hashes = self.guest_refs.get(user_email)
+        if birth_hashes is None:
+            self.guest_refs.set(user_email, {birth_hash})
+        elif birth_hash not in birth_hashes:
+            birth_hashes.add(birth_hash)
+            self.guest_refs.resize(user_email)
     
     async def get_cached_birth_chart(self, user_email: str, birth_details: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Get cached birth chart data if available and valid"""
         try:
             birth_hash = self.generate_birth_details_hash(birth_details)
+            is_guest = user_email.startswith("guest_")
             
-            # Handle guest users with in-memory cache
-            if user_email.startswith("guest_"):
-                cache_key = f"{user_email}_{birth_hash}"
-                cached_data = self.guest_cache.get(cache_key)
-                
+            # Guests are served from memory first; any chart with these birth details will do
+            if is_guest:
+                cached_data = self.guest_cache.get(birth_hash)
                 if cached_data and cached_data['expires_at'] > datetime.now():
+                    self._add_guest_ref(user_email, birth_hash)
                     logger.info(f"✅ Birth chart cache HIT for guest user {user_email}")
                     return cached_data
-                else:
-                    logger.info(f"❌ Birth chart cache MISS for guest user {user_email}")
-                    return None
             
-            # Handle registered users with database cache
             import db
             pool = db.get_db_pool()
             if not pool:
@@ -62,7 +71,34 @@ class BirthChartCacheService:
                 return None
                 
             async with pool.acquire() as conn:
-                # Check for cached data with matching hash and valid expiry
+                # Content-addressed store: shared by everyone with the same birth details
+                stored = await self.store.get(conn, birth_hash, payloads=('chart_data',))
+                if stored and stored['chart_data']:
+                    cached_data = {
+                        'data': stored['chart_data'],
+                        'cached_at': stored['cached_at'],
+                        'expires_at': stored['expires_at'],
+                        'cache_hit': True
+                    }
+                    if is_guest:
+                        self.guest_cache.set(birth_hash, cached_data)
+                        self._add_guest_ref(user_email, birth_hash)
+                    else:
+                        # Point this user at the shared chart (no-op if already linked)
+                        linked = await conn.fetchval("""
+                            SELECT birth_chart_hash IS NOT DISTINCT FROM $2 FROM users WHERE email = $1
+                        """, user_email, birth_hash)
+                        if linked is False:
+                            await self.store.link_user(conn, user_email, birth_details,
+                                                       stored['cached_at'], stored['expires_at'])
+                    logger.info(f"✅ Birth chart store HIT for user {user_email}")
+                    return cached_data
+                
+                if is_guest:
+                    logger.info(f"❌ Birth chart cache MISS for guest user {user_email}")
+                    return None
+                
+                # Charts cached on the user row before the shared store existed
                 cached_data = await conn.fetchrow("""
                     SELECT birth_chart_data, birth_chart_cached_at, birth_chart_expires_at
                     FROM users 
@@ -71,11 +107,13 @@ class BirthChartCacheService:
                     AND birth_chart_expires_at > NOW()
                     AND birth_chart_data IS NOT NULL
                 """, user_email, birth_hash)
+                # A reference to a stored entry that has since been removed is a miss
+                chart_data = await self.store.resolve_user_data(conn, cached_data['birth_chart_data']) if cached_data else None
             
-            if cached_data:
+            if chart_data:
                 logger.info(f"✅ Birth chart cache HIT for user {user_email}")
                 return {
-                    'data': cached_data['birth_chart_data'],
+                    'data': chart_data,
                     'cached_at': cached_data['birth_chart_cached_at'],
                     'expires_at': cached_data['birth_chart_expires_at'],
                     'cache_hit': True
@@ -94,50 +132,32 @@ class BirthChartCacheService:
             birth_hash = self.generate_birth_details_hash(birth_details)
             cached_at = datetime.now()
             expires_at = cached_at + timedelta(days=self.cache_duration_days)
+            is_guest = user_email.startswith("guest_")
             
             # Handle guest users with in-memory cache
-            if user_email.startswith("guest_"):
-                cache_key = f"{user_email}_{birth_hash}"
-                self.guest_cache[cache_key] = {
+            if is_guest:
+                self._add_guest_ref(user_email, birth_hash)
+                self.guest_cache.set(birth_hash, {
                     'data': chart_data,
                     'cached_at': cached_at,
                     'expires_at': expires_at,
                     'cache_hit': True
-                }
-                logger.info(f"✅ Birth chart cached for guest user {user_email}, expires at {expires_at}")
-                return True
+                })
             
-            # Handle registered users with database cache
             import db
             pool = db.get_db_pool()
             if not pool:
                 logger.warning("Database pool not available")
-                return False
+                return is_guest
             
             async with pool.acquire() as conn:
-                # Update user record with cached birth chart data
-                await conn.execute("""
-                    UPDATE users SET 
-                        birth_chart_data = $1,
-                        birth_chart_hash = $2,
-                        birth_chart_cached_at = $3,
-                        birth_chart_expires_at = $4,
-                        has_free_birth_chart = true,
-                        birth_date = $5,
-                        birth_time = $6,
-                        birth_location = $7
-                    WHERE email = $8
-                """, 
-                json.dumps(chart_data), 
-                birth_hash, 
-                cached_at, 
-                expires_at,
-                birth_details.get('date'),
-                birth_details.get('time'),
-                birth_details.get('location'),
-                user_email)
+                # Guest charts go to the shared store too, so signing up later reuses them
+                stored = await self.store.put(conn, birth_details, chart_data=chart_data)
+                if not is_guest:
+                    await self.store.link_user(conn, user_email, birth_details,
+                                               stored['cached_at'], stored['expires_at'])
             
-            logger.info(f"✅ Birth chart cached for user {user_email}, expires at {expires_at}")
+            logger.info(f"✅ Birth chart cached for user {user_email}, expires at {stored['expires_at']}")
             return True
             
         except Exception as e:
@@ -149,10 +169,9 @@ class BirthChartCacheService:
         try:
             # Handle guest users
             if user_email.startswith("guest_"):
-                # Remove all cache entries for this guest user
-                keys_to_remove = [key for key in self.guest_cache.keys() if key.startswith(f"{user_email}_")]
-                for key in keys_to_remove:
-                    del self.guest_cache[key]
+                # Remove the charts this guest looked up
+                for birth_hash in self.guest_refs.pop(user_email, ()):
+                    self.guest_cache.pop(birth_hash, None)
                 logger.info(f"✅ Birth chart cache invalidated for guest user {user_email}")
                 return True
             
@@ -164,6 +183,13 @@ class BirthChartCacheService:
                 return False
             
             async with pool.acquire() as conn:
+                birth_hash = await conn.fetchval(
+                    "SELECT birth_chart_hash FROM users WHERE email = $1", user_email
+                )
+                # The user asked for a fresh chart, so the shared copy is regenerated too
+                if birth_hash:
+                    await self.store.delete(conn, birth_hash)
+                    self.guest_cache.pop(birth_hash, None)
                 await conn.execute("""
                     UPDATE users SET 
                         birth_chart_data = NULL,
@@ -186,7 +212,7 @@ class BirthChartCacheService:
             # Handle guest users
             if user_email.startswith("guest_"):
                 # Count guest cache entries
-                guest_entries = [key for key in self.guest_cache.keys() if key.startswith(f"{user_email}_")]
+                guest_entries = [h for h in self.guest_refs.get(user_email, ()) if h in self.guest_cache]
                 has_cached_data = len(guest_entries) > 0
                 
                 return {
@@ -263,41 +289,21 @@ class BirthChartCacheService:
     async def cleanup_expired_cache(self) -> int:
         """Clean up expired birth chart cache entries"""
         try:
-            # Clean up guest cache
-            current_time = datetime.now()
-            expired_guest_keys = [
-                key for key, data in self.guest_cache.items() 
-                if data['expires_at'] < current_time
-            ]
-            
-            for key in expired_guest_keys:
-                del self.guest_cache[key]
+            # Clean up guest cache (the background sweeper normally gets there first)
+            guest_cleaned = self.guest_cache.sweep()
+            self.guest_refs.sweep()
             
-            guest_cleaned = len(expired_guest_keys)
-            
-            # Clean up database cache
+            # Clean up database cache in bounded batches (the scheduled cleaner normally keeps up)
             import db
-            pool = db.get_db_pool()
-            if not pool:
+            if not db.get_db_pool():
                 logger.warning("Database pool not available")
                 return 0
             
-            async with pool.acquire() as conn:
-                result = await conn.execute("""
-                    UPDATE users SET 
-                        birth_chart_data = NULL,
-                        birth_chart_hash = NULL,
-                        birth_chart_cached_at = NULL,
-                        birth_chart_expires_at = NULL
-                    WHERE birth_chart_expires_at < NOW()
-                    AND birth_chart_data IS NOT NULL
-                """)
+            cleared = await get_birth_chart_cache_maintenance().sweep()
+            db_cleaned, store_cleaned = cleared['users'], cleared['store']
+            total_cleaned = guest_cleaned + db_cleaned + store_cleaned
             
-            # Extract number of rows updated using robust parsing
-            db_cleaned = self._parse_affected_rows(result)
-            total_cleaned = guest_cleaned + db_cleaned
-            
-            logger.info(f"✅ Cleaned up {total_cleaned} expired birth chart cache entries ({guest_cleaned} guest, {db_cleaned} database)")
+            logger.info(f"✅ Cleaned up {total_cleaned} expired birth chart cache entries ({guest_cleaned} guest, {db_cleaned} database, {store_cleaned} shared store)")
             return total_cleaned
             
         except Exception as e:
@@ -358,12 +364,9 @@ class BirthChartCacheService:
         """Get birth chart cache statistics"""
         try:
             # Count guest cache entries
-            current_time = datetime.now()
             guest_total = len(self.guest_cache)
-            guest_valid = len([
-                key for key, data in self.guest_cache.items() 
-                if data['expires_at'] > current_time
-            ])
+            guest_valid = sum(1 for _ in self.guest_cache.items())
+            guest_stats = {**self.guest_cache.get_stats(), 'tracked_guests': len(self.guest_refs)}
             
             # Get database cache statistics
             import db
@@ -379,19 +382,28 @@ class BirthChartCacheService:
                     'avg_cache_age_days': 0.0,
                     'guest_cache_total': guest_total,
                     'guest_cache_valid': guest_valid,
+                    'guest_cache': guest_stats,
+                    'generation_coalescing': get_chart_generation_flights().get_stats(),
+                    'prefetch': get_chart_prefetch_queue().get_stats(),
+                    'shared_store': {'process': dict(self.store.stats)},
+                    'cleanup': get_birth_chart_cache_maintenance().get_stats(),
                     'database_available': False
                 }
             
+            # Trigger-maintained rollup: no scan of the users table
             async with pool.acquire() as conn:
-                stats = await conn.fetchrow("""
-                    SELECT 
-                        COUNT(*) as total_users,
-                        COUNT(birth_chart_data) as users_with_cached_data,
-                        COUNT(CASE WHEN birth_chart_expires_at > NOW() THEN 1 END) as users_with_valid_cache,
-                        COUNT(CASE WHEN has_free_birth_chart = true THEN 1 END) as users_with_free_chart,
-                        AVG(EXTRACT(EPOCH FROM (NOW() - birth_chart_cached_at))/86400) as avg_cache_age_days
-                    FROM users
-                """)
+                stats = await get_birth_chart_cache_maintenance().get_rollup(conn)
+            
+            stored, references, reuse_hits = stats['stored_charts'], stats['user_references'], stats['reuse_hits']
+            store_stats = {
+                'stored_charts': stored,
+                'valid_charts': stats['valid_charts'],
+                'user_references': references,
+                'reuse_hits': reuse_hits,
+                'dedup_ratio': round(references / stored, 3) if stored else 0.0,
+                'reuse_ratio': round(reuse_hits / (reuse_hits + stored), 3) if stored else 0.0,
+                'process': dict(self.store.stats),
+            }
             
             return {
                 'total_users': stats['total_users'],
@@ -401,7 +413,13 @@ class BirthChartCacheService:
                 'cache_hit_ratio': stats['users_with_valid_cache'] / max(stats['total_users'], 1) * 100,
                 'avg_cache_age_days': float(stats['avg_cache_age_days'] or 0),
                 'guest_cache_total': guest_total,
-                'guest_cache_valid': guest_valid
+                'guest_cache_valid': guest_valid,
+                'guest_cache': guest_stats,
+                'generation_coalescing': get_chart_generation_flights().get_stats(),
+                'prefetch': get_chart_prefetch_queue().get_stats(),
+                'shared_store': store_stats,
+                'expired_pending_cleanup': stats['expired_pending_cleanup'],
+                'cleanup': get_birth_chart_cache_maintenance().get_stats()
             }
             
         except Exception as e:
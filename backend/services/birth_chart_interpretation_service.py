@@ -2,51 +2,55 @@
 🔮 Birth Chart Interpretation Service
 
 This service acts as the brain for interpreting raw astrological data from Prokerala.
-It uses the RAG knowledge engine to transform raw data (e.g., "Mars in Leo")
-into meaningful, wise interpretations in Swamiji's voice.
+Planet-in-sign and planet-in-house readings come from the precomputed
+interpretation library (services/interpretation_library.py); the RAG knowledge
+engine is only asked for entries the library does not hold yet, and its answers
+are written back so the next chart finds them.
 """
 
+import os
+import re
 import asyncio
 from typing import Dict, List, Any, Optional
 import logging
 
+from services.interpretation_library import (
+    DEFAULT_LANGUAGE, DEFAULT_PERSONA, LIBRARY_ASCENDANT, canonical_planet, canonical_sign, get_interpretation_library,
+    house_key, house_query, library_entries, localized_query, sign_key, sign_query,
+)
+
 # RAG engine will be imported at runtime to avoid startup dependencies
 
 logger = logging.getLogger(__name__)
 
+# The library summary is assembled without an LLM call; opt back into a GPT-4 summary per chart
+INTERPRETATION_LLM_SUMMARY = os.getenv("INTERPRETATION_LLM_SUMMARY", "false").lower() == "true"
+
+_LIBRARY_ENTRIES = {entry["key"]: entry for entry in library_entries()}
+
 class BirthChartInterpretationService:
     """
-    Transforms raw birth chart data into a comprehensive, RAG-powered interpretation.
+    Transforms raw birth chart data into a comprehensive interpretation.
     """
 
     def __init__(self):
+        self.library = get_interpretation_library()
         logger.info("Birth Chart Interpretation Service initialized.")
 
-    async def get_comprehensive_interpretation(self, prokerala_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def get_comprehensive_interpretation(self, prokerala_data: Dict[str, Any],
+                                               language: str = DEFAULT_LANGUAGE,
+                                               persona: str = DEFAULT_PERSONA) -> Dict[str, Any]:
         """
         The main method to generate a full birth chart interpretation.
 
         Args:
             prokerala_data: The raw JSON response from the Prokerala API.
+            language: Library language (e.g. "en", "ta").
+            persona: Library persona, the RAG service type the entries were generated for.
 
         Returns:
             A dictionary containing detailed interpretations for each planet and aspect.
         """
-        # Runtime check for RAG engine availability
-        try:
-            from ..enhanced_rag_knowledge_engine import rag_engine
-            if not rag_engine:
-                return {
-                    "error": "RAG Engine is not initialized.",
-                    "summary": "Could not perform interpretation."
-                }
-        except ImportError:
-            logger.warning("RAG Engine not available, cannot perform interpretation")
-            return {
-                "error": "RAG Engine is not available.",
-                "summary": "Could not perform interpretation."
-            }
-            
         planets = self._extract_planets(prokerala_data)
         if not planets:
             logger.warning("No valid planet data found in the input. Skipping interpretation.")
@@ -57,16 +61,24 @@ class BirthChartInterpretationService:
             }
 
         interpretations = {}
+        library_stats = {"hits": 0, "misses": 0}
         
         # 1. Interpret Planetary Positions in Signs
-        interpretations["planetary_positions"] = await self._interpret_planetary_positions(planets)
+        interpretations["planetary_positions"] = await self._interpret_planetary_positions(
+            planets, language, persona, library_stats)
 
         # 2. Interpret Planetary Positions in Houses (if available)
-        interpretations["house_positions"] = await self._interpret_house_positions(planets)
+        interpretations["house_positions"] = await self._interpret_house_positions(
+            planets, language, persona, library_stats)
 
         # 3. Generate a summary
-        interpretations["summary"] = await self._generate_summary(interpretations)
-        
+        if INTERPRETATION_LLM_SUMMARY:
+            interpretations["summary"] = await self._generate_summary(interpretations)
+        else:
+            interpretations["summary"] = self._assemble_summary(planets, interpretations)
+
+        interpretations["library"] = {"version": self.library.version, "language": language,
+                                      "persona": persona, **library_stats}
         return interpretations
 
     def _extract_planets(self, prokerala_data: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -76,18 +88,7 @@ class BirthChartInterpretationService:
         if not isinstance(prokerala_data, dict):
             return []
 
-        # Look for planet data under common keys, including nested within 'data'
-        possible_keys = ["planets", "planetary_positions", "planet_positions"]
-        raw_planets = None
-        for key in possible_keys:
-            if key in prokerala_data:
-                raw_planets = prokerala_data[key]
-                break
-        if not raw_planets and "data" in prokerala_data and isinstance(prokerala_data["data"], dict):
-            for key in possible_keys:
-                if key in prokerala_data["data"]:
-                    raw_planets = prokerala_data["data"][key]
-                    break
+        raw_planets = self._find_planet_list(prokerala_data)
         
         if not raw_planets or not isinstance(raw_planets, list):
             return []
@@ -100,12 +101,14 @@ class BirthChartInterpretationService:
             # Normalize common key variations for name, sign, and house
             name = planet_data.get("name") or planet_data.get("planet_name")
             sign = planet_data.get("sign") or planet_data.get("sign_name")
-            house = planet_data.get("house") or planet_data.get("house_number")
+            if not sign and isinstance(planet_data.get("rasi"), dict):
+                sign = planet_data["rasi"].get("name")  # Prokerala planet-position shape
+            house = planet_data.get("house") or planet_data.get("house_number") or planet_data.get("position")
 
             if name and sign:
                 normalized_planets.append({
-                    "name": str(name),
-                    "sign": str(sign),
+                    "name": canonical_planet(name) or str(name),
+                    "sign": canonical_sign(sign) or str(sign),
                     "house": int(house) if house is not None else None
                 })
         
@@ -114,50 +117,85 @@ class BirthChartInterpretationService:
 
         return normalized_planets
 
-    async def _interpret_planetary_positions(self, planets: List[Dict[str, Any]]) -> Dict[str, str]:
+    def _find_planet_list(self, data: Any, depth: int = 0) -> Optional[List[Any]]:
+        """Planet list under a common key, looking through nested ``data`` / endpoint wrappers"""
+        if not isinstance(data, dict) or depth > 3:
+            return None
+        possible_keys = ["planets", "planetary_positions", "planet_positions", "planet_position"]
+        for key in possible_keys:
+            value = data.get(key)
+            if isinstance(value, list) and value:
+                return value
+            if isinstance(value, dict):
+                nested = self._find_planet_list(value, depth + 1)
+                if nested:
+                    return nested
+        return self._find_planet_list(data.get("data"), depth + 1)
+
+    async def _interpret_planetary_positions(self, planets: List[Dict[str, Any]], language: str = DEFAULT_LANGUAGE,
+                                             persona: str = DEFAULT_PERSONA,
+                                             library_stats: Optional[Dict[str, int]] = None) -> Dict[str, str]:
         """
-        Queries the RAG engine for the meaning of each planet in its sign.
+        Reads the meaning of each planet in its sign from the library.
         """
-        tasks = []
+        queries = {}
         for planet in planets:
             planet_name = planet.get("name")
             sign = planet.get("sign")
             if planet_name and sign:
-                query = f"In Vedic astrology, what does it mean for a person to have {planet_name} in the sign of {sign}? Explain the positive and negative traits, and provide a wise spiritual perspective like a Swamiji."
-                tasks.append(self._query_rag_for_interpretation(f"{planet_name}_in_{sign}", query))
-        
-        results = await asyncio.gather(*tasks)
-        return {k: v for d in results for k, v in d.items()}
+                queries[sign_key(planet_name, sign)] = sign_query(planet_name, sign)
+        return await self._interpret_from_library(queries, language, persona, library_stats)
 
-    async def _interpret_house_positions(self, planets: List[Dict[str, Any]]) -> Dict[str, str]:
+    async def _interpret_house_positions(self, planets: List[Dict[str, Any]], language: str = DEFAULT_LANGUAGE,
+                                         persona: str = DEFAULT_PERSONA,
+                                         library_stats: Optional[Dict[str, int]] = None) -> Dict[str, str]:
         """
-        Queries the RAG engine for the meaning of each planet in its house.
+        Reads the meaning of each planet in its house from the library.
+        The Ascendant is skipped: it always marks house 1.
         """
-        tasks = []
+        queries = {}
         for planet in planets:
             planet_name = planet.get("name")
             house_number = planet.get("house")
-            if planet_name and house_number:
-                query = f"In a birth chart, what are the effects of planet {planet_name} being in house number {house_number}? Describe the impact on life areas like career, relationships, and health from a spiritual master's viewpoint."
-                tasks.append(self._query_rag_for_interpretation(f"{planet_name}_in_house_{house_number}", query))
+            if planet_name and house_number and planet_name != LIBRARY_ASCENDANT:
+                queries[house_key(planet_name, house_number)] = house_query(planet_name, house_number)
+        return await self._interpret_from_library(queries, language, persona, library_stats)
 
-        results = await asyncio.gather(*tasks)
-        return {k: v for d in results for k, v in d.items()}
+    async def _interpret_from_library(self, queries: Dict[str, str], language: str, persona: str,
+                                      library_stats: Optional[Dict[str, int]]) -> Dict[str, str]:
+        """
+        Library entries for ``queries``; misses go to the RAG engine and are written back.
+        """
+        found, missing = await self.library.lookup(list(queries), language, persona)
+        if library_stats is not None:
+            library_stats["hits"] += len(found)
+            library_stats["misses"] += len(missing)
+        if missing:
+            logger.info(f"Interpretation library miss for {missing} ({language}/{persona}), asking RAG")
+            results = await asyncio.gather(*(
+                self._query_rag_for_interpretation(key, localized_query(queries[key], language),
+                                                   language=language, persona=persona)
+                for key in missing
+            ))
+            for result in results:
+                found.update(result)
+        return {key: found[key] for key in queries}
 
-    async def _query_rag_for_interpretation(self, key: str, query: str) -> Dict[str, str]:
+    async def _query_rag_for_interpretation(self, key: str, query: str, language: str = DEFAULT_LANGUAGE,
+                                            persona: str = DEFAULT_PERSONA) -> Dict[str, str]:
         """
         Helper function to query the RAG engine and handle potential errors.
+        Library entries that come back are stored for the next chart.
         """
         try:
-            # Runtime import of RAG function
-            from ..enhanced_rag_knowledge_engine import get_rag_enhanced_guidance
-            
-            response = await get_rag_enhanced_guidance(
-                user_query=query,
-                birth_details=None, # We are asking conceptual questions, not for a specific person
-                service_type="astrological_interpretation"
-            )
-            interpretation_text = response.get("enhanced_guidance", "No specific guidance available.")
+            interpretation_text = await generate_interpretation(query, persona)
+            if not interpretation_text:
+                return {key: "No specific guidance available."}
+            if key in _LIBRARY_ENTRIES:
+                try:
+                    await self.library.put(_LIBRARY_ENTRIES[key], interpretation_text, language, persona)
+                except Exception as e:
+                    logger.warning(f"Could not store interpretation library entry {key}: {e}")
             return {key: interpretation_text}
         except ImportError:
             logger.warning(f"RAG system not available for interpretation of {key}")
@@ -166,6 +204,28 @@ class BirthChartInterpretationService:
             logger.error(f"RAG query failed for key '{key}': {e}")
             return {key: "Could not retrieve interpretation due to an internal error."}
 
+    def _assemble_summary(self, planets: List[Dict[str, Any]], interpretations: Dict[str, Any]) -> str:
+        """
+        Builds the summary from the library readings of the Sun, Moon and first-house planets.
+        """
+        placements = ", ".join(
+            f"{p['name']} in {p['sign']}" + (f" (house {p['house']})" if p.get("house") else "")
+            for p in planets
+        )
+        highlights = []
+        signs = interpretations.get("planetary_positions", {})
+        houses = interpretations.get("house_positions", {})
+        for planet in planets:
+            if planet["name"] in ("Sun", "Moon"):
+                highlights.append(_first_sentence(signs.get(sign_key(planet["name"], planet["sign"]), "")))
+            if planet.get("house") == 1 and planet["name"] not in ("Sun", "Moon"):
+                highlights.append(_first_sentence(houses.get(house_key(planet["name"], 1), "")))
+        highlights = [h for h in highlights if h]
+        summary = f"Your chart places {placements}."
+        if highlights:
+            summary += " " + " ".join(highlights)
+        return summary
+
     async def _generate_summary(self, interpretations: Dict[str, Any]) -> str:
         """
         Uses the collected interpretations to generate a holistic summary.
@@ -173,6 +233,8 @@ class BirthChartInterpretationService:
         # Combine all the individual interpretations into one context block
         full_context = ""
         for section, interpretations_dict in interpretations.items():
+            if not isinstance(interpretations_dict, dict) or section == "library":
+                continue
             full_context += f"## {section.replace('_', ' ').title()}:\n"
             for key, text in interpretations_dict.items():
                 full_context += f"- **{key.replace('_', ' ').title()}:** {text}\n"
@@ -189,7 +251,7 @@ class BirthChartInterpretationService:
 
         try:
             # Runtime import of RAG function
-            from ..enhanced_rag_knowledge_engine import get_rag_enhanced_guidance
+            from enhanced_rag_knowledge_engine import get_rag_enhanced_guidance
             
             response = await get_rag_enhanced_guidance(
                 user_query=summary_query,
@@ -204,6 +266,29 @@ class BirthChartInterpretationService:
             logger.error(f"RAG summary generation failed: {e}")
             return "A summary could not be generated due to an internal error."
 
+def _first_sentence(text: str) -> str:
+    match = re.match(r"\s*(.+?[.!?])(\s|$)", text or "", re.S)
+    return match.group(1).strip() if match else (text or "").strip()
+
+
+async def generate_interpretation(query: str, persona: str = DEFAULT_PERSONA) -> Optional[str]:
+    """
+    One conceptual RAG answer (no birth details); also the library warm-up's generator.
+    """
+    # Runtime import of RAG function
+    from enhanced_rag_knowledge_engine import get_rag_enhanced_guidance, rag_engine
+    if not rag_engine:
+        raise RuntimeError("RAG Engine is not initialized.")
+
+    response = await get_rag_enhanced_guidance(
+        user_query=query,
+        birth_details=None, # We are asking conceptual questions, not for a specific person
+        service_type=persona
+    )
+    if response.get("error"):
+        return None
+    return response.get("enhanced_guidance")
+
 # Example Usage
 async def main():
     # This is a sample Prokerala-like data structure.
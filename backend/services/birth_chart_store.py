@@ -0,0 +1,291 @@
+"""
+Birth Chart Store - content-addressed birth charts shared across users
+
+A chart depends only on the birth details, so charts live in the
+``birth_chart_store`` table (migration 031) keyed by the normalized
+birth-details hash. Users hold a reference through ``users.birth_chart_hash``:
+two people with the same date, time and place, or a guest who later signs up,
+resolve to the stored chart instead of a new Prokerala fan-out.
+
+Payloads are stored as compressed, deduplicated blobs (chart_payload_codec,
+migration 035) and decoded only when an entry's ``chart_data`` or
+``profile_data`` is actually read. A lookup selects only the payloads its
+caller asks for, and the legacy JSONB column only where the blob is NULL, so
+unused payloads are never pulled out of TOAST. ``users.birth_chart_data`` holds a small
+reference to the stored entry instead of a copy, so queries on ``users`` no
+longer pull the payload out of TOAST; ``resolve_user_data`` follows it.
+
+Reads are plain SELECTs. Reuse is counted in process and written to
+``hit_count`` / ``last_hit_at`` in one batched UPDATE by ``flush_hits``, which
+the cache maintenance task runs on each tick, so a popular chart's row is not
+written (or locked) on every lookup. The same statement adds the batch to the
+``birth_chart_cache_stats`` rollup (migration 034).
+
+Methods take an open connection (pool connection or raw asyncpg) so each
+caller keeps its own connection handling.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from functools import lru_cache
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from services.chart_payload_codec import decode_payload, encode_payload
+
+logger = logging.getLogger(__name__)
+
+BIRTH_CHART_STORE_TTL_DAYS = int(os.getenv("BIRTH_CHART_STORE_TTL_DAYS", "365"))
+
+# users.birth_chart_data key marking a reference to a stored entry
+STORED_REF_KEY = 'stored_chart'
+_PAYLOAD_BLOBS = {'chart_data': 'chart_blob', 'profile_data': 'profile_blob'}
+PAYLOAD_KEYS = tuple(_PAYLOAD_BLOBS)
+# Part of every content address. Bump it when the same birth details start producing a
+# different chart, so entries computed the old way are never served again (they expire).
+# 2: places are resolved through the gazetteer with their historic UTC offset; earlier
+#    charts used Jaffna coordinates and +05:30 for every location.
+CHART_HASH_VERSION = 2
+
+
+def normalize_birth_details(birth_details: Dict[str, Any]) -> Dict[str, str]:
+    """The fields that determine a chart, in canonical form"""
+    return {
+        'date': birth_details.get('date', '') or '',
+        'time': birth_details.get('time', '') or '',
+        'location': (birth_details.get('location', '') or '').lower().strip(),
+        'timezone': birth_details.get('timezone', 'Asia/Colombo') or 'Asia/Colombo'
+    }
+
+
+def generate_birth_details_hash(birth_details: Dict[str, Any]) -> str:
+    """SHA-256 of the normalized birth details and chart version - the store's content address"""
+    normalized_string = json.dumps({**normalize_birth_details(birth_details), 'chart_version': CHART_HASH_VERSION},
+                                   sort_keys=True)
+    return hashlib.sha256(normalized_string.encode()).hexdigest()
+
+
+def _json(value: Any) -> Any:
+    # psycopg decodes JSONB, a raw asyncpg connection returns text
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def stored_reference(birth_hash: str, kind: str = 'chart', extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """users.birth_chart_data value pointing at the stored chart (kind) or complete profile"""
+    return {STORED_REF_KEY: {'birth_hash': birth_hash, 'kind': kind}, **(extra or {})}
+
+
+@lru_cache(maxsize=None)
+def _lookup_query(payloads: Tuple[str, ...]) -> str:
+    # CASE only reads the legacy column (and detoasts it) for rows written before migration 035
+    columns = "".join(f", {_PAYLOAD_BLOBS[key]}, CASE WHEN {_PAYLOAD_BLOBS[key]} IS NULL THEN {key} END AS {key}"
+                      for key in payloads)
+    return f"""
+        SELECT birth_hash, created_at, expires_at{columns}
+        FROM birth_chart_store
+        WHERE birth_hash = $1 AND expires_at > NOW()
+    """
+
+
+class StoredChart(dict):
+    """Store entry whose chart_data / profile_data are decoded on first access"""
+
+    def __init__(self, fields: Dict[str, Any], payloads: Dict[str, Any]):
+        super().__init__(fields)
+        self._payloads = payloads  # key -> encoded blob, legacy JSONB value or None
+
+    def __missing__(self, key):
+        if key not in self._payloads:
+            raise KeyError(key)
+        raw = self._payloads.pop(key)
+        value = decode_payload(raw) if isinstance(raw, (bytes, bytearray, memoryview)) else _json(raw)
+        self[key] = value
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self._payloads
+
+
+class BirthChartStore:
+    """Reads and writes shared charts and the user references pointing at them"""
+
+    def __init__(self, ttl_days: int = BIRTH_CHART_STORE_TTL_DAYS):
+        self.ttl_days = ttl_days
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "writes": 0, "links": 0, "errors": 0,
+                      "hits_flushed": 0, "flush_errors": 0}
+        self._pending_hits: Dict[str, int] = {}  # birth_hash -> reuse not yet written to hit_count
+
+    async def get(self, conn, birth_hash: str, payloads: Tuple[str, ...] = PAYLOAD_KEYS) -> Optional[Dict[str, Any]]:
+        """
+        Return the stored entry and count the reuse. Only the ``payloads``
+        ('chart_data' / 'profile_data') asked for are loaded; each may be None.
+        """
+        self.stats["lookups"] += 1
+        try:
+            row = await conn.fetchrow(_lookup_query(tuple(payloads)), birth_hash)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Birth chart store lookup failed: {e}")
+            return None
+        if not row:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        self._pending_hits[birth_hash] = self._pending_hits.get(birth_hash, 0) + 1
+        # Rows written before migration 035 still carry JSONB payloads
+        return StoredChart({
+            'birth_hash': row['birth_hash'],
+            'cached_at': row['created_at'],
+            'expires_at': row['expires_at'],
+        }, {key: row[_PAYLOAD_BLOBS[key]] if row[_PAYLOAD_BLOBS[key]] is not None else row[key] for key in payloads})
+
+    async def put(self, conn, birth_details: Dict[str, Any], chart_data: Optional[Dict[str, Any]] = None,
+                  profile_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Upsert the chart and/or complete profile for these birth details"""
+        birth_hash = generate_birth_details_hash(birth_details)
+        cached_at = datetime.now()
+        expires_at = cached_at + timedelta(days=self.ttl_days)
+        await conn.execute("""
+            INSERT INTO birth_chart_store (birth_hash, birth_details, chart_blob, profile_blob,
+                                           created_at, updated_at, expires_at)
+            VALUES ($1, $2, $3, $4, $5, $5, $6)
+            ON CONFLICT (birth_hash) DO UPDATE SET
+                chart_blob = COALESCE(EXCLUDED.chart_blob, birth_chart_store.chart_blob),
+                profile_blob = COALESCE(EXCLUDED.profile_blob, birth_chart_store.profile_blob),
+                chart_data = CASE WHEN EXCLUDED.chart_blob IS NULL THEN birth_chart_store.chart_data END,
+                profile_data = CASE WHEN EXCLUDED.profile_blob IS NULL THEN birth_chart_store.profile_data END,
+                updated_at = EXCLUDED.updated_at,
+                expires_at = EXCLUDED.expires_at
+        """,
+        birth_hash,
+        json.dumps(normalize_birth_details(birth_details)),
+        encode_payload(chart_data) if chart_data is not None else None,
+        encode_payload(profile_data) if profile_data is not None else None,
+        cached_at,
+        expires_at)
+        self.stats["writes"] += 1
+        return {'birth_hash': birth_hash, 'cached_at': cached_at, 'expires_at': expires_at}
+
+    async def link_user(self, conn, user_email: str, birth_details: Dict[str, Any],
+                        cached_at: datetime, expires_at: datetime, kind: str = 'chart',
+                        extra: Optional[Dict[str, Any]] = None):
+        """
+        Point a user at a stored chart. users.birth_chart_data gets a reference
+        to the stored ``kind`` ('chart' or 'profile') plus any user-specific
+        ``extra`` fields, never a copy of the payload.
+        """
+        birth_hash = generate_birth_details_hash(birth_details)
+        await conn.execute("""
+            UPDATE users SET
+                birth_chart_data = $1,
+                birth_chart_hash = $2,
+                birth_chart_cached_at = $3,
+                birth_chart_expires_at = $4,
+                has_free_birth_chart = true,
+                birth_date = $5,
+                birth_time = $6,
+                birth_location = $7
+            WHERE email = $8
+        """,
+        json.dumps(stored_reference(birth_hash, kind, extra)),
+        birth_hash,
+        cached_at,
+        expires_at,
+        birth_details.get('date'),
+        birth_details.get('time'),
+        birth_details.get('location'),
+        user_email)
+        self.stats["links"] += 1
+
+    async def resolve_user_data(self, conn, user_data: Any) -> Optional[Dict[str, Any]]:
+        """
+        The payload a users.birth_chart_data value stands for: references are
+        loaded from the store (None once the stored entry is gone), inline
+        payloads from before the store are returned as they are.
+        """
+        user_data = _json(user_data)
+        reference = user_data.get(STORED_REF_KEY) if isinstance(user_data, dict) else None
+        if not reference:
+            return user_data
+        key = 'profile_data' if reference.get('kind') == 'profile' else 'chart_data'
+        stored = await self.get(conn, reference['birth_hash'], payloads=(key,))
+        payload = stored and stored[key]
+        if not payload:
+            return None
+        extra = {key: value for key, value in user_data.items() if key != STORED_REF_KEY}
+        return {**payload, **extra}
+
+    async def flush_hits(self, conn) -> int:
+        """Write the reuse counted since the last flush in one statement; returns the entries updated"""
+        if not self._pending_hits:
+            return 0
+        pending, self._pending_hits = self._pending_hits, {}
+        birth_hashes = sorted(pending)  # Same row order in every worker, so concurrent flushes cannot deadlock
+        try:
+            await conn.execute("""
+                WITH flushed AS (
+                    UPDATE birth_chart_store s
+                    SET hit_count = s.hit_count + h.hits, last_hit_at = NOW()
+                    FROM unnest($1::text[], $2::bigint[]) AS h(birth_hash, hits)
+                    WHERE s.birth_hash = h.birth_hash
+                    RETURNING h.hits
+                )
+                UPDATE birth_chart_cache_stats SET
+                    store_hits = store_hits + (SELECT COALESCE(SUM(hits), 0) FROM flushed),
+                    updated_at = NOW()
+                WHERE slot = pg_backend_pid() % 8
+            """, birth_hashes, [pending[birth_hash] for birth_hash in birth_hashes])
+        except Exception:
+            self.stats["flush_errors"] += 1
+            for birth_hash, hits in pending.items():  # Kept for the next flush
+                self._pending_hits[birth_hash] = self._pending_hits.get(birth_hash, 0) + hits
+            raise
+        self.stats["hits_flushed"] += sum(pending.values())
+        return len(pending)
+
+    async def delete(self, conn, birth_hash: str):
+        await conn.execute("DELETE FROM birth_chart_store WHERE birth_hash = $1", birth_hash)
+
+    async def compact_legacy(self, conn, limit: int = 100) -> int:
+        """Re-encode up to ``limit`` entries still holding JSONB payloads; returns how many were compacted"""
+        rows = await conn.fetch("""
+            SELECT birth_hash, chart_data, profile_data, updated_at FROM birth_chart_store
+            WHERE chart_data IS NOT NULL OR profile_data IS NOT NULL
+            LIMIT $1
+        """, limit)
+        compacted = 0
+        for row in rows:
+            chart_data, profile_data = _json(row['chart_data']), _json(row['profile_data'])
+            # updated_at guards against a put() that replaced the payload meanwhile
+            done = await conn.fetchval("""
+                UPDATE birth_chart_store SET
+                    chart_blob = COALESCE($2, chart_blob),
+                    profile_blob = COALESCE($3, profile_blob),
+                    chart_data = NULL,
+                    profile_data = NULL
+                WHERE birth_hash = $1 AND updated_at IS NOT DISTINCT FROM $4
+                RETURNING 1
+            """,
+            row['birth_hash'],
+            encode_payload(chart_data) if chart_data is not None else None,
+            encode_payload(profile_data) if profile_data is not None else None,
+            row['updated_at'])
+            compacted += 1 if done else 0
+        return compacted
+
+
+# Shared instance
+_birth_chart_store: Optional[BirthChartStore] = None
+
+
+def get_birth_chart_store() -> BirthChartStore:
+    """Return the process-wide birth chart store"""
+    global _birth_chart_store
+    if _birth_chart_store is None:
+        _birth_chart_store = BirthChartStore()
+    return _birth_chart_store
@@ -0,0 +1,197 @@
+"""
+Chart Generation Flights - single-flight coalescing for birth chart pipelines
+
+Concurrent requests for the same birth details (a double click, or the chart
+and profile pages loading together) share one generation: the first caller
+leads and runs the Prokerala/OpenAI pipeline, everyone else awaits the
+leader's result. Followers re-read the cache afterwards so their own user row
+gets linked to the stored chart.
+
+With BIRTH_CHART_ADVISORY_LOCK_ENABLED=true the leader also takes a Postgres
+advisory lock on the key, so a leader in another worker is waited for (and its
+cached result reused) instead of generating the same chart twice. The locks live
+on one dedicated session per worker, opened outside the pool, and are polled with
+pg_try_advisory_lock: neither a long generation nor a wait for another worker
+ever holds a pooled connection. A wait longer than BIRTH_CHART_LOCK_WAIT_SECONDS
+gives up on the lock and generates anyway.
+"""
+
+import os
+import copy
+import asyncio
+import hashlib
+import time
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+BIRTH_CHART_ADVISORY_LOCK_ENABLED = os.getenv("BIRTH_CHART_ADVISORY_LOCK_ENABLED", "false").lower() == "true"
+BIRTH_CHART_LOCK_WAIT_SECONDS = float(os.getenv("BIRTH_CHART_LOCK_WAIT_SECONDS", "60"))
+BIRTH_CHART_LOCK_POLL_SECONDS = float(os.getenv("BIRTH_CHART_LOCK_POLL_SECONDS", "0.25"))
+
+
+def advisory_lock_key(key: str) -> int:
+    """Stable signed 64-bit key for pg_advisory_lock"""
+    return int(hashlib.sha256(key.encode()).hexdigest()[:15], 16)
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls per key, in-process and optionally across workers"""
+
+    def __init__(self, advisory_lock: bool = BIRTH_CHART_ADVISORY_LOCK_ENABLED,
+                 lock_wait_seconds: float = BIRTH_CHART_LOCK_WAIT_SECONDS,
+                 lock_poll_seconds: float = BIRTH_CHART_LOCK_POLL_SECONDS):
+        self.advisory_lock = advisory_lock
+        self.lock_wait_seconds = lock_wait_seconds
+        self.lock_poll_seconds = lock_poll_seconds
+        self._flights: Dict[str, asyncio.Task] = {}
+        self._lock_session = None
+        self._lock_session_opening: Optional[asyncio.Lock] = None
+        self.stats = {"leaders": 0, "followers": 0, "cross_worker_waits": 0,
+                      "cross_worker_reuses": 0, "lock_wait_timeouts": 0, "lock_errors": 0, "failures": 0}
+
+    async def run(self, key: str, generate: Callable[[], Awaitable[Any]],
+                  recheck: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        """
+        Return ``generate()``'s result, running it at most once per key at a time.
+        ``recheck`` reads the cache; followers use it to pick up (and link) the
+        leader's stored result and fall back to a copy of the leader's return value.
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.stats["followers"] += 1
+            # Shielded: a follower disconnecting must not cancel the leader's work
+            result = await asyncio.shield(flight)
+            if recheck is not None:
+                cached = await recheck()
+                if cached is not None:
+                    return cached
+            return copy.deepcopy(result)
+
+        self.stats["leaders"] += 1
+        flight = asyncio.get_running_loop().create_task(self._lead(key, generate, recheck))
+        self._flights[key] = flight
+        flight.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(flight)
+
+    def _finish(self, key: str, flight: asyncio.Task):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            flight.exception()  # Retrieved here in case every waiter went away
+
+    async def _lead(self, key: str, generate, recheck) -> Any:
+        try:
+            session = await self._get_lock_session()
+            if session is None:
+                return await generate()
+            return await self._run_locked(session, key, generate, recheck)
+        except Exception:
+            self.stats["failures"] += 1
+            raise
+
+    async def _run_locked(self, session, key: str, generate, recheck) -> Any:
+        lock_key = advisory_lock_key(key)
+        locked = await self._try_lock(session, lock_key)
+        if locked is False:
+            # Another worker is generating this chart: wait for it, then reuse its cache entry
+            self.stats["cross_worker_waits"] += 1
+            locked = await self._wait_for_lock(session, lock_key)
+            if locked and recheck is not None:
+                try:
+                    cached = await recheck()
+                except Exception:
+                    await self._unlock(session, lock_key)
+                    raise
+                if cached is not None:
+                    self.stats["cross_worker_reuses"] += 1
+                    await self._unlock(session, lock_key)
+                    return cached
+        try:
+            return await generate()
+        finally:
+            if locked:
+                await self._unlock(session, lock_key)
+
+    async def _wait_for_lock(self, session, lock_key: int) -> Optional[bool]:
+        """Poll until the lock is ours; None once the wait is over or the session fails"""
+        deadline = time.monotonic() + self.lock_wait_seconds
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.lock_poll_seconds)
+            locked = await self._try_lock(session, lock_key)
+            if locked is not False:
+                return locked
+        self.stats["lock_wait_timeouts"] += 1
+        logger.warning("Gave up waiting for another worker's chart generation, generating here")
+        return None
+
+    async def _try_lock(self, session, lock_key: int) -> Optional[bool]:
+        """True/False from pg_try_advisory_lock; None if the lock session broke"""
+        try:
+            return bool(await session.fetchval("SELECT pg_try_advisory_lock($1)", lock_key))
+        except Exception as e:
+            await self._drop_lock_session(session, e)
+            return None
+
+    async def _unlock(self, session, lock_key: int):
+        try:
+            await session.fetchval("SELECT pg_advisory_unlock($1)", lock_key)
+        except Exception as e:
+            await self._drop_lock_session(session, e)  # Closing the session releases its locks
+
+    async def _get_lock_session(self):
+        """This worker's lock session, opened on first use and after a failure"""
+        if not self.advisory_lock:
+            return None
+        if self._lock_session is not None:
+            return self._lock_session
+        if self._lock_session_opening is None:
+            self._lock_session_opening = asyncio.Lock()
+        async with self._lock_session_opening:
+            if self._lock_session is None:
+                try:
+                    self._lock_session = await self._connect_lock_session()
+                except Exception as e:
+                    self.stats["lock_errors"] += 1
+                    logger.warning(f"Advisory lock unavailable, coalescing in-process only: {e}")
+            return self._lock_session
+
+    async def _connect_lock_session(self):
+        import db
+        pool = db.get_db_pool()
+        if pool is None:
+            raise RuntimeError("database pool is not initialised")
+        raw = await db.AsyncConnection.connect(pool.connection_string, autocommit=True)
+        return db.AsyncPGCompatConnection(raw)
+
+    async def _drop_lock_session(self, session, error: Exception):
+        self.stats["lock_errors"] += 1
+        logger.warning(f"Advisory lock session failed, reconnecting on next use: {error}")
+        if self._lock_session is session:
+            self._lock_session = None
+        try:
+            await session._conn.close()
+        except Exception:
+            pass
+
+    async def close(self):
+        """Close the lock session, releasing any advisory locks it still holds"""
+        session, self._lock_session = self._lock_session, None
+        if session is not None:
+            await session._conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "in_flight": len(self._flights), "advisory_lock": self.advisory_lock}
+
+
+# Shared instance
+_chart_generation_flights: Optional[SingleFlight] = None
+
+
+def get_chart_generation_flights() -> SingleFlight:
+    """Return the process-wide single-flight group for chart generation"""
+    global _chart_generation_flights
+    if _chart_generation_flights is None:
+        _chart_generation_flights = SingleFlight()
+    return _chart_generation_flights
@@ -0,0 +1,159 @@
+"""
+Chart Payload Codec - compact binary encoding for cached chart and profile payloads
+
+Complete profiles repeat themselves: every Prokerala report is kept as both
+``data`` and ``structured_data``, and the same planet / nakshatra structures
+appear in several reports. ``encode_payload`` replaces every repeated subtree
+above ``CHART_PAYLOAD_MIN_SHARED_BYTES`` with a reference to a single shared
+copy, serializes with msgpack (JSON when msgpack is not installed) and
+compresses with zstd (zlib when zstandard is not installed). The five-byte
+header records the codecs, so blobs written with either stay readable as long
+as the codec that wrote them is installed.
+
+``decode_payload`` returns plain dicts/lists again; repeated subtrees come back
+as independent copies, so callers may mutate the result freely.
+"""
+
+import os
+import json
+import zlib
+import hashlib
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+CHART_PAYLOAD_ZSTD_LEVEL = int(os.getenv("CHART_PAYLOAD_ZSTD_LEVEL", "9"))
+CHART_PAYLOAD_MIN_SHARED_BYTES = int(os.getenv("CHART_PAYLOAD_MIN_SHARED_BYTES", "48"))
+
+MAGIC = b"JC"
+VERSION = 1
+SERIALIZER_MSGPACK, SERIALIZER_JSON = b"m", b"j"
+COMPRESSOR_ZSTD, COMPRESSOR_ZLIB = b"z", b"d"
+
+# Reference marker. PostgreSQL JSON cannot hold \u0000, so no payload that
+# ever lived in a JSONB column can contain this key
+_REF = "\x00"
+
+
+def _scan(node: Any, digests: Dict[int, str], counts: Counter, sizes: Dict[str, int]) -> Tuple[str, int]:
+    """Content key and approximate serialized size of a subtree; counts repeated containers"""
+    if isinstance(node, dict):
+        parts = []
+        size = 2
+        for key, value in node.items():
+            child, child_size = _scan(value, digests, counts, sizes)
+            parts.append(f"{json.dumps(key)}:{child}")
+            size += len(key) + 3 + child_size
+        body = "{" + ",".join(parts) + "}"
+    elif isinstance(node, list):
+        parts = []
+        size = 2
+        for value in node:
+            child, child_size = _scan(value, digests, counts, sizes)
+            parts.append(child)
+            size += 1 + child_size
+        body = "[" + ",".join(parts) + "]"
+    else:
+        text = json.dumps(node)
+        return text, len(text)
+    digest = "#" + hashlib.blake2b(body.encode(), digest_size=12).hexdigest()
+    digests[id(node)] = digest
+    counts[digest] += 1
+    sizes[digest] = size
+    return digest, size
+
+
+def _pack(node: Any, digests: Dict[int, str], shared_keys: set, slots: Dict[str, int], shared: List[Any]) -> Any:
+    if not isinstance(node, (dict, list)):
+        return node
+    digest = digests[id(node)]
+    if digest in shared_keys:
+        if digest not in slots:
+            slots[digest] = len(shared)
+            shared.append(None)
+            shared[slots[digest]] = _pack_children(node, digests, shared_keys, slots, shared)
+        return {_REF: slots[digest]}
+    return _pack_children(node, digests, shared_keys, slots, shared)
+
+
+def _pack_children(node, digests, shared_keys, slots, shared):
+    if isinstance(node, dict):
+        return {key: _pack(value, digests, shared_keys, slots, shared) for key, value in node.items()}
+    return [_pack(value, digests, shared_keys, slots, shared) for value in node]
+
+
+def _unpack(node: Any, shared: List[Any]) -> Any:
+    if isinstance(node, dict):
+        if len(node) == 1 and _REF in node:
+            return _unpack(shared[node[_REF]], shared)
+        return {key: _unpack(value, shared) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_unpack(value, shared) for value in node]
+    return node
+
+
+def deduplicate(payload: Any) -> List[Any]:
+    """``[shared, root]`` with every repeated subtree above the size threshold stored once"""
+    digests: Dict[int, str] = {}
+    counts: Counter = Counter()
+    sizes: Dict[str, int] = {}
+    _scan(payload, digests, counts, sizes)
+    shared_keys = {digest for digest, count in counts.items()
+                   if count > 1 and sizes[digest] >= CHART_PAYLOAD_MIN_SHARED_BYTES}
+    shared: List[Any] = []
+    root = _pack(payload, digests, shared_keys, {}, shared)
+    return [shared, root]
+
+
+def encode_payload(payload: Any) -> bytes:
+    """Deduplicate, serialize and compress a JSON-compatible payload"""
+    packed = deduplicate(payload)
+    if MSGPACK_AVAILABLE:
+        serializer, body = SERIALIZER_MSGPACK, msgpack.packb(packed, use_bin_type=True)
+    else:
+        serializer, body = SERIALIZER_JSON, json.dumps(packed, separators=(",", ":")).encode()
+    if ZSTD_AVAILABLE:
+        compressor = COMPRESSOR_ZSTD
+        body = zstandard.ZstdCompressor(level=CHART_PAYLOAD_ZSTD_LEVEL).compress(body)
+    else:
+        compressor, body = COMPRESSOR_ZLIB, zlib.compress(body, 6)
+    return MAGIC + bytes([VERSION]) + serializer + compressor + body
+
+
+def decode_payload(blob: bytes) -> Any:
+    """Inverse of ``encode_payload``"""
+    blob = bytes(blob)  # psycopg returns memoryview for BYTEA
+    if blob[:2] != MAGIC or blob[2] != VERSION:
+        raise ValueError("Not an encoded chart payload")
+    serializer, compressor, body = blob[3:4], blob[4:5], blob[5:]
+    if compressor == COMPRESSOR_ZSTD:
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("Chart payload was written with zstd; install zstandard to read it")
+        body = zstandard.ZstdDecompressor().decompress(body)
+    elif compressor == COMPRESSOR_ZLIB:
+        body = zlib.decompress(body)
+    else:
+        raise ValueError(f"Unknown chart payload compressor {compressor!r}")
+    if serializer == SERIALIZER_MSGPACK:
+        if not MSGPACK_AVAILABLE:
+            raise RuntimeError("Chart payload was written with msgpack; install msgpack to read it")
+        shared, root = msgpack.unpackb(body, raw=False, strict_map_key=False)
+    elif serializer == SERIALIZER_JSON:
+        shared, root = json.loads(body)
+    else:
+        raise ValueError(f"Unknown chart payload serializer {serializer!r}")
+    return _unpack(root, shared)
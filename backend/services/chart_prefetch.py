@@ -0,0 +1,270 @@
+"""
+Chart Prefetch - background birth chart + Swamiji reading generation
+
+Registration and login already know the user's birth details, so the complete
+profile is generated right away in the background instead of inside the first
+dashboard request (get_complete_birth_chart_profile). Jobs are recorded in the
+``chart_prefetch_jobs`` table (migration 033) and handed to a bounded asyncio
+queue drained by a few workers. Jobs that did not fit in the queue, failed
+attempts waiting for a retry, and jobs left behind by a restart are picked up
+by the poller.
+
+Generation goes through EnhancedBirthChartCacheService, so a prefetch shares
+the content-addressed chart store and the single-flight coalescing with the
+dashboard path: a dashboard request arriving mid-prefetch joins it.
+"""
+
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from services.birth_chart_store import generate_birth_details_hash
+
+logger = logging.getLogger(__name__)
+
+CHART_PREFETCH_ENABLED = os.getenv("CHART_PREFETCH_ENABLED", "true").lower() == "true"
+CHART_PREFETCH_WORKERS = int(os.getenv("CHART_PREFETCH_WORKERS", "2"))
+CHART_PREFETCH_QUEUE_SIZE = int(os.getenv("CHART_PREFETCH_QUEUE_SIZE", "500"))
+CHART_PREFETCH_MAX_ATTEMPTS = int(os.getenv("CHART_PREFETCH_MAX_ATTEMPTS", "3"))
+CHART_PREFETCH_POLL_SECONDS = float(os.getenv("CHART_PREFETCH_POLL_SECONDS", "60"))
+CHART_PREFETCH_STALE_MINUTES = int(os.getenv("CHART_PREFETCH_STALE_MINUTES", "15"))
+
+# get_complete_birth_chart_profile regenerates profiles older than this
+PROFILE_FRESH_DAYS = 30
+
+
+def birth_details_from_user(user: Any) -> Optional[Dict[str, str]]:
+    """Birth details dict from a users row, shaped like the dashboard builds it (None if incomplete)"""
+    date, time_ = user.get('birth_date'), user.get('birth_time')
+    if not (date and time_):
+        return None
+    return {
+        'date': date if isinstance(date, str) else date.strftime('%Y-%m-%d'),
+        'time': time_ if isinstance(time_, str) else time_.strftime('%H:%M'),
+        'location': user.get('birth_location') or 'Jaffna, Sri Lanka',
+        'timezone': 'Asia/Colombo'
+    }
+
+
+def needs_prefetch(user: Any) -> bool:
+    """True when the user's cached profile is missing, stale, or for different birth details"""
+    birth_details = birth_details_from_user(user)
+    if birth_details is None:
+        return False
+    if not user.get('birth_chart_data'):
+        return True
+    if user.get('birth_chart_hash') != generate_birth_details_hash(birth_details):
+        return True  # Birth details changed since the profile was generated
+    cached_at = user.get('birth_chart_cached_at')
+    if isinstance(cached_at, datetime):
+        return datetime.now(cached_at.tzinfo) - cached_at > timedelta(days=PROFILE_FRESH_DAYS)
+    return False
+
+
+class ChartPrefetchQueue:
+    """DB-backed job table drained by a bounded in-process worker queue"""
+
+    def __init__(self, workers: int = CHART_PREFETCH_WORKERS, max_queue: int = CHART_PREFETCH_QUEUE_SIZE,
+                 max_attempts: int = CHART_PREFETCH_MAX_ATTEMPTS,
+                 poll_interval: float = CHART_PREFETCH_POLL_SECONDS,
+                 stale_minutes: int = CHART_PREFETCH_STALE_MINUTES,
+                 enabled: bool = CHART_PREFETCH_ENABLED, profile_service=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.stale_minutes = stale_minutes
+        self.enabled = enabled
+        self._service = profile_service
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: Set[int] = set()
+        self._tasks: List[asyncio.Task] = []
+        self.stats = {"enqueued": 0, "deduplicated": 0, "overflow": 0, "recovered": 0,
+                      "completed": 0, "shared": 0, "retried": 0, "failed": 0}
+
+    def start(self):
+        """Start the workers and the poller on the running loop (idempotent)"""
+        if self._tasks and not all(task.done() for task in self._tasks):
+            return
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._queued.clear()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(loop.create_task(self._poll()))
+        logger.info(f"Chart prefetch started with {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, user_email: str, birth_details: Dict[str, Any], reason: str = "registration") -> bool:
+        """
+        Record a prefetch job and queue it. True when the job is (or already was)
+        scheduled; False when prefetch is disabled or the job table is unavailable.
+        """
+        if not self.enabled:
+            return False
+        self.start()
+        try:
+            async with self._pool().acquire() as conn:
+                job_id = await conn.fetchval("""
+                    INSERT INTO chart_prefetch_jobs (user_email, birth_hash, birth_details, reason)
+                    VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (user_email, birth_hash) WHERE status IN ('pending', 'running') DO NOTHING
+                    RETURNING id
+                """, user_email, generate_birth_details_hash(birth_details), json.dumps(birth_details), reason)
+        except Exception as e:
+            logger.warning(f"Could not record chart prefetch for {user_email}: {e}")
+            return False
+        if job_id is None:
+            self.stats["deduplicated"] += 1
+            return True
+        self.stats["enqueued"] += 1
+        if not self._offer(job_id):
+            self.stats["overflow"] += 1  # Stays pending in the table; the poller queues it later
+        return True
+
+    def _offer(self, job_id: int) -> bool:
+        if job_id in self._queued:
+            return True
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            return False
+        self._queued.add(job_id)
+        return True
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                await self.run_job(job_id)
+            except Exception as e:
+                logger.error(f"Chart prefetch job {job_id} crashed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def run_job(self, job_id: int) -> Optional[str]:
+        """Claim and run one job; returns its final status, or None if another worker owns it"""
+        async with self._pool().acquire() as conn:
+            job = await conn.fetchrow("""
+                UPDATE chart_prefetch_jobs
+                SET status = 'running', attempts = attempts + 1, started_at = NOW(), updated_at = NOW()
+                WHERE id = $1 AND status = 'pending'
+                RETURNING user_email, birth_details, attempts
+            """, job_id)
+        if job is None:
+            return None
+
+        birth_details = job['birth_details']
+        if isinstance(birth_details, str):
+            birth_details = json.loads(birth_details)
+        try:
+            # The connection is released while the (slow) generation runs
+            profile = await self._profile_service().generate_and_cache_complete_profile(
+                job['user_email'], birth_details)
+            if not profile.get('cached'):
+                raise RuntimeError("Profile generated but not cached")
+        except asyncio.CancelledError:
+            # Shutdown: hand the job back now rather than after the stale-job timeout
+            await self._finish(job_id, "pending", "Interrupted by shutdown")
+            raise
+        except Exception as e:
+            retry = job['attempts'] < self.max_attempts
+            self.stats["retried" if retry else "failed"] += 1
+            logger.warning(f"Chart prefetch for {job['user_email']} failed (attempt {job['attempts']}): {e}")
+            return await self._finish(job_id, "pending" if retry else "failed", str(e)[:500],
+                                      retry_seconds=60 * 2 ** job['attempts'])
+
+        self.stats["completed"] += 1
+        if profile.get('shared_cache_hit'):
+            self.stats["shared"] += 1
+        return await self._finish(job_id, "done", None)
+
+    async def _finish(self, job_id: int, status: str, error: Optional[str], retry_seconds: int = 0) -> str:
+        async with self._pool().acquire() as conn:
+            await conn.fetchval("""
+                UPDATE chart_prefetch_jobs
+                SET status = $2, last_error = $3, updated_at = NOW(),
+                    finished_at = CASE WHEN $2 = 'pending' THEN NULL ELSE NOW() END,
+                    run_after = NOW() + make_interval(secs => $4)
+                WHERE id = $1
+                RETURNING id
+            """, job_id, status, error, retry_seconds)
+        return status
+
+    async def _poll(self):
+        while True:
+            try:
+                await self.recover()
+            except Exception as e:
+                logger.warning(f"Chart prefetch poll failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def recover(self) -> int:
+        """Queue due pending jobs (overflow, retries, restarts) and release stale running ones"""
+        free = self.max_queue - self._queue.qsize()
+        if free <= 0:
+            return 0
+        async with self._pool().acquire() as conn:
+            # A worker that died mid-job leaves it running forever; hand it back
+            await conn.fetchval("""
+                WITH stale AS (
+                    UPDATE chart_prefetch_jobs SET status = 'pending', updated_at = NOW()
+                    WHERE status = 'running' AND started_at < NOW() - make_interval(mins => $1)
+                    RETURNING 1
+                )
+                SELECT COUNT(*) FROM stale
+            """, self.stale_minutes)
+            rows = await conn.fetch("""
+                SELECT id FROM chart_prefetch_jobs
+                WHERE status = 'pending' AND run_after <= NOW()
+                ORDER BY id
+                LIMIT $1
+            """, free)
+        recovered = 0
+        for row in rows:
+            if row['id'] not in self._queued and self._offer(row['id']):
+                recovered += 1
+        self.stats["recovered"] += recovered
+        return recovered
+
+    def _profile_service(self):
+        if self._service is None:
+            from services.enhanced_birth_chart_cache_service import EnhancedBirthChartCacheService
+            self._service = EnhancedBirthChartCacheService()
+        return self._service
+
+    def _pool(self):
+        import db
+        return db.require_db_pool()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "enabled": self.enabled, "workers": self.workers,
+                "queued": self._queue.qsize() if self._queue else 0,
+                "running": bool(self._tasks) and not all(task.done() for task in self._tasks)}
+
+
+async def prefetch_for_user(user: Any, reason: str = "login") -> bool:
+    """Schedule a prefetch for a users row when its cached profile will not serve the dashboard"""
+    if not needs_prefetch(user):
+        return False
+    return await get_chart_prefetch_queue().enqueue(user['email'], birth_details_from_user(user), reason)
+
+
+# Shared instance
+_chart_prefetch_queue: Optional[ChartPrefetchQueue] = None
+
+
+def get_chart_prefetch_queue() -> ChartPrefetchQueue:
+    """Return the process-wide chart prefetch queue"""
+    global _chart_prefetch_queue
+    if _chart_prefetch_queue is None:
+        _chart_prefetch_queue = ChartPrefetchQueue()
+    return _chart_prefetch_queue
@@ -0,0 +1,191 @@
+"""
+Embedding Cache - two-tier cache for OpenAI embeddings
+
+Tier 1 is an in-process LRU bounded by a byte budget that keeps vectors as
+compact float32 arrays. Tier 2 is the ``embedding_cache`` Postgres table
+(migration 029) keyed by model name and SHA-256 of the text, so restarts and
+additional workers start warm. Both tiers report hit/miss statistics.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import hashlib
+import logging
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+EMBEDDING_CACHE_PERSISTENT = os.getenv("EMBEDDING_CACHE_PERSISTENT", "true").lower() == "true"
+_ENTRY_OVERHEAD_BYTES = 160  # key tuple, array header and OrderedDict node
+_DB_RETRY_AFTER_SECONDS = 60.0
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _to_float32(vector: Sequence[float]) -> array:
+    return vector if isinstance(vector, array) else array("f", vector)
+
+
+def _to_bytes(vector: array) -> bytes:
+    if sys.byteorder == "big":
+        vector = array("f", vector)
+        vector.byteswap()
+    return vector.tobytes()
+
+
+def _from_bytes(data: bytes) -> array:
+    vector = array("f")
+    vector.frombytes(bytes(data))
+    if sys.byteorder == "big":
+        vector.byteswap()
+    return vector
+
+
+class _MemoryTier:
+    """LRU of float32 vectors bounded by an approximate byte budget"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, array]" = OrderedDict()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(vector: array) -> int:
+        return vector.itemsize * len(vector) + _ENTRY_OVERHEAD_BYTES
+
+    def get(self, key: str) -> Optional[array]:
+        vector = self._entries.get(key)
+        if vector is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return vector
+
+    def put(self, key: str, vector: array):
+        size = self._size(vector)
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.bytes_used -= self._size(previous)
+        self._entries[key] = vector
+        self.bytes_used += size
+        while self.bytes_used > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes_used -= self._size(evicted)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class EmbeddingCache:
+    """Memory LRU in front of a Postgres table, keyed by (model, content hash)"""
+
+    def __init__(self, model: str, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES,
+                 db_pool: Optional[Any] = None, persistent: bool = EMBEDDING_CACHE_PERSISTENT):
+        self.model = model
+        self.memory = _MemoryTier(max_bytes)
+        self.db_pool = db_pool
+        self.persistent = persistent
+        self._db_retry_at = 0.0
+        self._write_tasks: set = set()
+        self.db_stats = {"hits": 0, "misses": 0, "writes": 0, "errors": 0}
+
+    def attach_pool(self, db_pool: Any):
+        if self.db_pool is None and db_pool is not None:
+            self.db_pool = db_pool
+
+    def _db_usable(self) -> bool:
+        return self.persistent and self.db_pool is not None and time.monotonic() >= self._db_retry_at
+
+    def _db_failed(self, action: str, error: Exception):
+        self.db_stats["errors"] += 1
+        self._db_retry_at = time.monotonic() + _DB_RETRY_AFTER_SECONDS
+        logger.warning(f"Embedding cache {action} failed, persistent tier paused for {_DB_RETRY_AFTER_SECONDS:.0f}s: {error}")
+
+    async def get_many(self, texts: List[str]) -> Dict[str, List[float]]:
+        """Return cached vectors for the texts that have one (memory first, then Postgres)"""
+        found: Dict[str, List[float]] = {}
+        missing: Dict[str, str] = {}  # hash -> text
+        for text in texts:
+            key = content_hash(text)
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[text] = vector.tolist()
+            else:
+                missing[key] = text
+
+        if missing and self._db_usable():
+            try:
+                async with self.db_pool.acquire() as conn:
+                    rows = await conn.fetch(
+                        "SELECT content_hash, embedding FROM embedding_cache "
+                        "WHERE model = $1 AND content_hash = ANY($2)",
+                        self.model, list(missing)
+                    )
+                for row in rows:
+                    vector = _from_bytes(row["embedding"])
+                    self.memory.put(row["content_hash"], vector)
+                    found[missing[row["content_hash"]]] = vector.tolist()
+                self.db_stats["hits"] += len(rows)
+                self.db_stats["misses"] += len(missing) - len(rows)
+            except Exception as e:
+                self._db_failed("lookup", e)
+        return found
+
+    async def put_many(self, vectors: Dict[str, Sequence[float]]):
+        """Store freshly generated vectors in memory and (in the background) in Postgres"""
+        rows = []
+        for text, vector in vectors.items():
+            key = content_hash(text)
+            packed = _to_float32(vector)
+            self.memory.put(key, packed)
+            rows.append((key, _to_bytes(packed)))
+        if rows and self._db_usable():
+            task = asyncio.get_running_loop().create_task(self._write_rows(rows))
+            self._write_tasks.add(task)
+            task.add_done_callback(self._write_tasks.discard)
+
+    async def _write_rows(self, rows: List[tuple]):
+        try:
+            async with self.db_pool.acquire() as conn:
+                await conn.execute("""
+                    INSERT INTO embedding_cache (model, content_hash, dimensions, embedding)
+                    SELECT $1, h, octet_length(e) / 4, e
+                    FROM unnest($2::text[], $3::bytea[]) AS t(h, e)
+                    ON CONFLICT (model, content_hash) DO NOTHING
+                """, self.model, [h for h, _ in rows], [e for _, e in rows])
+            self.db_stats["writes"] += len(rows)
+        except Exception as e:
+            self._db_failed("write", e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        memory_lookups = self.memory.hits + self.memory.misses
+        return {
+            "model": self.model,
+            "memory": {
+                "entries": len(self.memory),
+                "bytes_used": self.memory.bytes_used,
+                "max_bytes": self.memory.max_bytes,
+                "hits": self.memory.hits,
+                "misses": self.memory.misses,
+                "evictions": self.memory.evictions,
+                "hit_rate": round(self.memory.hits / memory_lookups, 4) if memory_lookups else 0.0,
+            },
+            "persistent": {
+                "enabled": self.persistent and self.db_pool is not None,
+                **self.db_stats,
+            },
+        }
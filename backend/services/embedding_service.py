@@ -0,0 +1,221 @@
+"""
+Embedding Service - shared, batched OpenAI embeddings client for JyotiFlow
+
+Concurrent embedding requests arriving within a short window are coalesced
+into a single ``embeddings.create`` call (the API accepts a list of inputs),
+and identical texts that are already queued or in flight share one result.
+Results are kept in a two-tier EmbeddingCache (memory LRU + Postgres), so a
+text such as "Moon in Rohini" is embedded once across restarts and workers.
+Used by the RAG engine, the knowledge seeder and the monitoring validators.
+"""
+
+import os
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+try:
+    from openai import AsyncOpenAI
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+    AsyncOpenAI = None
+
+from services.embedding_cache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_DIM = 1536
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "10"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "128"))
+EMBEDDING_MAX_INPUT_CHARS = 8000  # Same input limit the validators already applied
+# Caps the total input of one request too; the API also limits tokens per request, and
+# long Tamil text can run close to a token per character
+EMBEDDING_MAX_BATCH_CHARS = int(os.getenv("EMBEDDING_MAX_BATCH_CHARS", "100000"))
+
+
+def _is_rejected_input(error: Exception) -> bool:
+    """The API refused the request itself (HTTP 400), e.g. an input over the token limit"""
+    return getattr(error, "status_code", None) == 400
+
+
+class EmbeddingService:
+    """Coalescing embeddings client; one instance is shared per process"""
+
+    def __init__(self, openai_client: Optional[Any] = None, model: str = EMBEDDING_MODEL,
+                 batch_window_ms: float = EMBEDDING_BATCH_WINDOW_MS, max_batch: int = EMBEDDING_MAX_BATCH,
+                 max_batch_chars: int = EMBEDDING_MAX_BATCH_CHARS,
+                 cache: Optional[EmbeddingCache] = None, db_pool: Optional[Any] = None):
+        self._client = openai_client
+        self.model = model
+        self.cache = cache if cache is not None else EmbeddingCache(model, db_pool=db_pool)
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.max_batch_chars = max(EMBEDDING_MAX_INPUT_CHARS, max_batch_chars)
+        self._pending: Dict[str, asyncio.Future] = {}    # queued for the next batch
+        self._pending_chars = 0
+        self._in_flight: Dict[str, asyncio.Future] = {}  # sent, awaiting response
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self.stats = {
+            "requests": 0,
+            "deduplicated": 0,
+            "batches": 0,
+            "texts_embedded": 0,
+            "errors": 0,
+            "cache_write_errors": 0,
+            "split_batches": 0,
+            "max_batch_seen": 0,
+            "cache_hits": 0,
+        }
+
+    @property
+    def client(self):
+        if self._client is None:
+            if not OPENAI_AVAILABLE:
+                raise RuntimeError("openai package not available")
+            self._client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._client
+
+    def attach_client(self, openai_client: Any):
+        """Adopt a caller's client if the shared service has none yet"""
+        if self._client is None and openai_client is not None:
+            self._client = openai_client
+    
+    def attach_pool(self, db_pool: Any):
+        """Enable the persistent cache tier once a database pool is available"""
+        self.cache.attach_pool(db_pool)
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed one text; concurrent calls are batched together"""
+        return (await self.embed_many([text]))[0]
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts, preserving order; cached texts skip the API, duplicates are sent once"""
+        texts = [(text or "")[:EMBEDDING_MAX_INPUT_CHARS] for text in texts]
+        cached = await self.cache.get_many([t for t in dict.fromkeys(texts) if t.strip()])
+        futures = {text: self._enqueue(text) for text in texts if text not in cached}
+        self.stats["requests"] += len(texts) - len(futures)
+        self.stats["cache_hits"] += sum(1 for text in texts if text in cached)
+        # Shield shared futures so one cancelled caller does not cancel the others
+        fresh = await asyncio.gather(*(asyncio.shield(f) for f in futures.values()))
+        results = dict(zip(futures, fresh))
+        return [cached[text] if text in cached else results[text] for text in texts]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "pending": len(self._pending),
+            "in_flight": len(self._in_flight),
+            "model": self.model,
+            "cache": self.cache.get_stats(),
+        }
+
+    def _enqueue(self, text: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        self.stats["requests"] += 1
+        text = (text or "")[:EMBEDDING_MAX_INPUT_CHARS]
+
+        if not text.strip():
+            # The API rejects empty input; an empty text has no meaningful direction
+            future = loop.create_future()
+            future.set_result([0.0] * EMBEDDING_DIM)
+            return future
+
+        existing = self._pending.get(text) or self._in_flight.get(text)
+        if existing is not None:
+            self.stats["deduplicated"] += 1
+            return existing
+
+        if self._pending and self._pending_chars + len(text) > self.max_batch_chars:
+            self._flush()
+        future = loop.create_future()
+        self._pending[text] = future
+        self._pending_chars += len(text)
+        if len(self._pending) >= self.max_batch or self._pending_chars >= self.max_batch_chars:
+            self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = loop.call_later(self.batch_window, self._flush)
+        return future
+
+    def _flush(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._pending_chars = 0
+        self._in_flight.update(batch)
+        asyncio.get_running_loop().create_task(self._send(batch))
+
+    async def _send(self, batch: Dict[str, asyncio.Future]):
+        texts = list(batch)
+        try:
+            await self._request(texts, batch)
+        finally:
+            for text in texts:
+                if self._in_flight.get(text) is batch[text]:
+                    del self._in_flight[text]
+
+    async def _request(self, texts: List[str], batch: Dict[str, asyncio.Future]):
+        self.stats["batches"] += 1
+        self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(texts))
+        try:
+            response = await self.client.embeddings.create(model=self.model, input=texts)
+            vectors: List[Optional[List[float]]] = [None] * len(texts)
+            for position, item in enumerate(response.data):
+                index = getattr(item, "index", position)
+                vectors[index] = item.embedding
+            for text, vector in zip(texts, vectors):
+                future = batch[text]
+                if future.done():
+                    continue
+                if vector is None:
+                    future.set_exception(RuntimeError("Embedding missing from batched response"))
+                else:
+                    future.set_result(vector)
+            self.stats["texts_embedded"] += len(texts)
+        except Exception as e:
+            if len(texts) > 1 and _is_rejected_input(e):
+                # Bisect so a rejected input only fails its own caller, not the unrelated texts coalesced with it
+                self.stats["split_batches"] += 1
+                middle = len(texts) // 2
+                await asyncio.gather(self._request(texts[:middle], batch), self._request(texts[middle:], batch))
+                return
+            self.stats["errors"] += 1
+            logger.error(f"Batched embedding request failed ({len(texts)} texts): {e}")
+            for text in texts:
+                future = batch[text]
+                if not future.done():
+                    future.set_exception(e)
+                    # Callers retrieve through shield(); mark retrieved to avoid noisy warnings
+                    future.exception()
+            return
+        
+        # Every caller already has its vector; a failed cache write only costs a future re-embed
+        try:
+            await self.cache.put_many({text: vector for text, vector in zip(texts, vectors) if vector is not None})
+        except Exception as e:
+            self.stats["cache_write_errors"] += 1
+            logger.warning(f"Could not cache {len(texts)} embeddings: {e}")
+
+
+# Shared instance
+_embedding_service: Optional[EmbeddingService] = None
+
+
+def get_embedding_service(openai_client: Optional[Any] = None, db_pool: Optional[Any] = None) -> EmbeddingService:
+    """Return the process-wide embedding service, creating it on first use"""
+    global _embedding_service
+    if _embedding_service is None:
+        _embedding_service = EmbeddingService(openai_client, db_pool=db_pool)
+    else:
+        _embedding_service.attach_client(openai_client)
+        _embedding_service.attach_pool(db_pool)
+    return _embedding_service
+
+
+def get_embedding_stats() -> Optional[Dict[str, Any]]:
+    """Batching and cache metrics for monitoring, or None before the first embedding request"""
+    return _embedding_service.get_stats() if _embedding_service is not None else None
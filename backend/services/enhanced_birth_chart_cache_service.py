@@ -3,12 +3,11 @@ Enhanced Birth Chart Caching Service
 Handles caching of birth chart data + PDF reports + AI-generated Swamiji readings
 """
 
-import hashlib
 import json
+import asyncio
 import asyncpg
-import httpx
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, AsyncIterator, Callable, Optional, List, Tuple
 import logging
 import os
 from pathlib import Path
@@ -20,93 +19,119 @@ try:
 except ImportError:
     OPENAI_AVAILABLE = False
 
+from services.birth_chart_store import (
+    PAYLOAD_KEYS, generate_birth_details_hash, get_birth_chart_store, stored_reference
+)
+from services.chart_generation_flights import get_chart_generation_flights
+from services.profile_pipeline import (
+    PROFILE_CHART_TIMEOUT_SECONDS, PROFILE_READING_TIMEOUT_SECONDS, PROFILE_REPORTS_TIMEOUT_SECONDS,
+    ProfilePipeline, Stage, get_profile_stage_metrics
+)
+from services.prokerala_client import get_prokerala_client
+from services.prokerala_token_manager import get_prokerala_token_manager
+from services.gazetteer import prokerala_params
+from services.sidereal_ephemeris import birth_moment, get_sidereal_ephemeris, offline_payload_for
+
 logger = logging.getLogger(__name__)
 
+# Sections of a complete profile, in the order they usually become available
+PROFILE_SECTIONS = ('birth_chart', 'pdf_reports', 'swamiji_reading')
+
+# Stand-in readings ask the user to try again, so they must never be cached
+FALLBACK_READINGS = frozenset({'timeout_fallback', 'error_fallback', 'service_unavailable'})
+
 class ProkeralaPDFProcessor:
     """Process PDF reports from Prokerala API"""
     
+    # Prokerala PDF report endpoints (these are the actual available endpoints)
+    PDF_ENDPOINTS = {
+        'basic_prediction': '/v2/astrology/basic-prediction',
+        'detailed_horoscope': '/v2/astrology/birth-details',  # This gives detailed text
+        'planetary_positions': '/v2/astrology/planet-position',
+        'house_cusps': '/v2/astrology/house-cusps',
+        'dasha_periods': '/v2/astrology/current-dasha'
+    }
+    
     def __init__(self, client_id: str, client_secret: str):
         self.client_id = client_id
         self.client_secret = client_secret
-        self.token = None
-        self.token_expiry = 0
     
     async def get_token(self) -> str:
-        """Get valid Prokerala API token"""
-        if not self.token or datetime.now().timestamp() > self.token_expiry:
-            await self._refresh_token()
-        return self.token or ""
+        """Get valid Prokerala API token (shared, single-flight token manager)"""
+        return await get_prokerala_token_manager(self.client_id, self.client_secret).get_token()
     
-    async def _refresh_token(self):
-        """Refresh Prokerala API token"""
-        try:
-            async with httpx.AsyncClient() as client:
-                data = {
-                    "grant_type": "client_credentials",
-                    "client_id": self.client_id,
-                    "client_secret": self.client_secret
-                }
-                response = await client.post("https://api.prokerala.com/token", data=data)
-                response.raise_for_status()
-                token_data = response.json()
-                self.token = token_data["access_token"]
-                self.token_expiry = datetime.now().timestamp() + token_data.get("expires_in", 3600) - 60
-        except Exception as e:
-            logger.error(f"Token refresh failed: {e}")
-            raise
+    def _report_params(self, birth_details: Dict[str, Any]) -> Dict[str, Any]:
+        datetime_str, coordinates, _ = prokerala_params(birth_details)  # Offline gazetteer
+        return {
+            "datetime": datetime_str,
+            "coordinates": coordinates,
+            "ayanamsa": "1"
+        }
     
     async def fetch_pdf_reports(self, birth_details: Dict[str, Any]) -> Dict[str, Any]:
         """Fetch available PDF reports from Prokerala API"""
         reports = {}
         
-        # Prokerala PDF report endpoints (these are the actual available endpoints)
-        pdf_endpoints = {
-            'basic_prediction': '/v2/astrology/basic-prediction',
-            'detailed_horoscope': '/v2/astrology/birth-details',  # This gives detailed text
-            'planetary_positions': '/v2/astrology/planet-position',
-            'house_cusps': '/v2/astrology/house-cusps',
-            'dasha_periods': '/v2/astrology/current-dasha'
-        }
-        
-        token = await self.get_token()
-        headers = {"Authorization": f"Bearer {token}"}
+        await self.get_token()  # Warm the shared token (and register our credentials)
         
         # Prepare parameters
-        datetime_str = f"{birth_details['date']}T{birth_details['time']}:00+05:30"
-        coordinates = "9.66845,80.00742"  # Default coordinates
+        params = self._report_params(birth_details)
         
-        params = {
-            "datetime": datetime_str,
-            "coordinates": coordinates,
-            "ayanamsa": "1"
-        }
+        client = get_prokerala_client()
         
-        async with httpx.AsyncClient() as client:
-            for report_type, endpoint in pdf_endpoints.items():
-                try:
-                    response = await client.get(
-                        f"https://api.prokerala.com{endpoint}",
-                        headers=headers,
-                        params=params
-                    )
+        async def fetch_report(report_type: str, endpoint: str):
+            try:
+                response = await client.api_get(f"https://api.prokerala.com{endpoint}", params=params)
+                
+                if response.status_code == 200:
+                    report_data = response.json()
+                    if report_data.get('data'):
+                        reports[report_type] = {
+                            'data': report_data['data'],
+                            'text_content': self._extract_text_from_data(report_data['data']),
+                            'structured_data': report_data['data'],
+                            'generated_at': datetime.now().isoformat(),
+                            'endpoint': endpoint
+                        }
+                else:
+                    logger.warning(f"Failed to fetch {report_type}: {response.status_code}")
                     
-                    if response.status_code == 200:
-                        report_data = response.json()
-                        if report_data.get('data'):
-                            reports[report_type] = {
-                                'data': report_data['data'],
-                                'text_content': self._extract_text_from_data(report_data['data']),
-                                'structured_data': report_data['data'],
-                                'generated_at': datetime.now().isoformat(),
-                                'endpoint': endpoint
-                            }
-                    else:
-                        logger.warning(f"Failed to fetch {report_type}: {response.status_code}")
-                        
-                except Exception as e:
-                    logger.error(f"Error fetching {report_type}: {e}")
+            except Exception as e:
+                logger.error(f"Error fetching {report_type}: {e}")
         
-        return reports
+        # Reports are independent, so fetch them concurrently (rate limited by the shared client)
+        await client.gather({
+            report_type: (lambda report_type=report_type, endpoint=endpoint: fetch_report(report_type, endpoint))
+            for report_type, endpoint in self.PDF_ENDPOINTS.items()
+        })
+        # Reports the API could not deliver are computed offline where the ephemeris covers them
+        return self.offline_reports(birth_details, reports)
+    
+    def offline_reports(self, birth_details: Dict[str, Any],
+                        reports: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Fill the reports missing from ``reports`` with the offline ephemeris, in endpoint order"""
+        reports = dict(reports or {})
+        params = self._report_params(birth_details)
+        for report_type, endpoint in self.PDF_ENDPOINTS.items():
+            if report_type in reports:
+                continue
+            try:
+                payload = offline_payload_for(endpoint, params)
+            except Exception as e:
+                logger.warning(f"Offline {report_type} unavailable: {e}")
+                payload = None
+            if payload:
+                reports[report_type] = {
+                    'data': payload['data'],
+                    'text_content': self._extract_text_from_data(payload['data']),
+                    'structured_data': payload['data'],
+                    'generated_at': datetime.now().isoformat(),
+                    'endpoint': endpoint,
+                    'source': 'offline_ephemeris'
+                }
+        
+        # Keep the endpoint order regardless of which response arrived first
+        return {report_type: reports[report_type] for report_type in self.PDF_ENDPOINTS if report_type in reports}
     
     def _extract_text_from_data(self, data: Dict[str, Any]) -> str:
         """Extract meaningful text from structured data for RAG processing"""
@@ -146,18 +171,12 @@ class EnhancedBirthChartCacheService:
         else:
             self.openai_client = None
             logger.warning("OpenAI not available for AI readings")
+        
+        self.store = get_birth_chart_store()
     
     def generate_birth_details_hash(self, birth_details: Dict[str, Any]) -> str:
         """Generate unique hash for birth details"""
-        normalized_data = {
-            'date': birth_details.get('date', ''),
-            'time': birth_details.get('time', ''),
-            'location': birth_details.get('location', '').lower().strip(),
-            'timezone': birth_details.get('timezone', 'Asia/Colombo')
-        }
-        
-        normalized_string = json.dumps(normalized_data, sort_keys=True)
-        return hashlib.sha256(normalized_string.encode()).hexdigest()
+        return generate_birth_details_hash(birth_details)
     
     async def get_cached_complete_profile(self, user_email: str, birth_details: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Get complete cached profile including birth chart + PDF reports + AI reading"""
@@ -166,6 +185,14 @@ class EnhancedBirthChartCacheService:
         try:
             birth_hash = self.generate_birth_details_hash(birth_details)
             conn = await asyncpg.connect(self.db_url)
+            # Shared store first: anyone with the same birth details may have generated it
+            stored = await self.store.get(conn, birth_hash, payloads=('profile_data',))
+            if stored and stored['profile_data']:
+                await self.store.link_user(conn, user_email, birth_details,
+                                           stored['cached_at'], stored['expires_at'], kind='profile')
+                logger.info(f"✅ Complete profile store HIT for user {user_email}")
+                return self._cached_profile_response(stored['profile_data'], stored['cached_at'], stored['expires_at'])
+            
             result = await conn.fetchrow("""
                 SELECT birth_chart_data, birth_chart_cached_at, birth_chart_expires_at
                 FROM users 
@@ -174,78 +201,195 @@ class EnhancedBirthChartCacheService:
                 AND birth_chart_expires_at > NOW()
                 AND birth_chart_data IS NOT NULL
             """, user_email, birth_hash)
+            cached_data = await self.store.resolve_user_data(conn, result['birth_chart_data']) if result else None
         except Exception as e:
             logger.error(f"Error getting cached profile: {e}")
             return None
         finally:
             if conn:
                 await conn.close()
-        if result:
+        if cached_data:
             logger.info(f"✅ Complete profile cache HIT for user {user_email}")
-            cached_data = result['birth_chart_data']
-            return {
-                'birth_chart': cached_data.get('birth_chart', {}),
-                'pdf_reports': cached_data.get('pdf_reports', {}),
-                'swamiji_reading': cached_data.get('swamiji_reading', {}),
-                'cached_at': result['birth_chart_cached_at'],
-                'expires_at': result['birth_chart_expires_at'],
-                'cache_hit': True
-            }
+            return self._cached_profile_response(cached_data, result['birth_chart_cached_at'],
+                                                 result['birth_chart_expires_at'])
         else:
             logger.info(f"❌ Complete profile cache MISS for user {user_email}")
             return None
+    
+    def _cached_profile_response(self, cached_data: Dict[str, Any], cached_at, expires_at) -> Dict[str, Any]:
+        return {
+            'birth_chart': cached_data.get('birth_chart', {}),
+            'pdf_reports': cached_data.get('pdf_reports', {}),
+            'swamiji_reading': cached_data.get('swamiji_reading', {}),
+            'cached_at': cached_at,
+            'expires_at': expires_at,
+            'cache_hit': True
+        }
+    
+    async def link_stored_chart(self, user_email: str, birth_details: Dict[str, Any],
+                                extra: Optional[Dict[str, Any]] = None,
+                                require_profile: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Reference the shared chart for these birth details from the user's row.
+        Returns the linked profile, or None when nothing (or, with
+        ``require_profile``, no complete profile) is stored for them yet.
+        """
+        conn = None
+        try:
+            conn = await asyncpg.connect(self.db_url)
+            stored = await self.store.get(conn, self.generate_birth_details_hash(birth_details),
+                                          payloads=('profile_data',) if require_profile else PAYLOAD_KEYS)
+            if not stored or not (stored['profile_data'] or (not require_profile and stored['chart_data'])):
+                return None
+            kind = 'profile' if stored['profile_data'] else 'chart'
+            profile = stored['profile_data'] or {'birth_chart': stored['chart_data']}
+            profile = {**profile, **(extra or {})}
+            await self.store.link_user(conn, user_email, birth_details,
+                                       stored['cached_at'], stored['expires_at'], kind=kind, extra=extra)
+            return profile
+        except Exception as e:
+            logger.error(f"Error linking stored chart: {e}")
+            return None
+        finally:
+            if conn:
+                await conn.close()
                 
     async def generate_and_cache_complete_profile(self, user_email: str, birth_details: Dict[str, Any]) -> Dict[str, Any]:
         """Generate complete profile: birth chart + PDF reports + AI reading and cache it"""
         try:
-            logger.info(f"🚀 Generating complete profile for {user_email}")
+            # Someone with the same birth details already paid for this profile
+            stored_profile = await self._reuse_stored_profile(user_email, birth_details)
+            if stored_profile:
+                return stored_profile
             
-            # Step 1: Get birth chart data from Prokerala
-            birth_chart_data = await self._fetch_birth_chart_data(birth_details)
-            
-            # Step 2: Get PDF reports from Prokerala  
-            pdf_reports = await self.pdf_processor.fetch_pdf_reports(birth_details)
-            
-            # Step 3: Generate AI reading with Swamiji's persona
-            swamiji_reading = await self._generate_swamiji_reading(birth_chart_data, pdf_reports, birth_details)
-            
-            # Step 4: Cache the complete profile
-            complete_profile = {
-                'birth_chart': birth_chart_data,
-                'pdf_reports': pdf_reports,
-                'swamiji_reading': swamiji_reading,
-                'generated_at': datetime.now().isoformat(),
-                'data_sources': {
-                    'birth_chart': 'Prokerala API v2/astrology/birth-details + chart',
-                    'pdf_reports': list(pdf_reports.keys()),
-                    'ai_reading': 'OpenAI + Swamiji RAG Knowledge',
-                    'total_api_calls': len(pdf_reports) + 2  # birth chart + chart + PDF reports
-                }
-            }
-            
-            success = await self._cache_complete_profile(user_email, birth_details, complete_profile)
-            
-            if success:
-                logger.info(f"✅ Complete profile cached for {user_email}")
-                complete_profile['cached'] = True
-            else:
-                logger.error(f"❌ Failed to cache profile for {user_email}")
-                complete_profile['cached'] = False
-            
-            return complete_profile
+            # Concurrent requests for the same birth details share one generation
+            return await get_chart_generation_flights().run(
+                f"complete_profile:{self.generate_birth_details_hash(birth_details)}",
+                lambda: self._generate_complete_profile(user_email, birth_details),
+                recheck=lambda: self._reuse_stored_profile(user_email, birth_details)
+            )
             
         except Exception as e:
             logger.error(f"Error generating complete profile: {e}")
             raise
     
+    async def _reuse_stored_profile(self, user_email: str, birth_details: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        stored_profile = await self.link_stored_chart(user_email, birth_details, require_profile=True)
+        if stored_profile:
+            logger.info(f"✅ Reusing stored complete profile for {user_email}")
+            return {**stored_profile, 'cached': True, 'shared_cache_hit': True}
+        return None
+    
+    async def stream_complete_profile(self, user_email: str,
+                                      birth_details: Dict[str, Any]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Same as generate_and_cache_complete_profile, but yields each section as it
+        is ready: ``(stage name, partial profile)`` for birth_chart, pdf_reports and
+        swamiji_reading, then ``('profile', complete profile)``. A request that joins
+        a generation already in flight (or hits the store) only gets the last event.
+        """
+        stored_profile = await self._reuse_stored_profile(user_email, birth_details)
+        if stored_profile:
+            yield 'profile', stored_profile
+            return
+        
+        stages: asyncio.Queue = asyncio.Queue()
+        generation = asyncio.ensure_future(get_chart_generation_flights().run(
+            f"complete_profile:{self.generate_birth_details_hash(birth_details)}",
+            lambda: self._generate_complete_profile(
+                user_email, birth_details, on_stage=lambda stage, results: stages.put_nowait((stage, results))),
+            recheck=lambda: self._reuse_stored_profile(user_email, birth_details)
+        ))
+        next_stage = None
+        try:
+            while True:
+                next_stage = asyncio.ensure_future(stages.get())
+                await asyncio.wait({next_stage, generation}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_stage.done():
+                    break
+                yield self._partial_profile(*next_stage.result())
+            while not stages.empty():
+                yield self._partial_profile(*stages.get_nowait())
+            yield 'profile', generation.result()
+        finally:
+            # Only this caller stops waiting; the shared generation runs on and gets cached
+            for task in (next_stage, generation):
+                if task is not None and not task.done():
+                    task.cancel()
+    
+    def _partial_profile(self, stage: str, results: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        return stage, {
+            'profile': dict(results),
+            'pending': [name for name in PROFILE_SECTIONS if name not in results]
+        }
+    
+    def _profile_pipeline(self, birth_details: Dict[str, Any]) -> ProfilePipeline:
+        """Chart and reports run concurrently; the reading starts once both are in"""
+        return ProfilePipeline([
+            Stage('birth_chart', lambda results: self._fetch_birth_chart_data(birth_details),
+                  timeout=PROFILE_CHART_TIMEOUT_SECONDS,
+                  fallback=lambda results, e: self._offline_birth_chart_data(birth_details)),
+            Stage('pdf_reports', lambda results: self.pdf_processor.fetch_pdf_reports(birth_details),
+                  timeout=PROFILE_REPORTS_TIMEOUT_SECONDS,
+                  fallback=lambda results, e: self.pdf_processor.offline_reports(birth_details)),
+            Stage('swamiji_reading',
+                  lambda results: self._generate_swamiji_reading(results['birth_chart'], results['pdf_reports'],
+                                                                 birth_details),
+                  after=('birth_chart', 'pdf_reports'), timeout=PROFILE_READING_TIMEOUT_SECONDS,
+                  fallback=lambda results, e: self._reading_fallback(e)),
+        ], metrics=get_profile_stage_metrics())
+    
+    async def _generate_complete_profile(self, user_email: str, birth_details: Dict[str, Any],
+                                         on_stage: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        logger.info(f"🚀 Generating complete profile for {user_email}")
+        
+        # Steps 1-3: birth chart and PDF reports from Prokerala side by side, then the
+        # AI reading with Swamiji's persona once both are available
+        results = {}
+        async for stage, results in self._profile_pipeline(birth_details).stream():
+            if on_stage is not None:
+                on_stage(stage, results)
+        birth_chart_data = results['birth_chart']
+        pdf_reports = results['pdf_reports']
+        swamiji_reading = results['swamiji_reading']
+        
+        # Step 4: Cache the complete profile
+        complete_profile = {
+            'birth_chart': birth_chart_data,
+            'pdf_reports': pdf_reports,
+            'swamiji_reading': swamiji_reading,
+            'generated_at': datetime.now().isoformat(),
+            'data_sources': {
+                'birth_chart': 'Prokerala API v2/astrology/birth-details + chart',
+                'pdf_reports': list(pdf_reports.keys()),
+                'ai_reading': 'OpenAI + Swamiji RAG Knowledge',
+                'total_api_calls': len(pdf_reports) + 2  # birth chart + chart + PDF reports
+            }
+        }
+        
+        if swamiji_reading.get('generated_with') in FALLBACK_READINGS:
+            # Caching this would serve the apology to every later request for these birth details
+            logger.warning(f"⚠️ Not caching profile for {user_email}: reading was a fallback")
+            complete_profile['cached'] = False
+            return complete_profile
+        
+        success = await self._cache_complete_profile(user_email, birth_details, complete_profile)
+        
+        if success:
+            logger.info(f"✅ Complete profile cached for {user_email}")
+            complete_profile['cached'] = True
+        else:
+            logger.error(f"❌ Failed to cache profile for {user_email}")
+            complete_profile['cached'] = False
+        
+        return complete_profile
+    
     async def _fetch_birth_chart_data(self, birth_details: Dict[str, Any]) -> Dict[str, Any]:
         """Fetch birth chart data from Prokerala API (existing logic)"""
         try:
-            token = await self.pdf_processor.get_token()
-            headers = {"Authorization": f"Bearer {token}"}
+            await self.pdf_processor.get_token()  # Warm the shared token (and register our credentials)
             
-            datetime_str = f"{birth_details['date']}T{birth_details['time']}:00+05:30"
-            coordinates = "9.66845,80.00742"
+            datetime_str, coordinates, _ = prokerala_params(birth_details)
             
             params = {
                 "datetime": datetime_str,
@@ -255,37 +399,52 @@ class EnhancedBirthChartCacheService:
             
             chart_data = {}
             
-            async with httpx.AsyncClient() as client:
-                # Get basic birth details
-                basic_resp = await client.get(
-                    "https://api.prokerala.com/v2/astrology/birth-details",
-                    headers=headers,
-                    params=params
-                )
-                
-                if basic_resp.status_code == 200:
-                    basic_data = basic_resp.json()
-                    if "data" in basic_data:
-                        chart_data.update(basic_data["data"])
-                
-                # Get chart visualization
-                chart_params = {**params, "chart_type": "rasi", "chart_style": "north-indian", "format": "json"}
-                chart_resp = await client.get(
-                    "https://api.prokerala.com/v2/astrology/chart",
-                    headers=headers,
-                    params=chart_params
-                )
-                
-                if chart_resp.status_code == 200:
-                    chart_visual_data = chart_resp.json()
-                    if "data" in chart_visual_data:
-                        chart_data["chart_visualization"] = chart_visual_data["data"]
+            client = get_prokerala_client()
+            chart_params = {**params, "chart_type": "rasi", "chart_style": "north-indian", "format": "json"}
             
+            # Birth details and chart visualization are independent - request both at once
+            responses = await client.gather({
+                "basic": lambda: client.api_get("https://api.prokerala.com/v2/astrology/birth-details", params=params),
+                "chart": lambda: client.api_get("https://api.prokerala.com/v2/astrology/chart", params=chart_params),
+            })
+            for response in responses.values():
+                if isinstance(response, Exception):
+                    raise response
+            basic_resp, chart_resp = responses["basic"], responses["chart"]
+            
+            # Get basic birth details
+            if basic_resp.status_code == 200:
+                basic_data = basic_resp.json()
+                if "data" in basic_data:
+                    chart_data.update(basic_data["data"])
+            
+            # Get chart visualization
+            if chart_resp.status_code == 200:
+                chart_visual_data = chart_resp.json()
+                if "data" in chart_visual_data:
+                    chart_data["chart_visualization"] = chart_visual_data["data"]
+            
+            if not chart_data:
+                raise Exception(f"Prokerala returned {basic_resp.status_code}/{chart_resp.status_code}")
             return chart_data
             
         except Exception as e:
-            logger.error(f"Birth chart data fetch failed: {e}")
-            raise
+            logger.error(f"Birth chart data fetch failed, using offline ephemeris: {e}")
+            return self._offline_birth_chart_data(birth_details)
+    
+    def _offline_birth_chart_data(self, birth_details: Dict[str, Any]) -> Dict[str, Any]:
+        """Same shape as _fetch_birth_chart_data, computed by the offline ephemeris"""
+        engine = get_sidereal_ephemeris()
+        chart = engine.compute_chart(*birth_moment(birth_details))
+        return {
+            **chart['birth_details'],
+            'chart_visualization': {
+                'houses': engine.south_indian_houses(chart),
+                'chart_style': 'south-indian',
+                'chart_type': 'rasi'
+            },
+            'data_source': 'offline_ephemeris'
+        }
     
     async def _generate_swamiji_reading(self, birth_chart_data: Dict[str, Any], 
                                        pdf_reports: Dict[str, Any], 
@@ -350,6 +509,17 @@ class EnhancedBirthChartCacheService:
                 'generated_with': 'error_fallback'
             }
     
+    def _reading_fallback(self, error: BaseException) -> Dict[str, Any]:
+        """Stand-in reading when generation outlives its stage timeout"""
+        return {
+            'reading': 'Swamiji\'s personalized reading is taking longer than usual. Please try again shortly.',
+            'personality_insights': ['Reading generation timed out'],
+            'spiritual_guidance': ['Please try again shortly'],
+            'practical_advice': ['Service temporarily slow'],
+            'generated_at': datetime.now().isoformat(),
+            'generated_with': 'timeout_fallback' if isinstance(error, asyncio.TimeoutError) else 'error_fallback'
+        }
+    
     def _build_swamiji_prompt(self, birth_chart_data: Dict[str, Any], 
                               pdf_reports: Dict[str, Any], 
                               birth_details: Dict[str, Any]) -> str:
@@ -440,8 +610,11 @@ Make it personal and practical for daily life.
         return advice[:3]  # Top 3 practical advice points
     
     async def _cache_complete_profile(self, user_email: str, birth_details: Dict[str, Any], 
-                                     complete_profile: Dict[str, Any]) -> bool:
-        """Cache complete profile to database"""
+                                     complete_profile: Dict[str, Any], share: bool = True) -> bool:
+        """
+        Cache complete profile to database. ``share`` also publishes it to the
+        shared store; only server-generated profiles may be shared.
+        """
         try:
             birth_hash = self.generate_birth_details_hash(birth_details)
             cached_at = datetime.now()
@@ -451,6 +624,13 @@ Make it personal and practical for daily life.
             try:
                 conn = await asyncpg.connect(self.db_url)
                 
+                # Shared profiles are referenced from the user row; private ones are kept inline
+                user_data = complete_profile
+                if share:
+                    stored = await self.store.put(conn, birth_details, profile_data=complete_profile)
+                    cached_at, expires_at = stored['cached_at'], stored['expires_at']
+                    user_data = stored_reference(birth_hash, 'profile')
+                
                 # Use PostgreSQL UPSERT (INSERT ... ON CONFLICT) instead of INSERT OR REPLACE
                 await conn.execute("""
                     INSERT INTO users 
@@ -470,7 +650,7 @@ Make it personal and practical for daily life.
                     name = $10
                 """, 
                 user_email,
-                json.dumps(complete_profile),
+                json.dumps(user_data),
                 birth_hash,
                 cached_at,
                 expires_at,
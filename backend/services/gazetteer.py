@@ -0,0 +1,412 @@
+"""
+Gazetteer - offline birth location -> coordinates and UTC offset
+
+Charts need the birth place's coordinates and the UTC offset that was in force
+at the birth moment. Both come from a local city index instead of a geocoding
+call:
+
+- ``assets/gazetteer/cities.tsv`` is the editable source (one city per line,
+  with aliases such as Madras/Chennai or Yalpanam/Jaffna).
+- ``cities.idx`` is compiled from it (``python -m services.gazetteer build``):
+  one line per normalized name, sorted, so lookups are a binary search over
+  the memory-mapped file with no parsing at startup. Pass ``--geonames
+  cities15000.txt`` to merge a GeoNames dump for worldwide coverage.
+- Offsets are resolved through the IANA database (zoneinfo, pytz as
+  fallback), so historic changes such as Sri Lanka's +06:00 / +06:30 years
+  (1996-2006) are honoured.
+"""
+
+import os
+import re
+import csv
+import mmap
+import logging
+import difflib
+import unicodedata
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+    ZONEINFO_AVAILABLE = True
+except ImportError:
+    ZONEINFO_AVAILABLE = False
+
+try:
+    import pytz
+    PYTZ_AVAILABLE = True
+except ImportError:
+    PYTZ_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+GAZETTEER_DIR = os.getenv("GAZETTEER_DIR", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "gazetteer"))
+GAZETTEER_SOURCE = os.path.join(GAZETTEER_DIR, "cities.tsv")
+GAZETTEER_INDEX = os.path.join(GAZETTEER_DIR, "cities.idx")
+
+# Used when the location is empty or unknown: the app's historical default
+DEFAULT_PLACE_NAME = "Jaffna"
+DEFAULT_LATITUDE = 9.66845
+DEFAULT_LONGITUDE = 80.00742
+DEFAULT_TIMEZONE = "Asia/Colombo"
+DEFAULT_UTC_OFFSET = timedelta(hours=5, minutes=30)
+
+FUZZY_MIN_RATIO = 0.82
+_FUZZY_SCAN_LIMIT = 4000
+
+COUNTRY_NAMES = {
+    "LK": ["sri lanka", "ceylon", "lanka", "srilanka"], "IN": ["india", "bharat"],
+    "MV": ["maldives"], "NP": ["nepal"], "BD": ["bangladesh"], "PK": ["pakistan"],
+    "SG": ["singapore"], "MY": ["malaysia"], "MM": ["myanmar", "burma"], "TH": ["thailand"],
+    "ID": ["indonesia"], "HK": ["hong kong"], "JP": ["japan"],
+    "AE": ["united arab emirates", "uae"], "QA": ["qatar"], "OM": ["oman"], "KW": ["kuwait"],
+    "SA": ["saudi arabia", "ksa"], "BH": ["bahrain"],
+    "GB": ["united kingdom", "uk", "england", "scotland", "wales", "great britain", "britain"],
+    "FR": ["france"], "DE": ["germany", "deutschland"], "CH": ["switzerland"], "NO": ["norway"],
+    "DK": ["denmark"], "SE": ["sweden"], "NL": ["netherlands", "holland"], "IT": ["italy"],
+    "CA": ["canada"], "US": ["united states", "usa", "us", "united states of america", "america"],
+    "AU": ["australia"], "NZ": ["new zealand"], "FJ": ["fiji"], "MU": ["mauritius"],
+    "RE": ["reunion"], "ZA": ["south africa"], "KE": ["kenya"], "GY": ["guyana"],
+    "TT": ["trinidad and tobago", "trinidad"],
+}
+_COUNTRY_BY_NAME = {name: code for code, names in COUNTRY_NAMES.items() for name in names}
+
+
+def normalize_place(text: Any) -> str:
+    """Lowercase ASCII with single spaces: 'Zürich ' -> 'zurich', 'Dehiwala-Mount Lavinia' -> 'dehiwala mount lavinia'"""
+    folded = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", " ", folded.lower()).strip()
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    admin: str
+    country: str
+    latitude: float
+    longitude: float
+    timezone: str
+    population: int = 0
+
+    def utc_offset(self, local: datetime) -> timedelta:
+        """Offset in force at the local (wall clock) birth moment"""
+        return utc_offset(self.timezone, local)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "admin": self.admin, "country": self.country,
+                "latitude": self.latitude, "longitude": self.longitude, "timezone": self.timezone}
+
+
+def utc_offset(tz_name: str, local: datetime) -> timedelta:
+    """UTC offset of ``tz_name`` at a naive local time, from the IANA history"""
+    local = local.replace(tzinfo=None)
+    if ZONEINFO_AVAILABLE:
+        try:
+            return local.replace(tzinfo=ZoneInfo(tz_name)).utcoffset()
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    if PYTZ_AVAILABLE:
+        try:
+            return pytz.timezone(tz_name).localize(local).utcoffset()
+        except pytz.UnknownTimeZoneError:
+            pass
+    logger.warning(f"No timezone data for {tz_name}, using +05:30")
+    return DEFAULT_UTC_OFFSET
+
+
+def format_offset(offset: timedelta) -> str:
+    """timedelta -> '+05:30' (Prokerala / ISO 8601 form)"""
+    minutes = int(offset.total_seconds() // 60)
+    sign = "+" if minutes >= 0 else "-"
+    return f"{sign}{abs(minutes) // 60:02d}:{abs(minutes) % 60:02d}"
+
+
+class Gazetteer:
+    """Sorted, memory-mapped city index with exact, prefix and fuzzy lookup"""
+
+    def __init__(self, index_path: str = GAZETTEER_INDEX):
+        self.index_path = index_path
+        self._mm: Optional[mmap.mmap] = None
+        self._file = None
+
+    def _map(self) -> Optional[mmap.mmap]:
+        if self._mm is None:
+            try:
+                self._file = open(self.index_path, "rb")
+                self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Gazetteer index unavailable at {self.index_path}: {e}")
+                return None
+        return self._mm
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+            self._mm = None
+
+    def _lower_bound(self, mm: mmap.mmap, key: bytes) -> int:
+        """Offset of the first line whose key is >= ``key``"""
+        lo, hi = 0, len(mm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = max(lo, mm.rfind(b"\n", lo, mid) + 1)
+            end = mm.find(b"\n", start)
+            end = len(mm) if end < 0 else end
+            if mm[start:mm.find(b"\t", start, end)] < key:
+                lo = end + 1
+            else:
+                hi = start
+        return lo
+
+    def _scan(self, prefix: str, limit: int) -> Iterable[Tuple[str, Place]]:
+        """(key, place) for keys starting with ``prefix``, in key order"""
+        mm = self._map()
+        if mm is None:
+            return
+        needle = prefix.encode()
+        offset = self._lower_bound(mm, needle)
+        for _ in range(limit):
+            if offset >= len(mm):
+                return
+            end = mm.find(b"\n", offset)
+            end = len(mm) if end < 0 else end
+            line = mm[offset:end].decode()
+            offset = end + 1
+            key, _, record = line.partition("\t")
+            if not key.startswith(prefix):
+                return
+            yield key, _parse_record(record)
+
+    def lookup(self, name: str, limit: int = 10) -> List[Place]:
+        """Places whose name or alias is exactly ``name``, most populous first"""
+        key = normalize_place(name)
+        if not key:
+            return []
+        matches = []
+        for candidate, place in self._scan(key, _FUZZY_SCAN_LIMIT):
+            if candidate != key:
+                break  # Sorted: exact matches are contiguous at the lower bound
+            matches.append(place)
+        return _ranked(matches)[:limit]
+
+    def prefix(self, text: str, limit: int = 10) -> List[Place]:
+        """Autocomplete: places with a name or alias starting with ``text``"""
+        key = normalize_place(text)
+        if not key:
+            return []
+        return _ranked(place for _, place in self._scan(key, _FUZZY_SCAN_LIMIT))[:limit]
+
+    def fuzzy(self, name: str, limit: int = 5) -> List[Place]:
+        """Misspellings ('Jafna', 'Trincomali'): close names sharing the first letter"""
+        key = normalize_place(name)
+        if not key:
+            return []
+        scored = {}
+        matcher = difflib.SequenceMatcher(None, autojunk=False)
+        matcher.set_seq2(key)  # difflib caches the analysis of seq2
+        for candidate, place in self._scan(key[0], _FUZZY_SCAN_LIMIT):
+            if abs(len(candidate) - len(key)) > 3:
+                continue
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() < FUZZY_MIN_RATIO or matcher.quick_ratio() < FUZZY_MIN_RATIO:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= FUZZY_MIN_RATIO and ratio > scored.get(place, (0,))[0]:
+                scored[place] = (ratio, place.population)
+        return [place for place, _ in sorted(scored.items(), key=lambda item: item[1], reverse=True)][:limit]
+
+    def resolve(self, location: str) -> Optional[Place]:
+        """
+        Best place for free text like 'Jaffna, Sri Lanka' or 'Scarborough, ON, Canada'.
+        The first part names the city; later parts (region, country) break ties.
+        """
+        parts = [normalize_place(part) for part in str(location or "").split(",")]
+        parts = [part for part in parts if part]
+        if not parts:
+            return None
+        hints = parts[1:]
+        candidates = self.lookup(parts[0]) or self.fuzzy(parts[0])
+        if not candidates and len(parts) == 1 and " " in parts[0]:
+            # 'Jaffna Sri Lanka' without a comma: try the words before a known country
+            words = parts[0].split()
+            for cut in range(len(words) - 1, 0, -1):
+                candidates = self.lookup(" ".join(words[:cut]))
+                if candidates:
+                    hints = [" ".join(words[cut:])]
+                    break
+        if not candidates:
+            return None
+        return max(candidates, key=lambda place: (_hint_score(place, hints), place.population))
+
+
+def _parse_record(record: str) -> Place:
+    name, admin, country, latitude, longitude, tz_name, population = record.split("\t")
+    return Place(name, admin, country, float(latitude), float(longitude), tz_name, int(population or 0))
+
+
+def _ranked(places: Iterable[Place]) -> List[Place]:
+    return sorted(set(places), key=lambda place: place.population, reverse=True)
+
+
+def _hint_score(place: Place, hints: List[str]) -> int:
+    score = 0
+    for hint in hints:
+        if _COUNTRY_BY_NAME.get(hint) == place.country or hint == place.country.lower():
+            score += 2
+        elif hint and hint in (normalize_place(place.admin), normalize_place(place.admin).replace(" province", "")):
+            score += 1
+    return score
+
+
+# ---------------------------------------------------------------------------
+# Index build
+# ---------------------------------------------------------------------------
+
+def read_source(path: str = GAZETTEER_SOURCE) -> List[Dict[str, Any]]:
+    """Rows of the editable cities.tsv"""
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            name, aliases, admin, country, latitude, longitude, tz_name, population = line.rstrip("\n").split("\t")
+            rows.append({"name": name, "aliases": [a for a in aliases.split(",") if a], "admin": admin,
+                         "country": country, "latitude": float(latitude), "longitude": float(longitude),
+                         "timezone": tz_name, "population": int(population or 0)})
+    return rows
+
+
+def read_geonames(path: str, min_population: int = 15000) -> List[Dict[str, Any]]:
+    """Rows from a GeoNames citiesNNNN.txt dump (tab separated, 19 columns)"""
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for fields in csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE):
+            population = int(fields[14] or 0)
+            if population < min_population:
+                continue
+            aliases = [fields[2]] + [a for a in fields[3].split(",") if a.isascii()][:20]
+            rows.append({"name": fields[1], "aliases": aliases, "admin": fields[10], "country": fields[8],
+                         "latitude": float(fields[4]), "longitude": float(fields[5]),
+                         "timezone": fields[17], "population": population})
+    return rows
+
+
+def build_index(rows: List[Dict[str, Any]], index_path: str = GAZETTEER_INDEX) -> int:
+    """Write the sorted one-line-per-name index; returns the number of lines"""
+    lines = set()
+    for row in rows:
+        record = "\t".join([row["name"], row["admin"], row["country"], f"{row['latitude']:.5f}",
+                            f"{row['longitude']:.5f}", row["timezone"], str(row["population"])])
+        for name in [row["name"]] + row["aliases"]:
+            key = normalize_place(name)
+            if key:
+                lines.add(f"{key}\t{record}")
+    ordered = sorted(lines, key=lambda line: line.encode())
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="\n") as f:
+        f.write("\n".join(ordered))
+        f.write("\n")
+    os.replace(tmp_path, index_path)
+    return len(ordered)
+
+
+# ---------------------------------------------------------------------------
+# Birth details
+# ---------------------------------------------------------------------------
+
+def _local_moment(birth_details: Dict[str, Any]) -> Optional[datetime]:
+    time_ = str(birth_details.get("time") or "12:00")
+    if re.fullmatch(r"\d{1,2}:\d{2}", time_):
+        time_ += ":00"
+    try:
+        return datetime.fromisoformat(f"{birth_details.get('date')}T{time_}")
+    except (TypeError, ValueError):
+        return None
+
+
+def resolve_birth_place(birth_details: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Coordinates, timezone and the UTC offset at the birth moment for an app
+    ``birth_details`` dict. Explicit latitude/longitude win; otherwise the
+    location is looked up; unknown places keep the Jaffna default.
+    """
+    place = None
+    if birth_details.get("latitude") is not None and birth_details.get("longitude") is not None:
+        latitude, longitude = float(birth_details["latitude"]), float(birth_details["longitude"])
+        tz_name = birth_details.get("timezone") or DEFAULT_TIMEZONE
+        source = "provided"
+    else:
+        place = get_gazetteer().resolve(birth_details.get("location") or "")
+        if place is not None:
+            latitude, longitude, tz_name, source = place.latitude, place.longitude, place.timezone, "gazetteer"
+        else:
+            latitude, longitude, source = DEFAULT_LATITUDE, DEFAULT_LONGITUDE, "default"
+            tz_name = birth_details.get("timezone") or DEFAULT_TIMEZONE
+
+    local = _local_moment(birth_details)
+    offset = utc_offset(tz_name, local) if local is not None else DEFAULT_UTC_OFFSET
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "timezone": tz_name,
+        "utc_offset": format_offset(offset),
+        "utc_offset_minutes": int(offset.total_seconds() // 60),
+        "place": place.to_dict() if place else None,
+        "source": source,
+    }
+
+
+def prokerala_params(birth_details: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any]]:
+    """(datetime, coordinates, resolved place) in the form Prokerala expects"""
+    resolved = resolve_birth_place(birth_details)
+    time_ = str(birth_details.get("time") or "12:00")
+    if re.fullmatch(r"\d{1,2}:\d{2}", time_):
+        time_ += ":00"
+    datetime_str = f"{birth_details.get('date')}T{time_}{resolved['utc_offset']}"
+    coordinates = f"{resolved['latitude']},{resolved['longitude']}"
+    return datetime_str, coordinates, resolved
+
+
+def birth_datetime(birth_details: Dict[str, Any]) -> Optional[datetime]:
+    """Timezone-aware birth moment using the resolved historic offset"""
+    local = _local_moment(birth_details)
+    if local is None:
+        return None
+    minutes = resolve_birth_place(birth_details)["utc_offset_minutes"]
+    return local.replace(tzinfo=timezone(timedelta(minutes=minutes)))
+
+
+# Shared instance
+_gazetteer: Optional[Gazetteer] = None
+
+
+def get_gazetteer() -> Gazetteer:
+    """Return the process-wide gazetteer (the index is mapped on first lookup)"""
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = Gazetteer()
+    return _gazetteer
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Gazetteer index tools")
+    parser.add_argument("command", choices=["build", "lookup"])
+    parser.add_argument("location", nargs="?", help="Location to resolve (lookup)")
+    parser.add_argument("--geonames", help="GeoNames citiesNNNN.txt dump to merge")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        source_rows = read_source()
+        if args.geonames:
+            source_rows += read_geonames(args.geonames)
+        print(f"✅ Wrote {build_index(source_rows)} index lines to {GAZETTEER_INDEX}")
+    else:
+        if not args.location:
+            sys.exit("lookup needs a location")
+        print(resolve_birth_place({"location": args.location, "date": datetime.now().date().isoformat()}))
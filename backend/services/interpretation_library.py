@@ -0,0 +1,221 @@
+"""
+Interpretation Library - precomputed planet-in-sign / planet-in-house readings
+
+"Saturn in Capricorn" or "Mars in house 5" reads the same for every chart, so
+instead of a RAG + GPT-4 round trip per planet per chart the 228 readings
+(9 planets x 12 signs, 9 planets x 12 houses, the Ascendant in each of the 12
+signs) are generated once per language
+and persona by a batch job (warm_interpretation_library.py) and stored in the
+``interpretation_library`` table (migration 032). Charts are then assembled
+from the library with no LLM calls.
+
+Entries are versioned: bumping INTERPRETATION_LIBRARY_VERSION (new prompts, a
+new knowledge base) makes the service read a fresh set while the old rows stay
+available for rollback.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.sidereal_ephemeris import ASCENDANT, PLANETS, RASIS, ZODIAC_SIGNS
+
+logger = logging.getLogger(__name__)
+
+INTERPRETATION_LIBRARY_VERSION = int(os.getenv("INTERPRETATION_LIBRARY_VERSION", "1"))
+INTERPRETATION_LIBRARY_REFRESH_SECONDS = float(os.getenv("INTERPRETATION_LIBRARY_REFRESH_SECONDS", "3600"))
+DEFAULT_LANGUAGE = "en"
+DEFAULT_PERSONA = "astrological_interpretation"
+
+LIBRARY_PLANETS = [name for _, name, _ in PLANETS]
+# The lagna only has sign readings: it is the cusp of house 1 by definition
+LIBRARY_ASCENDANT = ASCENDANT[1]
+LIBRARY_HOUSES = list(range(1, 13))
+LANGUAGE_NAMES = {"en": "English", "ta": "Tamil", "hi": "Hindi"}
+
+# Sign spellings seen in Prokerala responses and user-entered charts
+_SIGN_ALIASES = {name.lower(): sign for name, sign in zip(RASIS, ZODIAC_SIGNS)}
+_SIGN_ALIASES.update({sign.lower(): sign for sign in ZODIAC_SIGNS})
+_SIGN_ALIASES.update({"vrushabha": "Taurus", "vrishabham": "Taurus", "karkata": "Cancer", "kataka": "Cancer",
+                      "simham": "Leo", "thula": "Libra", "vrishchika": "Scorpio", "vrischikam": "Scorpio",
+                      "dhanus": "Sagittarius", "makaram": "Capricorn", "kumbham": "Aquarius",
+                      "meenam": "Pisces", "mina": "Pisces", "mesham": "Aries", "midhuna": "Gemini"})
+_PLANET_ALIASES = {name.lower(): name for name in LIBRARY_PLANETS}
+_PLANET_ALIASES.update({vedic.lower(): name for _, name, vedic in PLANETS})
+_PLANET_ALIASES.update({LIBRARY_ASCENDANT.lower(): LIBRARY_ASCENDANT, ASCENDANT[2].lower(): LIBRARY_ASCENDANT})
+
+
+def canonical_sign(sign: Any) -> Optional[str]:
+    """English sign name for any known spelling, else None"""
+    return _SIGN_ALIASES.get(str(sign or "").strip().lower())
+
+
+def canonical_planet(planet: Any) -> Optional[str]:
+    return _PLANET_ALIASES.get(str(planet or "").strip().lower())
+
+
+def sign_key(planet: str, sign: str) -> str:
+    return f"{planet}_in_{sign}"
+
+
+def house_key(planet: str, house: int) -> str:
+    return f"{planet}_in_house_{house}"
+
+
+def sign_query(planet: str, sign: str) -> str:
+    if planet == LIBRARY_ASCENDANT:
+        return (f"In Vedic astrology, what does it mean for a person to have the Ascendant (Lagna) in {sign}? "
+                "Explain the personality and life path it shapes, and provide a wise spiritual perspective like a Swamiji.")
+    return (f"In Vedic astrology, what does it mean for a person to have {planet} in the sign of {sign}? "
+            "Explain the positive and negative traits, and provide a wise spiritual perspective like a Swamiji.")
+
+
+def house_query(planet: str, house: int) -> str:
+    return (f"In a birth chart, what are the effects of planet {planet} being in house number {house}? "
+            "Describe the impact on life areas like career, relationships, and health from a spiritual master's viewpoint.")
+
+
+def library_entries() -> List[Dict[str, Any]]:
+    """Every entry the library holds for one language and persona"""
+    entries = []
+    for planet in LIBRARY_PLANETS:
+        for sign in ZODIAC_SIGNS:
+            entries.append({"key": sign_key(planet, sign), "kind": "sign", "planet": planet,
+                            "placement": sign, "query": sign_query(planet, sign)})
+        for house in LIBRARY_HOUSES:
+            entries.append({"key": house_key(planet, house), "kind": "house", "planet": planet,
+                            "placement": str(house), "query": house_query(planet, house)})
+    for sign in ZODIAC_SIGNS:
+        entries.append({"key": sign_key(LIBRARY_ASCENDANT, sign), "kind": "sign", "planet": LIBRARY_ASCENDANT,
+                        "placement": sign, "query": sign_query(LIBRARY_ASCENDANT, sign)})
+    return entries
+
+
+def localized_query(query: str, language: str) -> str:
+    if language == DEFAULT_LANGUAGE:
+        return query
+    return f"{query} Answer in {LANGUAGE_NAMES.get(language, language)}."
+
+
+class InterpretationLibrary:
+    """Versioned interpretation entries, read from the DB once and served from memory"""
+
+    def __init__(self, version: int = INTERPRETATION_LIBRARY_VERSION,
+                 refresh_seconds: float = INTERPRETATION_LIBRARY_REFRESH_SECONDS):
+        self.version = version
+        self.refresh_seconds = refresh_seconds
+        self._entries: Dict[Tuple[str, str], Dict[str, str]] = {}
+        self._loaded_at: Dict[Tuple[str, str], float] = {}
+        self._load_lock = asyncio.Lock()
+        self.stats = {"hits": 0, "misses": 0, "loads": 0, "load_failures": 0, "stored": 0}
+
+    async def get_entries(self, language: str = DEFAULT_LANGUAGE, persona: str = DEFAULT_PERSONA,
+                          pool=None) -> Dict[str, str]:
+        """All entries for a language and persona, keyed like ``Saturn_in_Capricorn``"""
+        scope = (language, persona)
+        if self._is_fresh(scope):
+            return self._entries[scope]
+        async with self._load_lock:
+            if self._is_fresh(scope):
+                return self._entries[scope]
+            try:
+                pool = pool or self._pool()
+                async with pool.acquire() as conn:
+                    rows = await conn.fetch("""
+                        SELECT entry_key, interpretation FROM interpretation_library
+                        WHERE language = $1 AND persona = $2 AND version = $3
+                    """, language, persona, self.version)
+            except Exception as e:
+                self.stats["load_failures"] += 1
+                logger.warning(f"Interpretation library unavailable ({language}/{persona}): {e}")
+                return self._entries.get(scope, {})
+            self.stats["loads"] += 1
+            self._entries[scope] = {row["entry_key"]: row["interpretation"] for row in rows}
+            self._loaded_at[scope] = time.monotonic()
+            return self._entries[scope]
+
+    def _is_fresh(self, scope: Tuple[str, str]) -> bool:
+        loaded_at = self._loaded_at.get(scope)
+        return loaded_at is not None and time.monotonic() - loaded_at < self.refresh_seconds
+
+    async def lookup(self, keys: List[str], language: str = DEFAULT_LANGUAGE,
+                     persona: str = DEFAULT_PERSONA) -> Tuple[Dict[str, str], List[str]]:
+        """Split ``keys`` into (found interpretations, missing keys)"""
+        entries = await self.get_entries(language, persona)
+        found = {key: entries[key] for key in keys if key in entries}
+        missing = [key for key in keys if key not in entries]
+        self.stats["hits"] += len(found)
+        self.stats["misses"] += len(missing)
+        return found, missing
+
+    async def put(self, entry: Dict[str, Any], interpretation: str, language: str = DEFAULT_LANGUAGE,
+                  persona: str = DEFAULT_PERSONA, source: str = "rag", pool=None):
+        """Store one entry for the current version and make it visible in this process"""
+        pool = pool or self._pool()
+        async with pool.acquire() as conn:
+            await conn.execute("""
+                INSERT INTO interpretation_library
+                    (entry_key, kind, planet, placement, language, persona, version, interpretation, source)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+                ON CONFLICT (entry_key, language, persona, version) DO UPDATE SET
+                    interpretation = EXCLUDED.interpretation,
+                    source = EXCLUDED.source,
+                    updated_at = CURRENT_TIMESTAMP
+            """, entry["key"], entry["kind"], entry["planet"], entry["placement"],
+                language, persona, self.version, interpretation, source)
+        self.stats["stored"] += 1
+        self._entries.setdefault((language, persona), {})[entry["key"]] = interpretation
+
+    async def warm(self, generate: Callable[[str], Awaitable[Optional[str]]],
+                   language: str = DEFAULT_LANGUAGE, persona: str = DEFAULT_PERSONA,
+                   concurrency: int = 4, force: bool = False, pool=None) -> Dict[str, int]:
+        """
+        Batch job: generate and store every missing entry (all of them with ``force``).
+        ``generate`` takes the query and returns the interpretation text, or None to skip.
+        """
+        self._loaded_at.pop((language, persona), None)
+        existing = {} if force else await self.get_entries(language, persona, pool=pool)
+        pending = [entry for entry in library_entries() if entry["key"] not in existing]
+        semaphore = asyncio.Semaphore(concurrency)
+        result = {"total": len(library_entries()), "existing": len(library_entries()) - len(pending),
+                  "generated": 0, "failed": 0}
+
+        async def fill(entry):
+            async with semaphore:
+                try:
+                    text = await generate(localized_query(entry["query"], language))
+                    if not text:
+                        result["failed"] += 1
+                        return
+                    await self.put(entry, text, language, persona, pool=pool)
+                    result["generated"] += 1
+                except Exception as e:
+                    result["failed"] += 1
+                    logger.error(f"Interpretation library entry {entry['key']} failed: {e}")
+
+        await asyncio.gather(*(fill(entry) for entry in pending))
+        logger.info(f"Interpretation library v{self.version} {language}/{persona}: {result}")
+        return result
+
+    def _pool(self):
+        import db
+        return db.require_db_pool()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "version": self.version,
+                "loaded": {f"{language}/{persona}": len(entries)
+                           for (language, persona), entries in self._entries.items()}}
+
+
+# Shared instance
+_interpretation_library: Optional[InterpretationLibrary] = None
+
+
+def get_interpretation_library() -> InterpretationLibrary:
+    """Return the process-wide interpretation library"""
+    global _interpretation_library
+    if _interpretation_library is None:
+        _interpretation_library = InterpretationLibrary()
+    return _interpretation_library
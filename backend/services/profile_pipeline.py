@@ -0,0 +1,164 @@
+"""
+Profile Pipeline - dependency-ordered, concurrent profile assembly
+
+A complete profile is built from stages that declare which earlier results
+they need. Every stage whose inputs are ready runs at once (the birth chart and
+the Prokerala reports are independent; the Swamiji reading needs both), each
+under its own timeout. A stage that times out or fails is replaced by its
+fallback, so one slow upstream degrades a section of the profile instead of
+the whole request.
+
+``ProfilePipeline.stream`` yields the accumulated results after every stage,
+which lets callers show the chart while the reading is still being written.
+Per-stage latency and timeout/error counts are kept in ``ProfileStageMetrics``
+for the monitoring dashboard.
+"""
+
+import os
+import time
+import asyncio
+import inspect
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_CHART_TIMEOUT_SECONDS = float(os.getenv("PROFILE_CHART_TIMEOUT_SECONDS", "20"))
+PROFILE_REPORTS_TIMEOUT_SECONDS = float(os.getenv("PROFILE_REPORTS_TIMEOUT_SECONDS", "30"))
+PROFILE_READING_TIMEOUT_SECONDS = float(os.getenv("PROFILE_READING_TIMEOUT_SECONDS", "60"))
+PROFILE_STAGE_METRICS_WINDOW = int(os.getenv("PROFILE_STAGE_METRICS_WINDOW", "500"))
+
+
+@dataclass
+class Stage:
+    """One step of the pipeline; ``run`` and ``fallback`` receive the results of earlier stages"""
+    name: str
+    run: Callable[[Dict[str, Any]], Awaitable[Any]]
+    after: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    # (results, exception) -> replacement value; without one a failure aborts the pipeline
+    fallback: Optional[Callable[[Dict[str, Any], BaseException], Any]] = None
+
+
+def _percentiles(samples) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0, "avg": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {
+        "count": len(ordered),
+        "avg": round(sum(ordered) / len(ordered), 3),
+        "p50": round(ordered[int(last * 0.50)], 3),
+        "p95": round(ordered[int(last * 0.95)], 3),
+        "p99": round(ordered[int(last * 0.99)], 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+class ProfileStageMetrics:
+    """Latency (milliseconds, recent window) and outcome counts per stage"""
+
+    def __init__(self, window: int = PROFILE_STAGE_METRICS_WINDOW):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, stage: str, seconds: float, outcome: str = "ok"):
+        if stage not in self._samples:
+            self._samples[stage] = deque(maxlen=self.window)
+            self._counts[stage] = {"runs": 0, "ok": 0, "timeouts": 0, "errors": 0}
+        self._samples[stage].append(seconds * 1000)
+        counts = self._counts[stage]
+        counts["runs"] += 1
+        counts[{"timeout": "timeouts", "error": "errors"}.get(outcome, "ok")] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {stage: {**self._counts[stage], "latency_ms": _percentiles(samples)}
+                for stage, samples in self._samples.items()}
+
+    def reset(self):
+        self.__init__(self.window)
+
+
+class ProfilePipeline:
+    """Runs stages as soon as their dependencies finish"""
+
+    def __init__(self, stages: Iterable[Stage], metrics: Optional[ProfileStageMetrics] = None):
+        self.stages: List[Stage] = list(stages)
+        self.metrics = metrics
+        names = [stage.name for stage in self.stages]
+        if len(set(names)) != len(names):
+            raise ValueError("Duplicate stage names")
+        # Declaration order must already be a valid execution order: no cycles, no unknown inputs
+        seen = set()
+        for stage in self.stages:
+            missing = [name for name in stage.after if name not in seen]
+            if missing:
+                raise ValueError(f"Stage {stage.name!r} depends on {missing}, which are not declared before it")
+            seen.add(stage.name)
+
+    async def stream(self) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Yield ``(stage name, results so far)`` as each stage completes"""
+        started = time.perf_counter()
+        results: Dict[str, Any] = {}
+        waiting = list(self.stages)
+        running: Dict[asyncio.Task, Stage] = {}
+        try:
+            while waiting or running:
+                for stage in [stage for stage in waiting if all(name in results for name in stage.after)]:
+                    waiting.remove(stage)
+                    running[asyncio.ensure_future(self._run_stage(stage, dict(results)))] = stage
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=lambda task: self.stages.index(running[task])):
+                    stage = running.pop(task)
+                    results[stage.name] = task.result()
+                    yield stage.name, dict(results)
+            if self.metrics is not None:
+                self.metrics.record("total", time.perf_counter() - started)
+        finally:
+            # Consumer went away or a stage failed: stop whatever is still running
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    async def run(self) -> Dict[str, Any]:
+        """Results of every stage once the whole pipeline has finished"""
+        results: Dict[str, Any] = {}
+        async for _, results in self.stream():
+            pass
+        return results
+
+    async def _run_stage(self, stage: Stage, inputs: Dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        outcome, error = "ok", None
+        try:
+            value = await asyncio.wait_for(stage.run(inputs), stage.timeout)
+        except asyncio.TimeoutError as e:
+            outcome, error = "timeout", e
+            logger.warning(f"Profile stage {stage.name} timed out after {stage.timeout}s")
+        except Exception as e:
+            outcome, error = "error", e
+            logger.error(f"Profile stage {stage.name} failed: {e}")
+        if self.metrics is not None:  # Cancelled stages are not recorded
+            self.metrics.record(stage.name, time.perf_counter() - started, outcome)
+        if error is None:
+            return value
+        if stage.fallback is None:
+            raise error
+        value = stage.fallback(inputs, error)
+        return await value if inspect.isawaitable(value) else value
+
+
+# Shared instance
+_profile_stage_metrics: Optional[ProfileStageMetrics] = None
+
+
+def get_profile_stage_metrics() -> ProfileStageMetrics:
+    """Return the process-wide profile stage latency recorder"""
+    global _profile_stage_metrics
+    if _profile_stage_metrics is None:
+        _profile_stage_metrics = ProfileStageMetrics()
+    return _profile_stage_metrics
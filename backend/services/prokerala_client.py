@@ -0,0 +1,203 @@
+"""
+Prokerala Client - shared HTTP client for all Prokerala API traffic
+
+One long-lived httpx.AsyncClient (HTTP/2 when the h2 package is installed)
+keeps connections to api.prokerala.com warm instead of paying a TLS handshake
+per request. Requests run under a per-host concurrency cap and a token-bucket
+rate limiter sized to our Prokerala plan, so independent endpoint calls can be
+fired together with ``gather`` without tripping the API's rate limit. The
+``api_*`` methods authenticate with the shared ProkeralaTokenManager.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+try:
+    import h2  # noqa: F401 - enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+from services.prokerala_token_manager import get_prokerala_token_manager, get_prokerala_token_stats
+
+logger = logging.getLogger(__name__)
+
+PROKERALA_BASE_URL = os.getenv("PROKERALA_BASE_URL", "https://api.prokerala.com")
+# Requests/second and burst allowed by our Prokerala plan
+PROKERALA_RATE_LIMIT_PER_SECOND = float(os.getenv("PROKERALA_RATE_LIMIT_PER_SECOND", "5"))
+PROKERALA_RATE_LIMIT_BURST = int(os.getenv("PROKERALA_RATE_LIMIT_BURST", "5"))
+PROKERALA_MAX_CONCURRENCY = int(os.getenv("PROKERALA_MAX_CONCURRENCY", "4"))
+PROKERALA_TIMEOUT_SECONDS = float(os.getenv("PROKERALA_TIMEOUT_SECONDS", "30"))
+PROKERALA_MAX_CONNECTIONS = int(os.getenv("PROKERALA_MAX_CONNECTIONS", "20"))
+
+
+class _TokenBucket:
+    """Classic token bucket: ``rate`` tokens/second, holding at most ``capacity``"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.throttled = 0
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:  # FIFO: waiters are served in arrival order
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                self.throttled += 1
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ProkeralaClient:
+    """Pooled, rate-limited Prokerala HTTP client; one instance is shared per event loop"""
+
+    def __init__(self, base_url: str = PROKERALA_BASE_URL,
+                 rate_per_second: float = PROKERALA_RATE_LIMIT_PER_SECOND,
+                 burst: int = PROKERALA_RATE_LIMIT_BURST,
+                 max_concurrency: int = PROKERALA_MAX_CONCURRENCY,
+                 timeout: float = PROKERALA_TIMEOUT_SECONDS,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max(1, max_concurrency)
+        self._bucket = _TokenBucket(rate_per_second, burst)
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE and transport is None,
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(max_connections=PROKERALA_MAX_CONNECTIONS,
+                                max_keepalive_connections=PROKERALA_MAX_CONNECTIONS,
+                                keepalive_expiry=120.0),
+            transport=transport,
+        )
+        self._in_flight = 0
+        self.stats = {"requests": 0, "errors": 0, "peak_concurrency": 0, "total_ms": 0.0,
+                      "unauthorized_retries": 0}
+
+    @property
+    def closed(self) -> bool:
+        return self._client.is_closed
+
+    def _url(self, path_or_url: str) -> str:
+        if path_or_url.startswith(("http://", "https://")):
+            return path_or_url
+        return f"{self.base_url}/{path_or_url.lstrip('/')}"
+
+    async def request(self, method: str, path_or_url: str, token: Optional[str] = None,
+                      **kwargs) -> httpx.Response:
+        """Send one request under the host concurrency cap and the plan's rate limit"""
+        url = self._url(path_or_url)
+        if token:
+            kwargs["headers"] = {**kwargs.get("headers", {}), "Authorization": f"Bearer {token}"}
+        host = urlsplit(url).netloc
+        limit = self._host_limits.setdefault(host, asyncio.Semaphore(self.max_concurrency))
+
+        async with limit:
+            await self._bucket.acquire()
+            self._in_flight += 1
+            self.stats["peak_concurrency"] = max(self.stats["peak_concurrency"], self._in_flight)
+            start = time.perf_counter()
+            try:
+                return await self._client.request(method, url, **kwargs)
+            except Exception:
+                self.stats["errors"] += 1
+                raise
+            finally:
+                self._in_flight -= 1
+                self.stats["requests"] += 1
+                self.stats["total_ms"] += (time.perf_counter() - start) * 1000
+
+    async def api_request(self, method: str, path_or_url: str, **kwargs) -> httpx.Response:
+        """Authenticated request using the shared token; a 401 forces one refresh and retry"""
+        tokens = get_prokerala_token_manager()
+        token = await tokens.get_token()
+        response = await self.request(method, path_or_url, token, **kwargs)
+        if response.status_code == 401:
+            self.stats["unauthorized_retries"] += 1
+            token = await tokens.force_refresh(token)
+            response = await self.request(method, path_or_url, token, **kwargs)
+        return response
+
+    async def api_get(self, path_or_url: str, **kwargs) -> httpx.Response:
+        return await self.api_request("GET", path_or_url, **kwargs)
+
+    async def api_post(self, path_or_url: str, **kwargs) -> httpx.Response:
+        return await self.api_request("POST", path_or_url, **kwargs)
+
+    async def get(self, path_or_url: str, token: Optional[str] = None, **kwargs) -> httpx.Response:
+        return await self.request("GET", path_or_url, token, **kwargs)
+
+    async def post(self, path_or_url: str, token: Optional[str] = None, **kwargs) -> httpx.Response:
+        return await self.request("POST", path_or_url, token, **kwargs)
+
+    async def gather(self, calls: Dict[str, Callable[[], Awaitable[Any]]]) -> Dict[str, Any]:
+        """
+        Run independent calls concurrently; returns {name: result or exception} so one
+        failing endpoint never discards the others
+        """
+        names = list(calls)
+        results = await asyncio.gather(*(calls[name]() for name in names), return_exceptions=True)
+        return dict(zip(names, results))
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        requests = self.stats["requests"]
+        return {
+            **self.stats,
+            "avg_ms": round(self.stats["total_ms"] / requests, 2) if requests else 0.0,
+            "in_flight": self._in_flight,
+            "throttled": self._bucket.throttled,
+            "http2": HTTP2_AVAILABLE,
+            "max_concurrency": self.max_concurrency,
+            "rate_per_second": self._bucket.rate,
+            "token": get_prokerala_token_stats(),
+        }
+
+
+# Shared instance (httpx clients and asyncio primitives are bound to one event loop)
+_prokerala_client: Optional[ProkeralaClient] = None
+_prokerala_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_prokerala_client() -> ProkeralaClient:
+    """Return the process-wide Prokerala client, creating it on first use"""
+    global _prokerala_client, _prokerala_client_loop
+    loop = asyncio.get_running_loop()
+    if _prokerala_client is None or _prokerala_client.closed or _prokerala_client_loop is not loop:
+        _prokerala_client = ProkeralaClient()
+        _prokerala_client_loop = loop
+    return _prokerala_client
+
+
+def get_prokerala_client_stats() -> Optional[Dict[str, Any]]:
+    """Client and token refresh/wait metrics for monitoring, or None before the first Prokerala call"""
+    if _prokerala_client is not None:
+        return _prokerala_client.get_stats()
+    token_stats = get_prokerala_token_stats()
+    return {"token": token_stats} if token_stats is not None else None
+
+
+async def close_prokerala_client():
+    """Close the shared client's connections (called on application shutdown)"""
+    global _prokerala_client
+    if get_prokerala_token_stats() is not None:
+        get_prokerala_token_manager().close()
+    if _prokerala_client is not None:
+        await _prokerala_client.aclose()
+        _prokerala_client = None
@@ -1,5 +1,3 @@
-import httpx
-import time
 import os
 import json
 import logging
@@ -7,6 +5,10 @@ from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 import asyncpg
 
+from services.prokerala_client import get_prokerala_client
+from services.prokerala_token_manager import get_prokerala_token_manager
+from services.sidereal_ephemeris import offline_payload_for
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("prokerala_smart_service")
 
@@ -21,31 +23,10 @@ class ProkeralaSmartService:
         self.client_id = os.getenv("PROKERALA_CLIENT_ID")
         self.client_secret = os.getenv("PROKERALA_CLIENT_SECRET")
         self.base_url = "https://api.prokerala.com/v2"
-        self.token = None
-        self.token_expiry = 0
         
     async def _get_token(self) -> str:
-        """Get or refresh OAuth token"""
-        if self.token and time.time() < self.token_expiry:
-            return self.token
-            
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.prokerala.com/token",
-                data={
-                    "grant_type": "client_credentials",
-                    "client_id": self.client_id,
-                    "client_secret": self.client_secret
-                }
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                self.token = data["access_token"]
-                self.token_expiry = time.time() + data.get("expires_in", 3600) - 60
-                return self.token
-            else:
-                raise Exception(f"Token fetch failed: {response.text}")
+        """Get the shared OAuth token (single-flight refresh across all Prokerala callers)"""
+        return await get_prokerala_token_manager(self.client_id, self.client_secret).get_token()
     
     async def calculate_service_cost(self, service_id: int, user_id: Optional[str] = None) -> Dict:
         """
@@ -269,23 +250,30 @@ class ProkeralaSmartService:
         CRITICAL: Uses GET method with query params (not POST with JSON)
         """
         try:
-            token = await self._get_token()
+            # Shared pooled client: rate limited, capped per host, refreshes the token on 401
+            await self._get_token()
+            response = await get_prokerala_client().api_get(  # GET method!
+                f"{self.base_url}{endpoint}",
+                params=params  # Query parameters!
+            )
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(  # GET method!
-                    f"{self.base_url}{endpoint}",
-                    params=params,  # Query parameters!
-                    headers={"Authorization": f"Bearer {token}"}
-                )
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    logger.error(f"API call failed: {response.status_code} - {response.text}")
-                    raise Exception(f"API error: {response.status_code}")
+            if response.status_code == 200:
+                return response.json()
+            else:
+                logger.error(f"API call failed: {response.status_code} - {response.text}")
+                raise Exception(f"API error: {response.status_code}")
                     
         except Exception as e:
             logger.error(f"Error making API call: {e}")
+            # Birth details / planet positions / dasha periods can be computed locally
+            try:
+                offline = offline_payload_for(endpoint, params)
+            except Exception as offline_error:
+                logger.warning(f"Offline ephemeris could not answer {endpoint}: {offline_error}")
+                offline = None
+            if offline is not None:
+                logger.info(f"Serving {endpoint} from the offline ephemeris")
+                return offline
             raise
 
 # Global instance
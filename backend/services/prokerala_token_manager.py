@@ -0,0 +1,166 @@
+"""
+Prokerala Token Manager - one OAuth token shared by every Prokerala caller
+
+Refreshes are single-flight: when the token expires, the first caller starts
+the /token request and everyone else awaits that same request instead of
+firing their own. The token is renewed in the background shortly before it
+expires, and a 401 from the API forces a refresh (once per stale token, no
+matter how many requests saw the 401).
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PROKERALA_TOKEN_URL = os.getenv("PROKERALA_TOKEN_URL", "https://api.prokerala.com/token")
+PROKERALA_TOKEN_RENEW_BEFORE_SECONDS = float(os.getenv("PROKERALA_TOKEN_RENEW_BEFORE_SECONDS", "300"))
+_EXPIRY_MARGIN_SECONDS = 60  # Never hand out a token this close to expiry
+
+
+class ProkeralaTokenManager:
+    """Caches the client-credentials token with single-flight and proactive refresh"""
+
+    def __init__(self, client_id: Optional[str] = None, client_secret: Optional[str] = None,
+                 token_url: str = PROKERALA_TOKEN_URL,
+                 renew_before: float = PROKERALA_TOKEN_RENEW_BEFORE_SECONDS):
+        self.client_id = client_id or os.getenv("PROKERALA_CLIENT_ID")
+        self.client_secret = client_secret or os.getenv("PROKERALA_CLIENT_SECRET")
+        self.token_url = token_url
+        self.renew_before = renew_before
+        self.token: Optional[str] = None
+        self.expires_at = 0.0  # time.monotonic() deadline
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._renewal_handle: Optional[asyncio.TimerHandle] = None
+        self.stats = {
+            "refreshes": 0,
+            "refresh_failures": 0,
+            "forced_refreshes": 0,
+            "background_renewals": 0,
+            "waiters": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+        }
+
+    def attach_credentials(self, client_id: Optional[str], client_secret: Optional[str]):
+        """Adopt a caller's credentials if none were configured from the environment"""
+        if not self.client_id and client_id:
+            self.client_id = client_id
+        if not self.client_secret and client_secret:
+            self.client_secret = client_secret
+
+    def _valid(self) -> bool:
+        return self.token is not None and time.monotonic() < self.expires_at - _EXPIRY_MARGIN_SECONDS
+
+    async def get_token(self) -> str:
+        """Return a valid token, joining (or starting) a refresh when needed"""
+        if self._valid():
+            return self.token
+        return await self._refresh()
+
+    async def force_refresh(self, stale_token: Optional[str] = None) -> str:
+        """
+        Refresh after a 401. If the token was already replaced since ``stale_token``
+        was handed out, the newer token is returned without another /token call.
+        """
+        if stale_token is not None and self.token != stale_token and self._valid():
+            return self.token
+        self.stats["forced_refreshes"] += 1
+        self.expires_at = 0.0
+        return await self._refresh()
+
+    async def _refresh(self) -> str:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self._fetch_token())
+        start = time.perf_counter()
+        try:
+            # Shielded: a cancelled caller must not cancel the refresh others are awaiting
+            return await asyncio.shield(self._refresh_task)
+        finally:
+            waited_ms = (time.perf_counter() - start) * 1000
+            self.stats["waiters"] += 1
+            self.stats["total_wait_ms"] += waited_ms
+            self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], waited_ms)
+
+    async def _fetch_token(self) -> str:
+        from services.prokerala_client import get_prokerala_client
+
+        try:
+            response = await get_prokerala_client().post(self.token_url, data={
+                "grant_type": "client_credentials",
+                "client_id": self.client_id,
+                "client_secret": self.client_secret
+            })
+            response.raise_for_status()
+            token_data = response.json()
+        except Exception as e:
+            self.stats["refresh_failures"] += 1
+            logger.error(f"Prokerala token refresh failed: {e}")
+            raise
+
+        expires_in = float(token_data.get("expires_in", 3600))
+        self.token = token_data["access_token"]
+        self.expires_at = time.monotonic() + expires_in
+        self.stats["refreshes"] += 1
+        self._schedule_renewal(expires_in)
+        logger.info(f"Prokerala token refreshed (expires in {expires_in:.0f}s)")
+        return self.token
+
+    def _schedule_renewal(self, expires_in: float):
+        if self._renewal_handle is not None:
+            self._renewal_handle.cancel()
+        delay = max(0.0, expires_in - max(self.renew_before, _EXPIRY_MARGIN_SECONDS))
+        loop = asyncio.get_running_loop()
+        self._renewal_handle = loop.call_later(delay, lambda: loop.create_task(self._background_renew()))
+
+    async def _background_renew(self):
+        self._renewal_handle = None
+        self.stats["background_renewals"] += 1
+        try:
+            await self._refresh()
+        except Exception as e:
+            # The next caller retries in the foreground
+            logger.warning(f"Background Prokerala token renewal failed: {e}")
+
+    def close(self):
+        if self._renewal_handle is not None:
+            self._renewal_handle.cancel()
+            self._renewal_handle = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        waiters = self.stats["waiters"]
+        return {
+            **self.stats,
+            "avg_wait_ms": round(self.stats["total_wait_ms"] / waiters, 2) if waiters else 0.0,
+            "has_token": self.token is not None,
+            "expires_in_seconds": round(max(0.0, self.expires_at - time.monotonic()), 1) if self.token else None,
+            "refresh_in_flight": self._refresh_task is not None and not self._refresh_task.done(),
+        }
+
+
+# Shared instance (the refresh task and renewal timer are bound to one event loop)
+_token_manager: Optional[ProkeralaTokenManager] = None
+_token_manager_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_prokerala_token_manager(client_id: Optional[str] = None,
+                                client_secret: Optional[str] = None) -> ProkeralaTokenManager:
+    """Return the process-wide token manager, creating it on first use"""
+    global _token_manager, _token_manager_loop
+    loop = asyncio.get_running_loop()
+    if _token_manager is None or _token_manager_loop is not loop:
+        if _token_manager is not None:
+            _token_manager.close()
+        _token_manager = ProkeralaTokenManager(client_id, client_secret)
+        _token_manager_loop = loop
+    else:
+        _token_manager.attach_credentials(client_id, client_secret)
+    return _token_manager
+
+
+def get_prokerala_token_stats() -> Optional[Dict[str, Any]]:
+    """Token refresh/wait metrics, or None before the first Prokerala call"""
+    return _token_manager.get_stats() if _token_manager is not None else None
@@ -0,0 +1,406 @@
+"""
+Sidereal Ephemeris - offline Vedic chart engine (Lahiri ayanamsa)
+
+Computes sidereal longitudes of the nine grahas and the lagna, rasi,
+nakshatra/pada and Vimshottari dasha for a birth moment and place without any
+network call. Planet positions use Paul Schlyter's orbital elements with the
+main lunar and Jupiter/Saturn perturbations (accurate to a few arcminutes for
+the Moon and better for the Sun - well inside one nakshatra pada of 3°20');
+the Lahiri ayanamsa is anchored to the Swiss Ephemeris epoch and advanced with
+IAU 2006 general precession. Everything is vectorized with NumPy so a batch of
+birth moments costs one pass of array arithmetic.
+
+Output is shaped like the Prokerala v2 ``birth-details``, ``planet-position``
+and ``dasha-periods`` payloads so it can stand in for them when the API is
+unavailable, and can cross-check cached Prokerala charts.
+"""
+
+import re
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    np = None
+
+from services.gazetteer import DEFAULT_LATITUDE, DEFAULT_LONGITUDE, DEFAULT_UTC_OFFSET, resolve_birth_place
+
+logger = logging.getLogger(__name__)
+
+NAKSHATRA_SPAN = 360.0 / 27
+PADA_SPAN = NAKSHATRA_SPAN / 4
+_DASHA_YEAR_DAYS = 365.25
+
+# Prokerala planet ids and vedic names
+PLANETS = [
+    (0, "Sun", "Surya"), (1, "Moon", "Chandra"), (4, "Mars", "Mangal"), (2, "Mercury", "Budha"),
+    (5, "Jupiter", "Guru"), (3, "Venus", "Shukra"), (6, "Saturn", "Shani"),
+    (101, "Rahu", "Rahu"), (102, "Ketu", "Ketu"),
+]
+ASCENDANT = (100, "Ascendant", "Lagna")
+_PLANET_BY_NAME = {name: (pid, name, vedic) for pid, name, vedic in PLANETS}
+
+RASIS = ["Mesha", "Vrishabha", "Mithuna", "Karka", "Simha", "Kanya",
+         "Tula", "Vrischika", "Dhanu", "Makara", "Kumbha", "Meena"]
+ZODIAC_SIGNS = ["Aries", "Taurus", "Gemini", "Cancer", "Leo", "Virgo",
+                "Libra", "Scorpio", "Sagittarius", "Capricorn", "Aquarius", "Pisces"]
+RASI_LORDS = ["Mars", "Venus", "Mercury", "Moon", "Sun", "Mercury",
+              "Venus", "Mars", "Jupiter", "Saturn", "Saturn", "Jupiter"]
+NAKSHATRAS = ["Ashwini", "Bharani", "Krittika", "Rohini", "Mrigashira", "Ardra", "Punarvasu",
+              "Pushya", "Ashlesha", "Magha", "Purva Phalguni", "Uttara Phalguni", "Hasta",
+              "Chitra", "Swati", "Vishakha", "Anuradha", "Jyeshtha", "Mula", "Purva Ashadha",
+              "Uttara Ashadha", "Shravana", "Dhanishta", "Shatabhisha", "Purva Bhadrapada",
+              "Uttara Bhadrapada", "Revati"]
+# Vimshottari order (starting from Ashwini's lord) and period lengths in years
+DASHA_LORDS = ["Ketu", "Venus", "Sun", "Moon", "Mars", "Rahu", "Jupiter", "Saturn", "Mercury"]
+DASHA_YEARS = [7, 20, 6, 10, 7, 18, 16, 19, 17]
+
+# Schlyter orbital elements: (N, i, w, a, e, M) as (value at d=0, rate per day)
+_ELEMENTS = {
+    "Mercury": ((48.3313, 3.24587e-5), (7.0047, 5.00e-8), (29.1241, 1.01444e-5),
+                (0.387098, 0.0), (0.205635, 5.59e-10), (168.6562, 4.0923344368)),
+    "Venus": ((76.6799, 2.46590e-5), (3.3946, 2.75e-8), (54.8910, 1.38374e-5),
+              (0.723330, 0.0), (0.006773, -1.302e-9), (48.0052, 1.6021302244)),
+    "Mars": ((49.5574, 2.11081e-5), (1.8497, -1.78e-8), (286.5016, 2.92961e-5),
+             (1.523688, 0.0), (0.093405, 2.516e-9), (18.6021, 0.5240207766)),
+    "Jupiter": ((100.4542, 2.76854e-5), (1.3030, -1.557e-7), (273.8777, 1.64505e-5),
+                (5.20256, 0.0), (0.048498, 4.469e-9), (19.8950, 0.0830853001)),
+    "Saturn": ((113.6634, 2.38980e-5), (2.4886, -1.081e-7), (339.3939, 2.97661e-5),
+               (9.55475, 0.0), (0.055546, -9.499e-9), (316.9670, 0.0334442282)),
+}
+_MOON_ELEMENTS = ((125.1228, -0.0529538083), (5.1454, 0.0), (318.0634, 0.1643573223),
+                  (60.2666, 0.0), (0.054900, 0.0), (115.3654, 13.0649929509))
+
+# Lahiri: value at the Swiss Ephemeris reference epoch (JD 2435553.5)
+_LAHIRI_T0_JD = 2435553.5
+_LAHIRI_T0_VALUE = 23.245524743
+
+
+def _rad(degrees):
+    return np.radians(degrees)
+
+
+def _norm(degrees):
+    return np.mod(degrees, 360.0)
+
+
+def _kepler(M, e):
+    """Eccentric anomaly (radians) for mean anomaly M (radians), vectorized Newton iteration"""
+    E = M + e * np.sin(M) * (1.0 + e * np.cos(M))
+    for _ in range(6):
+        E = E - (E - e * np.sin(E) - M) / (1.0 - e * np.cos(E))
+    return E
+
+
+def _orbit(elements, d):
+    """Heliocentric (geocentric for the Moon) ecliptic x, y, z and mean anomaly (degrees)"""
+    N, i, w, a, e, M = (value + rate * d for value, rate in elements)
+    E = _kepler(_rad(M), e)
+    xv = a * (np.cos(E) - e)
+    yv = a * np.sqrt(1.0 - e * e) * np.sin(E)
+    v = np.arctan2(yv, xv)
+    r = np.hypot(xv, yv)
+    N, i, vw = _rad(N), _rad(i), v + _rad(w)
+    x = r * (np.cos(N) * np.cos(vw) - np.sin(N) * np.sin(vw) * np.cos(i))
+    y = r * (np.sin(N) * np.cos(vw) + np.cos(N) * np.sin(vw) * np.cos(i))
+    z = r * np.sin(vw) * np.sin(i)
+    return x, y, z, M
+
+
+def julian_day(moments: Sequence[datetime]) -> "np.ndarray":
+    """Julian day (UT) of each moment; naive datetimes are taken as UTC"""
+    seconds = np.array([
+        (m if m.tzinfo else m.replace(tzinfo=timezone.utc)).timestamp() for m in moments
+    ], dtype=np.float64)
+    return seconds / 86400.0 + 2440587.5
+
+
+def lahiri_ayanamsa(jd) -> "np.ndarray":
+    """Lahiri (Chitrapaksha) ayanamsa in degrees"""
+    def precession(jd_):
+        T = (np.asarray(jd_, dtype=np.float64) - 2451545.0) / 36525.0
+        return (5028.796195 * T + 1.1054348 * T * T) / 3600.0
+    return _LAHIRI_T0_VALUE + precession(jd) - precession(_LAHIRI_T0_JD)
+
+
+def tropical_longitudes(jd) -> "np.ndarray":
+    """(n, 9) tropical geocentric longitudes in PLANETS order"""
+    jd = np.atleast_1d(np.asarray(jd, dtype=np.float64))
+    d = jd - 2451543.5
+
+    # Sun (Earth's orbit seen from the Earth)
+    ws = 282.9404 + 4.70935e-5 * d
+    es = 0.016709 - 1.151e-9 * d
+    Ms = _norm(356.0470 + 0.9856002585 * d)
+    Es = _kepler(_rad(Ms), es)
+    xv, yv = np.cos(Es) - es, np.sqrt(1.0 - es * es) * np.sin(Es)
+    rs = np.hypot(xv, yv)
+    sun = np.degrees(np.arctan2(yv, xv)) + ws
+    xs, ys = rs * np.cos(_rad(sun)), rs * np.sin(_rad(sun))
+
+    # Moon with the main periodic terms
+    xm, ym, zm, Mm = _orbit(_MOON_ELEMENTS, d)
+    Nm = _MOON_ELEMENTS[0][0] + _MOON_ELEMENTS[0][1] * d
+    wm = _MOON_ELEMENTS[2][0] + _MOON_ELEMENTS[2][1] * d
+    Ls = Ms + ws
+    Lm = Mm + wm + Nm
+    D, F = _rad(Lm - Ls), _rad(Lm - Nm)
+    Ms_r, Mm_r = _rad(Ms), _rad(Mm)
+    moon = np.degrees(np.arctan2(ym, xm)) + (
+        -1.274 * np.sin(Mm_r - 2 * D) + 0.658 * np.sin(2 * D) - 0.186 * np.sin(Ms_r)
+        - 0.059 * np.sin(2 * Mm_r - 2 * D) - 0.057 * np.sin(Mm_r - 2 * D + Ms_r)
+        + 0.053 * np.sin(Mm_r + 2 * D) + 0.046 * np.sin(2 * D - Ms_r) + 0.041 * np.sin(Mm_r - Ms_r)
+        - 0.035 * np.sin(D) - 0.031 * np.sin(Mm_r + Ms_r) - 0.015 * np.sin(2 * F - 2 * D)
+        + 0.011 * np.sin(Mm_r - 4 * D)
+    )
+
+    # Planets: heliocentric orbit + Sun's geocentric position
+    helio = {name: _orbit(elements, d) for name, elements in _ELEMENTS.items()}
+    Mj, Msa = _rad(helio["Jupiter"][3]), _rad(helio["Saturn"][3])
+    perturbation = {
+        "Jupiter": (-0.332 * np.sin(2 * Mj - 5 * Msa - _rad(67.6)) - 0.056 * np.sin(2 * Mj - 2 * Msa + _rad(21))
+                    + 0.042 * np.sin(3 * Mj - 5 * Msa + _rad(21)) - 0.036 * np.sin(Mj - 2 * Msa)
+                    + 0.022 * np.cos(Mj - Msa) + 0.023 * np.sin(2 * Mj - 3 * Msa + _rad(52))
+                    - 0.016 * np.sin(Mj - 5 * Msa - _rad(69))),
+        "Saturn": (0.812 * np.sin(2 * Mj - 5 * Msa - _rad(67.6)) - 0.229 * np.cos(2 * Mj - 4 * Msa - _rad(2))
+                   + 0.119 * np.sin(Mj - 2 * Msa - _rad(3)) + 0.046 * np.sin(2 * Mj - 6 * Msa - _rad(69))
+                   + 0.014 * np.sin(Mj - 3 * Msa + _rad(32))),
+    }
+    geocentric = {}
+    for name, (x, y, z, _M) in helio.items():
+        if name in perturbation:
+            r = np.sqrt(x * x + y * y + z * z)
+            lon = np.arctan2(y, x) + _rad(perturbation[name])
+            lat = np.arctan2(z, np.hypot(x, y))
+            x, y = r * np.cos(lon) * np.cos(lat), r * np.sin(lon) * np.cos(lat)
+        geocentric[name] = np.degrees(np.arctan2(y + ys, x + xs))
+
+    rahu = Nm  # Mean lunar node
+    columns = [sun, moon, geocentric["Mars"], geocentric["Mercury"], geocentric["Jupiter"],
+               geocentric["Venus"], geocentric["Saturn"], rahu, rahu + 180.0]
+    return _norm(np.stack(columns, axis=1))
+
+
+def tropical_ascendant(jd, latitude, longitude) -> "np.ndarray":
+    """Tropical ecliptic longitude of the rising point"""
+    jd = np.asarray(jd, dtype=np.float64)
+    T = (jd - 2451545.0) / 36525.0
+    gmst = 280.46061837 + 360.98564736629 * (jd - 2451545.0) + 0.000387933 * T * T - T ** 3 / 38710000.0
+    theta = _rad(_norm(gmst + np.asarray(longitude, dtype=np.float64)))
+    eps = _rad(23.439291 - 0.0130042 * T)
+    phi = _rad(np.asarray(latitude, dtype=np.float64))
+    return _norm(np.degrees(np.arctan2(np.cos(theta), -(np.sin(theta) * np.cos(eps) + np.tan(phi) * np.sin(eps)))))
+
+
+def compute_positions(jd, latitude, longitude) -> Dict[str, "np.ndarray"]:
+    """
+    Batch computation for n birth moments/places. Returns sidereal longitudes
+    (n, 10: PLANETS order then Ascendant), retrograde flags (n, 10) and ayanamsa (n,).
+    """
+    jd = np.atleast_1d(np.asarray(jd, dtype=np.float64))
+    ayanamsa = lahiri_ayanamsa(jd)
+    tropical = tropical_longitudes(jd)
+    # Apparent motion over one day decides retrogression
+    motion = (tropical_longitudes(jd + 0.5) - tropical_longitudes(jd - 0.5) + 180.0) % 360.0 - 180.0
+    ascendant = tropical_ascendant(jd, np.broadcast_to(latitude, jd.shape), np.broadcast_to(longitude, jd.shape))
+    longitudes = _norm(np.column_stack([tropical, ascendant]) - ayanamsa[:, None])
+    retrograde = np.column_stack([motion < 0, np.zeros(jd.shape, dtype=bool)])
+    return {"longitudes": longitudes, "retrograde": retrograde, "ayanamsa": ayanamsa,
+            "speed": np.column_stack([motion, np.full(jd.shape, np.nan)])}
+
+
+def _lord(name: str) -> Dict[str, Any]:
+    pid, name, vedic = _PLANET_BY_NAME[name]
+    return {"id": pid, "name": name, "vedic_name": vedic}
+
+
+def _rasi(longitude: float) -> Dict[str, Any]:
+    index = int(longitude // 30) % 12
+    return {"id": index, "name": RASIS[index], "lord": _lord(RASI_LORDS[index])}
+
+
+def _nakshatra(longitude: float) -> Dict[str, Any]:
+    index = int(longitude // NAKSHATRA_SPAN) % 27
+    return {
+        "id": index,
+        "name": NAKSHATRAS[index],
+        "lord": _lord(DASHA_LORDS[index % 9]),
+        "pada": int((longitude % NAKSHATRA_SPAN) // PADA_SPAN) + 1,
+    }
+
+
+def vimshottari_dasha(moon_longitude: float, birth: datetime, levels: int = 2) -> List[Dict[str, Any]]:
+    """Mahadashas (with antardashas) covering the 120-year cycle from the one running at birth"""
+    index = int(moon_longitude // NAKSHATRA_SPAN) % 27
+    lord = index % 9
+    elapsed = (moon_longitude % NAKSHATRA_SPAN) / NAKSHATRA_SPAN
+    start = birth - timedelta(days=DASHA_YEARS[lord] * elapsed * _DASHA_YEAR_DAYS)
+
+    def periods(first: int, begin: datetime, total_years: float, depth: int) -> List[Dict[str, Any]]:
+        result = []
+        for step in range(9):
+            k = (first + step) % 9
+            years = total_years * DASHA_YEARS[k] / 120.0 if depth else DASHA_YEARS[k]
+            end = begin + timedelta(days=years * _DASHA_YEAR_DAYS)
+            period = {"id": _PLANET_BY_NAME[DASHA_LORDS[k]][0], "name": DASHA_LORDS[k],
+                      "start": begin.isoformat(), "end": end.isoformat()}
+            if depth + 1 < levels:
+                period["antardasha"] = periods(k, begin, years, depth + 1)
+            result.append(period)
+            begin = end
+        return result
+
+    return periods(lord, start, 120.0, 0)
+
+
+def parse_prokerala_params(params: Dict[str, Any]) -> Tuple[datetime, float, float]:
+    """Birth moment and place from Prokerala-style ``datetime``/``coordinates`` params"""
+    moment = datetime.fromisoformat(str(params["datetime"]).replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone(DEFAULT_UTC_OFFSET))
+    latitude, longitude = (float(part) for part in str(params.get(
+        "coordinates", f"{DEFAULT_LATITUDE},{DEFAULT_LONGITUDE}")).split(","))
+    return moment, latitude, longitude
+
+
+def birth_moment(birth_details: Dict[str, Any]) -> Tuple[datetime, float, float]:
+    """Moment and place for the app's birth_details dict (date, time, coordinates or location)"""
+    time_ = str(birth_details["time"])
+    if re.fullmatch(r"\d{1,2}:\d{2}", time_):
+        time_ += ":00"
+    place = resolve_birth_place(birth_details)
+    moment = datetime.fromisoformat(f"{birth_details['date']}T{time_}")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone(timedelta(minutes=place["utc_offset_minutes"])))
+    return moment, place["latitude"], place["longitude"]
+
+
+class SiderealEphemeris:
+    """Builds Prokerala-shaped chart payloads from the vectorized computation"""
+
+    def compute_charts(self, moments: Sequence[datetime], latitudes: Sequence[float],
+                       longitudes: Sequence[float]) -> List[Dict[str, Any]]:
+        """One chart per (moment, latitude, longitude), computed as a single batch"""
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("NumPy is required for the offline ephemeris")
+        positions = compute_positions(julian_day(moments), np.asarray(latitudes, dtype=np.float64),
+                                      np.asarray(longitudes, dtype=np.float64))
+        return [
+            self._chart(moment, positions["longitudes"][n], positions["retrograde"][n],
+                        float(positions["ayanamsa"][n]))
+            for n, moment in enumerate(moments)
+        ]
+
+    def compute_chart(self, moment: datetime, latitude: float, longitude: float) -> Dict[str, Any]:
+        return self.compute_charts([moment], [latitude], [longitude])[0]
+
+    def _chart(self, moment: datetime, longitudes, retrograde, ayanamsa: float) -> Dict[str, Any]:
+        lagna_longitude = float(longitudes[-1])
+        lagna_rasi = int(lagna_longitude // 30)
+        planet_position = []
+        for column, (pid, name, vedic) in enumerate(PLANETS + [ASCENDANT]):
+            longitude = float(longitudes[column])
+            rasi = _rasi(longitude)
+            planet_position.append({
+                "id": pid,
+                "name": name,
+                "vedic_name": vedic,
+                "longitude": round(longitude, 6),
+                "is_retrograde": bool(retrograde[column]),
+                # Whole-sign houses counted from the lagna
+                "position": (rasi["id"] - lagna_rasi) % 12 + 1,
+                "degree": round(longitude % 30, 6),
+                "rasi": rasi,
+                "nakshatra": _nakshatra(longitude),
+                # Flat fields read by BirthChartInterpretationService
+                "sign": ZODIAC_SIGNS[rasi["id"]],
+                "house": (rasi["id"] - lagna_rasi) % 12 + 1,
+            })
+
+        moon_longitude = float(longitudes[1])
+        sun_longitude = float(longitudes[0])
+        tropical_sun = (sun_longitude + ayanamsa) % 360.0
+        zodiac = int(tropical_sun // 30)
+        return {
+            "birth_details": {
+                "nakshatra": _nakshatra(moon_longitude),
+                "chandra_rasi": _rasi(moon_longitude),
+                "soorya_rasi": _rasi(sun_longitude),
+                "zodiac": {"id": zodiac, "name": ZODIAC_SIGNS[zodiac]},
+                "lagna": _rasi(lagna_longitude),
+                "ayanamsa": round(ayanamsa, 6),
+            },
+            "planet_position": planet_position,
+            "dasha_periods": vimshottari_dasha(moon_longitude, moment),
+        }
+
+    def south_indian_houses(self, chart: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Twelve whole-sign houses with their signs, lords and occupants"""
+        lagna = chart["birth_details"]["lagna"]["id"]
+        houses = []
+        for house in range(12):
+            sign = (lagna + house) % 12
+            houses.append({
+                "house_number": house + 1,
+                "sign": ZODIAC_SIGNS[sign],
+                "rasi": RASIS[sign],
+                "planets": [p["name"] if p["id"] != ASCENDANT[0] else "Asc"
+                            for p in chart["planet_position"] if p["rasi"]["id"] == sign],
+                "lord": RASI_LORDS[sign],
+            })
+        return houses
+
+    def prokerala_payloads(self, chart: Dict[str, Any]) -> Dict[str, Any]:
+        """The chart as the API responses the routers store (``{"status", "data"}`` envelopes)"""
+        return {
+            "birth_details": {"status": "ok", "data": chart["birth_details"], "source": "offline_ephemeris"},
+            "planetary_positions": {"status": "ok", "data": {"planet_position": chart["planet_position"]},
+                                    "source": "offline_ephemeris"},
+            "dasha_periods": {"status": "ok", "data": {"dasha_periods": chart["dasha_periods"]},
+                              "source": "offline_ephemeris"},
+        }
+
+    def check_consistency(self, prokerala_birth_details: Dict[str, Any], moment: datetime,
+                          latitude: float, longitude: float) -> Dict[str, Any]:
+        """Compare a (cached) Prokerala birth-details payload with the offline computation"""
+        data = prokerala_birth_details.get("data", prokerala_birth_details) if isinstance(prokerala_birth_details, dict) else {}
+        offline = self.compute_chart(moment, latitude, longitude)["birth_details"]
+        mismatches = []
+        for field in ("nakshatra", "chandra_rasi", "soorya_rasi"):
+            remote = (data.get(field) or {}).get("name") if isinstance(data.get(field), dict) else data.get(field)
+            if remote and remote != offline[field]["name"]:
+                mismatches.append({"field": field, "prokerala": remote, "offline": offline[field]["name"]})
+        remote_pada = (data.get("nakshatra") or {}).get("pada") if isinstance(data.get("nakshatra"), dict) else None
+        if remote_pada and not mismatches and remote_pada != offline["nakshatra"]["pada"]:
+            mismatches.append({"field": "nakshatra_pada", "prokerala": remote_pada,
+                               "offline": offline["nakshatra"]["pada"]})
+        return {"consistent": not mismatches, "mismatches": mismatches, "offline": offline}
+
+
+def offline_payload_for(endpoint: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Offline stand-in for a Prokerala endpoint, or None if the engine can't answer it"""
+    if not NUMPY_AVAILABLE:
+        return None
+    key = endpoint.rstrip("/").rsplit("/", 1)[-1]
+    mapping = {"birth-details": "birth_details", "planet-position": "planetary_positions",
+               "planet-positions": "planetary_positions", "dasha-periods": "dasha_periods"}
+    if key not in mapping:
+        return None
+    engine = get_sidereal_ephemeris()
+    return engine.prokerala_payloads(engine.compute_chart(*parse_prokerala_params(params)))[mapping[key]]
+
+
+# Shared instance
+_sidereal_ephemeris: Optional[SiderealEphemeris] = None
+
+
+def get_sidereal_ephemeris() -> SiderealEphemeris:
+    """Return the process-wide offline ephemeris"""
+    global _sidereal_ephemeris
+    if _sidereal_ephemeris is None:
+        _sidereal_ephemeris = SiderealEphemeris()
+    return _sidereal_ephemeris
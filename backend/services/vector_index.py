@@ -0,0 +1,281 @@
+"""
+Vector Index - in-process NumPy index over rag_knowledge_base
+
+The seeded knowledge base is small enough to keep in RAM, so guidance requests
+can rank it with one matrix-vector product instead of a pgvector round trip.
+Each knowledge domain owns a contiguous float32 block (rows are pre-normalised,
+so cosine similarity is a dot product) that grows by doubling. New rows from the
+seeder or AutomatedKnowledgeExpansion are written into their domain block in
+place, so an upsert costs one row and searches never wait on a re-pack; the
+vectors live only in the blocks. Snapshot loads are parsed and packed in a
+worker thread.
+
+Enabled with RAG_VECTOR_INDEX_ENABLED=true; the RAG engine falls back to
+pgvector whenever the index is disabled, unavailable or not loaded.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    np = None
+
+logger = logging.getLogger(__name__)
+
+RAG_VECTOR_INDEX_ENABLED = os.getenv("RAG_VECTOR_INDEX_ENABLED", "false").lower() == "true"
+RAG_VECTOR_INDEX_MAX_ROWS = int(os.getenv("RAG_VECTOR_INDEX_MAX_ROWS", "50000"))
+RAG_VECTOR_INDEX_REFRESH_SECONDS = float(os.getenv("RAG_VECTOR_INDEX_REFRESH_SECONDS", "900"))
+
+_ROW_FIELDS = ("id", "knowledge_domain", "content_type", "title", "content", "metadata",
+               "source_reference", "authority_level", "cultural_context")
+
+
+def _parse_vector(value: Any) -> Optional["np.ndarray"]:
+    """Accept pgvector text ('[1,2]'), FLOAT[] text ('{1,2}'), lists and arrays"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        vector = np.array(value.strip("[]{}").split(","), dtype=np.float32) if value.strip("[]{} ") else None
+    else:
+        vector = np.asarray(value, dtype=np.float32)
+    return vector if vector is not None and vector.ndim == 1 and vector.size else None
+
+
+class _DomainBlock:
+    """Rows of one knowledge domain: a float32 matrix with spare capacity plus its row dicts"""
+
+    __slots__ = ("matrix", "norms", "rows")
+
+    def __init__(self, dimensions: int, capacity: int = 16):
+        self.matrix = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.norms = np.zeros(capacity, dtype=np.float32)  # original norms, 0 for fallback zero vectors
+        self.rows: List[Dict[str, Any]] = []
+
+    def write(self, slot: int, row: Dict[str, Any], vector: "np.ndarray"):
+        norm = float(np.linalg.norm(vector))
+        self.matrix[slot] = vector / norm if norm > 0 else 0.0
+        self.norms[slot] = norm
+        if slot == len(self.rows):
+            self.rows.append(row)
+        else:
+            self.rows[slot] = row
+
+    def append(self, row: Dict[str, Any], vector: "np.ndarray") -> int:
+        slot = len(self.rows)
+        if slot == self.matrix.shape[0]:
+            # Amortised growth: copy once per doubling, never per upsert
+            self.matrix = np.concatenate([self.matrix, np.zeros_like(self.matrix)])
+            self.norms = np.concatenate([self.norms, np.zeros_like(self.norms)])
+        self.write(slot, row, vector)
+        return slot
+
+    def remove(self, slot: int) -> Optional[Dict[str, Any]]:
+        """Drop a row by moving the last one into its slot; returns the moved row, if any"""
+        last = len(self.rows) - 1
+        moved = None
+        if slot != last:
+            self.matrix[slot], self.norms[slot] = self.matrix[last], self.norms[last]
+            self.rows[slot] = moved = self.rows[last]
+        self.rows.pop()
+        return moved
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.matrix.nbytes + self.norms.nbytes)
+
+
+def _pack(rows: Sequence[Dict[str, Any]]) -> Tuple[Optional[int], Dict[str, _DomainBlock], Dict[str, Tuple[str, int]]]:
+    """Parse and pack a snapshot (runs in a worker thread)"""
+    parsed: Dict[str, Tuple[Dict[str, Any], "np.ndarray"]] = {}
+    dimensions = None
+    for row in rows:
+        vector = _parse_vector(row["embedding"])
+        if vector is None:
+            continue
+        if dimensions is None:
+            dimensions = vector.size
+        if vector.size != dimensions:
+            continue  # e.g. rows embedded with a different model
+        parsed[row["title"]] = ({field: row[field] for field in _ROW_FIELDS}, vector)
+
+    by_domain: Dict[str, List[Tuple[Dict[str, Any], "np.ndarray"]]] = {}
+    for row, vector in parsed.values():
+        by_domain.setdefault(row["knowledge_domain"], []).append((row, vector))
+
+    blocks: Dict[str, _DomainBlock] = {}
+    slots: Dict[str, Tuple[str, int]] = {}
+    for domain, items in by_domain.items():
+        block = blocks[domain] = _DomainBlock(dimensions, capacity=max(16, len(items)))
+        for row, vector in items:
+            slots[row["title"]] = (domain, block.append(row, vector))
+    return dimensions, blocks, slots
+
+
+class RAGVectorIndex:
+    """Per-domain float32 blocks answering cosine top-k queries"""
+
+    def __init__(self, max_rows: int = RAG_VECTOR_INDEX_MAX_ROWS,
+                 refresh_seconds: float = RAG_VECTOR_INDEX_REFRESH_SECONDS):
+        self.max_rows = max_rows
+        self.refresh_seconds = refresh_seconds
+        self.dimensions: Optional[int] = None
+        self.loaded_at: Optional[float] = None
+        self._blocks: Dict[str, _DomainBlock] = {}
+        self._slots: Dict[str, Tuple[str, int]] = {}  # title -> (domain, row in that domain's block)
+        self._load_lock: Optional[asyncio.Lock] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Upserts made while a load is in flight, replayed once its snapshot is swapped in
+        self._pending_upserts: Optional[List[Tuple[Dict[str, Any], Sequence[float]]]] = None
+        self.stats = {"loads": 0, "searches": 0, "upserts": 0, "load_errors": 0}
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded_at is not None
+
+    async def ensure_loaded(self, db_pool) -> bool:
+        """Load on first use and refresh in the background once the snapshot is stale"""
+        if not NUMPY_AVAILABLE or db_pool is None:
+            return False
+        if not self.ready:
+            if self._load_lock is None:
+                self._load_lock = asyncio.Lock()
+            async with self._load_lock:
+                if not self.ready:
+                    await self.load(db_pool)
+        elif (time.monotonic() - self.loaded_at > self.refresh_seconds
+              and (self._refresh_task is None or self._refresh_task.done())):
+            self._refresh_task = asyncio.get_running_loop().create_task(self.load(db_pool))
+        return self.ready
+
+    async def load(self, db_pool):
+        """Replace the index contents with a fresh snapshot of rag_knowledge_base"""
+        self._pending_upserts = []
+        try:
+            async with db_pool.acquire() as conn:
+                rows = await conn.fetch("""
+                    SELECT id, knowledge_domain, content_type, title, content, metadata,
+                           source_reference, authority_level, cultural_context,
+                           embedding_vector::text AS embedding
+                    FROM rag_knowledge_base
+                    WHERE embedding_vector IS NOT NULL
+                    ORDER BY id
+                    LIMIT $1
+                """, self.max_rows)
+        except Exception as e:
+            self.stats["load_errors"] += 1
+            logger.warning(f"RAG vector index load failed, using pgvector: {e}")
+            self._pending_upserts = None
+            return
+
+        # Parsing and packing up to max_rows vectors stays off the event loop
+        try:
+            self.dimensions, self._blocks, self._slots = await asyncio.to_thread(_pack, rows)
+        finally:
+            pending, self._pending_upserts = self._pending_upserts, None
+        self.loaded_at = time.monotonic()
+        # The snapshot may predate upserts that arrived while it was fetched and packed
+        for knowledge_data, embedding in pending:
+            self.upsert(knowledge_data, embedding)
+        self.stats["loads"] += 1
+        logger.info(f"RAG vector index loaded {len(self._slots)} knowledge pieces")
+
+    def upsert(self, knowledge_data: Dict[str, Any], embedding: Sequence[float]):
+        """Add or replace one knowledge piece (keyed by title, like the table's ON CONFLICT)"""
+        if self._pending_upserts is not None:
+            self._pending_upserts.append((knowledge_data, embedding))
+        if not NUMPY_AVAILABLE or not self.ready:
+            return  # The next load picks the row up from the database
+        vector = _parse_vector(embedding)
+        if vector is None:
+            return
+        if self.dimensions is None:
+            self.dimensions = vector.size
+        if vector.size != self.dimensions:
+            return
+        metadata = knowledge_data.get("metadata", {})
+        if isinstance(metadata, str):
+            metadata = json.loads(metadata)
+        row = {
+            "id": knowledge_data.get("id"),
+            "knowledge_domain": knowledge_data.get("knowledge_domain") or knowledge_data.get("domain"),
+            "content_type": knowledge_data.get("content_type", "knowledge"),
+            "title": knowledge_data["title"],
+            "content": knowledge_data["content"],
+            "metadata": metadata,
+            "source_reference": knowledge_data.get("source_reference") or knowledge_data.get("source"),
+            "authority_level": knowledge_data.get("authority_level", 3),
+            "cultural_context": knowledge_data.get("cultural_context", "universal"),
+        }
+        domain, title = row["knowledge_domain"], row["title"]
+        current = self._slots.get(title)
+        if current is not None and current[0] == domain:
+            self._blocks[domain].write(current[1], row, vector)
+        else:
+            if current is not None:
+                # The piece moved to another domain
+                moved = self._blocks[current[0]].remove(current[1])
+                if moved is not None:
+                    self._slots[moved["title"]] = current
+            block = self._blocks.get(domain)
+            if block is None:
+                block = self._blocks[domain] = _DomainBlock(self.dimensions)
+            self._slots[title] = (domain, block.append(row, vector))
+        self.stats["upserts"] += 1
+
+    def search(self, query_embedding: Sequence[float], domains: Sequence[str],
+               top_k: int) -> List[Tuple[Dict[str, Any], float]]:
+        """Top-k (row, cosine similarity) per domain, best first within each domain"""
+        self.stats["searches"] += 1
+        query = _parse_vector(query_embedding)
+        if query is None or self.dimensions is None or query.size != self.dimensions:
+            return []
+        query_norm = float(np.linalg.norm(query))
+        if query_norm == 0.0:
+            return []
+        query = query / query_norm
+
+        results: List[Tuple[Dict[str, Any], float]] = []
+        for domain in dict.fromkeys(domains):
+            block = self._blocks.get(domain)
+            count = len(block.rows) if block is not None else 0
+            if not count:
+                continue
+            scores = block.matrix[:count] @ query
+            k = min(top_k, count)
+            best = np.argpartition(-scores, k - 1)[:k] if k < count else np.arange(count)
+            for i in best[np.argsort(-scores[best])]:
+                if block.norms[i] > 0:  # zero fallback vectors have no direction
+                    results.append((block.rows[i], float(scores[i])))
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "enabled": RAG_VECTOR_INDEX_ENABLED and NUMPY_AVAILABLE,
+            "ready": self.ready,
+            "entries": len(self._slots),
+            "dimensions": self.dimensions,
+            "domains": {domain: len(block.rows) for domain, block in self._blocks.items()},
+            "matrix_bytes": sum(block.nbytes for block in self._blocks.values()),
+            "age_seconds": round(time.monotonic() - self.loaded_at, 1) if self.ready else None,
+        }
+
+
+# Shared instance
+_vector_index: Optional[RAGVectorIndex] = None
+
+
+def get_vector_index() -> RAGVectorIndex:
+    """Return the process-wide knowledge vector index"""
+    global _vector_index
+    if _vector_index is None:
+        _vector_index = RAGVectorIndex()
+    return _vector_index
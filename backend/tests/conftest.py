@@ -0,0 +1,34 @@
+"""
+Shared fixtures for the backend tests.
+"""
+
+import pytest
+
+
+class FakePool:
+    """Stands in for the asyncpg-style pool: each acquire() checks out ``connect()``"""
+
+    def __init__(self, connect):
+        self.connect = connect
+        self.checkouts = 0
+
+    def acquire(self):
+        self.checkouts += 1
+        return _Checkout(self.connect)
+
+
+class _Checkout:
+    def __init__(self, connect):
+        self._connect = connect
+
+    async def __aenter__(self):
+        return self._connect()
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def fake_pool():
+    """Factory for fake pools: ``fake_pool(lambda: connection)``"""
+    return FakePool
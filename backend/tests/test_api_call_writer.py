@@ -0,0 +1,76 @@
+import asyncio
+
+from monitoring.api_call_writer import ApiCallWriter
+
+
+class _LogConnection:
+    def __init__(self, db):
+        self.db = db
+
+    async def execute(self, query, *columns):
+        if self.db["fail"]:
+            raise RuntimeError("database unavailable")
+        assert "unnest(" in query and len(columns) == 8
+        self.db["batches"].append(list(zip(*columns)))
+
+
+def _writer(fake_pool, fail=False, **kwargs):
+    writer = ApiCallWriter(**kwargs)
+    db = {"batches": [], "fail": fail}
+    pool = fake_pool(lambda: _LogConnection(db))
+    writer._pool = lambda: pool
+    return writer, db
+
+
+def test_rows_are_written_in_multi_row_batches(fake_pool):
+    writer, db = _writer(fake_pool, capacity=100, batch_size=4, flush_interval=60)
+
+    async def scenario():
+        for n in range(10):
+            writer.record(f"/api/{n}", "GET", 200, n)
+        return await writer.flush()
+
+    assert asyncio.run(scenario()) == 10
+    assert [len(batch) for batch in db["batches"]] == [4, 4, 2]
+    assert writer._pool().checkouts == 3  # One connection per batch, not per request
+    endpoint, method, status, response_time, user_id, body, error, called_at = db["batches"][0][1]
+    assert (endpoint, method, status, response_time, user_id) == ("/api/1", "GET", 200, 1, None)
+    assert writer.get_stats()["written"] == 10 and writer.get_stats()["buffered"] == 0
+
+
+def test_full_buffer_drops_and_counts_new_rows(fake_pool):
+    writer, db = _writer(fake_pool, capacity=3, batch_size=10, flush_interval=60)
+    writer._closed = True  # No running loop here: keep record() from starting the flusher
+
+    accepted = [writer.record("/api/x", "POST", 201, 5) for _ in range(5)]
+    assert accepted == [True, True, True, False, False]
+    assert writer.stats["dropped"] == 2 and writer.get_stats()["buffered"] == 3
+
+
+def test_flusher_wakes_on_batch_size_and_stop_drains_the_rest(fake_pool):
+    writer, db = _writer(fake_pool, capacity=100, batch_size=3, flush_interval=60)
+
+    async def scenario():
+        for n in range(3):
+            writer.record("/api/a", "GET", 200, n)  # Starts the flusher; the third row wakes it
+        for _ in range(10):
+            await asyncio.sleep(0)
+        flushed_early = sum(len(batch) for batch in db["batches"])
+        writer.record("/api/b", "GET", 404, 1)
+        await writer.stop()
+        return flushed_early
+
+    assert asyncio.run(scenario()) == 3
+    assert sum(len(batch) for batch in db["batches"]) == 4
+    assert not writer.get_stats()["running"]
+
+
+def test_failed_batches_are_counted_not_retried(fake_pool):
+    writer, db = _writer(fake_pool, fail=True, capacity=100, batch_size=2, flush_interval=60)
+    writer._closed = True
+    for n in range(3):
+        writer.record("/api/a", "GET", 200, n)
+
+    assert asyncio.run(writer.flush()) == 0
+    assert writer.stats["errors"] == 1 and writer.stats["dropped"] == 2
+    assert writer.get_stats()["buffered"] == 1  # Left for the next tick
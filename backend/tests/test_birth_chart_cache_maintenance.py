@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from services.birth_chart_cache_maintenance import BirthChartCacheMaintenance
+
+NOW = datetime(2026, 10, 16, 12, 0)
+
+
+class _CacheConnection:
+    """Expired users / store rows behind the cleaner's cursor-ordered batch statements"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def fetchrow(self, query, *args):
+        if "FROM birth_chart_cache_stats" in query:
+            return self.db["rollup"]
+        after_expires, after_key, limit = args
+        table = "users" if "UPDATE users u" in query else "store"
+        rows = self.db[table]
+        cursor = (after_expires, after_key) if after_expires is not None else None
+        batch = sorted((expires, key) for key, expires in rows.items()
+                       if expires < NOW and (cursor is None or (expires, key) > cursor)
+                       and key not in self.db["locked"])[:limit]
+        if not batch:
+            return None
+        self.db["batches"].append((table, batch))
+        for _, key in batch:
+            del rows[key]
+        last = batch[-1]
+        return {"cleared": len(batch), "cursor_expires_at": last[0], "cursor_key": last[1]}
+
+
+def _cache_db(users, store, locked=()):
+    return {"users": dict(users), "store": dict(store), "locked": set(locked), "batches": [], "rollup": None}
+
+
+def _maintenance(fake_pool, db, **kwargs):
+    maintenance = BirthChartCacheMaintenance(enabled=True, **kwargs)
+    pool = fake_pool(lambda: _CacheConnection(db))
+    maintenance._pool = lambda: pool
+    return maintenance
+
+
+def test_sweep_clears_expired_rows_in_bounded_batches(fake_pool):
+    expired = {f"u{n:02d}": NOW - timedelta(days=n + 1) for n in range(7)}
+    db = _cache_db({**expired, "fresh": NOW + timedelta(days=30)},
+                   {"hash-a": NOW - timedelta(days=2), "hash-b": NOW + timedelta(days=1)})
+    maintenance = _maintenance(fake_pool, db, batch_size=3, max_batches=2)
+
+    first = asyncio.run(maintenance.sweep())
+    assert first == {"users": 6, "store": 1}  # Two batches of three, then stop for this tick
+    assert [len(batch) for table, batch in db["batches"] if table == "users"] == [3, 3]
+
+    second = asyncio.run(maintenance.sweep())
+    assert second == {"users": 1, "store": 0}
+    assert set(db["users"]) == {"fresh"} and set(db["store"]) == {"hash-b"}
+    assert maintenance.stats["users_cleared"] == 7 and maintenance.stats["passes"] >= 2
+
+
+def test_locked_rows_are_skipped_then_cleared_on_the_next_pass(fake_pool):
+    db = _cache_db({"a": NOW - timedelta(days=3), "b": NOW - timedelta(days=2), "c": NOW - timedelta(days=1)},
+                   {}, locked={"b"})
+    maintenance = _maintenance(fake_pool, db, batch_size=1, max_batches=10)
+
+    assert asyncio.run(maintenance.sweep())["users"] == 2
+    assert set(db["users"]) == {"b"}
+    assert maintenance._cursors["users"] is None  # Pass finished: the next one starts over
+
+    db["locked"].clear()
+    assert asyncio.run(maintenance.sweep())["users"] == 1
+    assert db["users"] == {}
+
+
+def test_rollup_statistics_subtract_entries_awaiting_cleanup():
+    db = _cache_db({}, {})
+    cached_at = NOW - timedelta(days=10)
+    db["rollup"] = {
+        "total_users": 1000, "cached_users": 400, "free_chart_users": 380, "linked_users": 390,
+        "cached_at_count": 2, "cached_at_epoch_sum": int(cached_at.timestamp()) * 2,
+        "stored_charts": 300, "store_hits": 900, "now_epoch": NOW.timestamp(),
+        "expired_users": 15, "expired_charts": 5,
+    }
+    maintenance = BirthChartCacheMaintenance(enabled=True)
+
+    stats = asyncio.run(maintenance.get_rollup(_CacheConnection(db)))
+    assert stats["total_users"] == 1000
+    assert stats["users_with_valid_cache"] == 385
+    assert stats["valid_charts"] == 295 and stats["reuse_hits"] == 900
+    assert stats["expired_pending_cleanup"] == 20
+    assert round(stats["avg_cache_age_days"], 3) == 10.0
@@ -0,0 +1,142 @@
+import sys
+import json
+import asyncio
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+
+from services.birth_chart_store import (
+    BirthChartStore, CHART_HASH_VERSION, generate_birth_details_hash, stored_reference
+)
+
+
+BIRTH_DETAILS = {"date": "1990-04-12", "time": "06:30", "location": "Jaffna, Sri Lanka", "timezone": "Asia/Colombo"}
+
+
+class _FakeStoreConnection:
+    """Just enough of birth_chart_store / users to exercise the store's queries"""
+
+    def __init__(self, charts, users):
+        self.charts = charts
+        self.users = users
+        self.flushes = []
+        self.lookups = []
+
+    async def fetchrow(self, query, *args):
+        if "FROM birth_chart_store" in query and "WHERE birth_hash" in query:
+            self.lookups.append(query)
+            entry = self.charts.get(args[0])
+            return {"birth_hash": args[0], **entry} if entry else None
+        raise AssertionError(query)
+
+    async def fetchval(self, query, *args):
+        email, birth_hash = args
+        if email not in self.users:
+            return None
+        return self.users[email].get("birth_chart_hash") == birth_hash
+
+    async def execute(self, query, *args):
+        if "INSERT INTO birth_chart_store" in query:
+            birth_hash, _details, chart, profile, created_at, expires_at = args
+            entry = self.charts.setdefault(birth_hash, {"chart_blob": None, "profile_blob": None,
+                                                        "chart_data": None, "profile_data": None, "hit_count": 0})
+            entry["chart_blob"] = chart or entry["chart_blob"]
+            entry["profile_blob"] = profile or entry["profile_blob"]
+            entry.update(created_at=created_at, expires_at=expires_at)
+        elif "unnest" in query:
+            self.flushes.append(list(args[0]))
+            for birth_hash, hits in zip(*args):
+                if birth_hash in self.charts:
+                    self.charts[birth_hash]["hit_count"] += hits
+        elif "UPDATE users" in query:
+            data, birth_hash, *_rest, email = args
+            if email in self.users:
+                self.users[email].update(birth_chart_data=data, birth_chart_hash=birth_hash)
+        else:
+            raise AssertionError(query)
+
+
+def test_hash_is_content_addressed_and_versioned():
+    normalized = {"date": "1990-04-12", "time": "06:30", "location": "jaffna, sri lanka", "timezone": "Asia/Colombo"}
+    expected = hashlib.sha256(json.dumps({**normalized, "chart_version": CHART_HASH_VERSION},
+                                         sort_keys=True).encode()).hexdigest()
+    pre_gazetteer = hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+    assert generate_birth_details_hash(BIRTH_DETAILS) == expected
+    assert generate_birth_details_hash({**BIRTH_DETAILS, "location": "  JAFFNA, Sri Lanka ", "name": "Ravi"}) == expected
+    assert generate_birth_details_hash({**BIRTH_DETAILS, "time": "06:31"}) != expected
+    # Charts cached before places were resolved (Jaffna / +05:30 for everyone) are never hit again
+    assert expected != pre_gazetteer
+
+
+def test_store_shares_one_chart_between_users():
+    conn = _FakeStoreConnection({}, {"a@example.com": {}, "b@example.com": {}})
+    store = BirthChartStore()
+
+    async def scenario():
+        stored = await store.put(conn, BIRTH_DETAILS, chart_data={"nakshatra": "Rohini"})
+        for email in ("a@example.com", "b@example.com"):
+            entry = await store.get(conn, stored["birth_hash"])
+            await store.link_user(conn, email, BIRTH_DETAILS, entry["cached_at"], entry["expires_at"])
+        return entry
+
+    entry = asyncio.run(scenario())
+    assert entry["chart_data"] == {"nakshatra": "Rohini"}
+    assert len(conn.charts) == 1
+    assert {user["birth_chart_hash"] for user in conn.users.values()} == {entry["birth_hash"]}
+    assert store.stats["writes"] == 1 and store.stats["hits"] == 2
+
+
+def test_reads_do_not_write_and_hits_are_flushed_in_one_batch():
+    conn = _FakeStoreConnection({}, {})
+    store = BirthChartStore()
+
+    async def scenario():
+        stored = await store.put(conn, BIRTH_DETAILS, chart_data={"nakshatra": "Rohini"})
+        for _ in range(3):
+            await store.get(conn, stored["birth_hash"])
+        assert conn.charts[stored["birth_hash"]]["hit_count"] == 0
+        return stored, await store.flush_hits(conn), await store.flush_hits(conn)
+
+    stored, flushed, again = asyncio.run(scenario())
+    assert flushed == 1 and again == 0
+    assert conn.flushes == [[stored["birth_hash"]]]
+    assert conn.charts[stored["birth_hash"]]["hit_count"] == 3
+    assert store.stats["hits_flushed"] == 3
+
+
+def test_references_load_only_the_payload_they_point_at():
+    conn = _FakeStoreConnection({}, {})
+    store = BirthChartStore()
+
+    async def scenario():
+        stored = await store.put(conn, BIRTH_DETAILS, chart_data={"nakshatra": "Rohini"},
+                                 profile_data={"birth_chart": {"nakshatra": "Rohini"}, "swamiji_reading": {}})
+        return await store.resolve_user_data(conn, stored_reference(stored["birth_hash"], "chart", {"name": "Ravi"}))
+
+    assert asyncio.run(scenario()) == {"nakshatra": "Rohini", "name": "Ravi"}
+    assert "chart_blob" in conn.lookups[0] and "profile" not in conn.lookups[0]
+
+
+def test_second_user_and_guests_resolve_through_the_store(monkeypatch, fake_pool):
+    pytest.importorskip("asyncpg")
+    from services.birth_chart_cache_service import BirthChartCacheService
+
+    charts, users = {}, {"a@example.com": {}, "b@example.com": {}}
+    pool = fake_pool(lambda: _FakeStoreConnection(charts, users))
+    monkeypatch.setitem(sys.modules, "db", SimpleNamespace(get_db_pool=lambda: pool))
+    service = BirthChartCacheService("postgresql://unused")
+
+    async def scenario():
+        assert await service.get_cached_birth_chart("a@example.com", BIRTH_DETAILS) is None
+        assert await service.cache_birth_chart("a@example.com", BIRTH_DETAILS, {"nakshatra": "Rohini"})
+        same_person = {**BIRTH_DETAILS, "location": "jaffna, sri lanka"}
+        return (await service.get_cached_birth_chart("b@example.com", same_person),
+                await service.get_cached_birth_chart("guest_1234abcd", BIRTH_DETAILS))
+
+    registered, guest = asyncio.run(scenario())
+    assert registered["data"] == {"nakshatra": "Rohini"}
+    assert guest["data"] == {"nakshatra": "Rohini"}
+    assert len(charts) == 1
+    assert users["b@example.com"]["birth_chart_hash"] == generate_birth_details_hash(BIRTH_DETAILS)
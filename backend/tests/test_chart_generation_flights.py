@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from services.chart_generation_flights import SingleFlight
+
+
+def test_concurrent_identical_generations_run_once():
+    flights = SingleFlight(advisory_lock=False)
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"birth_chart": {"nakshatra": "Rohini"}}
+
+    async def scenario():
+        return await asyncio.gather(*(flights.run("birth_chart:abc", generate) for _ in range(10)))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(r == {"birth_chart": {"nakshatra": "Rohini"}} for r in results)
+    # Followers get their own copy, so mutating one response cannot leak into another
+    assert len({id(r) for r in results}) == 10
+    assert flights.get_stats()["followers"] == 9 and flights.get_stats()["in_flight"] == 0
+
+
+def test_followers_prefer_their_own_cache_read_and_share_failures():
+    flights = SingleFlight(advisory_lock=False)
+    attempts = []
+
+    async def failing():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("Prokerala unavailable")
+
+    async def recheck():
+        return {"cache_hit": True}
+
+    async def scenario():
+        outcomes = await asyncio.gather(*(flights.run("k", failing) for _ in range(3)), return_exceptions=True)
+        leader = flights.run("k", lambda: asyncio.sleep(0.01, result={"fresh": True}))
+        follower = flights.run("k", lambda: asyncio.sleep(0, result={"unused": True}), recheck=recheck)
+        return outcomes, await asyncio.gather(leader, follower)
+
+    outcomes, (leader, follower) = asyncio.run(scenario())
+    assert len(attempts) == 1 and all(isinstance(o, RuntimeError) for o in outcomes)
+    assert leader == {"fresh": True} and follower == {"cache_hit": True}
+
+
+class _LockConnection:
+    def __init__(self, held_polls):
+        self.held_polls = held_polls  # pg_try_advisory_lock fails this many times first
+        self.queries = []
+
+    async def fetchval(self, query, key):
+        self.queries.append(query.split("(")[0].replace("SELECT ", ""))
+        if "pg_try_advisory_lock" in query:
+            if self.held_polls:
+                self.held_polls -= 1
+                return False
+        return True
+
+
+def _locked_flights(conn, **kwargs):
+    flights = SingleFlight(advisory_lock=True, lock_poll_seconds=0.001, **kwargs)
+
+    async def connect():
+        return conn
+
+    flights._connect_lock_session = connect
+    return flights
+
+
+@pytest.mark.parametrize("held", [True, False])
+def test_advisory_lock_waits_for_another_worker_and_reuses_its_result(held):
+    conn = _LockConnection(held_polls=2 if held else 0)
+    flights = _locked_flights(conn)
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        return {"fresh": True}
+
+    async def recheck():
+        return {"cache_hit": True}
+
+    result = asyncio.run(flights.run("k", generate, recheck=recheck))
+    if held:
+        assert result == {"cache_hit": True} and calls == []
+        assert conn.queries == ["pg_try_advisory_lock"] * 3 + ["pg_advisory_unlock"]
+        assert flights.get_stats()["cross_worker_reuses"] == 1
+    else:
+        assert result == {"fresh": True} and calls == [1]
+        assert conn.queries == ["pg_try_advisory_lock", "pg_advisory_unlock"]
+
+
+def test_lock_wait_is_bounded_and_then_generates_without_the_lock():
+    conn = _LockConnection(held_polls=10 ** 6)
+    flights = _locked_flights(conn, lock_wait_seconds=0.02)
+
+    async def generate():
+        return {"fresh": True}
+
+    assert asyncio.run(flights.run("k", generate)) == {"fresh": True}
+    assert "pg_advisory_unlock" not in conn.queries
+    assert flights.get_stats()["lock_wait_timeouts"] == 1
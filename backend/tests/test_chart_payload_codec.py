@@ -0,0 +1,91 @@
+import json
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from services import chart_payload_codec
+from services.birth_chart_store import BirthChartStore, StoredChart, stored_reference
+from services.chart_payload_codec import decode_payload, deduplicate, encode_payload
+
+
+def _profile():
+    planets = [{"id": n, "name": f"Planet {n}", "rasi": {"id": n % 12, "name": f"Rasi {n % 12}",
+                                                         "lord": {"id": n, "name": "Lord", "vedic_name": "Swami"}},
+                "longitude": 12.5 * n, "is_retrograde": n % 3 == 0} for n in range(9)]
+    reports = {}
+    for report in ("basic_prediction", "planetary_positions", "house_cusps"):
+        data = {"planet_position": planets, "report": report}
+        reports[report] = {"data": data, "text_content": f"{report}: long text " * 20,
+                           "structured_data": data, "endpoint": f"/v2/astrology/{report}"}
+    return {"birth_chart": {"planets": planets, "nakshatra": {"name": "Rohini"}},
+            "pdf_reports": reports, "swamiji_reading": {"reading": "Om " * 200}}
+
+
+def test_round_trip_restores_the_payload_with_shared_subtrees_stored_once():
+    profile = _profile()
+    blob = encode_payload(profile)
+
+    assert decode_payload(blob) == profile
+    assert len(blob) * 5 < len(json.dumps(profile))
+    shared, root = deduplicate(profile)
+    report = root["pdf_reports"]["basic_prediction"]
+    assert report["data"] == report["structured_data"] and list(report["data"]) == ["\x00"]
+    # The planet list appears four times and each report twice, but each is kept once
+    assert len(json.dumps([shared, root])) * 2 < len(json.dumps(profile))
+
+
+def test_decoded_duplicates_are_independent_copies():
+    profile = decode_payload(encode_payload(_profile()))
+    report = profile["pdf_reports"]["basic_prediction"]
+    report["data"]["report"] = "changed"
+    assert report["structured_data"]["report"] == "basic_prediction"
+
+
+def test_unknown_codecs_are_rejected():
+    blob = encode_payload({"a": 1})
+    with pytest.raises(ValueError):
+        decode_payload(blob[:4] + b"?" + blob[5:])
+    with pytest.raises(ValueError):
+        decode_payload(b'{"a": 1}')
+
+
+def test_stored_entries_decode_only_when_read(monkeypatch):
+    calls = []
+    real_decode = chart_payload_codec.decode_payload
+    monkeypatch.setattr("services.birth_chart_store.decode_payload",
+                        lambda blob: calls.append(blob) or real_decode(blob))
+    entry = StoredChart({"birth_hash": "h"}, {"chart_data": encode_payload({"nakshatra": "Rohini"}),
+                                              "profile_data": {"legacy": True}})
+
+    assert "chart_data" in entry and entry["birth_hash"] == "h" and not calls
+    assert entry["chart_data"] == {"nakshatra": "Rohini"} and entry.get("chart_data") == {"nakshatra": "Rohini"}
+    assert len(calls) == 1
+    assert entry["profile_data"] == {"legacy": True}  # Pre-migration JSONB passes through
+    assert entry.get("missing") is None
+
+
+class _StoreConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetchrow(self, query, birth_hash):
+        return self.rows.get(birth_hash)
+
+
+def test_user_references_resolve_through_the_store():
+    now = datetime.now()
+    row = {"birth_hash": "h", "chart_blob": encode_payload({"nakshatra": "Rohini"}),
+           "profile_blob": encode_payload({"birth_chart": {"nakshatra": "Rohini"}, "swamiji_reading": {}}),
+           "chart_data": None, "profile_data": None, "created_at": now, "expires_at": now + timedelta(days=1)}
+    conn = _StoreConnection({"h": row})
+    store = BirthChartStore()
+
+    async def resolve(value):
+        return await store.resolve_user_data(conn, value)
+
+    profile = asyncio.run(resolve(json.dumps(stored_reference("h", "profile", {"session_id": "s1"}))))
+    assert profile == {"birth_chart": {"nakshatra": "Rohini"}, "swamiji_reading": {}, "session_id": "s1"}
+    assert asyncio.run(resolve(stored_reference("h"))) == {"nakshatra": "Rohini"}
+    assert asyncio.run(resolve(stored_reference("gone", "profile"))) is None
+    assert asyncio.run(resolve({"birth_chart": {"inline": True}})) == {"birth_chart": {"inline": True}}
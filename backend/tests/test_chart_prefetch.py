@@ -0,0 +1,156 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from services.birth_chart_store import generate_birth_details_hash
+from services.chart_prefetch import ChartPrefetchQueue, birth_details_from_user, needs_prefetch
+
+BIRTH = {"date": "1990-04-12", "time": "06:30", "location": "Jaffna, Sri Lanka", "timezone": "Asia/Colombo"}
+
+
+class _JobConnection:
+    """Just enough of the chart_prefetch_jobs table for the queue's statements"""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+
+    async def fetchval(self, query, *args):
+        if "INSERT INTO chart_prefetch_jobs" in query:
+            email, birth_hash, details, reason = args
+            if any(j["user_email"] == email and j["birth_hash"] == birth_hash and j["status"] in ("pending", "running")
+                   for j in self.jobs.values()):
+                return None
+            job_id = len(self.jobs) + 1
+            self.jobs[job_id] = {"user_email": email, "birth_hash": birth_hash, "birth_details": details,
+                                 "status": "pending", "attempts": 0, "last_error": None}
+            return job_id
+        if "SET status = $2" in query:
+            job_id, status, error, _ = args
+            self.jobs[job_id].update(status=status, last_error=error)
+            return job_id
+        return 0  # Stale-job release
+
+    async def fetchrow(self, query, job_id):
+        job = self.jobs.get(job_id)
+        if not job or job["status"] != "pending":
+            return None
+        job.update(status="running", attempts=job["attempts"] + 1)
+        return dict(job)
+
+    async def fetch(self, query, limit):
+        return [{"id": job_id} for job_id, job in self.jobs.items() if job["status"] == "pending"][:limit]
+
+
+class _ProfileService:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    async def generate_and_cache_complete_profile(self, email, birth_details):
+        self.calls.append((email, birth_details))
+        await asyncio.sleep(0.01)
+        if len(self.calls) <= self.failures:
+            raise RuntimeError("Prokerala unavailable")
+        return {"birth_chart": {}, "cached": True}
+
+
+def _queue(service, fake_pool, **kwargs):
+    queue = ChartPrefetchQueue(workers=2, poll_interval=3600, enabled=True, profile_service=service, **kwargs)
+    jobs = {}
+    pool = fake_pool(lambda: _JobConnection(jobs))
+    queue._pool = lambda: pool
+    return queue, jobs
+
+
+def test_registration_prefetch_runs_once_in_the_background(fake_pool):
+    service = _ProfileService()
+    queue, jobs = _queue(service, fake_pool)
+
+    async def scenario():
+        accepted = [await queue.enqueue("a@x.com", BIRTH) for _ in range(3)]
+        await queue.enqueue("b@x.com", BIRTH)
+        await asyncio.sleep(0.05)
+        await queue.stop()
+        return accepted
+
+    assert asyncio.run(scenario()) == [True, True, True]
+    assert [email for email, _ in service.calls] == ["a@x.com", "b@x.com"]
+    assert [job["status"] for job in jobs.values()] == ["done", "done"]
+    assert json.loads(jobs[1]["birth_details"]) == BIRTH
+    assert queue.stats["deduplicated"] == 2 and queue.stats["completed"] == 2
+
+
+def test_failed_jobs_retry_then_give_up(fake_pool):
+    service = _ProfileService(failures=5)
+    queue, jobs = _queue(service, fake_pool, max_attempts=2)
+
+    async def scenario():
+        await queue.enqueue("a@x.com", BIRTH)
+        await asyncio.sleep(0.03)
+        first = jobs[1]["status"]
+        await queue.recover()  # The poller picks up the due retry
+        await asyncio.sleep(0.03)
+        await queue.stop()
+        return first
+
+    assert asyncio.run(scenario()) == "pending"
+    assert jobs[1]["status"] == "failed" and jobs[1]["attempts"] == 2
+    assert jobs[1]["last_error"] == "Prokerala unavailable"
+    assert queue.stats["retried"] == 1 and queue.stats["failed"] == 1
+
+
+def test_stopping_mid_job_hands_the_job_back(fake_pool):
+    service = _ProfileService()
+    queue, jobs = _queue(service, fake_pool)
+
+    async def slow_profile(email, birth_details):
+        await asyncio.sleep(10)
+
+    service.generate_and_cache_complete_profile = slow_profile
+
+    async def scenario():
+        await queue.enqueue("a@x.com", BIRTH)
+        await asyncio.sleep(0.01)
+        running = jobs[1]["status"]
+        await queue.stop()
+        return running
+
+    assert asyncio.run(scenario()) == "running"
+    assert jobs[1]["status"] == "pending" and jobs[1]["last_error"] == "Interrupted by shutdown"
+
+
+def test_queue_overflow_stays_in_the_table_until_recovered(fake_pool):
+    service = _ProfileService()
+    queue, jobs = _queue(service, fake_pool, max_queue=1)
+
+    async def scenario():
+        queue.start()
+        for task in queue._tasks[:-1]:
+            task.cancel()  # Workers busy elsewhere: nothing drains the queue yet
+        for n in range(3):
+            await queue.enqueue(f"user{n}@x.com", BIRTH)
+        overflow = queue.stats["overflow"]
+        await queue.stop()
+        queue.start()  # Restart: the pending jobs are resumed from the table
+        await queue.recover()
+        for _ in range(10):
+            await asyncio.sleep(0.02)
+            await queue.recover()
+        await queue.stop()
+        return overflow
+
+    assert asyncio.run(scenario()) == 2
+    assert all(job["status"] == "done" for job in jobs.values())
+    assert len(service.calls) == 3
+
+
+def test_login_prefetches_only_missing_stale_or_changed_profiles():
+    fresh = {"email": "a@x.com", "birth_date": datetime(1990, 4, 12).date(), "birth_time": "06:30",
+             "birth_location": "Jaffna, Sri Lanka", "birth_chart_data": "{}",
+             "birth_chart_hash": generate_birth_details_hash(BIRTH), "birth_chart_cached_at": datetime.now()}
+    assert birth_details_from_user(fresh) == BIRTH
+    assert not needs_prefetch(fresh)
+    assert needs_prefetch({**fresh, "birth_chart_data": None})
+    assert needs_prefetch({**fresh, "birth_location": "Chennai"})
+    assert needs_prefetch({**fresh, "birth_chart_cached_at": datetime.now() - timedelta(days=31)})
+    assert not needs_prefetch({**fresh, "birth_date": None})
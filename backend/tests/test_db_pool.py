@@ -0,0 +1,294 @@
+"""
+Tests for the bounded AsyncPGCompatPool.
+
+psycopg connections are replaced with an in-memory fake so the pool's
+checkout/checkin, sizing, timeout and recycling behaviour can be exercised
+without a running PostgreSQL server.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import knowledge_seeding_system as kss
+
+
+class _FakeTransactionStatus:
+    IDLE = "idle"
+    INTRANS = "intrans"
+
+
+class _FakeRawConnection:
+    opened = 0
+
+    def __init__(self):
+        _FakeRawConnection.opened += 1
+        self.closed = False
+        self.broken = False
+        self.info = SimpleNamespace(transaction_status=_FakeTransactionStatus.IDLE)
+        self.executed = []
+
+    @classmethod
+    async def connect(cls, *args, **kwargs):
+        return cls()
+
+    async def execute(self, query, *args):
+        if self.broken:
+            raise RuntimeError("connection broken")
+        self.executed.append(query)
+
+    async def rollback(self):
+        self.info.transaction_status = _FakeTransactionStatus.IDLE
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_psycopg(monkeypatch):
+    _FakeRawConnection.opened = 0
+    monkeypatch.setattr(kss, "PSYCOPG_AVAILABLE", True)
+    monkeypatch.setattr(kss, "AsyncConnection", _FakeRawConnection, raising=False)
+    monkeypatch.setattr(kss, "dict_row", None, raising=False)
+    monkeypatch.setattr(
+        kss, "psycopg", SimpleNamespace(pq=SimpleNamespace(TransactionStatus=_FakeTransactionStatus)), raising=False
+    )
+
+    async def _no_adapters(self, conn):
+        return None
+
+    monkeypatch.setattr(kss.AsyncPGCompatPool, "_register_pgvector_adapters", _no_adapters)
+
+
+def test_connections_are_reused_across_acquires():
+    async def scenario():
+        pool = kss.AsyncPGCompatPool("postgresql://test", min_size=0, max_size=2)
+        async with pool.acquire() as first:
+            raw = first._conn
+        async with pool.acquire() as second:
+            assert second._conn is raw
+        stats = pool.get_stats()
+        await pool.close()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert _FakeRawConnection.opened == 1
+    assert stats["connections_opened"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["idle"] == 1 and stats["in_use"] == 0
+
+
+def test_pool_never_exceeds_max_size_and_waiters_are_served():
+    async def scenario():
+        pool = kss.AsyncPGCompatPool("postgresql://test", min_size=0, max_size=2)
+        peak = 0
+
+        async def worker():
+            nonlocal peak
+            async with pool.acquire():
+                peak = max(peak, pool.get_stats()["in_use"])
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(worker() for _ in range(10)))
+        stats = pool.get_stats()
+        await pool.close()
+        return peak, stats
+
+    peak, stats = asyncio.run(scenario())
+    assert peak == 2
+    assert _FakeRawConnection.opened == 2
+    assert stats["checkout_waits"] > 0
+    assert stats["checkouts"] == 10
+
+
+def test_acquire_times_out_when_pool_is_exhausted():
+    async def scenario():
+        pool = kss.AsyncPGCompatPool("postgresql://test", min_size=0, max_size=1)
+        held = await pool.acquire()
+        with pytest.raises(kss.PoolTimeoutError):
+            async with pool.acquire(timeout=0.05):
+                pass
+        await pool.release(held)
+        # The pool is usable again once the connection is returned
+        async with pool.acquire(timeout=0.05):
+            pass
+        stats = pool.get_stats()
+        await pool.close()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["checkout_timeouts"] == 1
+
+
+def test_broken_and_expired_connections_are_replaced():
+    async def scenario():
+        pool = kss.AsyncPGCompatPool("postgresql://test", min_size=0, max_size=1, max_lifetime=3600)
+        async with pool.acquire() as conn:
+            conn._conn.broken = True
+        async with pool.acquire() as conn:
+            first_healthy = conn._conn
+        pool.max_lifetime = 0.0001
+        await asyncio.sleep(0.01)
+        async with pool.acquire() as conn:
+            replaced = conn._conn is not first_healthy
+        await pool.close()
+        return replaced
+
+    assert asyncio.run(scenario())
+    assert _FakeRawConnection.opened == 3
+
+
+def test_connection_left_in_transaction_is_rolled_back_on_release():
+    async def scenario():
+        pool = kss.AsyncPGCompatPool("postgresql://test", min_size=0, max_size=1)
+        async with pool.acquire() as conn:
+            conn._conn.info.transaction_status = _FakeTransactionStatus.INTRANS
+            raw = conn._conn
+        async with pool.acquire() as conn:
+            reused = conn._conn is raw
+        await pool.close()
+        return reused, raw.info.transaction_status
+
+    reused, status = asyncio.run(scenario())
+    assert reused
+    assert status == _FakeTransactionStatus.IDLE
+
+
+def test_reaper_trims_idle_connections_to_min_size():
+    async def scenario():
+        pool = kss.AsyncPGCompatPool("postgresql://test", min_size=1, max_size=3, max_idle=0.001)
+        held = [await pool.acquire() for _ in range(3)]
+        for conn in held:
+            await pool.release(conn)
+        await asyncio.sleep(0.01)
+        await pool._reap_once()
+        stats = pool.get_stats()
+        await pool.close()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["size"] == 1
+    assert stats["idle"] == 1
+
+
+def test_checkouts_queued_during_reap_get_the_kept_connections():
+    async def scenario():
+        pool = kss.AsyncPGCompatPool("postgresql://test", min_size=0, max_size=4, max_idle=0, max_lifetime=3600)
+        held = [await pool.acquire() for _ in range(4)]
+        for conn in held[1:]:
+            await pool.release(conn)
+        expired = pool._idle[-1]
+        kept = {pooled.raw for pooled in list(pool._idle)[:2]}
+        expired.created_at -= 7200
+        closing = asyncio.Event()
+
+        async def slow_close():
+            closing.set()
+            await asyncio.sleep(0.05)
+
+        expired.raw.close = slow_close
+        reap = asyncio.create_task(pool._reap_once())
+        await closing.wait()
+        # The freed slot is taken, so further checkouts queue while the reaper holds the kept connections
+        filler = await pool.acquire(timeout=0.01)
+        started = asyncio.get_running_loop().time()
+        waited = await asyncio.gather(pool.acquire(timeout=2), pool.acquire(timeout=2))
+        waited_for = asyncio.get_running_loop().time() - started
+        await reap
+        got_kept = {conn._conn for conn in waited} == kept
+        for conn in [*waited, filler, held[0]]:
+            await pool.release(conn)
+        await pool.close()
+        return got_kept, waited_for
+
+    got_kept, waited_for = asyncio.run(scenario())
+    # Served as soon as the reaper finishes, not when the acquire timeout re-checks the idle stack
+    assert got_kept and waited_for < 1
+
+
+def test_closed_pool_rejects_acquire():
+    async def scenario():
+        pool = kss.AsyncPGCompatPool("postgresql://test", min_size=0, max_size=1)
+        await pool.close()
+        with pytest.raises(kss.PoolClosedError):
+            await pool.acquire()
+
+    asyncio.run(scenario())
+
+
+def test_telemetry_attributes_hold_time_to_route_template():
+    class _Route:
+        path = "/api/sessions/{session_id}"
+
+    async def scenario():
+        pool = kss.AsyncPGCompatPool("postgresql://test", min_size=0, max_size=1)
+        scope = {"type": "http", "method": "GET", "path": "/api/sessions/42"}
+        token = kss.set_db_route_context(scope)
+        try:
+            scope["route"] = _Route()  # set by the router after the middleware ran
+            async with pool.acquire():
+                await asyncio.sleep(0.01)
+        finally:
+            kss.reset_db_route_context(token)
+        async with pool.acquire():
+            pass
+        telemetry = pool.get_telemetry()
+        await pool.close()
+        return telemetry
+
+    telemetry = asyncio.run(scenario())
+    routes = {r["route"]: r for r in telemetry["routes"]}
+    assert routes["GET /api/sessions/{session_id}"]["checkouts"] == 1
+    assert routes["GET /api/sessions/{session_id}"]["max_hold_ms"] >= 10
+    assert routes["background"]["checkouts"] == 1
+    assert telemetry["checkout_wait_ms"]["count"] == 2
+    assert telemetry["pool"]["in_use"] == 0
+
+
+def test_telemetry_counts_timeouts_per_route():
+    async def scenario():
+        pool = kss.AsyncPGCompatPool("postgresql://test", min_size=0, max_size=1)
+        held = await pool.acquire()
+        token = kss.set_db_route_context("report-job")
+        try:
+            with pytest.raises(kss.PoolTimeoutError):
+                await pool.acquire(timeout=0.01)
+        finally:
+            kss.reset_db_route_context(token)
+        await pool.release(held)
+        telemetry = pool.get_telemetry()
+        await pool.close()
+        return telemetry
+
+    telemetry = asyncio.run(scenario())
+    routes = {r["route"]: r for r in telemetry["routes"]}
+    assert routes["report-job"]["timeouts"] == 1
+    assert telemetry["pool"]["checkout_timeouts"] == 1
+
+
+def test_translate_params_memoises_and_reorders_placeholders():
+    kss._translate_query.cache_clear()
+    query = "SELECT * FROM users WHERE email = $1 AND (credits > $2 OR referrer = $1)"
+    for _ in range(3):
+        translated, args = kss._translate_params(query, ("a@b.c", 5))
+    assert translated == "SELECT * FROM users WHERE email = %s AND (credits > %s OR referrer = %s)"
+    assert args == ("a@b.c", 5, "a@b.c")
+    stats = kss.get_sql_cache_stats()
+    assert stats["misses"] == 1 and stats["hits"] == 2
+
+    translated, args = kss._translate_params("SELECT $1, $2", (1, 2))
+    assert translated == "SELECT %s, %s" and args == (1, 2)
+
+
+def test_pooled_connections_enable_server_side_prepare():
+    async def scenario():
+        pool = kss.AsyncPGCompatPool("postgresql://test", min_size=0, max_size=1)
+        async with pool.acquire() as conn:
+            raw = conn._conn
+        await pool.close()
+        return raw
+
+    raw = asyncio.run(scenario())
+    assert raw.prepare_threshold == kss.DB_PREPARE_THRESHOLD
+    assert raw.prepared_max == kss.DB_PREPARED_MAX
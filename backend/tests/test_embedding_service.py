@@ -0,0 +1,221 @@
+"""
+Tests for the coalescing EmbeddingService using a fake OpenAI client.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from services.embedding_service import EmbeddingService, EMBEDDING_DIM
+
+
+class _BadRequest(Exception):
+    status_code = 400
+
+
+class _FakeEmbeddings:
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.fail = fail
+
+    async def create(self, model, input):
+        self.calls.append(list(input))
+        await asyncio.sleep(0.001)
+        if self.fail:
+            raise RuntimeError("upstream unavailable")
+        if any(text.startswith("REJECT") for text in input):
+            raise _BadRequest("maximum context length exceeded")
+        # Return out of order to make sure results are matched by index
+        data = [SimpleNamespace(index=i, embedding=[float(len(text)), float(i)]) for i, text in enumerate(input)]
+        return SimpleNamespace(data=list(reversed(data)))
+
+
+def _service(fail: bool = False, **kwargs) -> EmbeddingService:
+    client = SimpleNamespace(embeddings=_FakeEmbeddings(fail=fail))
+    return EmbeddingService(openai_client=client, **kwargs)
+
+
+def test_concurrent_requests_are_coalesced_into_one_batch():
+    service = _service(batch_window_ms=5)
+
+    async def scenario():
+        return await asyncio.gather(
+            service.embed("Moon in Rohini"),
+            service.embed("Saturn in Capricorn"),
+            service.embed_many(["Jupiter in 9th house", "Moon in Rohini"]),
+        )
+
+    moon, saturn, many = asyncio.run(scenario())
+    calls = service.client.embeddings.calls
+    assert len(calls) == 1
+    assert sorted(calls[0]) == sorted(["Moon in Rohini", "Saturn in Capricorn", "Jupiter in 9th house"])
+    assert moon[0] == float(len("Moon in Rohini"))
+    assert saturn[0] == float(len("Saturn in Capricorn"))
+    assert many[1] == moon
+    assert service.get_stats()["deduplicated"] == 1
+
+
+def test_batches_are_split_at_max_batch():
+    service = _service(batch_window_ms=50, max_batch=2)
+
+    async def scenario():
+        return await service.embed_many(["a", "b", "c"])
+
+    vectors = asyncio.run(scenario())
+    assert [len(call) for call in service.client.embeddings.calls] == [2, 1]
+    assert [v[0] for v in vectors] == [1.0, 1.0, 1.0]
+
+
+def test_batches_are_also_capped_by_total_characters():
+    service = _service(batch_window_ms=50, max_batch_chars=20000)
+
+    async def scenario():
+        return await service.embed_many(["a" * 8000, "b" * 8000, "c" * 8000])
+
+    asyncio.run(scenario())
+    assert [len(call) for call in service.client.embeddings.calls] == [2, 1]
+
+
+def test_a_rejected_input_only_fails_its_own_caller():
+    service = _service(batch_window_ms=5)
+
+    async def scenario():
+        return await asyncio.gather(*(service.embed(text) for text in ["a", "b", "REJECT me", "c", "d"]),
+                                    return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert isinstance(results[2], _BadRequest)
+    assert [r[0] for i, r in enumerate(results) if i != 2] == [1.0, 1.0, 1.0, 1.0]
+    stats = service.get_stats()
+    assert stats["errors"] == 1 and stats["split_batches"] >= 1 and stats["in_flight"] == 0
+
+
+def test_empty_text_is_not_sent_upstream():
+    service = _service()
+    vector = asyncio.run(service.embed("   "))
+    assert vector == [0.0] * EMBEDDING_DIM
+    assert service.client.embeddings.calls == []
+
+
+def test_errors_propagate_to_every_waiter():
+    service = _service(fail=True, batch_window_ms=1)
+
+    async def scenario():
+        results = await asyncio.gather(service.embed("x"), service.embed("y"), return_exceptions=True)
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert service.get_stats()["errors"] == 1
+    assert service.get_stats()["in_flight"] == 0
+
+
+def test_cache_write_failure_is_not_a_request_error():
+    service = _service(batch_window_ms=1)
+
+    async def broken_put_many(vectors):
+        raise RuntimeError("cache table unavailable")
+
+    service.cache.put_many = broken_put_many
+    vector = asyncio.run(service.embed("Moon in Rohini"))
+    stats = service.get_stats()
+    assert vector[0] == float(len("Moon in Rohini"))
+    assert stats["errors"] == 0 and stats["cache_write_errors"] == 1
+
+
+def test_cancelled_caller_does_not_cancel_shared_request():
+    service = _service(batch_window_ms=5)
+
+    async def scenario():
+        first = asyncio.ensure_future(service.embed("shared text"))
+        second = asyncio.ensure_future(service.embed("shared text"))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    vector = asyncio.run(scenario())
+    assert vector[0] == float(len("shared text"))
+
+
+class _FakeCacheConnection:
+    def __init__(self, table):
+        self.table = table
+
+    async def fetch(self, query, model, hashes):
+        return [
+            {"content_hash": h, "embedding": self.table[(model, h)]}
+            for h in hashes if (model, h) in self.table
+        ]
+
+    async def execute(self, query, model, hashes, blobs):
+        for h, blob in zip(hashes, blobs):
+            self.table.setdefault((model, h), blob)
+
+
+def test_repeated_texts_are_served_from_memory_cache():
+    service = _service(batch_window_ms=1)
+
+    async def scenario():
+        first = await service.embed("Moon in Rohini")
+        second = await service.embed("Moon in Rohini")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert len(service.client.embeddings.calls) == 1
+    stats = service.get_stats()
+    assert stats["cache_hits"] == 1
+    assert stats["cache"]["memory"]["hits"] == 1
+
+
+def test_memory_tier_evicts_least_recently_used_within_byte_budget():
+    from services.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache("test-model", max_bytes=2 * (4 * 4 + 160), persistent=False)
+
+    async def scenario():
+        await cache.put_many({"a": [1.0] * 4, "b": [2.0] * 4})
+        await cache.get_many(["a"])  # "a" becomes most recently used
+        await cache.put_many({"c": [3.0] * 4})
+        return await cache.get_many(["a", "b", "c"])
+
+    found = asyncio.run(scenario())
+    assert set(found) == {"a", "c"}
+    stats = cache.get_stats()["memory"]
+    assert stats["evictions"] == 1
+    assert stats["bytes_used"] <= stats["max_bytes"]
+
+
+def test_persistent_tier_warms_a_fresh_process(fake_pool):
+    table = {}
+    pool = fake_pool(lambda: _FakeCacheConnection(table))
+
+    async def scenario():
+        writer = _service(batch_window_ms=1)
+        writer.attach_pool(pool)
+        original = await writer.embed("Saturn in Capricorn")
+        await asyncio.sleep(0.01)  # let the background write finish
+
+        reader = _service(batch_window_ms=1)
+        reader.attach_pool(pool)
+        restored = await reader.embed("Saturn in Capricorn")
+        return original, restored, reader
+
+    original, restored, reader = asyncio.run(scenario())
+    assert restored == original  # small float values round-trip exactly through float32
+    assert reader.client.embeddings.calls == []
+    assert reader.get_stats()["cache"]["persistent"]["hits"] == 1
+
+
+def test_monitoring_stats_report_cache_effectiveness(monkeypatch):
+    import services.embedding_service as embedding_module
+
+    monkeypatch.setattr(embedding_module, "_embedding_service", None)
+    assert embedding_module.get_embedding_stats() is None
+
+    service = _service(batch_window_ms=1)
+    monkeypatch.setattr(embedding_module, "_embedding_service", service)
+    asyncio.run(service.embed_many(["Moon in Rohini", "Moon in Rohini"]))
+    asyncio.run(service.embed("Moon in Rohini"))
+    stats = embedding_module.get_embedding_stats()
+    assert stats["cache_hits"] == 1 and stats["cache_write_errors"] == 0
+    assert stats["cache"]["memory"]["hits"] == 1
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pytest
+
+from services.gazetteer import (
+    GAZETTEER_INDEX, Gazetteer, build_index, get_gazetteer, prokerala_params, read_source,
+    resolve_birth_place, utc_offset,
+)
+
+
+def test_committed_index_matches_the_city_source(tmp_path):
+    rebuilt = tmp_path / "cities.idx"
+    build_index(read_source(), str(rebuilt))
+    with open(GAZETTEER_INDEX, "rb") as committed:
+        assert rebuilt.read_bytes() == committed.read(), "run: python -m services.gazetteer build"
+
+
+@pytest.mark.parametrize("location, expected", [
+    ("Jaffna, Sri Lanka", "Jaffna"),
+    ("madras", "Chennai"),              # Alias
+    ("Yalpanam", "Jaffna"),
+    ("Zürich", "Zurich"),               # Accent folding
+    ("Jafna", "Jaffna"),                # Fuzzy
+    ("Trincomali, Sri Lanka", "Trincomalee"),
+    ("Scarborough, ON, Canada", "Scarborough"),
+    ("Georgetown, Guyana", "Georgetown"),  # Country hint beats the larger Penang alias
+    ("Jaffna Sri Lanka", "Jaffna"),
+])
+def test_resolve_free_text_locations(location, expected):
+    assert get_gazetteer().resolve(location).name == expected
+
+
+def test_prefix_lookup_and_unknown_places():
+    gazetteer = get_gazetteer()
+    assert {"Kandy", "Kanchipuram", "Kanpur"} <= {place.name for place in gazetteer.prefix("kan")}
+    assert gazetteer.resolve("Atlantis") is None
+    assert gazetteer.resolve("") is None
+
+
+def test_historic_offsets_come_from_the_timezone_database():
+    # Sri Lanka ran on +06:00 between 1996 and 2006
+    assert utc_offset("Asia/Colombo", datetime(2000, 5, 1, 10)).total_seconds() == 6 * 3600
+    assert utc_offset("Asia/Colombo", datetime(2010, 5, 1, 10)).total_seconds() == 5.5 * 3600
+    assert utc_offset("America/Toronto", datetime(1990, 7, 15, 8, 30)).total_seconds() == -4 * 3600
+
+
+def test_prokerala_params_use_the_birth_place():
+    datetime_str, coordinates, place = prokerala_params(
+        {"date": "1990-01-15", "time": "08:30", "location": "Toronto, Canada"})
+    assert datetime_str == "1990-01-15T08:30:00-05:00"
+    assert coordinates == "43.70011,-79.4163"
+    assert place["source"] == "gazetteer" and place["timezone"] == "America/Toronto"
+
+    # Explicit coordinates win; unknown places keep the Jaffna default
+    provided = resolve_birth_place({"date": "2000-01-01", "time": "12:00", "latitude": 1.5, "longitude": 2.5,
+                                    "timezone": "Europe/London", "location": "Jaffna"})
+    assert (provided["latitude"], provided["utc_offset"], provided["source"]) == (1.5, "+00:00", "provided")
+    default = resolve_birth_place({"date": "2010-01-01", "time": "12:00", "location": "Atlantis"})
+    assert (default["latitude"], default["utc_offset"], default["source"]) == (9.66845, "+05:30", "default")
+
+
+def test_index_build_and_binary_search(tmp_path):
+    rows = [{"name": name, "aliases": [], "admin": "", "country": "XX", "latitude": float(i),
+             "longitude": 0.0, "timezone": "UTC", "population": i}
+            for i, name in enumerate(["Alpha", "Beta", "Betania", "Gamma", "Omega"])]
+    index = tmp_path / "cities.idx"
+    assert build_index(rows, str(index)) == 5
+
+    gazetteer = Gazetteer(str(index))
+    assert [place.name for place in gazetteer.lookup("beta")] == ["Beta"]
+    assert [place.name for place in gazetteer.prefix("bet")] == ["Betania", "Beta"]
+    assert gazetteer.lookup("omega")[0].latitude == 4.0
+    assert gazetteer.lookup("zeta") == [] and gazetteer.lookup("aaa") == []
+    gazetteer.close()
@@ -0,0 +1,115 @@
+"""
+Tests for streaming RAG guidance using a local fake OpenAI stream.
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import enhanced_rag_knowledge_engine as rag
+from utils.sse_utils import format_sse_event, sse_stream
+
+
+def _chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class _FakeCompletions:
+    def __init__(self, pieces, fail_after=None):
+        self.pieces = pieces
+        self.fail_after = fail_after
+        self.kwargs = None
+
+    async def create(self, **kwargs):
+        self.kwargs = kwargs
+        pieces, fail_after = self.pieces, self.fail_after
+
+        async def stream():
+            for i, piece in enumerate(pieces):
+                if fail_after is not None and i == fail_after:
+                    raise RuntimeError("stream dropped")
+                await asyncio.sleep(0)
+                yield _chunk(piece)
+            yield SimpleNamespace(choices=[])  # usage-only chunk
+
+        return stream()
+
+
+class _FakeRagEngine:
+    def __init__(self, completions):
+        self.openai_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    async def retrieve_knowledge_for_query(self, query):
+        return [rag.KnowledgeRetrieval("Saturn teaches patience", "BPHS", 5, 0.9123, "classical_astrology",
+                                       "principle", "vedic", {})]
+
+    async def _get_service_configuration(self, service_type):
+        return {}
+
+
+class _FakePersonaEngine:
+    async def get_persona_for_service(self, service_type, service_config):
+        return rag.SwamiPersonaConfig(persona_mode="career_guide")
+
+    async def generate_persona_enhanced_prompt(self, persona_config, knowledge, question, service_config):
+        return "You are Swamiji"
+
+
+@pytest.fixture
+def fake_engines(monkeypatch):
+    def install(completions):
+        monkeypatch.setattr(rag, "rag_engine", _FakeRagEngine(completions))
+        monkeypatch.setattr(rag, "persona_engine", _FakePersonaEngine())
+    return install
+
+
+def _collect(question="Will my career improve?"):
+    async def scenario():
+        return [event async for event in rag.stream_rag_enhanced_guidance(question, None, "career")]
+    return asyncio.run(scenario())
+
+
+def test_metadata_is_sent_before_tokens_and_done_carries_full_text(fake_engines):
+    completions = _FakeCompletions(["Om. ", "Saturn ", "rewards patience."])
+    fake_engines(completions)
+
+    events = _collect()
+
+    names = [name for name, _ in events]
+    assert names == ["metadata", "token", "token", "token", "done"]
+    assert events[0][1]["persona_mode"] == "career_guide"
+    assert events[0][1]["knowledge_sources"][0]["relevance"] == 0.912
+    assert events[-1][1]["enhanced_guidance"] == "Om. Saturn rewards patience."
+    assert completions.kwargs["stream"] is True
+
+
+def test_stream_failure_reports_error_and_keeps_partial_text(fake_engines):
+    fake_engines(_FakeCompletions(["Om. ", "never sent"], fail_after=1))
+
+    events = _collect()
+
+    assert [name for name, _ in events] == ["metadata", "token", "error", "done"]
+    assert events[-1][1]["enhanced_guidance"] == "Om. "
+
+
+def test_uninitialised_engine_falls_back_without_metadata(monkeypatch):
+    monkeypatch.setattr(rag, "rag_engine", None)
+    events = _collect()
+    assert [name for name, _ in events] == ["error", "done"]
+    assert events[-1][1]["enhanced_guidance"] == rag.RAG_GUIDANCE_FALLBACK
+
+
+def test_sse_frames_are_json_encoded():
+    frame = format_sse_event("token", {"text": "line one\nசுவாமி"})
+    assert frame.startswith("event: token\ndata: ")
+    assert frame.endswith("\n\n")
+    assert json.loads(frame.split("data: ", 1)[1]) == {"text": "line one\nசுவாமி"}
+
+    async def scenario():
+        async def events():
+            yield "done", {"ok": True}
+        return [f async for f in sse_stream(events())]
+
+    assert asyncio.run(scenario()) == ['event: done\ndata: {"ok": true}\n\n']
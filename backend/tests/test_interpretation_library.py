@@ -0,0 +1,97 @@
+import asyncio
+
+import services.birth_chart_interpretation_service as interpretation_module
+from services.birth_chart_interpretation_service import BirthChartInterpretationService
+from services.interpretation_library import InterpretationLibrary, library_entries
+
+
+class _LibraryConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetch(self, query, language, persona, version):
+        return [{"entry_key": key, "interpretation": text}
+                for (key, lang, pers, ver), text in self.rows.items()
+                if (lang, pers, ver) == (language, persona, version)]
+
+    async def execute(self, query, key, kind, planet, placement, language, persona, version, text, source):
+        self.rows[(key, language, persona, version)] = text
+
+
+def _library(fake_pool):
+    library = InterpretationLibrary(version=1)
+    rows = {}
+    pool = fake_pool(lambda: _LibraryConnection(rows))
+    library._pool = lambda: pool
+    return library, rows
+
+
+def test_warm_generates_every_sign_and_house_entry_once(fake_pool):
+    library, rows = _library(fake_pool)
+    queries = []
+
+    async def generate(query):
+        queries.append(query)
+        return f"Reading {len(queries)}."
+
+    first = asyncio.run(library.warm(generate, language="ta"))
+    second = asyncio.run(library.warm(generate, language="ta"))
+
+    assert len(library_entries()) == 228
+    assert first == {"total": 228, "existing": 0, "generated": 228, "failed": 0}
+    assert second["existing"] == 228 and second["generated"] == 0
+    assert len(queries) == 228 and all(q.endswith("Answer in Tamil.") for q in queries)
+    assert {key for key, *_ in rows} == {entry["key"] for entry in library_entries()}
+
+
+def test_chart_is_assembled_from_the_library_without_llm_calls(monkeypatch, fake_pool):
+    library, rows = _library(fake_pool)
+    asyncio.run(library.warm(lambda query: asyncio.sleep(0, result=f"Meaning of: {query[:40]}. More detail.")))
+
+    rag_calls = []
+
+    async def fake_generate(query, persona):
+        rag_calls.append(query)
+        return "fresh"
+
+    monkeypatch.setattr(interpretation_module, "generate_interpretation", fake_generate)
+    service = BirthChartInterpretationService()
+    service.library = library
+    # Prokerala planet-position response as stored by the birth chart endpoint
+    chart = {"planetary_positions": {"data": {"planet_position": [
+        {"id": 0, "name": "Sun", "position": 10, "rasi": {"id": 9, "name": "Makara"}},
+        {"id": 1, "name": "Moon", "position": 1, "rasi": {"id": 0, "name": "Mesha"}},
+        {"id": 6, "name": "Saturn", "position": 1, "rasi": {"id": 0, "name": "Mesha"}},
+        {"id": 100, "name": "Ascendant", "position": 1, "rasi": {"id": 0, "name": "Mesha"}},
+    ]}}}
+
+    result = asyncio.run(service.get_comprehensive_interpretation(chart))
+
+    assert rag_calls == []
+    assert set(result["planetary_positions"]) == {"Sun_in_Capricorn", "Moon_in_Aries", "Saturn_in_Aries",
+                                                  "Ascendant_in_Aries"}
+    assert set(result["house_positions"]) == {"Sun_in_house_10", "Moon_in_house_1", "Saturn_in_house_1"}
+    assert result["summary"].startswith("Your chart places Sun in Capricorn (house 10), Moon in Aries (house 1)")
+    assert result["library"]["hits"] == 7 and result["library"]["misses"] == 0
+
+
+def test_library_misses_fall_back_to_rag_and_are_written_back(monkeypatch, fake_pool):
+    library, rows = _library(fake_pool)
+    rag_calls = []
+
+    async def fake_generate(query, persona):
+        rag_calls.append(query)
+        return "Mars brings courage."
+
+    monkeypatch.setattr(interpretation_module, "generate_interpretation", fake_generate)
+    service = BirthChartInterpretationService()
+    service.library = library
+    chart = {"planets": [{"name": "Mars", "sign": "Leo", "house": 5}]}
+
+    first = asyncio.run(service.get_comprehensive_interpretation(chart))
+    second = asyncio.run(service.get_comprehensive_interpretation(chart))
+
+    assert first["planetary_positions"] == {"Mars_in_Leo": "Mars brings courage."}
+    assert len(rag_calls) == 2  # Sign and house entry, once
+    assert second["library"]["hits"] == 2 and second["library"]["misses"] == 0
+    assert ("Mars_in_house_5", "en", "astrological_interpretation", 1) in rows
@@ -0,0 +1,52 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from monitoring.metric_series import MetricSeries, MetricSeriesStore
+
+SECOND = 1_000_000_000
+
+
+def test_ring_buffer_keeps_the_last_capacity_samples_without_growing():
+    series = MetricSeries(capacity=4)
+    values = series.values
+    for n in range(10):
+        series.append(float(n), timestamp_ns=n * SECOND)
+
+    assert len(series) == 4 and series.values is values  # Written in place
+    assert sorted(series.window()[0].tolist()) == [6.0, 7.0, 8.0, 9.0]
+    assert series.values.dtype == np.float64 and series.timestamps.dtype == np.int64
+
+
+def test_percentiles_and_rate_over_a_time_window():
+    series = MetricSeries(capacity=1000)
+    now = 1000 * SECOND
+    for n in range(100):
+        series.append(float(n + 1), timestamp_ns=now - (99 - n) * SECOND // 10)  # 10 per second
+    series.append(10_000.0, timestamp_ns=now - 600 * SECOND)  # Outside the window
+
+    summary = series.summary(seconds=30, now_ns=now)
+    assert summary["count"] == 100 and summary["max"] == 100.0
+    assert (summary["p50"], summary["p95"], summary["p99"]) == (50.5, 95.05, 99.01)
+    assert summary["rate_per_s"] == pytest.approx(100 / 30, rel=1e-3)
+
+
+def test_rate_only_counts_the_span_a_full_buffer_still_covers():
+    series = MetricSeries(capacity=10)
+    now = 100 * SECOND
+    for n in range(50):
+        series.append(1.0, timestamp_ns=now - (49 - n) * SECOND // 5)  # 5 per second, buffer holds 1.8s
+    assert series.rate(60, now_ns=now) == pytest.approx(10 / 1.8)
+
+
+def test_store_is_keyed_by_integration_and_metric_and_bounded():
+    store = MetricSeriesStore(capacity=8, max_series=2)
+    for ms in (100, 200, 300):
+        store.record("spiritual_guidance", "execution_time_ms", ms)
+    store.record("spiritual_guidance", "success", 1.0)
+    store.record("avatar_generation", "success", 0.0)
+
+    assert store.dropped == 1 and store.get("avatar_generation", "success") is None
+    summary = store.summary(seconds=60)
+    assert summary["spiritual_guidance"]["execution_time_ms"]["p50"] == 200.0
+    assert summary["spiritual_guidance"]["success"]["mean"] == 1.0
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import datetime
+
+from monitoring.metrics_rollups import MetricsRollups, session_totals, MONITORING_ROLLUP_BACKFILL_MINUTES
+
+
+class _RollupConnection:
+    def __init__(self, db):
+        self.db = db
+
+    async def fetchval(self, query, *args):
+        if "pg_try_advisory_lock" in query:
+            if self.db["locked"]:
+                return False
+            self.db["locked"] = True
+            return True
+        if "pg_advisory_unlock" in query:
+            self.db["locked"] = False
+            return True
+        self.db["since_minutes"].append(args[0])
+        return datetime(2026, 10, 16, 12, 0)
+
+    async def execute(self, query, *args):
+        if self.db["broken"] and self.db["broken"] in query:
+            raise RuntimeError(f"relation {self.db['broken']} does not exist")
+        self.db["executed"].append(query)
+
+    async def fetch(self, query, *args):
+        return self.db["rows"]
+
+
+def _rollups(fake_pool, locked=False, broken=None, rows=()):
+    rollups = MetricsRollups(interval=60, enabled=True)
+    db = {"locked": locked, "broken": broken, "rows": list(rows), "executed": [], "since_minutes": []}
+    pool = fake_pool(lambda: _RollupConnection(db))
+    rollups._pool = lambda: pool
+    return rollups, db
+
+
+def test_refresh_backfills_once_then_reaggregates_the_settle_window_under_the_lock(fake_pool):
+    rollups, db = _rollups(fake_pool)
+
+    assert asyncio.run(rollups.refresh()) is True
+    assert db["since_minutes"] == [MONITORING_ROLLUP_BACKFILL_MINUTES] * 2
+    assert asyncio.run(rollups.refresh()) is True
+    assert db["since_minutes"][2:] == [120, 10]  # Session and validation settle windows
+
+    minute_upserts = [q for q in db["executed"] if "FROM sessions" in q]
+    assert minute_upserts and all("ON CONFLICT (resolution, bucket, service_type)" in q for q in minute_upserts)
+    assert all("DELETE FROM monitoring_session_rollups r" in q for q in minute_upserts)  # Emptied buckets go
+    assert not db["locked"] and rollups.stats["refreshes"] == 2
+
+
+def test_refresh_skips_while_another_worker_holds_the_lock(fake_pool):
+    rollups, db = _rollups(fake_pool, locked=True)
+
+    assert asyncio.run(rollups.refresh()) is False
+    assert db["executed"] == [] and rollups.stats["skipped"] == 1
+
+
+def test_a_failing_source_does_not_block_the_others_and_its_window_is_unavailable(fake_pool):
+    rollups, db = _rollups(fake_pool, broken="integration_validations", rows=[
+        {"service_type": "", "total": 3, "completed": 1, "active": 1, "failed": 1,
+         "duration_count": 1, "duration_minutes_sum": 4.0}])
+
+    assert asyncio.run(rollups.refresh()) is True
+    assert "integrations" in rollups.stats["last_errors"] and "sessions" not in rollups.stats["last_errors"]
+    assert any("FROM sessions" in q for q in db["executed"])
+    assert not db["locked"]
+
+    async def read():
+        async with rollups._pool().acquire() as conn:
+            sessions = await rollups.session_window(conn, 60)
+            try:
+                await rollups.integration_window(conn, 60)
+            except RuntimeError:
+                return sessions, None
+            return sessions, "read"
+
+    sessions, integrations = asyncio.run(read())
+    assert sessions[0]["service_type"] is None and integrations is None  # Dashboard falls back
+
+
+def test_session_totals_sums_over_service_types():
+    rows = [{"service_type": "clarity", "total": 4, "completed": 3, "active": 1, "failed": 0,
+             "duration_count": 3, "duration_minutes_sum": 30.0},
+            {"service_type": None, "total": 2, "completed": 0, "active": 0, "failed": 2,
+             "duration_count": 0, "duration_minutes_sum": None}]
+    totals = session_totals(rows)
+    assert (totals["total"], totals["completed"], totals["failed"]) == (6, 3, 2)
+    assert totals["duration_minutes_sum"] == 30.0
+    assert session_totals([])["total"] == 0
@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+
+from services.profile_pipeline import ProfilePipeline, ProfileStageMetrics, Stage
+
+
+def _stage(name, delay, log, after=(), **kwargs):
+    async def run(results):
+        log.append(("start", name, sorted(results)))
+        await asyncio.sleep(delay)
+        log.append(("end", name))
+        return f"{name} done"
+    return Stage(name, run, after=after, **kwargs)
+
+
+def test_independent_stages_overlap_and_results_stream_in_completion_order():
+    log = []
+    metrics = ProfileStageMetrics()
+    pipeline = ProfilePipeline([
+        _stage("birth_chart", 0.02, log),
+        _stage("pdf_reports", 0.05, log),
+        _stage("swamiji_reading", 0.01, log, after=("birth_chart", "pdf_reports")),
+    ], metrics=metrics)
+
+    async def collect():
+        return [(stage, sorted(results)) async for stage, results in pipeline.stream()]
+
+    streamed = asyncio.run(collect())
+    assert streamed == [
+        ("birth_chart", ["birth_chart"]),
+        ("pdf_reports", ["birth_chart", "pdf_reports"]),
+        ("swamiji_reading", ["birth_chart", "pdf_reports", "swamiji_reading"]),
+    ]
+    # Both fetches start before either finishes; the reading sees both results
+    assert log[:2] == [("start", "birth_chart", []), ("start", "pdf_reports", [])]
+    assert ("start", "swamiji_reading", ["birth_chart", "pdf_reports"]) in log
+    snapshot = metrics.snapshot()
+    assert snapshot["pdf_reports"]["runs"] == 1 and snapshot["pdf_reports"]["latency_ms"]["max"] >= 40
+    assert snapshot["total"]["latency_ms"]["max"] < 100  # Sequential would be 80ms or more
+
+
+def test_timed_out_stage_is_replaced_by_its_fallback():
+    log = []
+    metrics = ProfileStageMetrics()
+    pipeline = ProfilePipeline([
+        _stage("birth_chart", 0.0, log),
+        _stage("pdf_reports", 5, log, timeout=0.02, fallback=lambda results, e: f"offline ({type(e).__name__})"),
+        _stage("swamiji_reading", 0.0, log, after=("pdf_reports",)),
+    ], metrics=metrics)
+
+    results = asyncio.run(pipeline.run())
+    assert results["pdf_reports"] == "offline (TimeoutError)"
+    assert results["swamiji_reading"] == "swamiji_reading done"
+    assert metrics.snapshot()["pdf_reports"]["timeouts"] == 1
+
+
+def test_failure_without_fallback_cancels_running_stages():
+    cancelled = []
+
+    async def slow(results):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append("pdf_reports")
+            raise
+
+    async def broken(results):
+        raise RuntimeError("prokerala down")
+
+    pipeline = ProfilePipeline([Stage("birth_chart", broken), Stage("pdf_reports", slow)])
+    with pytest.raises(RuntimeError):
+        asyncio.run(pipeline.run())
+    assert cancelled == ["pdf_reports"]
+
+
+def test_stages_must_be_declared_after_their_inputs():
+    with pytest.raises(ValueError):
+        ProfilePipeline([Stage("swamiji_reading", None, after=("birth_chart",)), Stage("birth_chart", None)])
+
+
+def test_service_streams_chart_before_the_reading(monkeypatch):
+    pytest.importorskip("asyncpg")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")  # The service builds its OpenAI client on init
+    from services.chart_generation_flights import SingleFlight
+    from services.enhanced_birth_chart_cache_service import EnhancedBirthChartCacheService
+
+    service = EnhancedBirthChartCacheService("postgresql://unused")
+    monkeypatch.setattr("services.enhanced_birth_chart_cache_service.get_chart_generation_flights",
+                        lambda: SingleFlight(advisory_lock=False))
+
+    async def nothing_stored(user_email, birth_details):
+        return None
+
+    async def chart(birth_details):
+        await asyncio.sleep(0.01)
+        return {"nakshatra": "Rohini"}
+
+    async def reports(birth_details):
+        await asyncio.sleep(0.03)
+        return {"basic_prediction": {}}
+
+    async def reading(chart_data, pdf_reports, birth_details):
+        return {"reading": f"{chart_data['nakshatra']} with {len(pdf_reports)} report"}
+
+    async def cache(user_email, birth_details, profile):
+        return True
+
+    service._reuse_stored_profile = nothing_stored
+    service._fetch_birth_chart_data = chart
+    service.pdf_processor.fetch_pdf_reports = reports
+    service._generate_swamiji_reading = reading
+    service._cache_complete_profile = cache
+
+    async def collect():
+        return [event async for event in service.stream_complete_profile("a@example.com", {"date": "1990-04-12"})]
+
+    events = asyncio.run(collect())
+    assert [event for event, _ in events] == ["birth_chart", "pdf_reports", "swamiji_reading", "profile"]
+    assert events[0][1] == {"profile": {"birth_chart": {"nakshatra": "Rohini"}},
+                            "pending": ["pdf_reports", "swamiji_reading"]}
+    profile = events[-1][1]
+    assert profile["cached"] and profile["swamiji_reading"] == {"reading": "Rohini with 1 report"}
+
+
+def test_fallback_reading_is_returned_but_not_cached(monkeypatch):
+    pytest.importorskip("asyncpg")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    from services.chart_generation_flights import SingleFlight
+    from services.enhanced_birth_chart_cache_service import EnhancedBirthChartCacheService
+
+    service = EnhancedBirthChartCacheService("postgresql://unused")
+    monkeypatch.setattr("services.enhanced_birth_chart_cache_service.get_chart_generation_flights",
+                        lambda: SingleFlight(advisory_lock=False))
+    cached = []
+
+    async def nothing_stored(user_email, birth_details):
+        return None
+
+    async def chart(birth_details):
+        return {"nakshatra": "Rohini"}
+
+    async def reports(birth_details):
+        return {}
+
+    async def reading(chart_data, pdf_reports, birth_details):
+        raise RuntimeError("openai down")
+
+    async def cache(user_email, birth_details, profile):
+        cached.append(profile)
+        return True
+
+    service._reuse_stored_profile = nothing_stored
+    service._fetch_birth_chart_data = chart
+    service.pdf_processor.fetch_pdf_reports = reports
+    service._generate_swamiji_reading = reading
+    service._cache_complete_profile = cache
+
+    profile = asyncio.run(service.generate_and_cache_complete_profile("a@example.com", {"date": "1990-04-12"}))
+    assert profile["swamiji_reading"]["generated_with"] == "error_fallback"
+    assert profile["cached"] is False and cached == []
@@ -0,0 +1,108 @@
+"""
+Tests for the shared, rate-limited Prokerala HTTP client.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from services.prokerala_client import ProkeralaClient
+
+
+class _SlowEndpoint:
+    """Async handler for httpx.MockTransport that records overlap and headers"""
+
+    def __init__(self, delay=0.02, fail_paths=()):
+        self.delay = delay
+        self.fail_paths = set(fail_paths)
+        self.active = 0
+        self.peak = 0
+        self.seen = []
+
+    async def __call__(self, request):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        self.seen.append((request.url.path, request.headers.get("authorization")))
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        if request.url.path in self.fail_paths:
+            raise httpx.ConnectError("boom", request=request)
+        return httpx.Response(200, json={"path": request.url.path})
+
+
+def _client(handler, **kwargs):
+    return ProkeralaClient(base_url="https://api.test", transport=httpx.MockTransport(handler), **kwargs)
+
+
+def test_independent_calls_run_concurrently_under_the_host_cap():
+    handler = _SlowEndpoint()
+
+    async def scenario():
+        client = _client(handler, rate_per_second=0, max_concurrency=3)
+        start = time.perf_counter()
+        results = await client.gather({
+            f"call{i}": (lambda i=i: client.get(f"/v2/astrology/e{i}", "tok")) for i in range(6)
+        })
+        elapsed = time.perf_counter() - start
+        await client.aclose()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(scenario())
+    assert handler.peak == 3
+    assert elapsed < 6 * handler.delay  # faster than one-by-one
+    assert [r.json()["path"] for r in results.values()] == [f"/v2/astrology/e{i}" for i in range(6)]
+    assert all(auth == "Bearer tok" for _, auth in handler.seen)
+
+
+def test_token_bucket_limits_request_rate_after_the_burst():
+    handler = _SlowEndpoint(delay=0)
+
+    async def scenario():
+        client = _client(handler, rate_per_second=50, burst=2, max_concurrency=10)
+        start = time.perf_counter()
+        await asyncio.gather(*(client.get("/v2/astrology/x") for _ in range(6)))
+        elapsed = time.perf_counter() - start
+        stats = client.get_stats()
+        await client.aclose()
+        return elapsed, stats
+
+    elapsed, stats = asyncio.run(scenario())
+    # Two requests ride the burst, the remaining four wait ~20ms each
+    assert elapsed >= 4 / 50 * 0.9
+    assert stats["requests"] == 6
+    assert stats["throttled"] > 0
+
+
+def test_gather_keeps_other_results_when_one_endpoint_fails():
+    handler = _SlowEndpoint(delay=0, fail_paths={"/v2/astrology/chart"})
+
+    async def scenario():
+        client = _client(handler, rate_per_second=0)
+        results = await client.gather({
+            "birth_details": lambda: client.get("/v2/astrology/birth-details"),
+            "chart": lambda: client.get("/v2/astrology/chart"),
+        })
+        stats = client.get_stats()
+        await client.aclose()
+        return results, stats
+
+    results, stats = asyncio.run(scenario())
+    assert results["birth_details"].status_code == 200
+    assert isinstance(results["chart"], httpx.ConnectError)
+    assert stats["errors"] == 1
+
+
+def test_monitoring_stats_are_none_until_prokerala_is_used(monkeypatch):
+    import services.prokerala_client as client_module
+
+    monkeypatch.setattr(client_module, "_prokerala_client", None)
+    monkeypatch.setattr(client_module, "get_prokerala_token_stats", lambda: None)
+    assert client_module.get_prokerala_client_stats() is None
+
+    monkeypatch.setattr(client_module, "get_prokerala_token_stats", lambda: {"refreshes": 2, "avg_wait_ms": 1.5})
+    assert client_module.get_prokerala_client_stats() == {"token": {"refreshes": 2, "avg_wait_ms": 1.5}}
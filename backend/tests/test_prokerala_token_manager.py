@@ -0,0 +1,99 @@
+"""
+Tests for the single-flight Prokerala token manager.
+"""
+
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+import services.prokerala_client as prokerala_client
+from services.prokerala_client import ProkeralaClient
+from services.prokerala_token_manager import get_prokerala_token_manager
+
+
+class _FakeProkerala:
+    """Token endpoint issuing tok-1, tok-2, ...; API endpoints reject stale tokens"""
+
+    def __init__(self, expires_in=3600):
+        self.expires_in = expires_in
+        self.issued = 0
+        self.token_calls = 0
+        self.valid_token = None
+
+    async def __call__(self, request):
+        if request.url.path == "/token":
+            self.token_calls += 1
+            await asyncio.sleep(0.01)
+            self.issued += 1
+            self.valid_token = f"tok-{self.issued}"
+            return httpx.Response(200, json={"access_token": self.valid_token, "expires_in": self.expires_in})
+        await asyncio.sleep(0.005)  # keep concurrent requests in flight together
+        if request.headers.get("authorization") != f"Bearer {self.valid_token}":
+            return httpx.Response(401, json={"error": "expired"})
+        return httpx.Response(200, json={"ok": True})
+
+
+@pytest.fixture
+def fake_prokerala(monkeypatch):
+    server = _FakeProkerala()
+
+    def shared_client():
+        loop = asyncio.get_running_loop()
+        if getattr(shared_client, "loop", None) is not loop:
+            shared_client.loop = loop
+            shared_client.client = ProkeralaClient(base_url="https://api.test", rate_per_second=0,
+                                                   transport=httpx.MockTransport(server))
+        return shared_client.client
+
+    monkeypatch.setattr(prokerala_client, "get_prokerala_client", shared_client)
+    return server
+
+
+def test_concurrent_callers_share_one_refresh(fake_prokerala):
+    async def scenario():
+        tokens = get_prokerala_token_manager("id", "secret")
+        results = await asyncio.gather(*(tokens.get_token() for _ in range(20)))
+        again = await tokens.get_token()
+        return results, again, tokens.get_stats()
+
+    results, again, stats = asyncio.run(scenario())
+    assert set(results) == {"tok-1"} and again == "tok-1"
+    assert fake_prokerala.token_calls == 1
+    assert stats["refreshes"] == 1
+    assert stats["waiters"] == 20
+    assert stats["max_wait_ms"] >= 10
+
+
+def test_401_forces_a_single_refresh_for_all_stale_requests(fake_prokerala):
+    async def scenario():
+        tokens = get_prokerala_token_manager("id", "secret")
+        await tokens.get_token()
+        fake_prokerala.valid_token = "revoked-upstream"  # every request now gets 401
+        client = prokerala_client.get_prokerala_client()
+        responses = await asyncio.gather(*(client.api_get("/v2/astrology/birth-details") for _ in range(5)))
+        return responses, tokens.get_stats(), client.get_stats()
+
+    responses, token_stats, client_stats = asyncio.run(scenario())
+    assert all(r.status_code == 200 for r in responses)
+    assert fake_prokerala.token_calls == 2
+    assert client_stats["unauthorized_retries"] == 5
+    assert token_stats["refreshes"] == 2
+
+
+def test_token_is_renewed_in_the_background_before_expiry(fake_prokerala):
+    fake_prokerala.expires_in = 60.05  # renewal is scheduled right away (60s margin)
+
+    async def scenario():
+        tokens = get_prokerala_token_manager("id", "secret")
+        first = await tokens.get_token()
+        await asyncio.sleep(0.1)
+        stats = tokens.get_stats()
+        tokens.close()
+        return first, tokens.token, stats
+
+    first, current, stats = asyncio.run(scenario())
+    assert first == "tok-1"
+    assert current != "tok-1"
+    assert stats["background_renewals"] >= 1
@@ -0,0 +1,58 @@
+"""
+Tests for single-query multi-domain retrieval in the RAG knowledge engine.
+"""
+
+import asyncio
+
+from enhanced_rag_knowledge_engine import RAGKnowledgeEngine
+
+
+def _row(domain, similarity):
+    return {
+        "id": 1, "knowledge_domain": domain, "content_type": "principle", "title": "t",
+        "content": f"{domain} {similarity}", "metadata": {}, "source_reference": "BPHS",
+        "authority_level": 3, "cultural_context": "vedic", "similarity": similarity,
+    }
+
+
+class _FakeConnection:
+    def __init__(self, rows, queries):
+        self.rows = rows
+        self.queries = queries
+
+    async def fetch(self, query, *args):
+        self.queries.append((query, args))
+        return self.rows
+
+
+def _engine(fake_pool, rows):
+    engine = RAGKnowledgeEngine.__new__(RAGKnowledgeEngine)
+    queries = []
+    engine.db_pool = fake_pool(lambda: _FakeConnection(rows, queries))
+    return engine, queries
+
+
+def test_all_domains_are_fetched_in_one_query_and_thresholded_afterwards(fake_pool):
+    engine, queries = _engine(fake_pool, [
+        _row("career_astrology", 0.91),
+        _row("career_astrology", 0.78),
+        _row("remedial_measures", 0.83),
+    ])
+
+    results = asyncio.run(engine._retrieve_domain_knowledge(
+        ["career_astrology", "remedial_measures", "career_astrology"], [0.1] * 4, "q", "comprehensive"
+    ))
+
+    assert len(queries) == 1
+    query, args = queries[0]
+    assert args[1] == ["career_astrology", "remedial_measures"]
+    # The distance is only computed for ordering, never filtered in SQL
+    assert "ORDER BY embedding_vector <=> $1::vector" in query
+    assert "> $3" not in query
+    assert [r.relevance_score for r in results] == [0.91, 0.83]
+
+
+def test_empty_domain_list_skips_the_database(fake_pool):
+    engine, queries = _engine(fake_pool, [])
+    assert asyncio.run(engine._retrieve_domain_knowledge([], [0.1], "q", "standard")) == []
+    assert queries == []
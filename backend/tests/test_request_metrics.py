@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from monitoring.request_metrics import RequestMetrics, route_template
+
+
+class _Route:
+    def __init__(self, path):
+        self.path = path
+
+
+def test_histograms_are_keyed_by_route_template_and_estimate_percentiles():
+    metrics = RequestMetrics()
+    for elapsed in [3] * 90 + [40] * 9 + [7000]:
+        metrics.record("GET /api/users/{user_id}", elapsed, 200)
+    metrics.record("GET /api/users/{user_id}", 12, 503, error=True)
+
+    route = metrics.snapshot()["routes"][0]
+    assert route["count"] == 101 and route["errors"] == 1
+    assert route["status"] == {"2xx": 100, "5xx": 1}
+    assert (route["p50_ms"], route["p95_ms"], route["p99_ms"]) == (5.0, 50.0, 50.0)
+    assert route["max_ms"] == 7000 and route["buckets"]["le_10000"] == 1
+
+
+def test_route_series_are_bounded():
+    metrics = RequestMetrics(max_routes=2)
+    for n in range(5):
+        metrics.record(f"GET /r{n}", 1, 200)
+    assert sorted(entry["route"] for entry in metrics.snapshot()["routes"]) == ["GET /r0", "GET /r1", "other"]
+    assert metrics.snapshot()["requests"] == 5
+
+
+def test_route_template_uses_the_matched_route():
+    assert route_template({"method": "GET", "path": "/api/users/42", "route": _Route("/api/users/{user_id}")}) \
+        == "GET /api/users/{user_id}"
+    assert route_template({"method": "GET", "path": "/wp-login.php"}) == "GET <unmatched>"
+
+
+def test_asgi_middleware_streams_through_and_samples_detail_logging(monkeypatch):
+    pytest.importorskip("aiohttp")
+    pytest.importorskip("openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")  # The module builds its validator on import
+    from monitoring import core_integration
+
+    metrics = RequestMetrics()
+    logged = []
+    monkeypatch.setattr(core_integration, "get_request_metrics", lambda: metrics)
+    monkeypatch.setattr(core_integration, "db_manager", object())
+    monkeypatch.setattr(core_integration.MonitoringCoreIntegration, "_log_api_call",
+                        lambda self, **row: logged.append(row))
+    monkeypatch.setattr(core_integration, "MONITORING_TRACE_SAMPLE_RATE", 0.0)
+
+    async def app(scope, receive, send):
+        scope["route"] = _Route("/api/stream/{item}")  # What the router does on a match
+        await send({"type": "http.response.start", "status": 200 if scope["path"] != "/api/stream/bad" else 502})
+        for chunk in (b"one", b"two"):
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = core_integration.monitoring_integration.create_middleware()(app)
+
+    async def request(path):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await middleware({"type": "http", "method": "GET", "path": path}, None, send)
+        return sent
+
+    sent = asyncio.run(request("/api/stream/1"))
+    assert [message.get("body") for message in sent] == [None, b"one", b"two", b""]
+    asyncio.run(request("/api/stream/bad"))
+
+    route = metrics.snapshot()["routes"][0]
+    assert route["route"] == "GET /api/stream/{item}" and route["count"] == 2
+    # Nothing sampled, but server errors are always logged in full
+    assert [(row["endpoint"], row["status_code"]) for row in logged] == [("/api/stream/bad", 502)]
@@ -0,0 +1,86 @@
+from datetime import datetime, timezone
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from services.sidereal_ephemeris import (
+    NAKSHATRA_SPAN, get_sidereal_ephemeris, lahiri_ayanamsa, offline_payload_for,
+    tropical_ascendant, tropical_longitudes, vimshottari_dasha,
+)
+
+J2000 = 2451545.0
+
+
+def _angle_diff(a, b):
+    return abs((a - b + 180.0) % 360.0 - 180.0)
+
+
+def test_tropical_positions_match_reference_ephemeris_at_j2000():
+    # Geocentric apparent longitudes for 2000-01-01 12:00 (JPL Horizons, rounded)
+    reference = {"Sun": 280.37, "Moon": 223.32, "Mars": 327.96, "Mercury": 271.89,
+                 "Jupiter": 25.25, "Venus": 241.57, "Saturn": 40.40, "Rahu": 125.04}
+    order = ["Sun", "Moon", "Mars", "Mercury", "Jupiter", "Venus", "Saturn", "Rahu", "Ketu"]
+    computed = dict(zip(order, tropical_longitudes(J2000)[0]))
+
+    for name, expected in reference.items():
+        assert _angle_diff(computed[name], expected) < 0.1, name
+    assert _angle_diff(computed["Ketu"], computed["Rahu"] + 180.0) < 1e-9
+    assert lahiri_ayanamsa(J2000) == pytest.approx(23.857, abs=0.005)
+
+
+def test_ascendant_geometry():
+    # Local sidereal time 0h on the equator: 0° Aries culminates, 0° Cancer rises
+    jd_lst_zero = J2000 - 280.46061837 / 360.98564736629
+    assert _angle_diff(float(tropical_ascendant(jd_lst_zero, 0.0, 0.0)), 90.0) < 0.05
+
+
+def test_batch_chart_is_shaped_like_prokerala_and_vectorized():
+    engine = get_sidereal_ephemeris()
+    moments = [datetime(2000, 1, 1, 12, tzinfo=timezone.utc), datetime(1990, 4, 12, 1, tzinfo=timezone.utc)]
+    charts = engine.compute_charts(moments, [9.66845, 13.0827], [80.00742, 80.2707])
+
+    first = charts[0]["birth_details"]
+    assert first["nakshatra"]["name"] == "Swati" and first["nakshatra"]["lord"]["name"] == "Rahu"
+    assert first["chandra_rasi"]["name"] == "Tula" and first["soorya_rasi"]["name"] == "Dhanu"
+    assert first["lagna"]["name"] == "Mithuna"
+    assert first["zodiac"]["name"] == "Capricorn"
+
+    positions = charts[0]["planet_position"]
+    assert [p["name"] for p in positions][-1] == "Ascendant"
+    assert positions[-1]["position"] == 1
+    assert all(1 <= p["nakshatra"]["pada"] <= 4 for p in positions)
+    assert next(p for p in positions if p["name"] == "Rahu")["is_retrograde"]
+    assert charts[1]["birth_details"] != first
+
+    houses = engine.south_indian_houses(charts[0])
+    assert houses[0]["rasi"] == "Mithuna" and "Asc" in houses[0]["planets"]
+    assert sum(len(h["planets"]) for h in houses) == 10
+
+
+def test_vimshottari_dasha_covers_the_cycle_from_the_birth_balance():
+    birth = datetime(2000, 1, 1, 12, tzinfo=timezone.utc)
+    moon = 5.5 * NAKSHATRA_SPAN  # Halfway through Ardra (ruled by Rahu)
+    dashas = vimshottari_dasha(moon, birth)
+
+    assert [d["name"] for d in dashas][:3] == ["Rahu", "Jupiter", "Saturn"]
+    first_end = datetime.fromisoformat(dashas[0]["end"])
+    assert (first_end - birth).days == pytest.approx(9 * 365.25, abs=1)  # Half of Rahu's 18 years left
+    assert len(dashas[0]["antardasha"]) == 9 and dashas[0]["antardasha"][0]["name"] == "Rahu"
+    assert dashas[0]["antardasha"][-1]["end"] == dashas[0]["end"]
+
+
+def test_offline_payloads_stand_in_for_prokerala_and_check_consistency():
+    params = {"datetime": "2000-01-01T17:30:00+05:30", "coordinates": "9.66845,80.00742", "ayanamsa": "1"}
+    payload = offline_payload_for("/v2/astrology/birth-details", params)
+    assert payload["data"]["nakshatra"]["name"] == "Swati"
+    assert "planet_position" in offline_payload_for("/v2/astrology/planet-position", params)["data"]
+    assert offline_payload_for("/v2/astrology/kaal-sarp-dosha", params) is None
+
+    engine = get_sidereal_ephemeris()
+    moment = datetime(2000, 1, 1, 12, tzinfo=timezone.utc)
+    assert engine.check_consistency(payload, moment, 9.66845, 80.00742)["consistent"]
+    cached = {"data": {**payload["data"], "nakshatra": {"name": "Rohini", "pada": 1}}}
+    result = engine.check_consistency(cached, moment, 9.66845, 80.00742)
+    assert not result["consistent"]
+    assert result["mismatches"] == [{"field": "nakshatra", "prokerala": "Rohini", "offline": "Swati"}]
@@ -0,0 +1,43 @@
+import asyncio
+
+from utils.ttl_cache import TTLLRUCache
+
+
+def test_least_recently_used_entries_are_evicted_at_the_entry_limit():
+    cache = TTLLRUCache(max_entries=2, max_bytes=10_000, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_byte_budget_bounds_memory():
+    cache = TTLLRUCache(max_entries=100, max_bytes=1_000, ttl_seconds=60, sizeof=lambda value: len(value))
+    for i in range(10):
+        cache.set(i, "x" * 300)
+
+    assert cache.bytes_used <= 1_000
+    assert len(cache) == 2
+    cache.set("huge", "x" * 5_000)  # Larger than the whole budget: never stored
+    assert "huge" not in cache
+
+
+def test_expired_entries_miss_and_are_swept_in_the_background():
+    cache = TTLLRUCache(max_entries=10, max_bytes=10_000, ttl_seconds=0.01, sweep_interval=0.02)
+
+    async def scenario():
+        cache.set("guest_1", {"chart": 1})
+        cache.set("guest_2", {"chart": 2})
+        await asyncio.sleep(0.015)
+        missed = cache.get("guest_1")
+        await asyncio.sleep(0.03)
+        return missed
+
+    assert asyncio.run(scenario()) is None
+    stats = cache.get_stats()
+    assert stats["entries"] == 0 and stats["bytes_used"] == 0
+    assert stats["expired"] == 2 and stats["sweeps"] >= 1
@@ -0,0 +1,105 @@
+"""
+Tests for the in-memory NumPy knowledge vector index.
+"""
+
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from services.vector_index import RAGVectorIndex
+
+
+def _row(title, domain, vector):
+    return {
+        "id": hash(title) & 0xFFFF, "knowledge_domain": domain, "content_type": "principle",
+        "title": title, "content": title, "metadata": {}, "source_reference": "BPHS",
+        "authority_level": 3, "cultural_context": "vedic",
+        "embedding": "[" + ",".join(str(x) for x in vector) + "]",
+    }
+
+
+class _FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetch(self, query, *args):
+        return self.rows
+
+
+def _loaded_index(fake_pool, rows):
+    index = RAGVectorIndex()
+    pool = fake_pool(lambda: _FakeConnection(rows))
+    assert asyncio.run(index.ensure_loaded(pool))
+    return index, pool
+
+
+def test_top_k_per_domain_matches_brute_force_cosine(fake_pool):
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(40, 8)).astype(np.float32)
+    rows = [_row(f"piece {i}", "career_astrology" if i % 2 else "remedial_measures", v) for i, v in enumerate(vectors)]
+    index, _ = _loaded_index(fake_pool, rows)
+    query = rng.normal(size=8).astype(np.float32)
+
+    results = index.search(query.tolist(), ["career_astrology", "remedial_measures"], top_k=3)
+
+    for domain, parity in (("career_astrology", 1), ("remedial_measures", 0)):
+        got = [(row["title"], score) for row, score in results if row["knowledge_domain"] == domain]
+        candidates = [(f"piece {i}", float(v @ query / (np.linalg.norm(v) * np.linalg.norm(query))))
+                      for i, v in enumerate(vectors) if i % 2 == parity]
+        expected = sorted(candidates, key=lambda c: -c[1])[:3]
+        assert [title for title, _ in got] == [title for title, _ in expected]
+        assert [score for _, score in got] == pytest.approx([score for _, score in expected], abs=1e-5)
+
+
+def test_upsert_refreshes_without_reloading_and_skips_zero_vectors(fake_pool):
+    index, pool = _loaded_index(fake_pool, [_row("old", "career_astrology", [1.0, 0.0])])
+
+    index.upsert({"title": "new", "content": "new", "domain": "career_astrology"}, [0.0, 1.0])
+    index.upsert({"title": "fallback", "content": "fallback", "knowledge_domain": "career_astrology"}, [0.0, 0.0])
+    results = index.search([0.1, 1.0], ["career_astrology"], top_k=5)
+
+    assert [row["title"] for row, _ in results] == ["new", "old"]
+    assert pool.checkouts == 1
+    assert index.get_stats()["entries"] == 3
+
+
+def test_upserts_write_in_place_and_follow_domain_moves(fake_pool):
+    index, _ = _loaded_index(fake_pool, [_row(f"p{i}", "career_astrology", [1.0, float(i)]) for i in range(3)])
+    block = index._blocks["career_astrology"]
+    matrix = block.matrix
+
+    index.upsert({"title": "p1", "content": "p1", "knowledge_domain": "career_astrology"}, [0.0, 1.0])
+    assert block.matrix is matrix  # Overwritten in place, nothing re-packed
+    index.upsert({"title": "p0", "content": "p0", "knowledge_domain": "remedial_measures"}, [1.0, 0.0])
+
+    assert [row["title"] for row, _ in index.search([0.0, 1.0], ["career_astrology"], top_k=5)] == ["p1", "p2"]
+    assert [row["title"] for row, _ in index.search([1.0, 0.0], ["remedial_measures"], top_k=5)] == ["p0"]
+    assert index.get_stats()["domains"] == {"career_astrology": 2, "remedial_measures": 1}
+
+    for i in range(40):  # Grows by doubling past the initial capacity
+        index.upsert({"title": f"n{i}", "content": "n", "knowledge_domain": "remedial_measures"}, [1.0, 1.0])
+    assert index.get_stats()["entries"] == 43
+
+
+def test_unknown_domain_and_dimension_mismatch_return_nothing(fake_pool):
+    index, _ = _loaded_index(fake_pool, [_row("a", "career_astrology", [1.0, 0.0])])
+    assert index.search([1.0, 0.0], ["world_knowledge"], top_k=5) == []
+    assert index.search([1.0, 0.0, 0.0], ["career_astrology"], top_k=5) == []
+
+
+def test_upserts_during_a_load_survive_the_snapshot_swap(fake_pool):
+    index = RAGVectorIndex()
+
+    class _SlowConnection(_FakeConnection):
+        async def fetch(self, query, *args):
+            # The seeder writes a piece after the snapshot query has already run
+            index.upsert({"title": "late", "content": "late", "domain": "career_astrology"}, [0.0, 1.0])
+            return self.rows
+
+    pool = fake_pool(lambda: _SlowConnection([_row("old", "career_astrology", [1.0, 0.0])]))
+    assert asyncio.run(index.ensure_loaded(pool))
+
+    assert sorted(row["title"] for row, _ in index.search([1.0, 1.0], ["career_astrology"], top_k=5)) == ["late", "old"]
+    assert index._pending_upserts is None
@@ -0,0 +1,123 @@
+import asyncio
+
+from monitoring.ws_publisher import ConnectionManager, HealthPublisher, merge_patch
+
+
+class _Manager:
+    """Records what each client would receive, like ConnectionManager.broadcast"""
+
+    def __init__(self, clients=()):
+        self.active_connections = list(clients)
+        self.pending_snapshot = set(clients)
+        self.received = {client: [] for client in clients}
+
+    def connect(self, client):
+        self.active_connections.append(client)
+        self.pending_snapshot.add(client)
+        self.received[client] = []
+
+    async def broadcast(self, message, snapshot=None):
+        for client in self.active_connections:
+            if snapshot is not None and client in self.pending_snapshot:
+                self.received[client].append(snapshot)
+                self.pending_snapshot.discard(client)
+            elif message is not None:
+                self.received[client].append(message)
+
+
+def _collector(states):
+    calls = []
+
+    async def collect():
+        calls.append(1)
+        return states[min(len(calls), len(states)) - 1]
+
+    return collect, calls
+
+
+def test_merge_patch_sends_only_what_changed():
+    old = {"system_health": {"status": "healthy", "points": {"openai": {"ok": True}, "rag": {"ok": True}}},
+           "db_pool": {"in_use": 3}}
+    new = {"system_health": {"status": "healthy", "points": {"openai": {"ok": False}}}, "db_pool": {"in_use": 3}}
+    assert merge_patch(old, new) == {"system_health": {"points": {"openai": {"ok": False}, "rag": None}}}
+    assert merge_patch(new, new) == {}
+    # null means "remove" in a merge patch, so a value turning null needs a snapshot
+    assert merge_patch({"a": 1}, {"a": None}) is None
+    # ...and so does a new or replaced object carrying a null anywhere inside it
+    assert merge_patch({"a": 1}, {"a": 1, "b": {"err": None, "x": 1}}) is None
+    assert merge_patch({"a": 1}, {"a": {"deep": {"err": None}}}) is None
+    assert merge_patch({}, {"b": {"errors": [None]}}) == {"b": {"errors": [None]}}
+
+
+def test_one_collection_per_tick_snapshot_first_then_deltas():
+    states = [{"system_health": {"status": "healthy", "active_sessions": 1}},
+              {"system_health": {"status": "healthy", "active_sessions": 2}},
+              {"system_health": {"status": "healthy", "active_sessions": 2}}]
+    collect, calls = _collector(states)
+    manager = _Manager(["tab1", "tab2", "tab3"])
+    publisher = HealthPublisher(manager, collect)
+
+    async def ticks():
+        await publisher.publish()
+        await publisher.publish()
+        manager.connect("tab4")
+        await publisher.publish()  # Unchanged: only the new tab gets anything
+
+    asyncio.run(ticks())
+    assert len(calls) == 3
+    first, second = manager.received["tab1"]
+    assert first["type"] == "monitoring_snapshot" and first["data"] == states[0] and first["seq"] == 1
+    assert second == {**second, "type": "monitoring_delta", "seq": 2,
+                      "patch": {"system_health": {"active_sessions": 2}}}
+    assert [m["type"] for m in manager.received["tab4"]] == ["monitoring_snapshot"]
+    assert manager.received["tab4"][0]["data"] == states[2] and manager.received["tab4"][0]["seq"] == 2
+
+
+def test_publisher_computes_nothing_without_clients_and_publishes_on_connect():
+    collect, calls = _collector([{"system_health": {"status": "healthy"}}])
+    manager = _Manager()
+    publisher = HealthPublisher(manager, collect, interval=0.01)
+
+    async def scenario():
+        publisher.start()
+        await asyncio.sleep(0.05)
+        idle_calls = len(calls)
+        manager.connect("tab1")
+        publisher.wake()
+        await asyncio.sleep(0.05)
+        await publisher.stop()
+        return idle_calls
+
+    assert asyncio.run(scenario()) == 0
+    assert calls and manager.received["tab1"][0]["type"] == "monitoring_snapshot"
+
+
+def test_broadcast_is_concurrent_and_drops_clients_that_time_out():
+    class _Socket:
+        def __init__(self, delay):
+            self.delay, self.sent, self.closed = delay, [], False
+
+        async def accept(self):
+            pass
+
+        async def send_json(self, message):
+            await asyncio.sleep(self.delay)
+            self.sent.append(message)
+
+        async def close(self, code=1000):
+            self.closed = True
+
+    async def scenario():
+        manager = ConnectionManager(send_timeout=0.05)
+        fast, stuck = _Socket(0.01), _Socket(10)
+        await manager.connect(fast)
+        await manager.connect(stuck)
+        started = asyncio.get_running_loop().time()
+        await manager.broadcast({"type": "monitoring_delta"}, snapshot={"type": "monitoring_snapshot"})
+        await manager.broadcast({"type": "monitoring_delta"}, snapshot={"type": "monitoring_snapshot"})
+        return manager, fast, stuck, asyncio.get_running_loop().time() - started
+
+    manager, fast, stuck, elapsed = asyncio.run(scenario())
+    assert [m["type"] for m in fast.sent] == ["monitoring_snapshot", "monitoring_delta"]
+    assert manager.active_connections == [fast] and stuck.closed
+    assert elapsed < 0.5
@@ -0,0 +1,24 @@
+"""
+Server-Sent Events helpers for streaming guidance endpoints
+"""
+
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Tuple
+
+# Disable proxy buffering (nginx / Render) so tokens reach the browser as they are produced
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse_event(event: str, data: Any) -> str:
+    """Encode one SSE frame; data is JSON so multi-line text stays in one frame"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+async def sse_stream(events: AsyncIterable[Tuple[str, Dict[str, Any]]]) -> AsyncIterator[str]:
+    """Turn an async iterable of (event, data) pairs into SSE frames"""
+    async for event, data in events:
+        yield format_sse_event(event, data)
@@ -0,0 +1,143 @@
+"""
+Bounded in-memory TTL/LRU cache
+
+Entries expire after ``ttl_seconds`` and the least recently used entries are
+evicted once either the entry count or the approximate byte budget is
+exceeded. Expired entries are also removed by a background sweeper, so keys
+that are never looked up again do not stay in memory.
+"""
+
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_ENTRY_OVERHEAD_BYTES = 200  # key, OrderedDict node and entry tuple
+
+
+def json_size(value: Any) -> int:
+    """Approximate footprint of a JSON-like value"""
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 1024
+
+
+class TTLLRUCache:
+    """OrderedDict-backed LRU with per-entry TTL, entry and byte limits"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float,
+                 sizeof: Callable[[Any], int] = json_size, sweep_interval: float = 60.0):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self._sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()  # value, deadline, size
+        self.bytes_used = 0
+        self._sweeper: Optional[asyncio.Task] = None
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "sweeps": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[1] > time.monotonic()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return default
+        if entry[1] <= time.monotonic():
+            self._remove(key)
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return default
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        size = self._sizeof(value) + _ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        deadline = time.monotonic() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        self._entries[key] = (value, deadline, size)
+        self.bytes_used += size
+        while len(self._entries) > self.max_entries or self.bytes_used > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+        self._ensure_sweeper()
+
+    def resize(self, key: Hashable):
+        """Re-measure an entry whose value was mutated in place"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.set(key, entry[0], entry[1] - time.monotonic())
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._remove(key)
+        return entry[0] if entry is not None else default
+
+    def _remove(self, key: Hashable) -> Optional[Tuple[Any, float, int]]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes_used -= entry[2]
+        return entry
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        """Live (unexpired) entries, without touching LRU order"""
+        now = time.monotonic()
+        return ((key, entry[0]) for key, entry in list(self._entries.items()) if entry[1] > now)
+
+    def sweep(self) -> int:
+        """Drop every expired entry; returns how many were removed"""
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if entry[1] <= now]
+        for key in expired:
+            self._remove(key)
+        self.stats["expired"] += len(expired)
+        self.stats["sweeps"] += 1
+        return len(expired)
+
+    def _ensure_sweeper(self):
+        if self._sweeper is not None and not self._sweeper.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No loop (sync caller); expiry still happens on access
+        self._sweeper = loop.create_task(self._sweep_forever())
+
+    async def _sweep_forever(self):
+        while self._entries:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning(f"Cache sweep failed: {e}")
+        # Idle caches hold no task; the next set() starts a new sweeper
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes_used = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes_used": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
@@ -20,6 +20,8 @@ logger = logging.getLogger(__name__)
 import openai
 import os
 
+from services.embedding_service import get_embedding_service
+
 class RAGValidator:
     """
     Validates RAG knowledge retrieval for relevance and quality.
@@ -35,6 +37,7 @@ class RAGValidator:
         if not api_key:
             raise ValueError("OpenAI API key is missing. Please set the OPENAI_API_KEY environment variable.")
         self.openai_client = openai.AsyncClient(api_key=api_key)
+        self.embedding_service = get_embedding_service(self.openai_client)
         self.spiritual_keywords = self._load_spiritual_keywords()
         self.domain_keywords = self._load_domain_keywords()
         
@@ -388,18 +391,11 @@ class RAGValidator:
     async def _calculate_semantic_similarity(self, text1: str, text2: str) -> float:
         """Calculate semantic similarity using OpenAI embeddings"""
         try:
-            # Get embeddings
-            embedding1_response = await self.openai_client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=text1[:8000]  # Limit length
-            )
-            embedding2_response = await self.openai_client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=text2[:8000]
-            )
-            
-            embedding1 = embedding1_response.data[0].embedding
-            embedding2 = embedding2_response.data[0].embedding
+            # Get both embeddings in one batched request
+            embedding1, embedding2 = await self.embedding_service.embed_many([
+                text1[:8000],  # Limit length
+                text2[:8000]
+            ])
             
             # Calculate cosine similarity
             if NUMPY_AVAILABLE: